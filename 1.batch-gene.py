@@ -1,29 +1,30 @@
-from helper import sign_in, get_datafields, get_standard_search_scope, create_simulation_data
+from helper import sign_in, get_standard_search_scope, AlphaCombinations
+from datafield_catalog import DatafieldCatalog
+from validator import ExpressionValidator
+from payload_batch import JSON_HEADERS, payload_body
+from rate_limiter import limited_request
 
+# 整个运行只取一次会话：token到期前自动续期，遇到401自动重新登录，不需要定期重新登录
 sess = sign_in()
 
 searchScope = get_standard_search_scope()
-dataField = get_datafields(s=sess, searchScope=searchScope, dataset_id='news12') # 这里可以改改
-dataField = dataField[dataField['type'] == "MATRIX"]
-dataField.head()
-
-datafields_list_dataField = dataField['id'].values
+catalog = DatafieldCatalog()
+catalog.sync(sess, searchScope, dataset_ids=['news12']) # 这里可以改改
+# 也可以跨数据集查询，例如 catalog.ids(searchScope, type='MATRIX', min_coverage=0.8, search='sales')
+datafields_list_dataField = catalog.ids(searchScope, dataset='news12', type='MATRIX')
 print(datafields_list_dataField)
 print(len(datafields_list_dataField))
 
 
 # 将datafield替换到Alpha模板(框架)中group_rank({fundamental model data}/cap,subindustry)批量生成Alpha
-alpha_list = []
-
-for index,datafield in enumerate(datafields_list_dataField,start=1):
-    
-    alpha_expression = f'group_rank(({datafield})/cap, subindustry)'
-    print(f"正在循环第 {index} 个元素,组装alpha表达式: {alpha_expression}")
-    simulation_data = create_simulation_data(alpha_expression)
-    alpha_list.append(simulation_data)
+# 惰性生成，访问时才组装模拟数据
+alpha_list = AlphaCombinations('group_rank(({datafield})/cap, subindustry)',
+                               [('datafield', datafields_list_dataField)]).simulation_data()
 
 print(f"there are {len(alpha_list)} Alphas to simulate")
 print(alpha_list[0])
+# 发送前按本地数据字段目录校验操作符、参数类型和settings
+validator = ExpressionValidator(catalog)
 
 
 # 将Alpha一个一个发送至服务器进行回测,并检查是否断线，如断线则重连，并继续发送
@@ -32,19 +33,21 @@ from time import sleep
 for index,alpha in enumerate(alpha_list,start=1):
     if index < 1:   #如果中断重跑，可以修改1从指定位置重跑，即可跳过已经模拟过的Alpha
         continue
-    if index % 100 == 0:
-        sess = sign_in()
-        print(f"重新登录，当前index为{index}")
-        
-    sim_resp = sess.post(
+    errors = validator.errors(alpha)
+    if errors:   # 注定被服务器拒绝的alpha不发送，index保持不变，重跑时位置仍然对应
+        print(f"跳过无效的Alpha {index}: {alpha['regular']}: {'; '.join(errors)}")
+        continue
+    sim_resp = limited_request(
+        sess, 'post',
         'https://api.worldquantbrain.com/simulations',
-        json=alpha,
+        data=payload_body(alpha),
+        headers=JSON_HEADERS,
     )
 
     try:
         sim_progress_url = sim_resp.headers['Location']
         while True:
-            sim_progress_resp = sess.get(sim_progress_url)
+            sim_progress_resp = limited_request(sess, 'get', sim_progress_url)
             retry_after_sec = float(sim_progress_resp.headers.get("Retry-After", 0))
             if retry_after_sec == 0:  # simulation done!模拟完成!
                 break
@@ -52,6 +55,10 @@ for index,alpha in enumerate(alpha_list,start=1):
         alpha_id = sim_progress_resp.json()["alpha"]  # the final simulation result.# 最终模拟结果
         print(f"{index}: {alpha_id}: {alpha['regular']}")
     except:
+        if sim_resp.status_code == 429:
+            # 被限流时限流器已经降速，不再额外睡眠
+            print("throttled, try next alpha at the limiter's rate.")
+            continue
         print("no location, sleep for 10 seconds and try next alpha.“没有位置，睡10秒然后尝试下一个字母。”")
         sleep(10)
 
@@ -1,12 +1,18 @@
 # 登录
-from helper import sign_in, get_datafields, get_standard_search_scope, create_simulation_data, generate_alpha_combinations
+from helper import sign_in, get_standard_search_scope, iter_unique_alphas
+from datafield_catalog import DatafieldCatalog
+from template_engine import AlphaTemplate
+from validator import ExpressionValidator
+from payload_batch import JSON_HEADERS, payload_body
+from rate_limiter import limited_request
 
 sess = sign_in()
 
 searchScope = get_standard_search_scope()
-fnd6 = get_datafields(s=sess, searchScope=searchScope, dataset_id='news12')
-fnd6 = fnd6[fnd6['type'] == "MATRIX"] # 筛选类型为 "MATRIX" 的数据字段
-datafields_list_fnd6 = fnd6['id'].values  # 提取数据字段的ID并转换为列表 比如：['assets', 'liabilities', 'revenue', ...]
+catalog = DatafieldCatalog()
+catalog.sync(sess, searchScope, dataset_ids=['news12'])  # 本地目录没有该数据集或已过期时从服务器同步
+# 筛选类型为 "MATRIX" 的数据字段ID 比如：['assets', 'liabilities', 'revenue', ...]
+datafields_list_fnd6 = catalog.ids(searchScope, dataset='news12', type='MATRIX')
 print(datafields_list_fnd6)
 print(len(datafields_list_fnd6))
 
@@ -21,34 +27,35 @@ days = [60, 200]
 # 定义分组依据列表
 group = ['market', 'industry', 'subindustry', 'sector', 'densify(pv13_h_f1_sector)']
 
-# 使用helper函数生成Alpha表达式组合
-alpha_expressions = generate_alpha_combinations(
-    group_compare_op, 
-    ts_compare_op, 
-    company_fundamentals, 
-    days, 
-    group
-)
+# 声明Alpha模板，代替手写的多层for循环（惰性展开，不在内存中生成全部组合）
+alpha_template = AlphaTemplate(
+    "<group_compare_op>(<ts_compare_op>(<company_fundamentals>, <days>), <group>)",
+    {'group_compare_op': group_compare_op, 'ts_compare_op': ts_compare_op,
+     'company_fundamentals': company_fundamentals, 'days': days, 'group': group})
+# 可以声明不需要的组合，例如：alpha_template.exclude(ts_compare_op='ts_av_diff', days=200)
 
-# 输出生成的alpha表达式总数 # 打印或返回结果字符串列表
-print(f"there are total {len(alpha_expressions)} alpha expressions")
+# 输出生成的alpha表达式总数 # 打印前几个结果
+print(f"there are total {alpha_template.count()} alpha expressions")
+print(alpha_template.sample(5, seed=0))
 
-# 打印结果
-print(alpha_expressions[:5])
-print(len(alpha_expressions))
+# 将alpha表达式与setting封装，遍历时才生成模拟数据
+alpha_list = alpha_template.simulation_data()
+# 发送前按本地数据字段目录校验操作符、参数类型和settings，注定被服务器拒绝的alpha不发送
+validator = ExpressionValidator(catalog)
 
-# 将datafield替换到Alpha模板(框架)中group_rank({fundamental model data}/cap,subindustry)批量生成Alpha
-alpha_list = []
+# 输出
+print(next(iter(alpha_list)))
 
-print("将alpha表达式与setting封装")
-for index, alpha_expression in enumerate(alpha_expressions, start=1):
-    print(f"正在循环第 {index} 个元素,组装alpha表达式: {alpha_expression}")
-    simulation_data = create_simulation_data(alpha_expression)
-    alpha_list.append(simulation_data)
-print(f"there are {len(alpha_list)} Alphas to simulate")
+# 自适应搜索：设为整数（如500）时不再模拟全部组合，先小批量模拟，再按各操作符/字段/窗口/分组的通过率
+# 把剩余的模拟预算集中到产出高的取值上；为None时按原来的方式逐个模拟全部组合
+adaptive_budget = None
+if adaptive_budget:
+    from adaptive_search import AdaptiveSearch, session_simulator
 
-# 输出
-print(alpha_list[0])
+    search = AdaptiveSearch(alpha_template, session_simulator(sess), batch_size=20)
+    search.run(adaptive_budget)
+    print(search.summary())
+    raise SystemExit
 
 # 将Alpha一个一个发送至服务器进行回测,并检查是否断线，如断线则重连
 ##设置log
@@ -64,20 +71,22 @@ import logging
 
 alpha_fail_attempt_tolerance = 15 # 每个alpha允许的最大失败尝试次数
 
-# 从第0个元素开始迭代回测alpha_list
-for index in range(0, len(alpha_list)):
-    alpha = alpha_list[index]
+# 从第0个元素开始迭代回测alpha_list，等价的表达式（空白、多余括号、rank(rank(x))等写法不同）只模拟一次
+for index, alpha in enumerate(validator.filter(iter_unique_alphas(alpha_list))):
     print(f"{index}: {alpha['regular']}")
     logging.info(f"{index}: {alpha['regular']}")
     keep_trying = True  # 控制while循环继续的标志
     failure_count = 0  # 记录失败尝试次数的计数器
 
     while keep_trying:
+        sim_resp = None
         try:
-            # 尝试发送POST请求
-            sim_resp = sess.post(
+            # 尝试发送POST请求，经过共享限流器
+            sim_resp = limited_request(
+                sess, 'post',
                 'https://api.worldquantbrain.com/simulations',
-                json=alpha  # 将当前alpha（一个JSON）发送到服务器
+                data=payload_body(alpha),  # 将当前alpha（一个JSON）发送到服务器
+                headers=JSON_HEADERS
             )
 
             # 从响应头中获取位置
@@ -87,10 +96,15 @@ for index in range(0, len(alpha_list)):
             keep_trying = False  # 成功获取位置，退出while循环
 
         except Exception as e:
-            # 处理异常：记录错误，让程序休眠15秒后重试
-            logging.error(f"No Location, sleep 15 and retry, error message: {str(e)}")
-            print("No Location, sleep 15 and retry")
-            sleep(15)  # 休眠15秒后重试
+            if sim_resp is not None and sim_resp.status_code == 429:
+                # 被限流：限流器已经按Retry-After/AIMD降速，直接重试，由它决定等待多久
+                logging.error(f"Throttled, retry at the limiter's rate, error message: {str(e)}")
+                print("Throttled, retry at the limiter's rate")
+            else:
+                # 处理异常：记录错误，让程序休眠15秒后重试
+                logging.error(f"No Location, sleep 15 and retry, error message: {str(e)}")
+                print("No Location, sleep 15 and retry")
+                sleep(15)  # 休眠15秒后重试
             failure_count += 1  # 增加失败尝试次数
 
             # 检查失败尝试次数是否达到容忍上限
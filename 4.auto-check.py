@@ -5,9 +5,18 @@ import random
 import functools
 from datetime import datetime
 import argparse
+import atexit
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 
+from alpha_mirror import AlphaMirror
+from blacklist_store import BlacklistStore
+from candidates import MIRROR_COLUMNS, candidate_rows, filter_candidates
+from paging import PageFetchError, fetch_pages
+from rate_limiter import get_rate_limiter, limited_request
+from session_manager import get_session
+
 
 parser = argparse.ArgumentParser(description='Check Submission')
 parser.add_argument('--credentials_file', type=str, default="credentials.txt", help='账号文件')
@@ -18,8 +27,13 @@ parser.add_argument('--sharpe_th', type=float, default=1.25, help='Sharpe阈值'
 parser.add_argument('--fitness_th', type=float, default=1.0, help='Fitness阈值')
 parser.add_argument('--turnover_th', type=float, default=0.3, help='Turnover阈值')
 parser.add_argument('--region', type=str, default="USA", help='地区')
-parser.add_argument('--blacklist_file', type=str, default="blacklist.txt", help='黑名单文件路径')
+parser.add_argument('--blacklist_file', type=str, default="blacklist.txt", help='黑名单文件路径（手动维护，新增的ID启动时导入黑名单库）')
+parser.add_argument('--blacklist_db', type=str, default="blacklist.db", help='黑名单库（SQLite），检查和提交脚本共用')
 parser.add_argument('--add_passed_to_blacklist', type=bool, default=False, help='是否将检查通过的Alpha加入黑名单 (默认: False)')
+parser.add_argument('--check_workers', type=int, default=4, help='同时检查的Alpha数（共用同一个限流器）')
+parser.add_argument('--page_workers', type=int, default=8, help='并发获取Alpha列表分页的线程数')
+parser.add_argument('--mirror', type=str, default="alpha_mirror.db", help='本地Alpha镜像（SQLite），只同步上次之后修改过的Alpha；为空时每次从服务器读取全部分页')
+parser.add_argument('--quiet', action='store_true', help='不逐个打印跳过的和符合条件的Alpha（筛选大量Alpha时）')
 
 args = parser.parse_args()
 
@@ -50,33 +64,28 @@ def read_credentials(file_path):
         return "", ""
 
 
-# 读取黑名单（文件不存在时创建）
+# 打开黑名单库，并导入黑名单文件中新增的ID（文件没有变化时跳过）
 def read_blacklist(file_path):
-    blacklist = set()
+    blacklist = BlacklistStore(args.blacklist_db)
+    atexit.register(blacklist.close)
     try:
-        if not os.path.exists(file_path):
-            with open(file_path, 'w') as file:
-                pass
-            print(f"黑名单文件 {file_path} 不存在，已创建新文件")
-        else:
-            with open(file_path, 'r') as file:
-                for line in file:
-                    blacklist.add(line.strip())
-            print(f"已从黑名单文件中读取 {len(blacklist)} 个Alpha ID")
+        imported = blacklist.import_text(file_path)
+        if imported:
+            print(f"已从黑名单文件中导入 {imported} 个Alpha ID")
+        print(f"黑名单中共有 {len(blacklist)} 个Alpha ID")
     except Exception as e:
-        print(f"读取或创建黑名单文件时出错: {e}")
+        print(f"导入黑名单文件时出错: {e}")
     return blacklist
 
 
-# 更新黑名单（实时写入）
-def update_blacklist(file_path, alpha_id):
+# 更新黑名单（按批写入，多个脚本可以同时写）
+def update_blacklist(alpha_id, reason):
     try:
-        with open(file_path, 'a') as file:
-            file.write(f"{alpha_id}\n")
-            print(f"已实时将通过的Alpha ID {alpha_id} 添加到黑名单")
+        blacklist.add(alpha_id, reason=reason)
+        print(f"已将Alpha ID {alpha_id} 添加到黑名单 ({reason})")
         return True
     except Exception as e:
-        print(f"实时更新黑名单文件时出错: {e}")
+        print(f"更新黑名单时出错: {e}")
         return False
 
 def sign_in():
@@ -102,11 +111,11 @@ def sign_in():
         print(f"An error occurred while reading the credentials file: {e}")
         return None
 
-    s = requests.Session()
-    s.auth = (username, password)
+    # 同一账号共用一个会话，重新登录在原会话上进行，不丢弃连接池
+    s = get_session(username, password, pool_maxsize=max(10, args.check_workers))
     while True:
         try:
-            response = s.post('https://api.worldquantbrain.com/authentication')
+            response = s.refresh()
             response.raise_for_status()  # Raises a HTTPError if the status is 4xx, 5xx
             print(f"{response.json()['user']['id']},Authentication successful.")
             break  # Exit the loop on success
@@ -121,22 +130,22 @@ def sign_in():
 def session_close(session):
     session.close()
 
-def requests_wq(s,type='get',url='',json=None,t=15):
+def requests_wq(s,type='get',url='',json=None):
     session = s
     while True:
         try:
             if type == 'get':
-                ret = session.get(url)
+                ret = limited_request(session, 'get', url)
             if type == 'post':
                 if json == None:
-                    ret = session.post(url)
+                    ret = limited_request(session, 'post', url)
                 else:
-                    ret = session.post(url, json=json)
+                    ret = limited_request(session, 'post', url, json=json)
             if type == 'patch':
-                ret = session.patch(url, json=json)
+                ret = limited_request(session, 'patch', url, json=json)
             if ret.status_code == 429:
-                print(f"状态={ret.status_code},延时{t}秒")
-                time.sleep(t)
+                # 限流器已按Retry-After/AIMD降速，下次取令牌时自动等待
+                print(f"状态={ret.status_code},降速重试，当前速率{get_rate_limiter().rates()}")
                 continue
             if ret.status_code in (200,201):
                 return ret, session
@@ -243,59 +252,85 @@ def get_alpha_count(s,status):
 # 获取有效Alpha
 def get_alphas(s,start_date, end_date, sharpe_th, fitness_th, turnover_th, region, alpha_num):
     sess = s
-    output = []
-    count = 0
     current_year = datetime.now().strftime('%Y')
-    for i in range(0, alpha_num, 100):
-        print(i)
-        url = f"https://api.worldquantbrain.com/users/self/alphas?limit=100&offset={i}" \
-              f"&status=UNSUBMITTED%1FIS_FAIL&dateCreated%3E={current_year}-{start_date}" \
-              f"T00:00:00-04:00&dateCreated%3C{current_year}-{end_date}" \
-              f"T00:00:00-04:00&is.fitness%3E{fitness_th}&is.sharpe%3E{sharpe_th}" \
-              f"&settings.region={region}&order=is.sharpe&hidden=false&type!=SUPER" \
-              f"&is.turnover%3C{turnover_th}"
-
-        #response = s.get(url)
-        response,sess = requests_wq(sess,'get',url)
-        alpha_list = response.json()["results"]
-        if len(alpha_list) == 0: break
-        for j in range(len(alpha_list)):
-            alpha_id = alpha_list[j]["id"]
-            if alpha_id in blacklist:
-                print(f"跳过ID为 {alpha_id} 的Alpha，因为它在黑名单中")
-                continue
-            name = alpha_list[j]["name"]
-            dateCreated = alpha_list[j]["dateCreated"]
-            sharpe = alpha_list[j]["is"]["sharpe"]
-            fitness = alpha_list[j]["is"]["fitness"]
-            turnover = alpha_list[j]["is"]["turnover"]
-            margin = alpha_list[j]["is"]["margin"]
-            longCount = alpha_list[j]["is"]["longCount"]
-            shortCount = alpha_list[j]["is"]["shortCount"]
-            decay = alpha_list[j]["settings"]["decay"]
-            exp = alpha_list[j]['regular']['code']
-            count += 1
-            checks = alpha_list[j].get("is", {}).get("checks", [])
-            has_failed_checks = any(check.get('result') == 'FAIL' for check in checks if check)
-            if has_failed_checks:
-                print(f"跳过ID为 {alpha_id} 的Alpha，因为它有失败的检查项")
-                continue
-            if (longCount + shortCount) > 100 and turnover < turnover_th:
-                if sharpe < -sharpe_th:
-                    exp = "-%s" % exp
-                rec = [alpha_id, exp, sharpe, turnover, fitness, margin, dateCreated, decay]
-                print(rec)
-                output.append(rec)
+    url = "https://api.worldquantbrain.com/users/self/alphas?limit=100&offset={offset}" \
+          f"&status=UNSUBMITTED%1FIS_FAIL&dateCreated%3E={current_year}-{start_date}" \
+          f"T00:00:00-04:00&dateCreated%3C{current_year}-{end_date}" \
+          f"T00:00:00-04:00&is.fitness%3E{fitness_th}&is.sharpe%3E{sharpe_th}" \
+          f"&settings.region={region}&order=is.sharpe&hidden=false&type!=SUPER" \
+          f"&is.turnover%3C{turnover_th}"
+
+    # 第一页返回count后，其余分页并发获取（共用限流器），按offset顺序合并
+    def fetch(page_url):
+        response, _ = requests_wq(sess, 'get', page_url)
+        return response.json() if response is not None else None
+    try:
+        if args.mirror:
+            # 从服务器只同步增量，筛选在本地镜像上完成
+            mirror = AlphaMirror(args.mirror)
+            try:
+                synced = mirror.sync(fetch)
+                print(f"本地镜像同步了 {synced} 个Alpha，共 {len(mirror)} 个")
+                # 直接取展开好的列，不解析每条alpha的原始JSON
+                alphas = mirror.frame(MIRROR_COLUMNS, region=region,
+                                      created_after=f"{current_year}-{start_date}T00:00:00-04:00",
+                                      created_before=f"{current_year}-{end_date}T00:00:00-04:00",
+                                      sharpe=(sharpe_th, None), fitness=(fitness_th, None), max_turnover=turnover_th,
+                                      limit=alpha_num)
+            finally:
+                mirror.close()
+        else:
+            alphas = fetch_pages(fetch, url, page_size=100, max_items=alpha_num, max_workers=args.page_workers)
+    except PageFetchError as e:
+        # 缺页时的列表不完整，本轮不检查
+        print(f"\033[31m获取Alpha列表失败（offset {e.offsets}），本轮不检查\033[0m")
+        return [], sess
+    print(f"获取到 {len(alphas)} 个Alpha")
+    # 黑名单、失败的检查项、持仓数和Turnover按列一次筛完
+    candidates, skipped, count = filter_candidates(alphas, blacklist, sharpe_th, turnover_th)
+    output = candidate_rows(candidates)
+    if not args.quiet:
+        for alpha_id in skipped['blacklist']:
+            print(f"跳过ID为 {alpha_id} 的Alpha，因为它在黑名单中")
+        for alpha_id in skipped['failed_checks']:
+            print(f"跳过ID为 {alpha_id} 的Alpha，因为它有失败的检查项")
+        for rec in output:
+            print(rec)
+    print(f"跳过: 黑名单中 {len(skipped['blacklist'])} 个，有失败检查项 {len(skipped['failed_checks'])} 个")
     print("count: %d" % count)
     return output,sess
 
 
+# 检查一个Alpha并按结果打标签（在检查线程中运行）
+def check_alpha(s, alpha_id):
+    try:
+        for count_i in range(3):  #3次机会
+            check_result,s = get_check_submission(s, alpha_id)
+            if check_result != "sleep":
+                break
+            #延时40S
+            time.sleep(40)
+    except Exception as e:
+        print(f"Alpha {alpha_id}: 检查时出错: {e}")
+        check_result = "error"
+    if check_result in ("sleep","timeout","nan","ERROR","error"):
+        print(f"Alpha={alpha_id}: \033[33m 检查结果:{check_result},打上标签timeout,，到平台查看Tag-timeout,并手动检查 \033[0m")
+        set_alpha_properties(s, alpha_id, name=datetime.now().strftime("%Y.%m.%d"), color=None, selection_desc="None", combo_desc="None",
+                             tags="timeout", )
+    elif check_result != "FAIL":
+        print(f"Alpha {alpha_id}: \033[32m 检查通过,打上OKOK标签,到平台查看Tag-OKOK,并手动提交 \033[0m")
+        set_alpha_properties(s, alpha_id, name=datetime.now().strftime("%Y.%m.%d"), color=None, selection_desc="None", combo_desc="None",
+                             tags="OKOK", )
+    return check_result
+
+
 # 主程序
 def main():
     print("=== Check Submission ===")
     print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"凭据文件: {args.credentials_file}")
     print(f"黑名单文件: {args.blacklist_file}")
+    print(f"黑名单库: {args.blacklist_db}")
     print(f"日期范围: {start_date} 至 {end_date}")
     print(f"检查的Alpha数量: {alpha_num}")
     print(f"地区: {region}")
@@ -303,6 +338,7 @@ def main():
     print(f"Fitness阈值: {fitness_th}")
     print(f"Turnover阈值: {turnover_th}")
     print(f"检查通过的Alpha是否加入黑名单: {args.add_passed_to_blacklist}")  # 新增显示
+    print(f"并发检查数: {args.check_workers}")
 
     if not username or not password:
         print("未能获取有效的用户名或密码，请检查凭据文件格式。")
@@ -333,51 +369,40 @@ def main():
         print("没有发现符合条件的有效Alpha，无需提交。")
         return
 
-    print(f"\n准备检测 {len(valid_alphas)} 个有效Alpha")
-    failed = 0
+    print(f"\n准备检测 {len(valid_alphas)} 个有效Alpha，同时检查 {args.check_workers} 个")
+    # 检查和打标签在线程池中并发进行（Retry-After的等待互不阻塞），黑名单在主线程中按完成顺序实时更新
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, args.check_workers)) as executor:
+        futures = {executor.submit(check_alpha, s, alpha_id): alpha_id for alpha_id in valid_alphas}
+        for done, future in enumerate(as_completed(futures), 1):
+            alpha_id = futures[future]
+            check_result = results[alpha_id] = future.result()
+            print(f"完成 {done}/{len(valid_alphas)}: alphaId={alpha_id},check_result={check_result}")
+            if check_result == "FAIL":
+                print(f"检查结果: 错误 (FAIL)，列入黑名单")
+                update_blacklist(alpha_id, "FAIL")
+            elif check_result not in ("sleep","timeout","nan","ERROR","error"):
+                # 根据配置决定是否将检查通过的Alpha加入黑名单
+                if args.add_passed_to_blacklist:
+                    if update_blacklist(alpha_id, "passed"):
+                        print(f"Alpha {alpha_id}: 已加入黑名单")
+                else:
+                    print(f"Alpha {alpha_id}: 检查通过，未加入黑名单")
+
+    # 按原来的顺序输出每个Alpha的检查结果
+    print(f"\n检查结果:")
     for i, alpha_id in enumerate(valid_alphas):
         print(
-            f"检查 {i + 1}/{len(valid_alphas)}: {alpha_id}  [Sharpe: {alpha_metrics[alpha_id]['sharpe']},turnover: {alpha_metrics[alpha_id]['turnover']}, Fitness: {alpha_metrics[alpha_id]['fitness']}, margin: {alpha_metrics[alpha_id]['margin']}]")
-        if alpha_metrics[alpha_id]['exp'].startswith("para_") or alpha_metrics[alpha_id]['exp'].startswith("var_") or alpha_metrics[alpha_id]['exp'].startswith("trade_when"):
-            print(f"[exp: {alpha_metrics[alpha_id]['exp']}")
-        else:
-            print(f"[exp: {alpha_metrics[alpha_id]['exp']}")
-        # 先检查Alpha状态，处理 "sleep" 和超时逻辑
-        for count_i in range(3):  #3次机会
-            check_result,s = get_check_submission(s, alpha_id)
-            if check_result != "sleep" or check_result != "timeout":
-                break
-            if check_result == "sleep":
-                #延时40S
-                time.sleep(40)
-                continue
-        print(f"alphaId={alpha_id},check_result={check_result}")
-        if check_result in ("timeout","nan","ERROR","error"):
-            print(f"Alpha={alpha_id}: \033[33m 检查结果:timeout,打上标签timeout,，到平台查看Tag-timeout,并手动检查 \033[0m")
-            set_alpha_properties(s, alpha_id, name=datetime.now().strftime("%Y.%m.%d"), color=None, selection_desc="None", combo_desc="None",
-                                 tags="timeout", )
-            continue
-        elif check_result == "FAIL":
-            print(f"检查结果: 错误 (FAIL)，列入黑名单")
-            failed += 1
-            if update_blacklist(args.blacklist_file, alpha_id):
-                blacklist.add(alpha_id)
-                continue
-        else:
-            print(f"Alpha {alpha_id}: \033[32m 检查通过,打上OKOK标签,到平台查看Tag-OKOK,并手动提交 \033[0m")
-            set_alpha_properties(s, alpha_id, name=datetime.now().strftime("%Y.%m.%d"), color=None, selection_desc="None", combo_desc="None",
-                                 tags="OKOK", )
-            # 根据配置决定是否将检查通过的Alpha加入黑名单
-            if args.add_passed_to_blacklist:
-                if update_blacklist(args.blacklist_file, alpha_id):
-                    blacklist.add(alpha_id)
-                    print(f"Alpha {alpha_id}: 已加入黑名单")
-            else:
-                print(f"Alpha {alpha_id}: 检查通过，未加入黑名单")
+            f"{i + 1}/{len(valid_alphas)}: {alpha_id}  [Sharpe: {alpha_metrics[alpha_id]['sharpe']},turnover: {alpha_metrics[alpha_id]['turnover']}, Fitness: {alpha_metrics[alpha_id]['fitness']}, margin: {alpha_metrics[alpha_id]['margin']}] check_result={results[alpha_id]}")
+        print(f"[exp: {alpha_metrics[alpha_id]['exp']}")
+    failed = sum(1 for result in results.values() if result == "FAIL")
+    timeout = sum(1 for result in results.values() if result in ("sleep","timeout","nan","ERROR","error"))
 
     print(f"\n通过检查:")
     print(f"总共: {len(valid_alphas)} 个Alpha")
+    print(f"通过: {len(valid_alphas) - failed - timeout} 个")
     print(f"失败: {failed} 个")
+    print(f"待手动检查(timeout): {timeout} 个")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
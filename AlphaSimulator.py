@@ -7,9 +7,18 @@ import time
 import csv
 import requests
 import os
-import ast
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pytz import timezone
+from poll_scheduler import PollScheduler, parse_retry_after
+from alpha_store import HAS_PYARROW, SimulatedStore
+from payload_batch import JSON_HEADERS, payload_body
+from pending_queue import PendingQueue
+from result_cache import ResultCache
+from rate_limiter import limited_request
+from session_manager import get_session
 
 # 获取美国东部时间
 eastern = timezone('US/Eastern')
@@ -20,29 +29,61 @@ print("Current time in Eastern is", loc_dt.strftime(fmt))
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', filename='simulation.log', filemode='a')
 
+
+class SimulationLost(Exception):
+    '''轮询返回401/429以外的4xx（location过期或不存在），这个模拟不会再有结果，需要重新POST'''
+
+
 class AlphaSimulator:
 
-    def __init__(self, max_concurrent, username, password, alpha_list_file_path,batch_number_for_every_queue):
+    def __init__(self, max_concurrent, username, password, alpha_list_file_path,batch_number_for_every_queue,
+                 poll_interval=3, max_workers=None, pending_queue_path=None,
+                 result_cache_path='simulation_cache.db', validator=None, max_poll_attempts=1000,
+                 max_location_age=12 * 3600):
         self.fail_alphas = 'fail_alphas.csv'
+        # 安装了pyarrow时模拟结果写入Parquet目录（展开settings的固定schema），否则追加到CSV
         self.simulated_alphas = f'simulated_alphas_{loc_dt.strftime(fmt)}.csv'
+        self.simulated_store = SimulatedStore(f'simulated_alphas_{loc_dt.strftime(fmt)}.parquet') \
+            if HAS_PYARROW else None
         self.max_concurrent = max_concurrent
         self.active_simulations = []
         self.username = username
         self.password = password
+        self.poll_interval = poll_interval
+        # 阻塞的requests调用放在线程池里执行，事件循环只负责调度
+        self.max_workers = max_workers or max(32, 2 * max_concurrent)
+        self.executor = None
+        self.poll_scheduler = PollScheduler(default_delay=poll_interval)
+        # 单个location最多轮询的次数，超过后放弃并记入fail_alphas
+        self.max_poll_attempts = max_poll_attempts
         self.session = self.sign_in(username, password)
         self.alpha_list_file_path = alpha_list_file_path
         self.sim_queue_ls = []
         self.batch_number_for_every_queue = batch_number_for_every_queue
+        # CSV只作为追加写入的来源，实际的出队在SQLite队列中完成
+        self.pending_queue = PendingQueue(pending_queue_path or os.path.splitext(alpha_list_file_path)[0] + '.db')
+        released = self.pending_queue.release_owner(username)
+        if released:
+            logging.info(f"Re-queued {released} alphas claimed but not sent by the previous run of {username}.")
+        # 相同的表达式+设置只模拟一次，result_cache_path为None时关闭
+        self.result_cache = ResultCache(result_cache_path) if result_cache_path else None
+        # 缓存中超过这个秒数仍未完成的location不再续查，直接重新POST
+        self.max_location_age = max_location_age
+        # 本地校验（validator.ExpressionValidator），不通过的alpha不发送，直接记入fail_alphas
+        self.validator = validator
+        # CSV追加在线程池中进行，多个线程同时写同一个文件时逐行加锁
+        self._csv_lock = threading.Lock()
 
     def sign_in(self, username, password):
-        s = requests.Session()
-        s.auth = (username, password)
+        # 同一账号共用一个会话，重新登录在原会话上进行，连接池和TLS会话不丢弃；
+        # 连接池大小与并发线程数一致，避免并发请求时反复建连
+        s = get_session(username, password, pool_maxsize=self.max_workers)
         count = 0
         count_limit = 30
 
         while True:
             try:
-                response = s.post('https://api.worldquantbrain.com/authentication')
+                response = s.refresh()
                 response.raise_for_status()
                 break
             except:
@@ -58,41 +99,23 @@ class AlphaSimulator:
 
     def read_alphas_from_csv_in_batches(self, batch_size=50):
         '''
-        1. 打开alpha_list_pending_simulated
-        2. 取出batch_size个alpha,放入列表变量alphas
-        3. 取出后覆写（overwrite）alpha_list_pending_simulated
-        4. 把取出的alphas,写到sim_queue.csv文件中，方便随时监控在排队的alpha有多少
-        5. 返回列表变量alphas
-        '''
-
-        alphas = []
-        temp_file_name = self.alpha_list_file_path + '.tmp'
-        with open(self.alpha_list_file_path, 'r') as file, open(temp_file_name, 'w', newline='') as temp_file:
-            reader = csv.DictReader(file)
-            fieldnames = reader.fieldnames
-            writer = csv.DictWriter(temp_file, fieldnames=fieldnames)
-            writer.writeheader()
-            for _ in range(batch_size):
-                try:
-                    row = next(reader)
-                    if 'settings' in row:
-                        if isinstance(row['settings'], str):
-                            try:
-                                row['settings'] = ast.literal_eval(row['settings'])
-                            except (ValueError, SyntaxError):
-                                print(f"Error evaluating settings: {row['settings']}")
-                        elif isinstance(row['settings'], dict):
-                            pass
-                        else:
-                            print(f"Unexpected type for settings: {type(row['settings'])}")
-                    alphas.append(row)
-                except StopIteration:
-                    break
-
-            for remaining_row in reader:
-                writer.writerow(remaining_row)
+        1. 把alpha_list_pending_simulated中新追加的行导入持久化队列（只读上次导入之后的部分）
+        2. 从队列取出batch_size个alpha并加上租约，模拟请求发出后再ack，崩溃后会重新投递
+        3. 把取出的alphas,写到sim_queue.csv文件中，方便随时监控在排队的alpha有多少
+        4. 返回列表变量alphas
+        '''
 
-        os.replace(temp_file_name, self.alpha_list_file_path)
+        if self.alpha_list_file_path.endswith('.csv'):
+            imported = self.pending_queue.import_csv(self.alpha_list_file_path)
+        elif self.alpha_list_file_path.endswith('.parquet'):
+            # helper.save_alphas_to_store写出的PendingStore目录，只导入新增的分片
+            imported = self.pending_queue.import_store(self.alpha_list_file_path)
+        else:
+            imported = 0
+        if imported:
+            logging.info(f"Imported {imported} new alphas from {self.alpha_list_file_path}.")
+
+        alphas = self.pending_queue.claim(batch_size, owner=self.username)
         if alphas:
             with open('sim_queue.csv', 'w', newline='') as file:
                 writer = csv.DictWriter(file, fieldnames=alphas[0].keys())
@@ -106,7 +129,8 @@ class AlphaSimulator:
         count = 0
         while True:
             try:
-                response = self.session.post('https://api.worldquantbrain.com/simulations', json=alpha)
+                response = limited_request(self.session, 'post', 'https://api.worldquantbrain.com/simulations',
+                                           data=payload_body(alpha), headers=JSON_HEADERS)
                 response.raise_for_status()
                 if "Location" in response.headers:
                     logging.info("Alpha location retrieved successfully.")
@@ -119,90 +143,317 @@ class AlphaSimulator:
                     logging.error("Error occurred too many times, skipping this alpha and re-logging in.")
                     break
 
+                count += 1
+                if getattr(e.response, 'status_code', None) == 429:
+                    # 限流器已经降速，下次取令牌时自动等待
+                    logging.error("Simulation request throttled. Retrying at the limiter's rate...")
+                    continue
                 logging.error("Error in sending simulation request. Retrying after 5s...")
                 time.sleep(5)
-                count += 1
 
         logging.error(f"Simulation request failed after {count} attempts.")
-
-        with open(self.fail_alphas, 'a', newline='') as file:
-            writer = csv.DictWriter(file, fieldnames=alpha.keys())
-            writer.writerow(alpha)
-
+        self.record_failed_alpha(alpha)
         return None
 
-    def load_new_alpha_and_simulate(self):
-        if len(self.sim_queue_ls) < 1:
-            self.sim_queue_ls = self.read_alphas_from_csv_in_batches(self.batch_number_for_every_queue)  
-       
-        if len(self.active_simulations) >= self.max_concurrent:
-            logging.info(f"Max concurrent simulations reached ({self.max_concurrent}). Waiting 2 seconds")
-            time.sleep(2)
-            return
-       
-        logging.info('Loading new alpha...')
-
+    def post_simulation(self, alpha):
+        '''
+        只发送一次模拟请求，不重试。返回 (location, 状态码, Retry-After秒数)，
+        网络错误时状态码为None。供账号池根据401/429把alpha转给其他账号。
+        '''
         try:
-            alpha = self.sim_queue_ls.pop(0)
-            logging.info(f"Starting simulation for alpha: {alpha['regular']} with settings: {alpha['settings']}")
-            location_url = self.simulate_alpha(alpha)
-            if location_url:
-                self.active_simulations.append(location_url)
-        except IndexError:
-            logging.info("No more alphas available in the queue.")
+            response = limited_request(self.session, 'post', 'https://api.worldquantbrain.com/simulations',
+                                       data=payload_body(alpha), headers=JSON_HEADERS)
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error in sending simulation request: {e}")
+            return None, None, None
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if response.ok and "Location" in response.headers:
+            logging.info(f"Location: {response.headers['Location']}")
+            return response.headers['Location'], response.status_code, retry_after
+        logging.error(f"Simulation request rejected with status {response.status_code} for account {self.username}.")
+        return None, response.status_code, retry_after
+
+    def record_failed_alpha(self, alpha):
+        with self._csv_lock, open(self.fail_alphas, 'a', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=alpha.keys())
+            writer.writerow(alpha)
 
-    def check_simulation_progress(self, simulation_progress_url):
+    def reject_invalid(self, alpha):
+        '''本地校验不通过时记录并返回True，这个alpha不再占用并发名额和重试'''
+        if self.validator is None:
+            return False
+        errors = self.validator.errors(alpha)
+        if not errors:
+            return False
+        logging.error(f"Invalid alpha skipped without simulation: {alpha['regular']}: {'; '.join(errors)}")
+        self.record_failed_alpha(alpha)
+        return True
+
+    def lookup_cache(self, alpha):
+        '''
+        查询结果缓存，返回 (缓存的结果, 尚未完成的location)。
+        已完成的直接使用结果；已发出但未完成的继续轮询原来的location，不再重复POST。
+        '''
+        if self.result_cache is None:
+            return None, None
+        cached = self.result_cache.get(alpha)
+        if cached is None:
+            return None, None
+        if cached['alpha_id'] or cached['result'] is not None:
+            logging.info(f"Skipping cached alpha {cached['alpha_id']}: {alpha['regular']}")
+            return cached['result'] or {'id': cached['alpha_id'], 'status': cached['status']}, None
+        if not cached['location']:
+            return None, None
+        age = time.time() - (cached['updated'] or 0)
+        if age > self.max_location_age:
+            logging.info(f"Cached simulation sent {age / 3600:.1f}h ago, simulating again: {alpha['regular']}")
+            self.forget_location(cached['location'])
+            return None, None
+        logging.info(f"Resuming simulation already sent for alpha: {alpha['regular']}")
+        return None, cached['location']
+
+    def remember_location(self, alpha, location_url):
+        if self.result_cache is not None and location_url:
+            self.result_cache.mark_submitted(alpha, location_url)
+
+    def forget_location(self, location_url):
+        if self.result_cache is not None and location_url:
+            self.result_cache.forget_location(location_url)
+
+    def poll_simulation(self, simulation_progress_url):
+        '''
+        返回 (结果, Retry-After秒数)。模拟未结束时结果为None，
+        请求出错时Retry-After也为None，由调度器按默认间隔重试。
+        401/429以外的4xx抛出SimulationLost，不再重试。
+        '''
         try:
-            simulation_progress = self.session.get(simulation_progress_url)
+            simulation_progress = limited_request(self.session, 'get', simulation_progress_url)
             simulation_progress.raise_for_status()
-            if simulation_progress.headers.get("Retry-After", 0) == 0:
+            retry_after = parse_retry_after(simulation_progress.headers.get("Retry-After"))
+            if retry_after == 0:
                 alpha_id = simulation_progress.json().get("alpha")
                 if alpha_id:
-                    alpha_response = self.session.get(f"https://api.worldquantbrain.com/alphas/{alpha_id}")
+                    alpha_response = limited_request(self.session, 'get',
+                                                     f"https://api.worldquantbrain.com/alphas/{alpha_id}")
                     alpha_response.raise_for_status()
-                    return alpha_response.json()
+                    return alpha_response.json(), 0.0
                 else:
-                    return simulation_progress.json()
+                    return simulation_progress.json(), 0.0
             else:
-                return None
+                return None, retry_after
 
         except requests.exceptions.RequestException as e:
             logging.error(f"Error fetching simulation progress: {e}")
+            status_code = getattr(e.response, 'status_code', None)
+            if status_code == 429:
+                # 轮询被限流不是登录问题，按限流器给出的速率稍后再查
+                return None, None
+            if status_code is not None and 400 <= status_code < 500 and status_code != 401:
+                # 404等：location已失效，再轮询也不会有结果
+                raise SimulationLost(f"{status_code} polling {simulation_progress_url}") from e
             self.session = self.sign_in(self.username, self.password)
-            return None
+            return None, None
 
-    def check_simulation_status(self):
-        count = 0
-        if len(self.active_simulations) == 0:
-            logging.info("No one is in active simulation now")
-            return None
+    def record_simulation_result(self, sim_progress, location_url=None):
+        if self.result_cache is not None and location_url:
+            self.result_cache.store_by_location(location_url, sim_progress)
+        if self.simulated_store is not None:
+            self.simulated_store.add(dict(sim_progress, location=location_url))
+            return
+        with self._csv_lock, open(self.simulated_alphas, 'a', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=sim_progress.keys())
+            if file.tell() == 0:
+                writer.writeheader()
+            writer.writerow(sim_progress)
+
+    async def _run_blocking(self, func, *args):
+        '''HTTP请求、SQLite提交和CSV追加都放到线程池，不阻塞事件循环上其他模拟的轮询'''
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def _next_alpha(self):
+        if len(self.sim_queue_ls) < 1:
+            self.sim_queue_ls = await self._run_blocking(self.read_alphas_from_csv_in_batches,
+                                                         self.batch_number_for_every_queue)
+        if self.sim_queue_ls:
+            return self.sim_queue_ls.pop(0)
+        return None
 
-        for sim_url in self.active_simulations:
-            sim_progress = self.check_simulation_progress(sim_url)
-            if sim_progress is None:
-                count += 1
+    def _schedule_poll(self, sim_url, retry_after=None):
+        self.poll_scheduler.schedule(sim_url, retry_after)
+        self._poll_wakeup.set()
+
+    async def _poll_once(self, sim_url):
+        future = self._pending_polls[sim_url]
+        try:
+            sim_progress, retry_after = await self._run_blocking(self.poll_simulation, sim_url)
+        except Exception as e:
+            del self._pending_polls[sim_url]
+            future.set_exception(e)
+            return
+        if sim_progress is None:
+            self._poll_counts[sim_url] = attempts = self._poll_counts.get(sim_url, 0) + 1
+            if attempts >= self.max_poll_attempts:
+                del self._pending_polls[sim_url]
+                future.set_exception(TimeoutError(f"No result after {attempts} polls: {sim_url}"))
+                return
+            self._schedule_poll(sim_url, retry_after)
+        else:
+            del self._pending_polls[sim_url]
+            future.set_result(sim_progress)
+
+    async def _poll_loop(self):
+        '''
+        唯一的轮询协程：睡到堆顶到期（或有新的location加入）再醒来，
+        把到期的URL一次性并发GET出去。
+        '''
+        poll_tasks = set()
+        while True:
+            delay = self.poll_scheduler.next_due_in()
+            if delay is None or delay > 0:
+                self._poll_wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._poll_wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
                 continue
+            for sim_url in self.poll_scheduler.pop_due():
+                task = asyncio.create_task(self._poll_once(sim_url))
+                poll_tasks.add(task)
+                task.add_done_callback(poll_tasks.discard)
+
+    def start_dispatcher(self):
+        '''在当前事件循环上启动线程池和轮询协程，dispatch_simulations和账号池共用'''
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._pending_polls = {}
+        self._poll_counts = {}
+        self._poll_wakeup = asyncio.Event()
+        self._poller = asyncio.create_task(self._poll_loop())
+
+    def stop_dispatcher(self):
+        self._poller.cancel()
+        if self.simulated_store is not None:
+            self.simulated_store.flush()
+        self.executor.shutdown(wait=False)
+        self.executor = None
+
+    async def wait_for_simulation(self, location_url):
+        '''
+        等待轮询协程通知location对应的模拟结束，记录并返回结果。
+        location失效（SimulationLost）或轮询次数用完（TimeoutError）时从结果缓存删除这个location并抛出。
+        多个alpha等待同一个location（结果缓存中记着同一个未完成的location）时共用一次轮询，
+        结果只由第一个等待者记录一次。
+        '''
+        self.active_simulations.append(location_url)
+        future = self._pending_polls.get(location_url)
+        owner = future is None
+        if owner:
+            future = asyncio.get_running_loop().create_future()
+            self._pending_polls[location_url] = future
+            self._schedule_poll(location_url)
+        try:
+            # 其他等待者被取消时不能连带取消共用的future
+            sim_progress = await (future if owner else asyncio.shield(future))
+        except (SimulationLost, TimeoutError):
+            if owner:
+                await self._run_blocking(self.forget_location, location_url)
+            raise
+        finally:
+            self.active_simulations.remove(location_url)
+            if owner:
+                self._poll_counts.pop(location_url, None)
+
+        if owner:
+            logging.info(f"Alpha id: {sim_progress.get('id')} ended with status: {sim_progress.get('status')}.")
+            await self._run_blocking(self.record_simulation_result, sim_progress, location_url)
+        return sim_progress
+
+    async def wait_or_give_up(self, alpha, location_url):
+        '''wait_for_simulation，轮询次数用完时把alpha记入fail_alphas并返回None；SimulationLost照常抛出'''
+        try:
+            return await self.wait_for_simulation(location_url)
+        except TimeoutError as e:
+            logging.error(f"Giving up on alpha {alpha['regular']}: {e}")
+            await self._run_blocking(self.record_failed_alpha, alpha)
+            return None
 
-            alpha_id = sim_progress.get("id")
-            status = sim_progress.get("status")
-            logging.info(f"Alpha id: {alpha_id} ended with status: {status}. Removing from active list.")
-            self.active_simulations.remove(sim_url)
+    async def _simulate_and_wait(self, alpha, slots):
+        '''
+        单个alpha的完整流程：POST拿到location，然后等待轮询协程通知模拟结束。
+        等待期间不占用线程，只有真正发请求时才进入线程池。
+        '''
+        try:
+            if await self._run_blocking(self.reject_invalid, alpha):
+                await self._run_blocking(self.pending_queue.ack, [alpha])
+                return None
+            cached_result, location_url = await self._run_blocking(self.lookup_cache, alpha)
+            if cached_result is not None:
+                await self._run_blocking(self.pending_queue.ack, [alpha])
+                return cached_result
+            if location_url is not None:
+                await self._run_blocking(self.pending_queue.ack, [alpha])
+                try:
+                    return await self.wait_or_give_up(alpha, location_url)
+                except SimulationLost as e:
+                    logging.warning(f"Cached simulation is gone ({e}), simulating again: {alpha['regular']}")
+            logging.info(f"Starting simulation for alpha: {alpha['regular']} with settings: {alpha['settings']}")
+            location_url = await self._run_blocking(self.simulate_alpha, alpha)
+            await self._run_blocking(self.remember_location, alpha, location_url)
+            await self._run_blocking(self.pending_queue.ack, [alpha])
+            if not location_url:
+                return None
+            try:
+                return await self.wait_or_give_up(alpha, location_url)
+            except SimulationLost as e:
+                logging.error(f"Simulation lost for alpha {alpha['regular']}: {e}")
+                await self._run_blocking(self.record_failed_alpha, alpha)
+                return None
+        finally:
+            slots.release()
 
-            with open(self.simulated_alphas, 'a', newline='') as file:
-                writer = csv.DictWriter(file, fieldnames=sim_progress.keys())
-                writer.writerow(sim_progress)
+    async def dispatch_simulations(self, alphas=None):
+        '''
+        在一个事件循环上并发模拟，服务器上同时运行的alpha不超过max_concurrent个，
+        有空位就立即补上下一个alpha，不再按固定的3秒节拍逐个发送。
 
-        logging.info(f"Total {count} simulations are in process for account {self.username}.")
+        alphas为None时持续从alpha_list_file_path读取（队列为空时等待新alpha写入）；
+        传入alpha列表时跑完即返回，结果与输入顺序一一对应，失败的位置为None。
+        '''
+        slots = asyncio.Semaphore(self.max_concurrent)
+        tasks = []
+        self.start_dispatcher()
+        try:
+            if alphas is None:
+                while True:
+                    await slots.acquire()
+                    alpha = await self._next_alpha()
+                    if alpha is None:
+                        slots.release()
+                        logging.info("No more alphas available in the queue.")
+                        await asyncio.sleep(self.poll_interval)
+                        continue
+                    tasks = [task for task in tasks if not task.done()]
+                    tasks.append(asyncio.create_task(self._simulate_and_wait(alpha, slots)))
+            else:
+                for alpha in alphas:
+                    await slots.acquire()
+                    tasks.append(asyncio.create_task(self._simulate_and_wait(alpha, slots)))
+                return await asyncio.gather(*tasks)
+        finally:
+            self.stop_dispatcher()
+
+    def simulate_batch(self, alphas):
+        '''同步入口：模拟给定的一批alpha，按输入顺序返回结果'''
+        if not hasattr(alphas, '__len__'):
+            alphas = list(alphas)
+        return asyncio.run(self.dispatch_simulations(alphas))
 
     def manage_simulations(self):
         if not self.session:
             logging.error("Failed to sign in. Exiting...")
             return
 
-        while True:
-            self.check_simulation_status()
-            self.load_new_alpha_and_simulate()
-            time.sleep(3)
+        asyncio.run(self.dispatch_simulations())
 
 if __name__ == "__main__":
     # Example usage
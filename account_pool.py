@@ -0,0 +1,264 @@
+"""
+多账号模拟池
+在一个进程里登录多个账号，所有账号从同一个待模拟队列取alpha，
+某个账号遇到401/429时把alpha交还队列，由其他账号继续模拟
+"""
+import asyncio
+import collections
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os.path import expanduser
+
+from AlphaSimulator import AlphaSimulator, SimulationLost
+
+
+def read_accounts(file_path='brain_accounts.txt'):
+    """
+    读取多账号凭据文件
+
+    文件为JSON列表，每个元素是 ["username", "password"]，
+    也可以写成 ["username", "password", max_concurrent] 单独指定该账号的并发上限。
+
+    Args:
+        file_path (str): 凭据文件路径
+
+    Returns:
+        list: [(username, password, max_concurrent或None), ...]
+    """
+    with open(expanduser(file_path)) as f:
+        credentials = json.load(f)
+    accounts = []
+    for item in credentials:
+        username, password = item[0], item[1]
+        max_concurrent = item[2] if len(item) > 2 else None
+        accounts.append((username, password, max_concurrent))
+    return accounts
+
+
+class AccountPool:
+    """
+    账号池：每个账号一个AlphaSimulator，各自有并发上限和冷却时间，
+    共享一个待模拟队列，全部跑在同一个事件循环上。
+    """
+
+    def __init__(self, accounts, alpha_list_file_path, max_concurrent=3, batch_number_for_every_queue=20,
+                 cooldown=60, max_attempts=10, poll_interval=3, validator=None):
+        """
+        Args:
+            accounts (list): read_accounts返回的账号列表
+            alpha_list_file_path (str): 共享的待模拟alpha文件
+            max_concurrent (int): 账号没有单独指定时的并发上限
+            batch_number_for_every_queue (int): 每次从文件取出的alpha数量
+            cooldown (float): 429且没有Retry-After时账号暂停的秒数
+            max_attempts (int): 单个alpha在所有账号上累计的最大失败次数
+            poll_interval (float): 默认轮询间隔
+            validator (ExpressionValidator, optional): 发送前的本地校验，所有账号共用
+        """
+        self.alpha_list_file_path = alpha_list_file_path
+        self.batch_number_for_every_queue = batch_number_for_every_queue
+        self.cooldown = cooldown
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.validator = validator
+        self.simulators = self.sign_in_all(accounts, max_concurrent)
+        self._queue = collections.deque()
+        self._source = None
+        self._exhausted = False
+        self._in_flight = 0
+        self._results = None
+        self._refill_lock = None
+
+    def sign_in_all(self, accounts, max_concurrent):
+        """并发登录所有账号，登录失败的账号不参与模拟"""
+        def create(account):
+            username, password, account_max_concurrent = account
+            return AlphaSimulator(max_concurrent=account_max_concurrent or max_concurrent,
+                                  username=username, password=password,
+                                  alpha_list_file_path=self.alpha_list_file_path,
+                                  batch_number_for_every_queue=self.batch_number_for_every_queue,
+                                  poll_interval=self.poll_interval, validator=self.validator)
+
+        with ThreadPoolExecutor(max_workers=max(len(accounts), 1)) as executor:
+            simulators = list(executor.map(create, accounts))
+
+        signed_in = []
+        for simulator in simulators:
+            if simulator.session:
+                # 每个账号单独限流：一个账号收到429只暂停它自己，交回的alpha由其他账号立即接手
+                simulator.session.rate_limit_account = simulator.username
+                signed_in.append(simulator)
+            else:
+                logging.error(f"Account {simulator.username} failed to sign in, excluded from the pool.")
+        logging.info(f"{len(signed_in)}/{len(accounts)} accounts signed in.")
+        return signed_in
+
+    async def _take(self, simulator):
+        """取下一个 (序号, alpha, 已失败次数)，队列和来源都空时返回None"""
+        async with self._refill_lock:
+            if not self._queue and not self._exhausted:
+                if self._source is None:
+                    batch = await simulator._run_blocking(simulator.read_alphas_from_csv_in_batches,
+                                                          self.batch_number_for_every_queue)
+                    self._queue.extend((None, alpha, 0) for alpha in batch)
+                else:
+                    for _ in range(self.batch_number_for_every_queue):
+                        item = next(self._source, None)
+                        if item is None:
+                            self._exhausted = True
+                            break
+                        self._queue.append((item[0], item[1], 0))
+        if self._queue:
+            return self._queue.popleft()
+        return None
+
+    def _finish(self, index, result):
+        if index is not None and self._results is not None:
+            self._results[index] = result
+
+    async def _run_one(self, simulator, item, slots):
+        index, alpha, attempts = item
+        try:
+            if await simulator._run_blocking(simulator.reject_invalid, alpha):
+                # 换账号也不会成功，不交回队列
+                await simulator._run_blocking(simulator.pending_queue.ack, [alpha])
+                self._finish(index, None)
+                return
+            cached_result, location_url = await simulator._run_blocking(simulator.lookup_cache, alpha)
+            if cached_result is not None:
+                await simulator._run_blocking(simulator.pending_queue.ack, [alpha])
+                self._finish(index, cached_result)
+                return
+            status_code = retry_after = None
+            if location_url is None:
+                logging.info(f"[{simulator.username}] Starting simulation for alpha: {alpha['regular']}")
+                location_url, status_code, retry_after = await simulator._run_blocking(simulator.post_simulation,
+                                                                                       alpha)
+                await simulator._run_blocking(simulator.remember_location, alpha, location_url)
+            if location_url:
+                await simulator._run_blocking(simulator.pending_queue.ack, [alpha])
+                try:
+                    result = await simulator.wait_or_give_up(alpha, location_url)
+                except SimulationLost as e:
+                    # location已从结果缓存删除，交回队列后重新POST，计入失败次数
+                    logging.warning(f"[{simulator.username}] {e}, handing alpha back: {alpha['regular']}")
+                else:
+                    self._finish(index, result)
+                    return
+
+            if status_code == 429:
+                # 并发或频率超限：暂停该账号，alpha优先交给其他账号
+                pause = retry_after or self.cooldown
+                simulator.paused_until = time.monotonic() + pause
+                logging.warning(f"Account {simulator.username} throttled, pausing {pause:.0f}s and handing alpha back.")
+                self._queue.appendleft(item)
+                return
+            if status_code == 401:
+                simulator.paused_until = time.monotonic() + self.cooldown
+                logging.warning(f"Account {simulator.username} unauthorized, re-logging in and handing alpha back.")
+                self._queue.appendleft(item)
+                session = await simulator._run_blocking(simulator.sign_in, simulator.username, simulator.password)
+                if session:
+                    simulator.session = session
+                    simulator.paused_until = 0
+                else:
+                    simulator.paused_until = float('inf')
+                return
+
+            attempts += 1
+            if attempts >= self.max_attempts:
+                logging.error(f"Alpha failed {attempts} times across accounts, giving up: {alpha['regular']}")
+                await simulator._run_blocking(simulator.record_failed_alpha, alpha)
+                await simulator._run_blocking(simulator.pending_queue.ack, [alpha])
+                self._finish(index, None)
+                return
+            self._queue.append((index, alpha, attempts))
+        finally:
+            self._in_flight -= 1
+            slots.release()
+
+    async def _account_worker(self, simulator):
+        slots = asyncio.Semaphore(simulator.max_concurrent)
+        simulator.paused_until = 0
+        tasks = set()
+        while True:
+            await slots.acquire()
+            if simulator.paused_until == float('inf'):
+                # 重新登录失败，该账号退出，剩余alpha由其他账号完成
+                slots.release()
+                logging.error(f"Account {simulator.username} dropped from the pool.")
+                break
+            pause = simulator.paused_until - time.monotonic()
+            if pause > 0:
+                slots.release()
+                if self._exhausted and not self._queue and self._in_flight == 0:
+                    # 其他账号已经完成全部alpha，不必等冷却结束
+                    break
+                await asyncio.sleep(min(pause, self.poll_interval))
+                continue
+
+            item = await self._take(simulator)
+            if item is None:
+                slots.release()
+                if self._exhausted and self._in_flight == 0:
+                    break
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            self._in_flight += 1
+            task = asyncio.create_task(self._run_one(simulator, item, slots))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def dispatch(self, alphas=None):
+        """
+        所有账号并发地从同一个队列取alpha模拟。
+
+        Args:
+            alphas (list, optional): 要模拟的alpha列表；为None时持续读取alpha_list_file_path
+
+        Returns:
+            list: 传入alphas时按输入顺序返回结果，失败的位置为None
+        """
+        if not self.simulators:
+            logging.error("No account signed in. Exiting...")
+            return None
+        # 每次分发都从空队列开始，上一次的来源、计数和结束标记不能带到这一次
+        self._queue = collections.deque()
+        self._in_flight = 0
+        self._exhausted = False
+        if alphas is not None:
+            if not hasattr(alphas, '__len__'):
+                alphas = list(alphas)
+            self._source = iter(enumerate(alphas))
+            self._results = [None] * len(alphas)
+        else:
+            self._source = None
+            self._results = None
+
+        self._refill_lock = asyncio.Lock()
+        for simulator in self.simulators:
+            simulator.start_dispatcher()
+        try:
+            await asyncio.gather(*(self._account_worker(simulator) for simulator in self.simulators))
+        finally:
+            for simulator in self.simulators:
+                simulator.stop_dispatcher()
+        return self._results
+
+    def simulate_batch(self, alphas):
+        """同步入口：用所有账号模拟一批alpha，按输入顺序返回结果"""
+        return asyncio.run(self.dispatch(alphas))
+
+    def manage_simulations(self):
+        asyncio.run(self.dispatch())
+
+
+if __name__ == "__main__":
+    accounts = read_accounts('brain_accounts.txt')
+    pool = AccountPool(accounts, alpha_list_file_path='alpha_list_pending_simulated.csv',
+                       max_concurrent=3, batch_number_for_every_queue=20)
+    pool.manage_simulations()
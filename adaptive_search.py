@@ -0,0 +1,216 @@
+"""
+按预算自适应地搜索模板的组合空间
+先小批量模拟，按返回的Sharpe/Fitness估计每个槽位取值（操作符、字段、窗口、分组）的通过率，
+再把剩余的模拟预算集中到产出高的取值上，用更少的模拟得到同样多的合格alpha。
+
+每个槽位取值的通过率是一个Beta后验，每次按后验抽样为各槽位选值（Thompson抽样的多臂老虎机），
+没怎么试过的取值后验较宽，仍然有机会被选中，不会过早放弃。
+
+例:
+    search = AdaptiveSearch(alpha_template, session_simulator(sess), batch_size=20)
+    search.run(budget=500)
+    print(search.summary())
+"""
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from helper import submit_alpha_simulation
+from payload_batch import PayloadBatch
+from rate_limiter import limited_request
+
+
+def alpha_metrics(result):
+    """
+    从模拟结果（/alphas/{id}返回的JSON）中取出 (sharpe, fitness)，没有时为None
+    """
+    stats = (result or {}).get('is') or {}
+    return stats.get('sharpe'), stats.get('fitness')
+
+
+def session_simulator(sess, max_workers=3):
+    """
+    用一个已登录的会话并发模拟的simulate函数，供没有AlphaSimulator的脚本使用
+
+    Args:
+        sess (requests.Session): 已认证的会话对象
+        max_workers (int): 同时进行的模拟数
+
+    Returns:
+        callable: simulate(alphas) -> 与输入顺序对应的结果列表，失败的位置为None
+    """
+    def simulate_one(alpha):
+        alpha_id = submit_alpha_simulation(sess, alpha)
+        if not alpha_id:
+            return None
+        response = limited_request(sess, 'get', f"https://api.worldquantbrain.com/alphas/{alpha_id}")
+        return response.json() if response.ok else None
+
+    def simulate(alphas):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(simulate_one, alphas))
+    return simulate
+
+
+class AdaptiveSearch:
+    """
+    模板组合空间上的自适应搜索
+
+    每个槽位取值的通过率是独立的Beta(prior + 通过数, prior + 未通过数)后验，
+    一个组合的好坏由其各槽位取值共同决定。已经模拟过的组合不会再被选中。
+    """
+
+    def __init__(self, template, simulate, batch_size=20, sharpe_th=1.25, fitness_th=1.0, is_pass=None,
+                 prior=(1.0, 1.0), seed=None):
+        """
+        Args:
+            template (AlphaTemplate): 模板，约束(exclude/where)和设置覆盖(override)同样生效
+            simulate (callable): simulate(alphas) -> 结果列表，例如AlphaSimulator(...).simulate_batch
+                或session_simulator(sess)
+            batch_size (int): 每轮模拟的数量
+            sharpe_th (float): 合格的Sharpe阈值
+            fitness_th (float): 合格的Fitness阈值
+            is_pass (callable, optional): 自定义的合格判断，接收模拟结果，优先于阈值
+            prior (tuple): Beta先验 (alpha, beta)
+            seed (int, optional): 随机种子
+        """
+        self.template = template
+        self.simulate = simulate
+        self.batch_size = batch_size
+        self.sharpe_th = sharpe_th
+        self.fitness_th = fitness_th
+        self.is_pass = is_pass or self._default_pass
+        self.prior = prior
+        self.random = random.Random(seed)
+        self.slots = list(template.slots)
+        # 每个槽位: {取值: [通过数, 模拟数]}
+        self.stats = [{value: [0, 0] for value in template.domains[slot]} for slot in self.slots]
+        self.tried = set()
+        self.history = []
+
+    def _default_pass(self, result):
+        sharpe, fitness = alpha_metrics(result)
+        return sharpe is not None and fitness is not None and sharpe >= self.sharpe_th and fitness >= self.fitness_th
+
+    @property
+    def simulated(self):
+        return len(self.history)
+
+    @property
+    def passed(self):
+        return sum(1 for record in self.history if record['passed'])
+
+    def posterior_mean(self, slot, value):
+        passes, trials = self.stats[self.slots.index(slot)][value]
+        a, b = self.prior
+        return (a + passes) / (a + b + trials)
+
+    # ---------- 选择组合 ----------
+
+    def _draw_thompson(self):
+        a, b = self.prior
+        combo = []
+        for stats in self.stats:
+            best, best_theta = None, -1.0
+            for value, (passes, trials) in stats.items():
+                theta = self.random.betavariate(a + passes, b + trials - passes)
+                if theta > best_theta:
+                    best, best_theta = value, theta
+            combo.append(best)
+        return tuple(combo)
+
+    def _draw_uniform(self):
+        return tuple(self.random.choice(self.template.domains[slot]) for slot in self.slots)
+
+    def propose(self, n, max_tries=None):
+        """
+        选出n个未模拟过且满足约束的组合（组合空间快用完时可能少于n个）
+
+        Returns:
+            list: 组合（按slots顺序的取值元组）
+        """
+        combos = []
+        tries = 0
+        max_tries = max_tries or 50 * n
+        while len(combos) < n and tries < max_tries:
+            tries += 1
+            # 后验集中后抽样会反复选中同一个已模拟的组合，之后的尝试改为均匀抽样
+            combo = self._draw_thompson() if tries <= 10 * n else self._draw_uniform()
+            if combo in self.tried or not self.template.accepts(combo):
+                continue
+            self.tried.add(combo)
+            combos.append(combo)
+        return combos
+
+    # ---------- 更新 ----------
+
+    def observe(self, combos, results):
+        """
+        记录一批模拟结果并更新后验；结果为None（请求失败）的组合不计入统计，之后可以再次被选中
+
+        Returns:
+            list: 本批的记录
+        """
+        records = []
+        for combo, result in zip(combos, results):
+            if result is None:
+                self.tried.discard(combo)
+                continue
+            passed = bool(self.is_pass(result))
+            for stats, value in zip(self.stats, combo):
+                stats[value][0] += passed
+                stats[value][1] += 1
+            expression, settings = self.template.render(combo)
+            sharpe, fitness = alpha_metrics(result)
+            record = {'combo': dict(zip(self.slots, combo)), 'expression': expression, 'settings': settings,
+                      'alpha_id': result.get('id'), 'sharpe': sharpe, 'fitness': fitness, 'passed': passed}
+            records.append(record)
+        self.history.extend(records)
+        return records
+
+    # ---------- 运行 ----------
+
+    def run(self, budget, target=None):
+        """
+        按轮模拟直到用完预算、达到目标合格数或组合空间用完
+
+        Args:
+            budget (int): 最多模拟的数量
+            target (int, optional): 得到这么多合格alpha后提前结束
+
+        Returns:
+            list: 所有记录（combo, expression, settings, alpha_id, sharpe, fitness, passed）
+        """
+        failed_rounds = 0
+        while self.simulated < budget and (target is None or self.passed < target):
+            combos = self.propose(min(self.batch_size, budget - self.simulated))
+            if not combos:
+                logging.info("Adaptive search exhausted the template space.")
+                break
+            batch = PayloadBatch()
+            for combo in combos:
+                batch.append(*self.template.render(combo))
+            records = self.observe(combos, self.simulate(batch))
+            # 连续几轮全部失败多半是登录或网络问题，停止而不是空转
+            failed_rounds = 0 if records else failed_rounds + 1
+            if failed_rounds >= 3:
+                logging.error("Adaptive search stopped: 3 rounds in a row returned no results.")
+                break
+            logging.info(f"Adaptive search round: {len(records)} simulated, "
+                         f"{sum(r['passed'] for r in records)} passed, total {self.passed}/{self.simulated}.")
+            print(f"simulated {self.simulated}/{budget}, passed {self.passed}")
+        return self.history
+
+    def summary(self, top=5):
+        """
+        各槽位后验均值最高的取值
+
+        Returns:
+            str: 便于打印的文本
+        """
+        lines = [f"passed {self.passed}/{self.simulated}"]
+        for i, slot in enumerate(self.slots):
+            ranked = sorted(self.stats[i].items(), key=lambda item: self.posterior_mean(slot, item[0]), reverse=True)
+            best = ', '.join(f"{value} {passes}/{trials}" for value, (passes, trials) in ranked[:top] if trials)
+            lines.append(f"<{slot}>: {best}")
+        return '\n'.join(lines)
@@ -0,0 +1,344 @@
+"""
+/users/self/alphas 的本地镜像（SQLite）
+alpha的is指标、检查结果、设置和表达式展开成有索引的列，原始JSON也一并保存。
+同步按dateModified增量进行：只请求上次同步之后修改过（新建、提交、改名打标签等）的alpha并按id覆盖。
+分页按dateModified做keyset：每页从上一页最后一条的dateModified开始取，同步期间有alpha被修改（移到末尾）
+也不会像按offset分页那样让后面的记录前移一位而漏掉分页边界上的一条。
+检查和提交脚本筛选候选alpha时直接查询本地镜像，不再每次把日期范围内的alpha全部下载一遍。
+
+例:
+    mirror = AlphaMirror()
+    mirror.sync(lambda url: requests_wq(sess, 'get', url)[0].json())
+    alphas = mirror.records(region='USA', sharpe=(1.25, None), fitness=(1.0, None), max_turnover=0.3)
+"""
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+import pandas as pd
+
+from paging import PageFetchError
+
+
+SYNC_URL = "https://api.worldquantbrain.com/users/self/alphas?limit=100&offset={offset}&order=dateModified"
+SYNC_PAGE_SIZE = 100
+
+# (列名, 类型, 从alpha记录取值的函数)
+COLUMNS = [
+    ('type', 'TEXT', lambda a: a.get('type')),
+    ('status', 'TEXT', lambda a: a.get('status')),
+    ('name', 'TEXT', lambda a: a.get('name')),
+    ('hidden', 'INTEGER', lambda a: int(bool(a.get('hidden')))),
+    ('date_created', 'TEXT', lambda a: _utc(a.get('dateCreated'))),
+    ('date_modified', 'TEXT', lambda a: _utc(a.get('dateModified') or a.get('dateCreated'))),
+    ('instrument_type', 'TEXT', lambda a: _settings(a).get('instrumentType')),
+    ('region', 'TEXT', lambda a: _settings(a).get('region')),
+    ('universe', 'TEXT', lambda a: _settings(a).get('universe')),
+    ('delay', 'INTEGER', lambda a: _settings(a).get('delay')),
+    ('decay', 'INTEGER', lambda a: _settings(a).get('decay')),
+    ('neutralization', 'TEXT', lambda a: _settings(a).get('neutralization')),
+    ('truncation', 'REAL', lambda a: _settings(a).get('truncation')),
+    ('code', 'TEXT', lambda a: _code(a)),
+    ('sharpe', 'REAL', lambda a: _is(a).get('sharpe')),
+    ('fitness', 'REAL', lambda a: _is(a).get('fitness')),
+    ('turnover', 'REAL', lambda a: _is(a).get('turnover')),
+    ('margin', 'REAL', lambda a: _is(a).get('margin')),
+    ('returns', 'REAL', lambda a: _is(a).get('returns')),
+    ('drawdown', 'REAL', lambda a: _is(a).get('drawdown')),
+    ('long_count', 'INTEGER', lambda a: _is(a).get('longCount')),
+    ('short_count', 'INTEGER', lambda a: _is(a).get('shortCount')),
+    ('failed_checks', 'INTEGER', lambda a: sum(1 for check in _is(a).get('checks') or []
+                                               if check and check.get('result') == 'FAIL')),
+    ('checks', 'TEXT', lambda a: json.dumps(_is(a).get('checks') or [])),
+    ('settings', 'TEXT', lambda a: json.dumps(_settings(a), sort_keys=True)),
+    ('tags', 'TEXT', lambda a: json.dumps(a.get('tags') or [])),
+]
+
+
+def _is(alpha):
+    return alpha.get('is') or {}
+
+
+def _settings(alpha):
+    return alpha.get('settings') or {}
+
+
+def _code(alpha):
+    regular = alpha.get('regular')
+    return regular.get('code') if isinstance(regular, dict) else regular
+
+
+def _parse_time(value):
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _utc(value):
+    """
+    ISO时间 -> UTC的 'YYYY-MM-DDTHH:MM:SSZ'，不同时区的时间可以直接按字符串比较
+
+    Returns:
+        str: UTC时间，无法解析时原样返回
+    """
+    if not value:
+        return None
+    try:
+        return _parse_time(value).astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    except ValueError:
+        return value
+
+
+class AlphaMirror:
+    """
+    用户alpha列表的本地镜像
+
+    watermark是已同步记录中最新的dateModified。下一次同步请求dateModified不早于
+    (watermark - overlap) 的alpha，重叠部分按id覆盖，不会因为同一秒内修改或分页期间的变化而漏掉。
+    """
+
+    def __init__(self, db_path='alpha_mirror.db'):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        columns = ',\n'.join(f"{name} {kind}" for name, kind, _ in COLUMNS)
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS alphas (
+                id TEXT PRIMARY KEY,
+                {columns},
+                raw TEXT NOT NULL,
+                synced_at REAL NOT NULL
+            );
+            -- 检查/提交脚本的筛选：状态 + 地区 + 创建日期范围
+            CREATE INDEX IF NOT EXISTS idx_alphas_candidates ON alphas(status, region, date_created);
+            CREATE INDEX IF NOT EXISTS idx_alphas_modified ON alphas(date_modified);
+            CREATE TABLE IF NOT EXISTS syncs (
+                name TEXT PRIMARY KEY,
+                watermark TEXT,
+                synced_at REAL NOT NULL
+            );
+        """)
+        placeholders = ', '.join('?' * (len(COLUMNS) + 3))
+        self._upsert_sql = (f"INSERT OR REPLACE INTO alphas (id, {', '.join(name for name, _, _ in COLUMNS)}, "
+                            f"raw, synced_at) VALUES ({placeholders})")
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM alphas").fetchone()[0]
+
+    # ---------- 同步 ----------
+
+    def watermark(self):
+        """
+        已同步的最新dateModified（原始的ISO字符串）
+
+        Returns:
+            str: 从未同步时为None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT watermark FROM syncs WHERE name = 'alphas'").fetchone()
+        return row[0] if row else None
+
+    def upsert(self, alphas):
+        """
+        写入（覆盖）一批/users/self/alphas返回的alpha记录
+
+        Returns:
+            int: 写入的数量
+        """
+        now = time.time()
+        rows = [(alpha['id'], *(value(alpha) for _, _, value in COLUMNS), json.dumps(alpha), now)
+                for alpha in alphas if alpha and alpha.get('id')]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(self._upsert_sql, rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def sync(self, fetch, overlap=60):
+        """
+        从服务器同步上次之后修改过的alpha（第一次同步时下载全部）
+
+        分页逐页进行（keyset，不能并发）：下一页的条件是 dateModified >= 本页最后一条的dateModified，
+        同一时间的记录会重复取到，按id去重；一整页都是同一时间时在该时间内按offset继续。
+
+        Args:
+            fetch (callable): fetch(url) -> 解析后的JSON，失败时返回None，
+                例如 lambda url: requests_wq(sess, 'get', url)[0].json()
+            overlap (float): 与上次watermark重叠的秒数
+
+        Returns:
+            int: 本次同步的alpha数
+
+        Raises:
+            PageFetchError: 有分页获取失败，本次取到的alpha不写入，watermark不变
+        """
+        watermark = self.watermark()
+        since = None
+        if watermark:
+            try:
+                since = (_parse_time(watermark) - timedelta(seconds=overlap)).isoformat(timespec='seconds')
+            except ValueError:
+                since = watermark
+        fetched = {}
+        offset = 0
+        while True:
+            url = SYNC_URL.format(offset=offset)
+            if since:
+                url += f"&dateModified%3E={quote(since)}"
+            page = fetch(url)
+            if page is None:
+                raise PageFetchError(url, [offset], list(fetched.values()))
+            results = page.get('results') or []
+            for alpha in results:
+                fetched[alpha['id']] = alpha
+            if len(results) < SYNC_PAGE_SIZE:
+                break
+            last = results[-1].get('dateModified') or results[-1].get('dateCreated')
+            if since is not None and _utc(last) == _utc(since):
+                offset += len(results)
+            else:
+                since, offset = last, 0
+        alphas = list(fetched.values())
+        written = self.upsert(alphas)
+
+        latest = watermark
+        for alpha in alphas:
+            modified = alpha.get('dateModified') or alpha.get('dateCreated')
+            if modified and (latest is None or _utc(modified) > _utc(latest)):
+                latest = modified
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO syncs (name, watermark, synced_at) VALUES ('alphas', ?, ?)",
+                               (latest, time.time()))
+        return written
+
+    # ---------- 查询 ----------
+
+    def records(self, **filters):
+        """
+        按条件筛选镜像中的alpha，条件见_where，另可传limit（最多返回的数量）
+
+        Returns:
+            list: 按Sharpe升序的alpha记录（与列表接口返回的JSON相同）
+        """
+        sql, params = self._select("raw", **filters)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(raw) for raw, in rows]
+
+    def frame(self, columns=None, **filters):
+        """
+        按条件筛选镜像中的alpha，直接返回展开的列，不解析原始JSON（大批量筛选时比records快得多）
+
+        Args:
+            columns (dict, optional): {输出列名: SQL表达式}，默认id和COLUMNS中的全部列
+            **filters: 条件见_where，另可传limit
+
+        Returns:
+            pd.DataFrame: 按Sharpe升序
+        """
+        if columns is None:
+            columns = {name: name for name in ['id'] + [name for name, _, _ in COLUMNS]}
+        sql, params = self._select(', '.join(f"{expr} AS \"{name}\"" for name, expr in columns.items()), **filters)
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def _select(self, fields, limit=None, **filters):
+        where, params = self._where(**filters)
+        sql = f"SELECT {fields} FROM alphas"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY sharpe"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return sql, params
+
+    @staticmethod
+    def _where(statuses=('UNSUBMITTED', 'IS_FAIL'), region=None, created_after=None, created_before=None,
+               sharpe=(None, None), fitness=(None, None), max_turnover=None, min_positions=None,
+               include_hidden=False, exclude_types=('SUPER',), without_failed_checks=False):
+        """
+        筛选条件，与列表接口的同名过滤条件含义一致（上下界都不含端点）
+
+        Args:
+            statuses (tuple): 状态，None表示不限
+            region (str, optional): 地区
+            created_after (str, optional): 创建时间下界（ISO时间，可带时区）
+            created_before (str, optional): 创建时间上界
+            sharpe (tuple): Sharpe的 (下界, 上界)，None表示不限
+            fitness (tuple): Fitness的 (下界, 上界)
+            max_turnover (float, optional): Turnover上界
+            min_positions (int, optional): longCount + shortCount 的下界
+            include_hidden (bool): 是否包含隐藏的alpha
+            exclude_types (tuple): 排除的alpha类型
+            without_failed_checks (bool): 是否排除有FAIL检查项的alpha
+
+        Returns:
+            tuple: (WHERE子句列表, 参数列表)
+        """
+        where, params = [], []
+        if statuses:
+            where.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if region:
+            where.append("region = ?")
+            params.append(region)
+        if created_after:
+            where.append("date_created > ?")
+            params.append(_utc(created_after))
+        if created_before:
+            where.append("date_created < ?")
+            params.append(_utc(created_before))
+        for column, (low, high) in (('sharpe', sharpe), ('fitness', fitness)):
+            if low is not None:
+                where.append(f"{column} > ?")
+                params.append(low)
+            if high is not None:
+                where.append(f"{column} < ?")
+                params.append(high)
+        if max_turnover is not None:
+            where.append("turnover < ?")
+            params.append(max_turnover)
+        if min_positions is not None:
+            where.append("long_count + short_count > ?")
+            params.append(min_positions)
+        if not include_hidden:
+            where.append("hidden = 0")
+        if exclude_types:
+            where.append(f"type NOT IN ({', '.join('?' * len(exclude_types))})")
+            params.extend(exclude_types)
+        if without_failed_checks:
+            where.append("failed_checks = 0")
+        return where, params
+
+    def status_counts(self):
+        """各状态的alpha数"""
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM alphas GROUP BY status").fetchall())
+
+
+if __name__ == "__main__":
+    # 用法: python alpha_mirror.py  （同步credentials.txt账号的alpha列表并打印各状态的数量）
+    from helper import sign_in
+    from rate_limiter import limited_request
+
+    sess = sign_in()
+    mirror = AlphaMirror()
+    started = time.perf_counter()
+    synced = mirror.sync(lambda url: limited_request(sess, 'get', url).json())
+    print(f"synced {synced} alphas in {time.perf_counter() - started:.1f}s, {len(mirror)} in the mirror, "
+          f"watermark {mirror.watermark()}")
+    for status, count in mirror.status_counts().items():
+        print(f"{status}: {count}")
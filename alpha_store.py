@@ -0,0 +1,417 @@
+"""
+待模拟/已模拟alpha的列式存储（Parquet）
+settings展开成有类型的列（settings_region、settings_decay ...），不再以字典字符串写进CSV；
+每次追加写一个新的分片文件并原子改名，写到一半的文件不会被读到，也不会破坏已有数据的schema。
+可以按列过滤读取，也可以导入旧的CSV。
+
+依赖pyarrow（可选）：pip install pyarrow
+"""
+import ast
+import csv
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # 没有安装pyarrow时其余脚本照常使用CSV
+    pa = pc = ds = pq = None
+
+from payload_batch import PayloadBatch
+
+
+HAS_PYARROW = pa is not None
+
+# 展开成列的settings及其类型，其余的settings以JSON保存在settings_extra列
+SETTINGS_TYPES = {
+    "instrumentType": 'string',
+    "region": 'string',
+    "universe": 'string',
+    "delay": 'int64',
+    "decay": 'int64',
+    "neutralization": 'string',
+    "truncation": 'float64',
+    "pasteurization": 'string',
+    "unitHandling": 'string',
+    "nanHandling": 'string',
+    "language": 'string',
+    "visualization": 'bool',
+}
+SETTINGS_COLUMNS = [f"settings_{name}" for name in SETTINGS_TYPES]
+
+PENDING_FIELDS = [('type', 'string'), ('regular', 'string')] \
+    + [(f"settings_{name}", kind) for name, kind in SETTINGS_TYPES.items()] \
+    + [('settings_extra', 'string'), ('added_at', 'float64')]
+
+SIMULATED_FIELDS = [('id', 'string'), ('alpha', 'string'), ('status', 'string'), ('type', 'string'),
+                    ('regular', 'string')] \
+    + [(f"settings_{name}", kind) for name, kind in SETTINGS_TYPES.items()] \
+    + [('settings_extra', 'string'), ('message', 'string'), ('location', 'string'),
+       ('recorded_at', 'float64'), ('extra', 'string')]
+
+# AlphaSimulator以前写的simulated_alphas_{date}.csv没有表头，按模拟结果的键顺序写入
+SIMULATED_CSV_FIELDS = ['id', 'type', 'settings', 'regular', 'status', 'alpha']
+
+_CONVERTERS = {'string': str, 'int64': int, 'float64': float, 'bool': bool}
+
+
+def _require_pyarrow():
+    if not HAS_PYARROW:
+        raise ImportError("alpha_store needs pyarrow, install it with: pip install pyarrow")
+
+
+def flatten_settings(settings):
+    """
+    把settings字典展开成列
+
+    Args:
+        settings (dict): 模拟设置
+
+    Returns:
+        dict: {settings_xxx: 值}，包括settings_extra（其余设置的JSON，没有时为None）
+    """
+    columns = dict.fromkeys(SETTINGS_COLUMNS)
+    extra = {}
+    for name, value in (settings or {}).items():
+        kind = SETTINGS_TYPES.get(name)
+        if kind is None or value is None:
+            if value is not None:
+                extra[name] = value
+            continue
+        try:
+            # bool('OFF')之类的转换没有意义，字符串形式的布尔值按原样放进extra
+            if kind == 'bool' and not isinstance(value, bool):
+                raise ValueError(value)
+            columns[f"settings_{name}"] = _CONVERTERS[kind](value)
+        except (TypeError, ValueError):
+            extra[name] = value
+    columns['settings_extra'] = json.dumps(extra, sort_keys=True) if extra else None
+    return columns
+
+
+def unflatten_settings(row):
+    """flatten_settings的逆操作，row为一行的 {列名: 值}"""
+    settings = {}
+    for name in SETTINGS_TYPES:
+        value = row.get(f"settings_{name}")
+        if value is not None:
+            settings[name] = value
+    if row.get('settings_extra'):
+        settings.update(json.loads(row['settings_extra']))
+    return settings
+
+
+def build_filter(filters):
+    """
+    把 {列名: 值或值列表} 转成pyarrow过滤表达式，已经是表达式的原样返回
+
+    例: build_filter({'status': 'COMPLETE', 'settings_decay': [0, 6]})
+    """
+    if filters is None or not isinstance(filters, dict):
+        return filters
+    expression = None
+    for column, value in filters.items():
+        field = pc.field(column)
+        condition = field.isin(list(value)) if isinstance(value, (list, tuple, set)) else field == value
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+class AlphaStore:
+    """
+    Parquet分片目录
+
+    每次append写一个分片文件（part-*.parquet），先写临时文件再改名；
+    读取时把目录当作一个数据集，按schema读取并支持过滤和列裁剪。分片太多时用compact合并。
+    """
+
+    fields = None
+
+    def __init__(self, path, flush_every=1000, flush_interval=None):
+        """
+        Args:
+            path (str): 目录路径，不存在时自动创建
+            flush_every (int): add()缓冲多少行后写一个分片
+            flush_interval (float, optional): 缓冲中最早的一行超过这么多秒后写一个分片，None表示只按行数
+        """
+        _require_pyarrow()
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.schema = pa.schema([(name, pa.type_for_alias(kind)) for name, kind in self.fields])
+        self._buffer = []
+        self._timer = None
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def __len__(self):
+        return self.count()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.path!r})"
+
+    # ---------- 写入 ----------
+
+    def to_row(self, record):
+        """把一条记录转成按schema展开的一行，子类实现"""
+        raise NotImplementedError
+
+    def append(self, records):
+        """
+        追加一批记录，写成一个新的分片
+
+        Args:
+            records (iterable): 记录（字典）
+
+        Returns:
+            int: 写入的行数
+        """
+        rows = [self.to_row(record) for record in records]
+        if not rows:
+            return 0
+        columns = {name: [row.get(name) for row in rows] for name in self.schema.names}
+        self._write(pa.Table.from_pydict(columns, schema=self.schema))
+        return len(rows)
+
+    def _write(self, table):
+        name = f"part-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet"
+        # 以点开头的临时文件不会被数据集读到，写完后原子改名
+        tmp_path = os.path.join(self.path, f".{name}.tmp")
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, os.path.join(self.path, name))
+
+    def add(self, record):
+        """缓冲一条记录，满flush_every行或超过flush_interval秒时写一个分片（线程安全）"""
+        with self._lock:
+            self._buffer.append(record)
+            if len(self._buffer) < self.flush_every:
+                if self._timer is None and self.flush_interval is not None:
+                    # 结果来得很慢时也不会一直留在缓冲里（进程被杀掉时丢失）
+                    self._timer = threading.Timer(self.flush_interval, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            records = self._take_buffer()
+        self.append(records)
+
+    def flush(self):
+        """把缓冲的记录写入"""
+        with self._lock:
+            records = self._take_buffer()
+        return self.append(records)
+
+    def _take_buffer(self):
+        records, self._buffer = self._buffer, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return records
+
+    # ---------- 读取 ----------
+
+    def parts(self):
+        """已经写完的分片文件，按写入顺序"""
+        return sorted(glob.glob(os.path.join(self.path, 'part-*.parquet')))
+
+    def dataset(self, parts=None):
+        return ds.dataset(parts if parts is not None else self.parts(), schema=self.schema, format='parquet')
+
+    def read(self, filters=None, columns=None, parts=None):
+        """
+        读取为pyarrow.Table
+
+        Args:
+            filters (dict | pyarrow.compute.Expression, optional): 过滤条件，见build_filter
+            columns (list, optional): 只读取这些列
+            parts (list, optional): 只读取这些分片
+
+        Returns:
+            pyarrow.Table: 表
+        """
+        return self.dataset(parts).to_table(columns=columns, filter=build_filter(filters))
+
+    def to_pandas(self, filters=None, columns=None):
+        return self.read(filters, columns).to_pandas()
+
+    def count(self, filters=None):
+        return self.dataset().count_rows(filter=build_filter(filters))
+
+    def compact(self):
+        """
+        把所有分片合并成一个（先写新分片再删除旧分片，中途失败不丢数据，但合并期间不要并发追加）。
+        合并后的分片是新文件，PendingQueue.import_store会把它当作新增分片，已经导入过的待模拟目录不要合并。
+
+        Returns:
+            int: 合并前的分片数
+        """
+        parts = self.parts()
+        if len(parts) > 1:
+            self._write(self.read(parts=parts))
+            for part in parts:
+                os.remove(part)
+        return len(parts)
+
+    # ---------- 导入 ----------
+
+    def import_csv(self, filename, fieldnames=None, chunk_size=100000):
+        """
+        导入旧的CSV，settings列为字典字符串
+
+        Args:
+            filename (str): CSV文件路径
+            fieldnames (list, optional): 列名；为None时使用CSV第一行作为表头
+            chunk_size (int): 每个分片的行数
+
+        Returns:
+            int: 导入的行数
+        """
+        imported = 0
+        with open(filename, 'r', newline='') as file:
+            reader = csv.reader(file)
+            if fieldnames is None:
+                fieldnames = next(reader, None) or []
+            chunk = []
+            for values in reader:
+                if not values or values == list(fieldnames):
+                    # 空行，或追加写入时重复写出的表头
+                    continue
+                record = dict(zip(fieldnames, values))
+                if len(values) > len(fieldnames):
+                    record['_unnamed'] = values[len(fieldnames):]
+                if isinstance(record.get('settings'), str):
+                    try:
+                        record['settings'] = ast.literal_eval(record['settings'])
+                    except (ValueError, SyntaxError):
+                        print(f"Error evaluating settings: {record['settings']}")
+                        continue
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    imported += self.append(chunk)
+                    chunk = []
+            imported += self.append(chunk)
+        return imported
+
+
+class PendingStore(AlphaStore):
+    """待模拟的alpha（create_simulation_data格式）"""
+
+    fields = PENDING_FIELDS
+
+    def append(self, records):
+        """追加一批记录；PayloadBatch按预设直接生成列，不逐行展开"""
+        if isinstance(records, PayloadBatch):
+            return self._append_batch(records)
+        return super().append(records)
+
+    def _append_batch(self, batch):
+        if not len(batch):
+            return 0
+        preset_rows = [flatten_settings(settings) for settings in batch.presets.settings]
+        indices = pa.array(batch.preset_ids, type=pa.uint16())
+        columns = {
+            'type': pa.array(['REGULAR'] * len(batch), type=pa.string()),
+            'regular': pa.array(batch.expressions, type=pa.string()),
+            'added_at': pa.array([time.time()] * len(batch), type=pa.float64()),
+        }
+        for name in SETTINGS_COLUMNS + ['settings_extra']:
+            values = pa.array([row[name] for row in preset_rows], type=self.schema.field(name).type)
+            columns[name] = values.take(indices)
+        self._write(pa.Table.from_pydict(columns, schema=self.schema))
+        return len(batch)
+
+    def to_row(self, alpha):
+        row = flatten_settings(alpha.get('settings'))
+        row['type'] = alpha.get('type', 'REGULAR')
+        row['regular'] = alpha.get('regular')
+        row['added_at'] = time.time()
+        return row
+
+    def iter_alphas(self, filters=None, parts=None):
+        """
+        逐个产出create_simulation_data格式的alpha，按分片流式读取
+
+        Yields:
+            dict: 模拟数据
+        """
+        scanner = self.dataset(parts).scanner(filter=build_filter(filters))
+        for batch in scanner.to_batches():
+            for row in batch.to_pylist():
+                yield {'type': row['type'] or 'REGULAR', 'settings': unflatten_settings(row),
+                       'regular': row['regular']}
+
+    def payload_batch(self, filters=None, parts=None):
+        """
+        读取为PayloadBatch：相同settings的行共用一个预设
+
+        Returns:
+            PayloadBatch: 批次
+        """
+        batch = PayloadBatch()
+        table = self.read(filters, columns=['regular'] + SETTINGS_COLUMNS + ['settings_extra'], parts=parts)
+        presets = {}
+        settings_columns = [table.column(name).to_pylist() for name in SETTINGS_COLUMNS + ['settings_extra']]
+        for expression, *values in zip(table.column('regular').to_pylist(), *settings_columns):
+            key = tuple(values)
+            preset_id = presets.get(key)
+            if preset_id is None:
+                settings = unflatten_settings(dict(zip(SETTINGS_COLUMNS + ['settings_extra'], values)))
+                preset_id = presets[key] = batch.presets.intern(settings)
+            batch.expressions.append(expression)
+            batch.preset_ids.append(preset_id)
+        return batch
+
+
+class SimulatedStore(AlphaStore):
+    """模拟结果（/simulations/{id}返回的JSON），schema以外的字段以JSON保存在extra列"""
+
+    fields = SIMULATED_FIELDS
+
+    def __init__(self, path, flush_every=20, flush_interval=30.0):
+        super().__init__(path, flush_every, flush_interval)
+
+    def to_row(self, result):
+        result = dict(result)
+        row = flatten_settings(result.pop('settings', None))
+        # /alphas/{id}的记录中regular是 {'code': 表达式, ...}，旧CSV里是它的字符串形式
+        regular = result.pop('regular', None)
+        if isinstance(regular, str) and regular.startswith('{'):
+            try:
+                regular = ast.literal_eval(regular)
+            except (ValueError, SyntaxError):
+                pass
+        if isinstance(regular, dict):
+            regular = dict(regular)
+            row['regular'] = regular.pop('code', None)
+            if regular:
+                result['regular'] = regular
+        else:
+            row['regular'] = regular
+        for name in ('id', 'alpha', 'status', 'type', 'message', 'location'):
+            value = result.pop(name, None)
+            row[name] = str(value) if value is not None else None
+        row['recorded_at'] = result.pop('recorded_at', None) or time.time()
+        row['extra'] = json.dumps(result, sort_keys=True, default=str) if result else None
+        return row
+
+    def import_csv(self, filename, fieldnames=SIMULATED_CSV_FIELDS, chunk_size=100000):
+        """导入AlphaSimulator写的CSV：有表头时按表头，旧的无表头CSV按fieldnames（默认SIMULATED_CSV_FIELDS）"""
+        with open(filename, 'r', newline='') as file:
+            first = next(csv.reader(file), [])
+        if 'id' in first and 'status' in first:
+            fieldnames = None
+        return super().import_csv(filename, fieldnames, chunk_size)
+
+
+if __name__ == "__main__":
+    # 用法: python alpha_store.py pending|simulated 旧CSV文件 存储目录
+    import sys
+
+    kind, csv_path, store_path = sys.argv[1:4]
+    store = PendingStore(store_path) if kind == 'pending' else SimulatedStore(store_path)
+    print(f"Imported {store.import_csv(csv_path)} rows from {csv_path} into {store_path}")
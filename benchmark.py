@@ -0,0 +1,163 @@
+"""
+端到端吞吐基准
+每条客户端代码路径都在全新的mock_server上、在临时目录里以子进程运行（限流器和会话互不影响），
+从服务器侧统计 alphas/hour、端到端延迟p50/p99 和浪费的请求数。
+
+代码路径:
+    simulator     AlphaSimulator.simulate_batch（异步调度 + 轮询调度器）
+    account_pool  AccountPool.simulate_batch（两个账号共用一个队列）
+    batch_submit  helper.batch_submit_alphas（逐个提交、逐个等待）
+    auto_check    4.auto-check.py（列表分页 + 检查）
+    auto_submit   5.auto-submit.py（列表分页 + 检查 + 提交）
+
+用法:
+    python benchmark.py --paths simulator batch_submit --alphas 40 --sim_duration 2 --throttle_rate 0.02
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_server import MockBrainServer, add_server_arguments, server_config
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 每条路径完成一个alpha时，服务器侧记录的是哪一类事件
+PATH_KINDS = {
+    'simulator': 'simulations',
+    'account_pool': 'simulations',
+    'batch_submit': 'simulations',
+    'auto_check': 'checks',
+    'auto_submit': 'submits',
+}
+
+
+def bench_alphas(count):
+    from payload_batch import PayloadBatch
+    return PayloadBatch(f"rank(ts_delta(close, {i + 1}))" for i in range(count))
+
+
+def run_client(path, args):
+    """在子进程中运行一条代码路径（BRAIN_API_URL已指向mock_server，工作目录为临时目录）"""
+    alphas = bench_alphas(args.alphas)
+    if path == 'simulator':
+        from AlphaSimulator import AlphaSimulator
+        simulator = AlphaSimulator(max_concurrent=args.max_concurrent, username='bench', password='bench',
+                                   alpha_list_file_path='alpha_list_pending_simulated.csv',
+                                   batch_number_for_every_queue=20, poll_interval=1)
+        simulator.simulate_batch(alphas)
+    elif path == 'account_pool':
+        from account_pool import AccountPool
+        accounts = [('bench1', 'bench', None), ('bench2', 'bench', None)]
+        pool = AccountPool(accounts, 'alpha_list_pending_simulated.csv', max_concurrent=args.max_concurrent,
+                           poll_interval=1)
+        pool.simulate_batch(alphas)
+    elif path == 'batch_submit':
+        from helper import batch_submit_alphas, sign_in
+        batch_submit_alphas(sign_in(), alphas)
+    else:
+        raise ValueError(f"Unknown client path: {path}")
+
+
+def run_path(path, args):
+    """
+    启动mock_server并运行一条路径
+
+    Returns:
+        dict: 该路径的统计结果
+    """
+    server = MockBrainServer(**server_config(args))
+    url = server.start()
+    with tempfile.TemporaryDirectory(prefix=f'bench_{path}_') as work_dir:
+        for name in ('credentials.txt', 'brain_credentials.txt'):
+            with open(os.path.join(work_dir, name), 'w') as f:
+                json.dump(['bench', 'bench'], f)
+        env = dict(os.environ, BRAIN_API_URL=url,
+                   PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+        if path == 'auto_check':
+            command = [sys.executable, os.path.join(REPO_DIR, '4.auto-check.py'),
+                       '--alpha_num', str(args.alphas), '--blacklist_file', 'blacklist.txt']
+        elif path == 'auto_submit':
+            command = [sys.executable, os.path.join(REPO_DIR, '5.auto-submit.py'),
+                       '--alpha_num', str(args.alphas), '--blacklist_file', 'blacklist.txt',
+                       '--credentials_file', 'credentials.txt', '--submit_delay', '0',
+                       '--max_submitted_change', str(args.alphas + 1)]
+        else:
+            command = [sys.executable, os.path.abspath(__file__), '--client', path,
+                       '--alphas', str(args.alphas), '--max_concurrent', str(args.max_concurrent)]
+
+        server.brain.reset_stats()
+        start = time.monotonic()
+        with open(os.path.join(work_dir, 'client.log'), 'w') as log:
+            try:
+                returncode = subprocess.run(command, cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT,
+                                            timeout=args.timeout).returncode
+            except subprocess.TimeoutExpired:
+                returncode = 'timeout'
+        wall = time.monotonic() - start
+        if returncode != 0:
+            with open(os.path.join(work_dir, 'client.log')) as log:
+                tail = log.read()[-2000:]
+            print(f"[{path}] client exited with {returncode}, last output:\n{tail}")
+    stats = server.stats()
+    server.stop()
+
+    latency = stats['latency'].get(PATH_KINDS[path], {'count': 0, 'p50': None, 'p99': None})
+    return {
+        'path': path,
+        'done': latency['count'],
+        'wall': wall,
+        'alphas_per_hour': latency['count'] / wall * 3600 if wall else 0,
+        'p50': latency['p50'],
+        'p99': latency['p99'],
+        'requests': stats['total_requests'],
+        'wasted': stats['wasted'],
+        'returncode': returncode,
+    }
+
+
+def print_report(results):
+    def seconds(value):
+        return f"{value:.2f}" if value is not None else '-'
+
+    print(f"\n{'path':<14}{'done':>6}{'wall(s)':>9}{'alphas/h':>10}{'p50(s)':>8}{'p99(s)':>8}"
+          f"{'requests':>10}{'wasted':>8}  breakdown")
+    for r in results:
+        wasted = r['wasted']
+        print(f"{r['path']:<14}{r['done']:>6}{r['wall']:>9.1f}{r['alphas_per_hour']:>10.0f}"
+              f"{seconds(r['p50']):>8}{seconds(r['p99']):>8}{r['requests']:>10}{sum(wasted.values()):>8}  "
+              + ', '.join(f"{k}={v}" for k, v in sorted(wasted.items())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='BRAIN client throughput benchmark')
+    parser.add_argument('--paths', nargs='+', default=['simulator', 'account_pool', 'batch_submit'],
+                        choices=sorted(PATH_KINDS), help='要测量的代码路径')
+    parser.add_argument('--alphas', type=int, default=30, help='每条路径处理的alpha数量')
+    parser.add_argument('--max_concurrent', type=int, default=5, help='模拟路径的并发数')
+    parser.add_argument('--timeout', type=float, default=900, help='单条路径的超时（秒）')
+    parser.add_argument('--json', type=str, default=None, help='把结果另存为JSON文件')
+    parser.add_argument('--client', type=str, default=None, help=argparse.SUPPRESS)
+    add_server_arguments(parser)
+    parser.set_defaults(seed_alphas=None)
+    args = parser.parse_args()
+
+    if args.client:
+        run_client(args.client, args)
+        sys.exit(0)
+
+    # auto_check/auto_submit处理的是服务器上已有的alpha
+    if args.seed_alphas is None:
+        args.seed_alphas = args.alphas
+    results = []
+    for path in args.paths:
+        print(f"Running {path}...")
+        results.append(run_path(path, args))
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
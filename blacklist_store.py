@@ -0,0 +1,258 @@
+"""
+Alpha黑名单（SQLite）
+代替每加一个ID就追加一次的blacklist.txt：多个进程（检查、提交脚本）可以同时读写，
+每条记录带原因和时间，临时性的原因（如提交返回403）到期后自动失效。
+查询直接走主键索引，启动时不把整个黑名单读进内存；新增的ID先缓存，按批在一个事务里写入（一次fsync）。
+
+例:
+    blacklist = BlacklistStore()
+    blacklist.import_text('blacklist.txt')
+    if alpha_id not in blacklist: ...
+    blacklist.add(alpha_id, reason='FAIL')
+    blacklist.close()
+"""
+import os
+import sqlite3
+import threading
+import time
+
+
+# 各原因的默认有效期（秒），不在表中的原因永久有效
+DEFAULT_TTL = {
+    '403': 24 * 3600,
+}
+# IN查询每批的参数个数（SQLite默认上限999）
+_QUERY_CHUNK = 500
+
+
+class BlacklistStore:
+    """
+    黑名单
+
+    reason取值: FAIL（检查不通过）、403（提交被拒绝）、passed（检查通过后按配置加入）、manual（从blacklist.txt导入）等
+    """
+
+    def __init__(self, db_path='blacklist.db', batch_size=100, flush_interval=5.0, ttl=None):
+        """
+        Args:
+            db_path (str): 数据库文件
+            batch_size (int): 缓存这么多条后写入
+            flush_interval (float): 最早缓存的一条超过这么多秒后写入
+            ttl (dict, optional): 覆盖DEFAULT_TTL，{原因: 秒数或None}
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.ttl = dict(DEFAULT_TTL, **(ttl or {}))
+        self._pending = {}
+        self._pending_since = None
+        self._timer = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # 每次提交都fsync，攒批写入后一批只需要一次
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS blacklist (
+                id TEXT PRIMARY KEY,
+                reason TEXT NOT NULL,
+                added_at REAL NOT NULL,
+                expires_at REAL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_blacklist_expires ON blacklist(expires_at) WHERE expires_at IS NOT NULL;
+            CREATE TABLE IF NOT EXISTS imports (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL
+            );
+        """)
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self.flush()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, alpha_id):
+        now = time.time()
+        with self._lock:
+            pending = self._pending.get(alpha_id)
+            if pending is not None:
+                return pending[3] is None or pending[3] > now
+            row = self._conn.execute("SELECT 1 FROM blacklist WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+                                     (alpha_id, now)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        """未过期的条数（含尚未写入的）"""
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM blacklist WHERE expires_at IS NULL OR expires_at > ?",
+                                      (time.time(),)).fetchone()[0]
+
+    # ---------- 写入 ----------
+
+    def add(self, alpha_id, reason='manual', ttl=None):
+        """
+        加入黑名单（先缓存，攒够一批或超过flush_interval后写入）
+
+        Args:
+            alpha_id (str): Alpha ID
+            reason (str): 原因
+            ttl (float, optional): 有效期（秒），默认按原因取self.ttl，None表示永久
+
+        Returns:
+            bool: 总是True（与旧的update_blacklist返回值一致）
+        """
+        now = time.time()
+        ttl = ttl if ttl is not None else self.ttl.get(reason)
+        with self._lock:
+            self._pending[alpha_id] = (alpha_id, reason, now, now + ttl if ttl else None)
+            if self._pending_since is None:
+                self._pending_since = now
+                # 加入得很慢时也不会一直留在缓存里（进程被杀掉时丢失）
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            due = len(self._pending) >= self.batch_size or now - self._pending_since >= self.flush_interval
+        if due:
+            self.flush()
+        return True
+
+    def flush(self):
+        """把缓存的条目在一个事务中写入"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            rows = list(self._pending.values())
+            self._write(rows)
+            self._pending.clear()
+            self._pending_since = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return len(rows)
+
+    def _write(self, rows, replace=True):
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(f"{verb} INTO blacklist (id, reason, added_at, expires_at) VALUES (?, ?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def remove(self, alpha_id):
+        with self._lock:
+            self._pending.pop(alpha_id, None)
+            self._conn.execute("DELETE FROM blacklist WHERE id = ?", (alpha_id,))
+
+    def purge_expired(self):
+        """
+        删除已过期的条目
+
+        Returns:
+            int: 删除的条数
+        """
+        with self._lock:
+            return self._conn.execute("DELETE FROM blacklist WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                                      (time.time(),)).rowcount
+
+    # ---------- 查询 ----------
+
+    def filter(self, alpha_ids):
+        """
+        去掉黑名单中的ID，按批查询，比逐个判断快
+
+        Returns:
+            list: 不在黑名单中的ID，顺序不变
+        """
+        alpha_ids = list(alpha_ids)
+        now = time.time()
+        blocked = set()
+        with self._lock:
+            blocked.update(alpha_id for alpha_id in alpha_ids
+                           if alpha_id in self._pending and (self._pending[alpha_id][3] is None
+                                                             or self._pending[alpha_id][3] > now))
+            for i in range(0, len(alpha_ids), _QUERY_CHUNK):
+                chunk = alpha_ids[i:i + _QUERY_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT id FROM blacklist WHERE id IN ({', '.join('?' * len(chunk))}) "
+                    "AND (expires_at IS NULL OR expires_at > ?)", (*chunk, now)).fetchall()
+                blocked.update(row[0] for row in rows)
+        return [alpha_id for alpha_id in alpha_ids if alpha_id not in blocked]
+
+    def reason(self, alpha_id):
+        """
+        Returns:
+            tuple: (原因, 加入时间, 过期时间)，不在黑名单中时为None
+        """
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT reason, added_at, expires_at FROM blacklist WHERE id = ?",
+                                      (alpha_id,)).fetchone()
+
+    def reasons(self):
+        """各原因的未过期条数"""
+        self.flush()
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT reason, COUNT(*) FROM blacklist WHERE expires_at IS NULL OR expires_at > ? GROUP BY reason",
+                (time.time(),)).fetchall())
+
+    # ---------- 导入 ----------
+
+    def import_text(self, path, reason='manual', chunk_size=100000):
+        """
+        导入旧的blacklist.txt（每行一个ID）；文件大小和修改时间与上次导入时相同则跳过，
+        已有的条目保留原来的原因
+
+        Returns:
+            int: 本次读取的ID数
+        """
+        if not os.path.exists(path):
+            return 0
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime FROM imports WHERE path = ?", (key,)).fetchone()
+        if row is not None and row[0] == st.st_size and row[1] == st.st_mtime:
+            return 0
+        now = time.time()
+        count = 0
+        with open(path, 'r') as file:
+            batch = []
+            for line in file:
+                alpha_id = line.strip()
+                if not alpha_id:
+                    continue
+                batch.append((alpha_id, reason, now, None))
+                if len(batch) >= chunk_size:
+                    with self._lock:
+                        self._write(batch, replace=False)
+                    count += len(batch)
+                    batch = []
+            with self._lock:
+                self._write(batch, replace=False)
+                self._conn.execute("INSERT OR REPLACE INTO imports (path, size, mtime) VALUES (?, ?, ?)",
+                                   (key, st.st_size, st.st_mtime))
+            count += len(batch)
+        return count
+
+
+if __name__ == "__main__":
+    # 用法: python blacklist_store.py [blacklist.txt]  （导入文本黑名单并打印各原因的条数）
+    import sys
+
+    with BlacklistStore() as store:
+        if len(sys.argv) > 1:
+            print(f"imported {store.import_text(sys.argv[1])} ids from {sys.argv[1]}")
+        print(f"purged {store.purge_expired()} expired entries")
+        print(f"{len(store)} entries: {store.reasons()}")
@@ -0,0 +1,321 @@
+"""
+本地自相关预筛
+缓存已提交（ACTIVE）alpha和候选alpha的PnL（/alphas/{id}/recordsets/pnl，alpha不变则PnL不变，只需取一次），
+用NumPy按矩阵运算一次算出候选与所有已提交alpha的日PnL相关系数。
+最大相关明显超过平台上限的候选不再调用 /alphas/{id}/check，其余按预测的最大相关从低到高排序；
+提交成功后把该alpha加入已提交矩阵，后面的候选按新的矩阵重新判断。
+
+相关系数的计算方式与平台的SELF_CORRELATION一致：累计PnL按日差分，取最近4年，两两取共同有值的日期计算Pearson相关。
+
+例:
+    engine = CorrelationEngine(PnlCache(), lambda alpha_id: get_pnl(sess, alpha_id))
+    engine.set_active(active_ids)
+    ranked, skipped = engine.rank(candidate_ids, limit=0.7, margin=0.05)
+    ...
+    engine.add_active(submitted_id)
+"""
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+PNL_URL = "https://api.worldquantbrain.com/alphas/{alpha_id}/recordsets/pnl"
+# 平台SELF_CORRELATION检查的上限
+SELF_CORRELATION_LIMIT = 0.7
+
+
+def parse_pnl(payload):
+    """
+    解析PnL recordset
+
+    Args:
+        payload (dict): 接口返回的JSON，records为 [日期, 累计PnL, ...] 的列表，列的含义见schema.properties
+
+    Returns:
+        tuple: (日期: int64天数数组, 累计PnL: float64数组)，按日期升序；没有记录时为None
+    """
+    records = (payload or {}).get('records') or []
+    if not records:
+        return None
+    names = [prop.get('name') for prop in ((payload.get('schema') or {}).get('properties') or [])]
+    date_col = names.index('date') if 'date' in names else 0
+    pnl_col = names.index('pnl') if 'pnl' in names else 1
+    days = np.array([record[date_col] for record in records], dtype='datetime64[D]').astype(np.int64)
+    pnl = np.array([record[pnl_col] for record in records], dtype=np.float64)
+    order = np.argsort(days, kind='stable')
+    return days[order], pnl[order]
+
+
+def daily_pnl(days, pnl):
+    """
+    累计PnL -> 日PnL（按该alpha自己的相邻两条记录差分，第一条没有日PnL）
+
+    Returns:
+        tuple: (日期, 日PnL)
+    """
+    return days[1:], np.diff(pnl)
+
+
+class PnlCache:
+    """
+    PnL缓存（SQLite），日期和累计PnL以二进制数组保存
+    """
+
+    def __init__(self, db_path='pnl_cache.db'):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pnl (
+                alpha_id TEXT PRIMARY KEY,
+                days BLOB NOT NULL,
+                pnl BLOB NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pnl").fetchone()[0]
+
+    def get_many(self, alpha_ids):
+        """
+        Returns:
+            dict: {alpha_id: (日期, 累计PnL)}，只含缓存中有的
+        """
+        alpha_ids = list(alpha_ids)
+        found = {}
+        with self._lock:
+            for i in range(0, len(alpha_ids), 500):
+                chunk = alpha_ids[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT alpha_id, days, pnl FROM pnl WHERE alpha_id IN ({', '.join('?' * len(chunk))})",
+                    chunk).fetchall()
+                for alpha_id, days, pnl in rows:
+                    found[alpha_id] = (np.frombuffer(days, dtype=np.int64), np.frombuffer(pnl, dtype=np.float64))
+        return found
+
+    def put(self, alpha_id, days, pnl):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO pnl (alpha_id, days, pnl, fetched_at) VALUES (?, ?, ?, ?)",
+                               (alpha_id, np.ascontiguousarray(days, dtype=np.int64).tobytes(),
+                                np.ascontiguousarray(pnl, dtype=np.float64).tobytes(), time.time()))
+
+
+class CorrelationEngine:
+    """
+    候选alpha与已提交alpha的日PnL相关系数
+
+    已提交alpha的日PnL按日历日排成矩阵（没有数据的位置为0，另存一个0/1掩码），
+    k个候选与n个已提交alpha的两两相关只需要6次 (n×T)·(T×k) 矩阵乘法，
+    每对alpha只使用双方都有数据的日期。
+    """
+
+    def __init__(self, cache, fetch, window_days=4 * 365, min_overlap=60, max_workers=4):
+        """
+        Args:
+            cache (PnlCache): PnL缓存
+            fetch (callable): fetch(alpha_id) -> PnL recordset的JSON，失败时返回None
+            window_days (int): 只使用最近这么多天（以已提交alpha的最新日期为准）
+            min_overlap (int): 共同日期少于这么多天的一对不计算相关（视为0）
+            max_workers (int): 并发获取PnL的线程数
+        """
+        self.cache = cache
+        self.fetch = fetch
+        self.window_days = window_days
+        self.min_overlap = min_overlap
+        self.max_workers = max_workers
+        self._series = {}
+        self._active = []
+        self._end = None
+        self._values = None
+        self._squares = None
+        self._mask = None
+
+    # ---------- PnL ----------
+
+    def _fetch_one(self, alpha_id):
+        try:
+            parsed = parse_pnl(self.fetch(alpha_id))
+        except Exception as e:
+            print(f"Failed to get PnL of {alpha_id}: {e}")
+            return None
+        if parsed is not None:
+            self.cache.put(alpha_id, *parsed)
+        return parsed
+
+    def load(self, alpha_ids):
+        """
+        取得日PnL（先查缓存，缓存中没有的并发从服务器获取并写入缓存）
+
+        Returns:
+            dict: {alpha_id: (日期, 日PnL)}，获取失败的不含
+        """
+        alpha_ids = [alpha_id for alpha_id in dict.fromkeys(alpha_ids) if alpha_id not in self._series]
+        loaded = self.cache.get_many(alpha_ids)
+        missing = [alpha_id for alpha_id in alpha_ids if alpha_id not in loaded]
+        if missing:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(missing)))) as executor:
+                for alpha_id, parsed in zip(missing, executor.map(self._fetch_one, missing)):
+                    if parsed is not None:
+                        loaded[alpha_id] = parsed
+        for alpha_id, (days, pnl) in loaded.items():
+            self._series[alpha_id] = daily_pnl(days, pnl)
+        return {alpha_id: self._series[alpha_id] for alpha_id in alpha_ids if alpha_id in self._series}
+
+    # ---------- 已提交矩阵 ----------
+
+    def set_active(self, alpha_ids):
+        """
+        设置已提交的alpha（获取PnL并重建矩阵）
+
+        Returns:
+            int: 有PnL的已提交alpha数
+        """
+        self.load(alpha_ids)
+        self._active = [alpha_id for alpha_id in dict.fromkeys(alpha_ids) if alpha_id in self._series]
+        self._rebuild()
+        return len(self._active)
+
+    def add_active(self, alpha_id):
+        """
+        提交成功后加入已提交矩阵；日期在当前窗口内时只追加一行
+
+        Returns:
+            bool: 是否有该alpha的PnL
+        """
+        self.load([alpha_id])
+        if alpha_id not in self._series or alpha_id in self._active:
+            return alpha_id in self._series
+        self._active.append(alpha_id)
+        days = self._series[alpha_id][0]
+        if self._end is None or (len(days) and days[-1] > self._end):
+            self._rebuild()
+            return True
+        values, mask = self._row(alpha_id)
+        self._values = np.vstack([self._values, values])
+        self._squares = np.vstack([self._squares, values * values])
+        self._mask = np.vstack([self._mask, mask])
+        return True
+
+    def _rebuild(self):
+        ends = [self._series[alpha_id][0][-1] for alpha_id in self._active if len(self._series[alpha_id][0])]
+        self._end = max(ends) if ends else None
+        width = self.window_days + 1
+        self._values = np.zeros((len(self._active), width))
+        self._mask = np.zeros((len(self._active), width))
+        for i, alpha_id in enumerate(self._active):
+            self._values[i], self._mask[i] = self._row(alpha_id)
+        self._squares = self._values * self._values
+
+    def _row(self, alpha_id):
+        """alpha的日PnL放到以self._end结尾的日历日轴上"""
+        values = np.zeros(self.window_days + 1)
+        mask = np.zeros(self.window_days + 1)
+        days, pnl = self._series[alpha_id]
+        if self._end is None:
+            return values, mask
+        index = days - (self._end - self.window_days)
+        keep = (index >= 0) & (index <= self.window_days)
+        values[index[keep]] = pnl[keep]
+        mask[index[keep]] = 1.0
+        return values, mask
+
+    # ---------- 相关系数 ----------
+
+    def correlations(self, alpha_ids):
+        """
+        候选与每个已提交alpha的相关系数
+
+        Returns:
+            np.ndarray: (已提交数, 候选数)，共同日期不足min_overlap或方差为0的为0；没有PnL的候选整列为nan
+        """
+        self.load(alpha_ids)
+        result = np.full((len(self._active), len(alpha_ids)), np.nan)
+        known = [j for j, alpha_id in enumerate(alpha_ids) if alpha_id in self._series]
+        if not self._active or not known:
+            return result
+        rows = [self._row(alpha_ids[j]) for j in known]
+        y = np.array([values for values, _ in rows]).T
+        y_mask = np.array([mask for _, mask in rows]).T
+
+        x, xx, x_mask = self._values, self._squares, self._mask
+        n = x_mask @ y_mask
+        sx = x @ y_mask
+        sxx = xx @ y_mask
+        sy = x_mask @ y
+        syy = x_mask @ (y * y)
+        sxy = x @ y
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = n * sxy - sx * sy
+            var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+            corr = np.where((n >= self.min_overlap) & (var > 0), cov / np.sqrt(var), 0.0)
+        result[:, known] = corr
+        return result
+
+    def max_correlation(self, alpha_ids):
+        """
+        Returns:
+            np.ndarray: 每个候选与已提交alpha的最大相关系数；没有已提交alpha时为0，没有PnL时为nan
+        """
+        if not self._active:
+            self.load(alpha_ids)
+            return np.array([0.0 if alpha_id in self._series else np.nan for alpha_id in alpha_ids])
+        return self.correlations(alpha_ids).max(axis=0, initial=-np.inf)
+
+    def rank(self, alpha_ids, limit=SELF_CORRELATION_LIMIT, margin=0.05):
+        """
+        预筛并排序候选
+
+        Args:
+            alpha_ids (list): 候选alpha ID
+            limit (float): 平台的自相关上限
+            margin (float): 预测值超过 limit + margin 才跳过，留出与平台计算口径的误差
+
+        Returns:
+            tuple: (保留的 [(alpha_id, 预测最大相关)] 按预测值升序、没有PnL的放在最后并保持原顺序,
+                    跳过的 [(alpha_id, 预测最大相关)])
+        """
+        alpha_ids = list(alpha_ids)
+        predicted = self.max_correlation(alpha_ids)
+        kept, skipped = [], []
+        for alpha_id, value in zip(alpha_ids, predicted.tolist()):
+            if value == value and value > limit + margin:
+                skipped.append((alpha_id, value))
+            else:
+                kept.append((alpha_id, value))
+        # sorted是稳定排序，nan排在最后
+        kept.sort(key=lambda item: (item[1] != item[1], item[1] if item[1] == item[1] else 0.0))
+        return kept, skipped
+
+
+if __name__ == "__main__":
+    # 用法: python correlation.py ALPHA_ID [ALPHA_ID ...]  （打印候选与credentials.txt账号已提交alpha的预测最大自相关）
+    import sys
+    from helper import sign_in
+    from paging import fetch_pages
+    from rate_limiter import limited_request
+
+    sess = sign_in()
+
+    def fetch(alpha_id):
+        while True:
+            response = limited_request(sess, 'get', PNL_URL.format(alpha_id=alpha_id))
+            if 'retry-after' not in response.headers:
+                return response.json()
+            time.sleep(float(response.headers['Retry-After']))
+
+    active = fetch_pages(lambda url: limited_request(sess, 'get', url).json(),
+                         "https://api.worldquantbrain.com/users/self/alphas?limit=100&offset={offset}&status=ACTIVE")
+    engine = CorrelationEngine(PnlCache(), fetch)
+    print(f"{engine.set_active([alpha['id'] for alpha in active])} active alphas with PnL")
+    for alpha_id, value in zip(sys.argv[1:], engine.max_correlation(sys.argv[1:])):
+        print(f"{alpha_id}: {value:.4f}")
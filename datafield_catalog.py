@@ -0,0 +1,314 @@
+"""
+本地数据字段目录（SQLite）
+把/data-fields返回的所有数据字段及其元数据镜像到本地，按区域/股票池/延迟/类型/数据集建索引，
+对id和description建FTS5全文索引。生成Alpha的脚本直接查询本地目录，不再每次按数据集下载后在pandas里过滤，
+也不受线上search=只取前100个的限制。
+
+例:
+    catalog = DatafieldCatalog()
+    catalog.sync(sess, searchScope, dataset_ids=['pv13'])
+    fields = catalog.ids(searchScope, type='MATRIX', min_coverage=0.8)
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from helper import get_datafields
+
+
+COLUMNS = ['id', 'instrument_type', 'region', 'delay', 'universe', 'dataset_id', 'dataset_name',
+           'category', 'type', 'coverage', 'user_count', 'alpha_count', 'description']
+
+
+class DatafieldCatalog:
+    """
+    本地数据字段目录
+
+    同一个字段在不同的 (instrumentType, region, delay, universe) 下分别保存一行。
+    sync按数据集（或整个范围）整体替换，记录同步时间，未过期时不再请求服务器。
+    """
+
+    def __init__(self, db_path='datafield_catalog.db'):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # INSERT OR REPLACE删除旧行时也要触发datafields_ad，保持全文索引同步
+        self._conn.execute("PRAGMA recursive_triggers=ON")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS datafields (
+                pk INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                instrument_type TEXT NOT NULL,
+                region TEXT NOT NULL,
+                delay INTEGER NOT NULL,
+                universe TEXT NOT NULL,
+                dataset_id TEXT,
+                dataset_name TEXT,
+                category TEXT,
+                type TEXT,
+                coverage REAL,
+                user_count INTEGER,
+                alpha_count INTEGER,
+                description TEXT,
+                raw TEXT,
+                UNIQUE (instrument_type, region, delay, universe, id)
+            );
+            -- 覆盖索引：常见的 范围 + 数据集/类型 + coverage 过滤只读索引，不回表
+            CREATE INDEX IF NOT EXISTS idx_datafields_dataset
+                ON datafields(instrument_type, region, delay, universe, dataset_id, type, coverage, id);
+            CREATE INDEX IF NOT EXISTS idx_datafields_type
+                ON datafields(instrument_type, region, delay, universe, type, coverage, id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS datafields_fts
+                USING fts5(id, description, content='datafields', content_rowid='pk');
+            CREATE TRIGGER IF NOT EXISTS datafields_ai AFTER INSERT ON datafields BEGIN
+                INSERT INTO datafields_fts(rowid, id, description) VALUES (new.pk, new.id, new.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS datafields_ad AFTER DELETE ON datafields BEGIN
+                INSERT INTO datafields_fts(datafields_fts, rowid, id, description)
+                    VALUES ('delete', old.pk, old.id, old.description);
+            END;
+            CREATE TABLE IF NOT EXISTS syncs (
+                instrument_type TEXT NOT NULL,
+                region TEXT NOT NULL,
+                delay INTEGER NOT NULL,
+                universe TEXT NOT NULL,
+                dataset_id TEXT NOT NULL,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (instrument_type, region, delay, universe, dataset_id)
+            );
+        """)
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM datafields").fetchone()[0]
+
+    # ---------- 同步 ----------
+
+    def synced_at(self, searchScope, dataset_id=''):
+        """
+        数据集最近一次同步的时间；整个范围同步过也算（取两者中较新的）
+
+        Returns:
+            float: 时间戳，从未同步时为None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(synced_at) FROM syncs WHERE instrument_type = ? AND region = ? AND delay = ? "
+                "AND universe = ? AND dataset_id IN (?, '')", (*_scope_key(searchScope), dataset_id)).fetchone()
+        return row[0]
+
+    def sync(self, s, searchScope, dataset_ids=None, max_age=24 * 3600, max_workers=8):
+        """
+        从服务器同步数据字段，未过期的数据集跳过
+
+        Args:
+            s (requests.Session): 已认证的会话对象
+            searchScope (dict): 搜索范围配置
+            dataset_ids (list, optional): 要同步的数据集；为None时同步该范围内的全部字段
+            max_age (float): 同步结果的有效期（秒），0表示强制重新同步
+            max_workers (int): 并发获取分页的线程数
+
+        Returns:
+            int: 本次写入的字段数
+        """
+        written = 0
+        for dataset_id in dataset_ids if dataset_ids is not None else ['']:
+            synced_at = self.synced_at(searchScope, dataset_id)
+            if max_age and synced_at is not None and time.time() - synced_at < max_age:
+                continue
+            # 目录本身就是缓存，不再经过get_datafields的磁盘缓存
+            df = get_datafields(s, searchScope, dataset_id=dataset_id, cache_dir=None, max_workers=max_workers)
+            written += self.replace(searchScope, dataset_id, df.to_dict('records'))
+        return written
+
+    def replace(self, searchScope, dataset_id, fields):
+        """
+        用一批字段替换该范围内某个数据集（dataset_id为''时为整个范围）的全部字段
+
+        Args:
+            searchScope (dict): 搜索范围配置
+            dataset_id (str): 数据集ID
+            fields (list): /data-fields返回的字段字典
+
+        Returns:
+            int: 写入的字段数
+        """
+        scope = _scope_key(searchScope)
+        rows = [_field_row(scope, field) for field in fields]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                where = "instrument_type = ? AND region = ? AND delay = ? AND universe = ?"
+                if dataset_id:
+                    self._conn.execute(f"DELETE FROM datafields WHERE {where} AND dataset_id = ?", (*scope, dataset_id))
+                else:
+                    self._conn.execute(f"DELETE FROM datafields WHERE {where}", scope)
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO datafields ({', '.join(COLUMNS)}, raw) "
+                    f"VALUES ({', '.join('?' * (len(COLUMNS) + 1))})", rows)
+                self._conn.execute("INSERT OR REPLACE INTO syncs VALUES (?, ?, ?, ?, ?, ?)",
+                                   (*scope, dataset_id, time.time()))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            # 更新统计信息，让查询计划选用合适的索引
+            self._conn.execute("PRAGMA optimize")
+        return len(rows)
+
+    # ---------- 查询 ----------
+
+    def _select(self, columns, searchScope=None, dataset=None, type=None, min_coverage=None, max_coverage=None,
+                min_user_count=None, max_user_count=None, min_alpha_count=None, max_alpha_count=None,
+                search=None, order_by=None, limit=None):
+        conditions, params = [], []
+
+        def add(condition, *values):
+            conditions.append(condition)
+            params.extend(values)
+
+        if searchScope is not None:
+            add("instrument_type = ? AND region = ? AND delay = ? AND universe = ?", *_scope_key(searchScope))
+        for column, value in (('dataset_id', dataset), ('type', type)):
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set)):
+                add(f"{column} IN ({', '.join('?' * len(value))})", *value)
+            else:
+                add(f"{column} = ?", value)
+        for column, low, high in (('coverage', min_coverage, max_coverage),
+                                  ('user_count', min_user_count, max_user_count),
+                                  ('alpha_count', min_alpha_count, max_alpha_count)):
+            if low is not None:
+                add(f"{column} >= ?", low)
+            if high is not None:
+                add(f"{column} <= ?", high)
+        if search:
+            add("pk IN (SELECT rowid FROM datafields_fts WHERE datafields_fts MATCH ?)", _fts_query(search))
+
+        sql = f"SELECT {', '.join(columns)} FROM datafields"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        # 不指定排序时在Python里按id排序：SQL里的ORDER BY id会让查询计划放弃覆盖索引
+        if order_by or limit is not None:
+            sql += f" ORDER BY {_order_by(order_by)}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        if not order_by and limit is None:
+            rows.sort(key=lambda row: row[0])
+        return rows
+
+    def query(self, searchScope=None, **filters):
+        """
+        查询字段元数据
+
+        Args:
+            searchScope (dict, optional): 只查询该范围（instrumentType/region/delay/universe）
+            **filters: dataset（数据集ID或列表）、type（MATRIX/VECTOR/GROUP或列表）、
+                min_coverage/max_coverage、min_user_count/max_user_count、min_alpha_count/max_alpha_count、
+                search（在id和description中全文搜索，按词前缀匹配）、order_by（如'-coverage'）、limit
+
+        Returns:
+            pandas.DataFrame: 每行一个字段
+        """
+        rows = self._select(COLUMNS, searchScope, **filters)
+        return pd.DataFrame([tuple(row) for row in rows], columns=COLUMNS)
+
+    def ids(self, searchScope=None, **filters):
+        """
+        只返回字段ID，参数同query，可以直接作为AlphaTemplate的取值
+
+        例: catalog.ids(searchScope, type='MATRIX', min_coverage=0.8)
+
+        Returns:
+            list: 字段ID
+        """
+        return [row[0] for row in self._select(['id'], searchScope, **filters)]
+
+    def field_types(self, searchScope):
+        """
+        (instrumentType, region, delay) 下所有字段的类型和单位，供validator在本地检查表达式。
+        字段是否存在与股票池无关，不区分universe。
+
+        Returns:
+            dict: {字段ID: (type, unit)}，服务器没有返回单位时unit为None
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, type, json_extract(raw, '$.unit') FROM datafields "
+                "WHERE instrument_type = ? AND region = ? AND delay = ?", _scope_key(searchScope)[:3]).fetchall()
+        return {field_id: (field_type, unit) for field_id, field_type, unit in rows}
+
+    def get(self, field_id, searchScope=None):
+        """
+        单个字段的完整元数据（/data-fields返回的原始字典）
+
+        Returns:
+            dict: 字段，不存在时为None
+        """
+        sql = "SELECT raw FROM datafields WHERE id = ?"
+        params = [field_id]
+        if searchScope is not None:
+            sql += " AND instrument_type = ? AND region = ? AND delay = ? AND universe = ?"
+            params.extend(_scope_key(searchScope))
+        with self._lock:
+            row = self._conn.execute(sql + " LIMIT 1", params).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+def _scope_key(searchScope):
+    return (searchScope['instrumentType'], searchScope['region'], int(searchScope['delay']),
+            searchScope['universe'])
+
+
+def _nested_id(value):
+    if isinstance(value, dict):
+        return value.get('id'), value.get('name')
+    return value, value
+
+
+def _field_row(scope, field):
+    dataset_id, dataset_name = _nested_id(field.get('dataset'))
+    category, _ = _nested_id(field.get('category'))
+    return (field['id'], *scope, dataset_id, dataset_name, category, field.get('type'), field.get('coverage'),
+            field.get('userCount'), field.get('alphaCount'), field.get('description'),
+            json.dumps(field, ensure_ascii=False, default=str))
+
+
+def _fts_query(text):
+    """把用户输入拆成词，每个词按前缀匹配，所有词都要出现"""
+    tokens = re.findall(r'\w+', text)
+    return ' '.join(f'"{token}"*' for token in tokens) or '""'
+
+
+def _order_by(order_by):
+    if not order_by:
+        return "id"
+    column = order_by.lstrip('-')
+    if column not in COLUMNS:
+        raise ValueError(f"Unknown column to order by: {column}")
+    return f"{column} {'DESC' if order_by.startswith('-') else 'ASC'}, id"
+
+
+if __name__ == "__main__":
+    # 用法: python datafield_catalog.py [数据集ID ...]  同步标准范围内的数据集（不给数据集时同步全部字段）
+    import sys
+
+    from helper import get_standard_search_scope, sign_in
+
+    scope = get_standard_search_scope()
+    catalog = DatafieldCatalog()
+    written = catalog.sync(sign_in(), scope, dataset_ids=sys.argv[1:] or None, max_age=0)
+    print(f"Synced {written} datafields, {len(catalog)} in catalog.")
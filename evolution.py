@@ -0,0 +1,555 @@
+"""
+从已合格的alpha出发的进化搜索（遗传编程）
+把alpha50.csv里已经通过检查的表达式解析成语法树作为初始种群，对操作符、窗口、数据字段、分组和模拟设置做变异，
+在两个个体之间交换子树（交叉），每一代的后代整批交给模拟器并发模拟，按返回的Sharpe/Fitness做锦标赛选择。
+合格的alpha附近往往还有合格的alpha，比穷举模板的组合空间用更少的模拟得到更多合格的alpha。
+
+例:
+    engine = Evolution(load_seeds('alpha50.csv'), session_simulator(sess), population_size=20, seed=0)
+    engine.run(generations=10)
+    print(engine.summary())
+"""
+import ast
+import csv
+import logging
+import random
+
+from adaptive_search import alpha_metrics
+from fastexpr import (Assign, BinOp, Call, FastExprError, Name, Number, Program, Ternary, UnaryOp, canonicalize,
+                      parse, simplify, to_string)
+from payload_batch import DEFAULT_SETTINGS, PayloadBatch
+
+
+# 可以互相替换的操作符（同组内参数个数和参数含义相同）
+OPERATOR_GROUPS = [
+    ['rank', 'zscore', 'scale', 'normalize'],
+    ['ts_mean', 'ts_rank', 'ts_zscore', 'ts_av_diff', 'ts_delta', 'ts_std_dev', 'ts_sum', 'ts_scale',
+     'ts_decay_linear', 'ts_arg_max', 'ts_arg_min'],
+    ['ts_corr', 'ts_covariance'],
+    ['group_rank', 'group_zscore', 'group_neutralize', 'group_scale'],
+]
+# 参数中带时间窗口的非ts_前缀函数
+WINDOW_FUNCTIONS = {'sum', 'delay', 'delta', 'correlation', 'covariance', 'stddev', 'decay_linear', 'product'}
+WINDOWS = [5, 10, 20, 22, 40, 60, 66, 120, 250]
+GROUPS = ['market', 'sector', 'industry', 'subindustry']
+CONSTANTS = {'true', 'false', 'nan', 'inf'}
+# 变异时可以改动的模拟设置及其取值
+SETTINGS_SPACE = {
+    'decay': [0, 2, 4, 6, 10, 20, 40, 65, 80],
+    'truncation': [0.01, 0.02, 0.03, 0.05, 0.08],
+    'neutralization': ['NONE', 'MARKET', 'SECTOR', 'INDUSTRY', 'SUBINDUSTRY'],
+}
+# 各种变异的相对概率
+MUTATIONS = {'operator': 2, 'window': 2, 'field': 3, 'group': 1, 'wrap': 1, 'settings': 2}
+
+# alpha50.csv中网页端的设置名 -> API的设置名和类型
+_CSV_SETTINGS = {
+    'Region': ('region', str),
+    'Universe': ('universe', str),
+    'Decay': ('decay', int),
+    'Delay': ('delay', int),
+    'Truncation': ('truncation', float),
+    'Neutralization': ('neutralization', str.upper),
+    'Pasteurization': ('pasteurization', str.upper),
+    'NaN_Handling': ('nanHandling', str.upper),
+    'Unit_Handling': ('unitHandling', str.upper),
+}
+_OPERATOR_GROUP = {name: group for group in OPERATOR_GROUPS for name in group}
+
+
+def parse_csv_settings(text):
+    """
+    把alpha50.csv的settingdict列（网页端的设置名和字符串值）转换成API的settings
+
+    例: "{'Decay': '80', 'Neutralization': 'Subindustry', ...}" -> {'decay': 80, 'neutralization': 'SUBINDUSTRY', ...}
+
+    Returns:
+        dict: settings
+    """
+    settings = {}
+    for key, value in ast.literal_eval(text).items():
+        if key in _CSV_SETTINGS:
+            name, convert = _CSV_SETTINGS[key]
+            settings[name] = convert(value)
+    return settings
+
+
+def load_seeds(filename='alpha50.csv'):
+    """
+    读取作为初始种群的alpha
+
+    Args:
+        filename (str): alpha50.csv格式的文件（settingdict, formula, Sharpe, Fitness, ...）
+
+    Returns:
+        list: [{'expression', 'settings', 'sharpe', 'fitness'}, ...]，无法解析的表达式被跳过
+    """
+    seeds = []
+    with open(filename, newline='') as f:
+        for row in csv.DictReader(f):
+            expression = row['formula'].strip()
+            try:
+                parse(expression)
+            except FastExprError as e:
+                logging.warning(f"Skipping seed that cannot be parsed: {e}")
+                continue
+            seeds.append({'expression': expression, 'settings': parse_csv_settings(row['settingdict']),
+                          'sharpe': _float(row.get('Sharpe')), 'fitness': _float(row.get('Fitness'))})
+    return seeds
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------- 语法树操作 ----------
+
+def _children(node):
+    cls = type(node)
+    if cls is Call:
+        return list(node.args) + [value for _, value in node.kwargs]
+    if cls is UnaryOp:
+        return [node.operand]
+    if cls is BinOp:
+        return [node.left, node.right]
+    if cls is Ternary:
+        return list(node)
+    if cls is Assign:
+        return [node.value]
+    if cls is Program:
+        return list(node.statements)
+    return []
+
+
+def _with_children(node, children):
+    cls = type(node)
+    if cls is Call:
+        n = len(node.args)
+        return Call(node.name, tuple(children[:n]),
+                    tuple((key, value) for (key, _), value in zip(node.kwargs, children[n:])))
+    if cls is UnaryOp:
+        return UnaryOp(node.op, children[0])
+    if cls is BinOp:
+        return BinOp(node.op, children[0], children[1])
+    if cls is Ternary:
+        return Ternary(*children)
+    if cls is Assign:
+        return Assign(node.name, children[0])
+    if cls is Program:
+        return Program(tuple(children))
+    return node
+
+
+def _walk(node, path=(), parent=None):
+    """逐个产出 (路径, 节点, 父节点)，路径是从根开始的子节点下标"""
+    yield path, node, parent
+    for i, child in enumerate(_children(node)):
+        yield from _walk(child, path + (i,), node)
+
+
+def _replace(node, path, new):
+    if not path:
+        return new
+    children = _children(node)
+    children[path[0]] = _replace(children[path[0]], path[1:], new)
+    return _with_children(node, children)
+
+
+def _variables(tree):
+    return {node.name for _, node, _ in _walk(tree) if type(node) is Assign}
+
+
+def _depth(node):
+    return 1 + max((_depth(child) for child in _children(node)), default=0)
+
+
+def _is_window_call(name):
+    return name.startswith('ts_') or name in WINDOW_FUNCTIONS
+
+
+def _role(path, node, parent, variables):
+    """节点在表达式中的角色：field / window / group / operator / value，其余为None"""
+    cls = type(node)
+    index = path[-1] if path else None
+    if cls is Name:
+        if node.id in variables or node.id.lower() in CONSTANTS:
+            return None
+        if type(parent) is Call and parent.name.startswith('group_') and index == 1:
+            return 'group'
+        return 'field'
+    if cls is Number:
+        if (type(parent) is Call and index and index < len(parent.args) and _is_window_call(parent.name)
+                and node.value.isdigit()):
+            return 'window'
+        return None
+    if cls is Call:
+        return 'operator' if node.name in _OPERATOR_GROUP else 'value'
+    if cls in (BinOp, UnaryOp, Ternary):
+        return 'value'
+    return None
+
+
+def _nodes_by_role(tree):
+    variables = _variables(tree)
+    roles = {}
+    for path, node, parent in _walk(tree):
+        role = _role(path, node, parent, variables)
+        if role:
+            roles.setdefault(role, []).append((path, node))
+    return roles
+
+
+class Individual:
+    """种群中的一个alpha"""
+    __slots__ = ('tree', 'expression', 'settings', 'sharpe', 'fitness', 'passed', 'alpha_id', 'generation', 'origin')
+
+    def __init__(self, tree, settings, generation=0, origin='seed'):
+        self.tree = tree
+        self.expression = to_string(tree)
+        self.settings = settings
+        self.sharpe = self.fitness = self.alpha_id = None
+        self.passed = False
+        self.generation = generation
+        self.origin = origin
+
+    def __repr__(self):
+        return f"Individual({self.expression!r}, sharpe={self.sharpe}, fitness={self.fitness})"
+
+    @property
+    def key(self):
+        """去重用的键：规范化的表达式 + 设置"""
+        return canonicalize(self.expression), tuple(sorted(self.settings.items()))
+
+    def score(self):
+        """锦标赛比较用的分数，合格的优先，其次按Fitness、Sharpe"""
+        return (self.passed, self.fitness if self.fitness is not None else float('-inf'),
+                self.sharpe if self.sharpe is not None else float('-inf'))
+
+    def record(self):
+        return {'expression': self.expression, 'settings': self.settings, 'alpha_id': self.alpha_id,
+                'sharpe': self.sharpe, 'fitness': self.fitness, 'passed': self.passed,
+                'generation': self.generation, 'origin': self.origin}
+
+
+class Evolution:
+    """
+    以合格alpha为初始种群的遗传编程
+
+    每一代用锦标赛选择父代，按概率交叉和变异产生population_size个没有模拟过的后代，整批模拟后
+    与当前种群合并，保留分数最高的population_size个作为下一代（(mu + lambda)选择，好的个体不会丢失）。
+    """
+
+    def __init__(self, seeds, simulate, population_size=20, tournament_size=3, crossover_rate=0.3, max_depth=6,
+                 fields=None, settings_space=None, mutations=None, sharpe_th=1.25, fitness_th=1.0, is_pass=None,
+                 validator=None, seed=None):
+        """
+        Args:
+            seeds (list): 初始个体，load_seeds的结果；带sharpe/fitness的个体不再模拟
+            simulate (callable): simulate(alphas) -> 结果列表，例如AlphaSimulator(...).simulate_batch
+                或session_simulator(sess)
+            population_size (int): 种群大小，也是每代模拟的后代数量
+            tournament_size (int): 锦标赛每次比较的个体数
+            crossover_rate (float): 后代由交叉产生的概率
+            max_depth (int): 后代语法树的最大深度，防止反复套操作符和交叉后表达式无限膨胀
+            fields (list, optional): 字段变异可选的数据字段（例如catalog.ids(...)），默认只用种子中出现的字段
+            settings_space (dict, optional): 可变异的设置及取值，默认SETTINGS_SPACE
+            mutations (dict, optional): 各种变异的相对概率，默认MUTATIONS
+            sharpe_th (float): 合格的Sharpe阈值
+            fitness_th (float): 合格的Fitness阈值
+            is_pass (callable, optional): 自定义的合格判断，接收模拟结果，优先于阈值
+            validator (ExpressionValidator, optional): 本地校验，不通过的后代不模拟
+            seed (int, optional): 随机种子
+        """
+        self.simulate = simulate
+        self.population_size = population_size
+        self.tournament_size = tournament_size
+        self.crossover_rate = crossover_rate
+        self.max_depth = max_depth
+        self.settings_space = settings_space if settings_space is not None else SETTINGS_SPACE
+        self.mutations = mutations if mutations is not None else MUTATIONS
+        self.sharpe_th = sharpe_th
+        self.fitness_th = fitness_th
+        self.is_pass = is_pass or self._default_pass
+        self.validator = validator
+        self.random = random.Random(seed)
+        self.generation = 0
+        self.history = []
+        self.seen = set()
+
+        self.population = []
+        seed_fields = []
+        for seed_alpha in seeds:
+            individual = Individual(parse(seed_alpha['expression']), dict(seed_alpha.get('settings') or {}))
+            if individual.key in self.seen:
+                continue
+            self.seen.add(individual.key)
+            individual.sharpe, individual.fitness = seed_alpha.get('sharpe'), seed_alpha.get('fitness')
+            individual.passed = (individual.sharpe is not None and individual.fitness is not None
+                                 and individual.sharpe >= sharpe_th and individual.fitness >= fitness_th)
+            self.population.append(individual)
+            seed_fields.extend(node.id for _, node in _nodes_by_role(individual.tree).get('field', ()))
+        if not self.population:
+            raise ValueError("No seeds to start from")
+        self.fields = sorted(set(fields or ()) | set(seed_fields))
+
+    def _default_pass(self, result):
+        sharpe, fitness = alpha_metrics(result)
+        return sharpe is not None and fitness is not None and sharpe >= self.sharpe_th and fitness >= self.fitness_th
+
+    @property
+    def simulated(self):
+        return len(self.history)
+
+    @property
+    def passed(self):
+        return sum(1 for record in self.history if record['passed'])
+
+    # ---------- 选择 ----------
+
+    def select(self):
+        """锦标赛选择：随机取tournament_size个个体，返回分数最高的"""
+        contestants = self.random.sample(self.population, min(self.tournament_size, len(self.population)))
+        return max(contestants, key=Individual.score)
+
+    # ---------- 变异 ----------
+
+    def _mutate_operator(self, tree, roles, settings):
+        path, node = self.random.choice(roles['operator'])
+        choices = [name for name in _OPERATOR_GROUP[node.name] if name != node.name]
+        return _replace(tree, path, node._replace(name=self.random.choice(choices))), settings
+
+    def _mutate_window(self, tree, roles, settings):
+        path, node = self.random.choice(roles['window'])
+        choices = [window for window in WINDOWS if str(window) != node.value]
+        return _replace(tree, path, Number(str(self.random.choice(choices)))), settings
+
+    def _mutate_field(self, tree, roles, settings):
+        path, node = self.random.choice(roles['field'])
+        choices = [field for field in self.fields if field != node.id]
+        if not choices:
+            return None
+        return _replace(tree, path, Name(self.random.choice(choices))), settings
+
+    def _mutate_group(self, tree, roles, settings):
+        path, node = self.random.choice(roles['group'])
+        choices = [group for group in GROUPS if group != node.id]
+        return _replace(tree, path, Name(self.random.choice(choices))), settings
+
+    def _mutate_wrap(self, tree, roles, settings):
+        # 在表达式外层套一个时间序列或分组操作符，符号保留在最外层
+        if type(tree) in (Program, Assign):
+            return None
+        negative = type(tree) is UnaryOp and tree.op == '-'
+        inner = tree.operand if negative else tree
+        group = OPERATOR_GROUPS[1] if self.random.random() < 0.5 else OPERATOR_GROUPS[3]
+        # 同一组的操作符已经在最外层时再套一层没有意义，交给操作符变异
+        if type(inner) is Call and inner.name in group:
+            return None
+        name = self.random.choice(group)
+        if group is OPERATOR_GROUPS[1]:
+            wrapped = Call(name, (inner, Number(str(self.random.choice(WINDOWS)))), ())
+        else:
+            wrapped = Call(name, (inner, Name(self.random.choice(GROUPS))), ())
+        return (UnaryOp('-', wrapped) if negative else wrapped), settings
+
+    def _mutate_settings(self, tree, roles, settings):
+        key = self.random.choice(list(self.settings_space))
+        current = settings.get(key, DEFAULT_SETTINGS.get(key))
+        choices = [value for value in self.settings_space[key] if value != current]
+        if not choices:
+            return None
+        return tree, dict(settings, **{key: self.random.choice(choices)})
+
+    def mutate(self, individual):
+        """
+        对个体做一次随机变异
+
+        Returns:
+            tuple: (语法树, settings, 变异类型)，没有可用的变异时为None
+        """
+        roles = _nodes_by_role(individual.tree)
+        applicable = {'settings': True, 'wrap': True, 'operator': 'operator' in roles, 'window': 'window' in roles,
+                      'field': 'field' in roles and len(self.fields) > 1, 'group': 'group' in roles}
+        kinds = [kind for kind in self.mutations if applicable.get(kind) and self.mutations[kind] > 0]
+        if not kinds:
+            return None
+        kind = self.random.choices(kinds, [self.mutations[kind] for kind in kinds])[0]
+        mutated = getattr(self, f'_mutate_{kind}')(individual.tree, roles, individual.settings)
+        if mutated is None:
+            return None
+        return mutated[0], mutated[1], kind
+
+    # ---------- 交叉 ----------
+
+    def crossover(self, receiver, donor):
+        """
+        用donor的一棵子树替换receiver中的一棵子树，设置逐项从两者中随机选取
+
+        Returns:
+            tuple: (语法树, settings)，没有可交换的子树时为None
+        """
+        targets = [item for role in ('value', 'operator', 'field') for item in _nodes_by_role(receiver.tree).get(role, ())]
+        donor_variables = _variables(donor.tree)
+        sources = []
+        for role in ('value', 'operator', 'field'):
+            for path, node in _nodes_by_role(donor.tree).get(role, ()):
+                # 引用了变量的子树离开原来的程序就没有意义
+                if donor_variables and any(type(n) is Name and n.id in donor_variables for _, n, _ in _walk(node)):
+                    continue
+                sources.append(node)
+        if not targets or not sources:
+            return None
+        path, _ = self.random.choice(targets)
+        tree = _replace(receiver.tree, path, self.random.choice(sources))
+        settings = dict(receiver.settings)
+        for key, value in donor.settings.items():
+            if key not in settings or self.random.random() < 0.5:
+                settings[key] = value
+        return tree, settings
+
+    # ---------- 繁殖 ----------
+
+    def offspring(self, n, max_tries=None):
+        """
+        产生n个没有模拟过的后代（搜索空间很小时可能少于n个）
+
+        Returns:
+            list: Individual
+        """
+        children = []
+        tries = 0
+        max_tries = max_tries or 50 * n
+        while len(children) < n and tries < max_tries:
+            tries += 1
+            parent = self.select()
+            if len(self.population) > 1 and self.random.random() < self.crossover_rate:
+                result = self.crossover(parent, self.select())
+                origin = 'crossover'
+            else:
+                result = self.mutate(parent)
+                origin = result[2] if result else None
+            if result is None or _depth(result[0]) > self.max_depth:
+                continue
+            try:
+                # 消去交叉和变异产生的-(-x)、rank(rank(x))
+                child = Individual(simplify(result[0]), result[1], self.generation + 1, origin)
+                key = child.key
+            except FastExprError:
+                continue
+            if key in self.seen:
+                continue
+            self.seen.add(key)
+            if self.validator is not None and self.validator.errors(
+                    {'regular': child.expression, 'settings': child.settings}):
+                continue
+            children.append(child)
+        return children
+
+    def observe(self, children, results):
+        """
+        记录一代的模拟结果；结果为None（请求失败）的后代不进入种群，之后可以再次产生
+
+        Returns:
+            list: 有结果的后代
+        """
+        evaluated = []
+        for child, result in zip(children, results):
+            if result is None:
+                self.seen.discard(child.key)
+                continue
+            child.sharpe, child.fitness = alpha_metrics(result)
+            child.passed = bool(self.is_pass(result))
+            child.alpha_id = result.get('id')
+            evaluated.append(child)
+        self.history.extend(child.record() for child in evaluated)
+        return evaluated
+
+    def step(self):
+        """
+        进化一代：产生后代、整批模拟、选出下一代种群
+
+        Returns:
+            list: 本代有结果的后代
+        """
+        children = self.offspring(self.population_size)
+        if not children:
+            return []
+        batch = PayloadBatch()
+        for child in children:
+            batch.append(child.expression, child.settings)
+        evaluated = self.observe(children, self.simulate(batch))
+        self.generation += 1
+        self.population = sorted(self.population + evaluated, key=Individual.score,
+                                 reverse=True)[:self.population_size]
+        return evaluated
+
+    def run(self, generations=10, budget=None, target=None):
+        """
+        按代进化直到代数、模拟预算或目标合格数用完
+
+        Args:
+            generations (int): 最多进化的代数
+            budget (int, optional): 最多模拟的数量
+            target (int, optional): 得到这么多合格alpha后提前结束
+
+        Returns:
+            list: 所有模拟过的后代的记录（expression, settings, alpha_id, sharpe, fitness, passed, generation, origin）
+        """
+        failed_rounds = 0
+        for _ in range(generations):
+            if budget is not None and self.simulated >= budget:
+                break
+            if target is not None and self.passed >= target:
+                break
+            evaluated = self.step()
+            # 连续几代全部失败多半是登录或网络问题，停止而不是空转
+            failed_rounds = 0 if evaluated else failed_rounds + 1
+            if failed_rounds >= 3:
+                logging.error("Evolution stopped: 3 generations in a row returned no results.")
+                break
+            logging.info(f"Generation {self.generation}: {len(evaluated)} simulated, "
+                         f"{sum(child.passed for child in evaluated)} passed, total {self.passed}/{self.simulated}.")
+            print(f"generation {self.generation}: simulated {self.simulated}, passed {self.passed}")
+        return self.history
+
+    def summary(self, top=5):
+        """
+        各种变异的通过率和当前种群中最好的个体
+
+        Returns:
+            str: 便于打印的文本
+        """
+        lines = [f"passed {self.passed}/{self.simulated} in {self.generation} generations"]
+        origins = {}
+        for record in self.history:
+            stats = origins.setdefault(record['origin'], [0, 0])
+            stats[0] += record['passed']
+            stats[1] += 1
+        lines.append(', '.join(f"{origin} {passes}/{trials}" for origin, (passes, trials) in
+                               sorted(origins.items(), key=lambda item: -item[1][1])))
+        for individual in self.population[:top]:
+            lines.append(f"{individual.fitness} {individual.sharpe} {individual.expression} {individual.settings}")
+        return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    # 用法: python evolution.py [代数] [种群大小]  从alpha50.csv出发进化，合格的alpha写入evolved_alphas.csv
+    import sys
+
+    from adaptive_search import session_simulator
+    from helper import setup_logging, sign_in
+
+    setup_logging()
+    generations = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    population_size = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    engine = Evolution(load_seeds(), session_simulator(sign_in()), population_size=population_size)
+    engine.run(generations=generations)
+    print(engine.summary())
+    with open('evolved_alphas.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['expression', 'settings', 'alpha_id', 'sharpe', 'fitness', 'passed',
+                                               'generation', 'origin'])
+        writer.writeheader()
+        writer.writerows(record for record in engine.history if record['passed'])
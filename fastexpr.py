@@ -0,0 +1,523 @@
+"""
+FASTEXPR表达式解析与规范化
+把表达式解析成语法树，化简后按统一格式输出，用于在模拟之前合并写法不同但含义相同的alpha
+"""
+import functools
+import re
+from collections import namedtuple
+
+
+class FastExprError(ValueError):
+    """表达式语法错误"""
+
+
+# 语法树节点
+Number = namedtuple('Number', 'value')                 # value: 规范化后的数字字符串
+Name = namedtuple('Name', 'id')                        # 数据字段、变量或 true/false 等常量
+String = namedtuple('String', 'value')                 # 带引号的字符串参数，如 range="0.1,1,0.1"
+Call = namedtuple('Call', 'name args kwargs')          # kwargs: ((name, node), ...)
+UnaryOp = namedtuple('UnaryOp', 'op operand')          # op: '-' 或 '!'
+BinOp = namedtuple('BinOp', 'op left right')
+Ternary = namedtuple('Ternary', 'cond if_true if_false')
+Assign = namedtuple('Assign', 'name value')
+Program = namedtuple('Program', 'statements')          # 用 ; 分隔的多条语句
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+      | (?P<name>[A-Za-z_][A-Za-z0-9_.]*)
+      | (?P<str>"[^"]*"|'[^']*')
+      | (?P<op>&&|\|\||==|!=|<=|>=|[-+*/^<>!?:(),;=])
+    )""", re.VERBOSE)
+
+# 二元运算符优先级，数值越大结合越紧
+_BINARY_PRECEDENCE = {
+    '||': 2, '&&': 3,
+    '==': 4, '!=': 4,
+    '<': 5, '<=': 5, '>': 5, '>=': 5,
+    '+': 6, '-': 6,
+    '*': 7, '/': 7,
+    '^': 9,
+}
+_RIGHT_ASSOCIATIVE = {'^'}
+_TERNARY_PRECEDENCE = 1
+# 一元运算符比 ^ 结合得松：-x^2 是 -(x^2)，(-x)^2 输出时保留括号
+_UNARY_PRECEDENCE = 8
+
+# 满足交换律的运算符和函数，规范化时对参数排序
+COMMUTATIVE_OPS = {'+', '*', '==', '!=', '&&', '||'}
+# 其中满足结合律的，连续的同一运算展开后一起排序（a == b == c 不能展开）
+_ASSOCIATIVE_OPS = {'+', '*', '&&', '||'}
+COMMUTATIVE_FUNCTIONS = {'add', 'multiply', 'max', 'min', 'and', 'or'}
+# 幂等的单参数函数：f(f(x)) == f(x)
+IDEMPOTENT_FUNCTIONS = {'rank', 'zscore', 'scale', 'normalize', 'sign', 'abs'}
+
+
+def tokenize(text):
+    """
+    切分表达式
+
+    Returns:
+        list: [(类型, 文本), ...]，类型为 num / name / str / op
+    """
+    tokens = []
+    pos = 0
+    end = len(text.rstrip())
+    match = _TOKEN_RE.match
+    while pos < end:
+        m = match(text, pos)
+        if m is None:
+            pos += len(text[pos:]) - len(text[pos:].lstrip())
+            raise FastExprError(f"Unexpected character {text[pos]!r} at {pos} in: {text}")
+        kind = m.lastgroup
+        tokens.append((kind, m.group(kind)))
+        pos = m.end()
+    return tokens
+
+
+def _normalize_number(text):
+    value = float(text)
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _describe(token_text):
+    return 'end of expression' if token_text is None else repr(token_text)
+
+
+class _Parser:
+    __slots__ = ('tokens', 'pos', 'text')
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def _peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+
+    def _expect(self, value):
+        kind, text = self._peek()
+        if text != value or kind != 'op':
+            raise FastExprError(f"Expected {value!r} but got {_describe(text)} in: {self.text}")
+        self.pos += 1
+
+    def parse_program(self):
+        statements = []
+        while True:
+            kind, text = self._peek()
+            if kind is None:
+                break
+            if kind == 'op' and text == ';':
+                self.pos += 1
+                continue
+            statements.append(self._parse_statement())
+            kind, text = self._peek()
+            if kind is not None and text != ';':
+                raise FastExprError(f"Unexpected {_describe(text)} in: {self.text}")
+        if not statements:
+            raise FastExprError("Empty expression")
+        if len(statements) == 1:
+            return statements[0]
+        return Program(tuple(statements))
+
+    def _parse_statement(self):
+        kind, text = self._peek()
+        if kind == 'name' and self.pos + 1 < len(self.tokens) and self.tokens[self.pos + 1] == ('op', '='):
+            self.pos += 2
+            return Assign(text, self._parse_expression(0))
+        return self._parse_expression(0)
+
+    def _parse_expression(self, min_precedence):
+        left = self._parse_unary()
+        while True:
+            kind, op = self._peek()
+            if kind != 'op':
+                break
+            if op == '?' and min_precedence <= _TERNARY_PRECEDENCE:
+                self.pos += 1
+                if_true = self._parse_expression(0)
+                self._expect(':')
+                if_false = self._parse_expression(_TERNARY_PRECEDENCE)
+                left = Ternary(left, if_true, if_false)
+                continue
+            precedence = _BINARY_PRECEDENCE.get(op)
+            if precedence is None or precedence < min_precedence:
+                break
+            self.pos += 1
+            next_min = precedence if op in _RIGHT_ASSOCIATIVE else precedence + 1
+            left = BinOp(op, left, self._parse_expression(next_min))
+        return left
+
+    def _parse_unary(self):
+        kind, text = self._peek()
+        if kind == 'op' and text in ('-', '+', '!'):
+            self.pos += 1
+            operand = self._parse_expression(_UNARY_PRECEDENCE)
+            if text == '+':
+                return operand
+            return UnaryOp(text, operand)
+        return self._parse_primary()
+
+    def _parse_primary(self):
+        kind, text = self._peek()
+        self.pos += 1
+        if kind == 'num':
+            return Number(_normalize_number(text))
+        if kind == 'str':
+            return String(text[1:-1])
+        if kind == 'name':
+            if self._peek() == ('op', '('):
+                return self._parse_call(text)
+            return Name(text)
+        if kind == 'op' and text == '(':
+            node = self._parse_expression(0)
+            self._expect(')')
+            return node
+        raise FastExprError(f"Unexpected {_describe(text)} in: {self.text}")
+
+    def _parse_call(self, name):
+        self.pos += 1
+        args = []
+        kwargs = []
+        if self._peek() == ('op', ')'):
+            self.pos += 1
+            return Call(name, (), ())
+        while True:
+            kind, text = self._peek()
+            if kind == 'name' and self.pos + 1 < len(self.tokens) and self.tokens[self.pos + 1] == ('op', '='):
+                self.pos += 2
+                kwargs.append((text, self._parse_expression(0)))
+            else:
+                if kwargs:
+                    raise FastExprError(f"Positional argument after keyword argument in {name}(): {self.text}")
+                args.append(self._parse_expression(0))
+            kind, text = self._peek()
+            if text == ',':
+                self.pos += 1
+                continue
+            self._expect(')')
+            return Call(name, tuple(args), tuple(kwargs))
+
+
+def parse(text):
+    """
+    解析FASTEXPR表达式
+
+    Args:
+        text (str): 表达式，可以是用 ; 分隔、带变量赋值的多条语句
+
+    Returns:
+        语法树节点（Number / Name / String / Call / UnaryOp / BinOp / Ternary / Assign / Program）
+
+    Raises:
+        FastExprError: 语法错误
+    """
+    return _Parser(text).parse_program()
+
+
+def _precedence(node):
+    if isinstance(node, BinOp):
+        return _BINARY_PRECEDENCE[node.op]
+    if isinstance(node, Ternary):
+        return _TERNARY_PRECEDENCE
+    if isinstance(node, UnaryOp):
+        return _UNARY_PRECEDENCE
+    if isinstance(node, Number) and node.value.startswith('-'):
+        return _UNARY_PRECEDENCE
+    if isinstance(node, _Fixed):
+        return node.precedence
+    if isinstance(node, _Chain):
+        return _BINARY_PRECEDENCE[node.op]
+    return 10
+
+
+def _wrap(node, min_precedence):
+    text = to_string(node)
+    if _precedence(node) < min_precedence:
+        return f"({text})"
+    return text
+
+
+def to_string(node):
+    """
+    按统一格式输出语法树：函数参数用 ", " 分隔，二元运算符两侧各一个空格，只保留必要的括号
+    """
+    cls = type(node)
+    if cls is Call:
+        parts = [to_string(arg) for arg in node.args]
+        parts.extend(f"{key}={to_string(value)}" for key, value in node.kwargs)
+        return f"{node.name}({', '.join(parts)})"
+    if cls is Name:
+        return node.id
+    if cls is Number:
+        return node.value
+    if cls is BinOp:
+        precedence = _BINARY_PRECEDENCE[node.op]
+        if node.op in _RIGHT_ASSOCIATIVE:
+            left, right = _wrap(node.left, precedence + 1), _wrap(node.right, precedence)
+        else:
+            left, right = _wrap(node.left, precedence), _wrap(node.right, precedence + 1)
+        return f"{left} {node.op} {right}"
+    if cls is UnaryOp:
+        return f"{node.op}{_wrap(node.operand, _UNARY_PRECEDENCE)}"
+    if cls is String:
+        return f'"{node.value}"'
+    if cls is Ternary:
+        return (f"{_wrap(node.cond, _TERNARY_PRECEDENCE + 1)} ? {to_string(node.if_true)} : "
+                f"{_wrap(node.if_false, _TERNARY_PRECEDENCE)}")
+    if cls is Assign:
+        return f"{node.name} = {to_string(node.value)}"
+    if cls is Program:
+        return '; '.join(to_string(statement) for statement in node.statements)
+    raise TypeError(f"Unknown node type: {cls.__name__}")
+
+
+def _flatten(node, op):
+    if type(node) is BinOp and node.op == op:
+        return _flatten(node.left, op) + _flatten(node.right, op)
+    return [node]
+
+
+def simplify(node):
+    """
+    化简语法树
+
+    - 幂等函数嵌套合并：rank(rank(x)) -> rank(x)
+    - 双重取负消去：-(-x) -> x（!(!x) 的结果是0/1，不等于x，保留）
+    - 满足交换律的运算（+ * == != && || 以及 add/multiply/max/min）按参数的规范化文本排序，
+      其中 + * && || 先把连续的同一运算展开
+    """
+    cls = type(node)
+    if cls is Call:
+        args = tuple(simplify(arg) for arg in node.args)
+        kwargs = tuple((key, simplify(value)) for key, value in node.kwargs)
+        if (node.name in IDEMPOTENT_FUNCTIONS and len(args) == 1 and not kwargs
+                and type(args[0]) is Call and args[0].name == node.name
+                and len(args[0].args) == 1 and not args[0].kwargs):
+            return args[0]
+        if node.name in COMMUTATIVE_FUNCTIONS and len(args) > 1:
+            args = tuple(sorted(args, key=to_string))
+        return Call(node.name, args, kwargs)
+    if cls is BinOp:
+        if node.op in _ASSOCIATIVE_OPS:
+            # 化简后变成同一运算的参数（如 -(-(a + b))）也展开，参数中不会再有同一个运算
+            operands = [operand for item in _flatten(node, node.op) for operand in _flatten(simplify(item), node.op)]
+        elif node.op in COMMUTATIVE_OPS:
+            operands = [simplify(node.left), simplify(node.right)]
+        else:
+            return BinOp(node.op, simplify(node.left), simplify(node.right))
+        operands.sort(key=to_string)
+        result = operands[0]
+        for operand in operands[1:]:
+            result = BinOp(node.op, result, operand)
+        return result
+    if cls is UnaryOp:
+        operand = simplify(node.operand)
+        if node.op == '-' and type(operand) is UnaryOp and operand.op == '-':
+            return operand.operand
+        if node.op == '-' and type(operand) is Number:
+            value = operand.value
+            return Number(value[1:] if value.startswith('-') else '-' + value)
+        return UnaryOp(node.op, operand)
+    if cls is Ternary:
+        return Ternary(simplify(node.cond), simplify(node.if_true), simplify(node.if_false))
+    if cls is Assign:
+        return Assign(node.name, simplify(node.value))
+    if cls is Program:
+        return Program(tuple(simplify(statement) for statement in node.statements))
+    return node
+
+
+def _has_commutative(node):
+    """是否含有交换律运算"""
+    cls = type(node)
+    if cls is BinOp:
+        return node.op in COMMUTATIVE_OPS or _has_commutative(node.left) or _has_commutative(node.right)
+    if cls is Call:
+        if node.name in COMMUTATIVE_FUNCTIONS and len(node.args) > 1:
+            return True
+        return (any(_has_commutative(arg) for arg in node.args)
+                or any(_has_commutative(value) for _, value in node.kwargs))
+    if cls is UnaryOp:
+        return _has_commutative(node.operand)
+    if cls is Ternary:
+        return any(_has_commutative(child) for child in node)
+    if cls is Assign:
+        return _has_commutative(node.value)
+    if cls is Program:
+        return any(_has_commutative(statement) for statement in node.statements)
+    return False
+
+
+# 不是函数名的标识符（数据字段、变量名、关键字参数名）
+_LEAF_RE = re.compile(r'(?<![A-Za-z0-9_.])([A-Za-z_][A-Za-z0-9_.]*)(?![A-Za-z0-9_.(])')
+_PLACEHOLDER_RE = re.compile(r'__leaf(\d+)')
+
+
+def split_identifiers(text):
+    """
+    把表达式拆成骨架和标识符（数据字段、变量名、关键字参数名，不含函数名）。
+    同一个模板批量生成的表达式骨架相同，可以按骨架缓存解析结果。
+
+    Returns:
+        tuple: (骨架片段, 标识符)，骨架片段比标识符多一个
+    """
+    parts = _LEAF_RE.split(text)
+    return tuple(parts[0::2]), tuple(parts[1::2])
+
+
+def skeleton_text(parts):
+    """用占位符 __leaf0, __leaf1, ... 把骨架片段拼回可以解析的表达式"""
+    return parts[0] + ''.join(f"__leaf{i}{part}" for i, part in enumerate(parts[1:]))
+
+
+# 编译后骨架中不含交换律运算的子树：填入标识符即得规范文本
+_Fixed = namedtuple('_Fixed', 'template precedence')
+# 编译后骨架中交换律运算的一串参数（a + b + c 展开后的 a, b, c）
+_Chain = namedtuple('_Chain', 'op operands')
+
+
+def _compile(node):
+    """
+    化简后的骨架 -> 不含交换律运算的子树换成_Fixed，交换律运算链换成_Chain，
+    关键字参数名和赋值的变量名换成format模板
+    """
+    if not _has_commutative(node):
+        return _Fixed(_PLACEHOLDER_RE.sub(r'{\1}', to_string(node)), _precedence(node))
+    cls = type(node)
+    if cls is BinOp:
+        if node.op in COMMUTATIVE_OPS:
+            items = _flatten(node, node.op) if node.op in _ASSOCIATIVE_OPS else (node.left, node.right)
+            return _Chain(node.op, tuple(_compile(item) for item in items))
+        return BinOp(node.op, _compile(node.left), _compile(node.right))
+    if cls is Call:
+        return Call(node.name, tuple(_compile(arg) for arg in node.args),
+                    tuple((_PLACEHOLDER_RE.sub(r'{\1}', key), _compile(value)) for key, value in node.kwargs))
+    if cls is UnaryOp:
+        return UnaryOp(node.op, _compile(node.operand))
+    if cls is Ternary:
+        return Ternary(*(_compile(child) for child in node))
+    if cls is Assign:
+        return Assign(_PLACEHOLDER_RE.sub(r'{\1}', node.name), _compile(node.value))
+    return Program(tuple(_compile(statement) for statement in node.statements))
+
+
+def _render(node, leaves):
+    """
+    输出编译后的骨架，与 to_string(simplify(parse(表达式))) 相同：
+    交换律运算的参数先填入标识符，再按填入后的文本排序
+    """
+    cls = type(node)
+    if cls is _Fixed:
+        return node.template.format(*leaves)
+    if cls is _Chain:
+        precedence = _BINARY_PRECEDENCE[node.op]
+        operands = sorted((_render(item, leaves), _precedence(item)) for item in node.operands)
+        texts = [f"({text})" if item_precedence < (precedence if i == 0 else precedence + 1) else text
+                 for i, (text, item_precedence) in enumerate(operands)]
+        return f" {node.op} ".join(texts)
+    if cls is Call:
+        args = [_render(arg, leaves) for arg in node.args]
+        if node.name in COMMUTATIVE_FUNCTIONS and len(args) > 1:
+            args.sort()
+        args.extend(f"{key.format(*leaves)}={_render(value, leaves)}" for key, value in node.kwargs)
+        return f"{node.name}({', '.join(args)})"
+    if cls is BinOp:
+        precedence = _BINARY_PRECEDENCE[node.op]
+        if node.op in _RIGHT_ASSOCIATIVE:
+            left, right = _render_wrapped(node.left, leaves, precedence + 1), _render_wrapped(node.right, leaves, precedence)
+        else:
+            left, right = _render_wrapped(node.left, leaves, precedence), _render_wrapped(node.right, leaves, precedence + 1)
+        return f"{left} {node.op} {right}"
+    if cls is UnaryOp:
+        return f"{node.op}{_render_wrapped(node.operand, leaves, _UNARY_PRECEDENCE)}"
+    if cls is Ternary:
+        return (f"{_render_wrapped(node.cond, leaves, _TERNARY_PRECEDENCE + 1)} ? {_render(node.if_true, leaves)} : "
+                f"{_render_wrapped(node.if_false, leaves, _TERNARY_PRECEDENCE)}")
+    if cls is Assign:
+        return f"{node.name.format(*leaves)} = {_render(node.value, leaves)}"
+    return '; '.join(_render(statement, leaves) for statement in node.statements)
+
+
+def _render_wrapped(node, leaves, min_precedence):
+    text = _render(node, leaves)
+    return f"({text})" if _precedence(node) < min_precedence else text
+
+
+@functools.lru_cache(maxsize=1 << 14)
+def _compile_skeleton(parts):
+    """
+    把标识符替换成占位符后的表达式骨架编译一次，同一个模板批量生成的表达式骨架相同
+    （函数名、数字和空白保留在骨架中），之后只需填入标识符。
+
+    Returns:
+        不含交换律运算时为format模板字符串；否则为_compile的结果，交换律运算的参数在填入标识符后排序（见_render）；
+        函数名被当成占位符时（函数名和括号之间有空白）返回None，走完整解析；语法错误时返回FastExprError
+    """
+    if any(part.lstrip().startswith('(') for part in parts[1:]):
+        return None
+    try:
+        node = simplify(parse(skeleton_text(parts)))
+    except FastExprError as e:
+        return e
+    compiled = _compile(node)
+    if type(compiled) is _Fixed:
+        return compiled.template
+    return compiled
+
+
+@functools.lru_cache(maxsize=1 << 18)
+def canonicalize(text):
+    """
+    表达式的规范形式，等价的写法得到相同的字符串
+
+    Args:
+        text (str): 表达式
+
+    Returns:
+        str: 规范化后的表达式
+
+    Raises:
+        FastExprError: 语法错误
+    """
+    if '"' in text or "'" in text:
+        # 字符串里的空白有意义，不走骨架模板
+        return to_string(simplify(parse(text)))
+    parts, leaves = split_identifiers(text)
+    template = _compile_skeleton(parts)
+    if type(template) is str:
+        return template.format(*leaves)
+    if template is None:
+        return to_string(simplify(parse(text)))
+    if isinstance(template, FastExprError):
+        # 骨架的错误信息里是占位符，重新解析原表达式给出准确的位置
+        parse(text)
+        raise template
+    return _render(template, leaves)
+
+
+def dedupe_expressions(expressions, canonical=True):
+    """
+    去掉等价的重复表达式，保留第一次出现的
+
+    Args:
+        expressions (iterable): 表达式字符串
+        canonical (bool): True输出规范形式，False输出原始写法
+
+    Yields:
+        str: 不重复的表达式。无法解析的表达式原样输出，交给服务器判断
+    """
+    seen = set()
+    for expression in expressions:
+        try:
+            key = canonicalize(expression)
+        except FastExprError:
+            key = expression
+        if key in seen:
+            continue
+        seen.add(key)
+        yield key if canonical else expression
@@ -4,24 +4,33 @@ WorldQuant Brain API Helper Functions
 """
 import requests
 import json
+import itertools
+import os
 from os.path import expanduser
 from requests.auth import HTTPBasicAuth
 import pandas as pd
 
+from paging import fetch_pages
+from payload_batch import DEFAULT_SETTINGS, JSON_HEADERS, SettingsPresets, payload_body
+from rate_limiter import limited_request
+from session_manager import get_session
+
 
 def sign_in():
     """
     登录WorldQuant Brain API
     
+    重复调用返回同一个会话，只在原会话上重新登录，不会丢弃连接池；
+    token到期前会自动续期，遇到401会自动重新登录
+    
     Returns:
         requests.Session: 已认证的会话对象
     """
     with open(expanduser('credentials.txt')) as f:
         credentials = json.load(f)
     username, password = credentials
-    sess = requests.Session()
-    sess.auth = HTTPBasicAuth(username, password)
-    sess.post('https://api.worldquantbrain.com/authentication')
+    sess = get_session(username, password)
+    sess.refresh()
     return sess
 
 
@@ -43,15 +52,26 @@ def sign_in_with_debug():
     return sess
 
 
-def get_datafields(s, searchScope, dataset_id: str = '', search: str = ''):
+DATAFIELDS_CACHE_DIR = os.path.join('.cache', 'datafields')
+
+
+def get_datafields(s, searchScope, dataset_id: str = '', search: str = '', cache_ttl=24 * 3600,
+                   cache_dir=DATAFIELDS_CACHE_DIR, max_workers=8):
     """
     获取数据集中的数据字段
     
+    第一页返回count后，其余分页并发获取（经过共享限流器）。结果按
+    (instrumentType, region, delay, universe, dataset, search) 缓存在本地磁盘，
+    有效期内再次调用直接读缓存，不再请求服务器。
+    
     Args:
         s (requests.Session): 已认证的会话对象
         searchScope (dict): 搜索范围配置
         dataset_id (str, optional): 数据集ID. Defaults to ''.
         search (str, optional): 搜索关键词. Defaults to ''.
+        cache_ttl (float, optional): 缓存有效期（秒），0或None表示不读缓存、强制重新获取. Defaults to 1天.
+        cache_dir (str, optional): 缓存目录，None表示不使用缓存. Defaults to DATAFIELDS_CACHE_DIR.
+        max_workers (int, optional): 并发获取分页的线程数. Defaults to 8.
     
     Returns:
         pandas.DataFrame: 包含数据字段信息的DataFrame
@@ -61,31 +81,77 @@ def get_datafields(s, searchScope, dataset_id: str = '', search: str = ''):
     delay = searchScope['delay']
     universe = searchScope['universe']
 
+    cache_key = [instrument_type, region, str(delay), universe, dataset_id, search]
+    cache_path = _datafields_cache_path(cache_dir, cache_key) if cache_dir else None
+    if cache_path and cache_ttl:
+        cached = _read_datafields_cache(cache_path, cache_ttl)
+        if cached is not None:
+            return pd.DataFrame(cached)
+
     if len(search) == 0: # no search keyword
         url_template = "https://api.worldquantbrain.com/data-fields?" + \
                        f"&instrumentType={instrument_type}" + \
                        f"&region={region}&delay={str(delay)}&universe={universe}&dataset.id={dataset_id}&limit=50" + \
-                       "&offset={x}"
-        count = s.get(url_template.format(x=0)).json()['count']
+                       "&offset={offset}"
     else: 
         url_template = "https://api.worldquantbrain.com/data-fields?" + \
                        f"&instrumentType={instrument_type}" + \
                        f"&region={region}&delay={str(delay)}&universe={universe}&limit=50" + \
                        f"&search={search}" + \
-                       "&offset={x}"
-        count = 100
+                       "&offset={offset}"
 
-    datafields_list = []
-    for x in range(0, count, 50):
-        datafields = s.get(url_template.format(x=x))
-        datafields_list.append(datafields.json()['results'])
+    # 搜索模式也以第一页返回的count为准，不再固定取前100个
+    datafields_list_flat = fetch_pages(lambda url: _get_datafields_page(s, url), url_template, page_size=50,
+                                       max_workers=max_workers)
 
-    datafields_list_flat = [item for sublist in datafields_list for item in sublist]
+    if cache_path:
+        _write_datafields_cache(cache_path, cache_key, datafields_list_flat)
 
     datafields_df = pd.DataFrame(datafields_list_flat)
     return datafields_df
 
 
+def _get_datafields_page(s, url, max_attempts=5):
+    """获取一页数据字段，429时按限流器的速率重试，其余错误直接抛出（不缓存不完整的结果）"""
+    for attempt in range(max_attempts):
+        response = limited_request(s, 'get', url)
+        if response.status_code == 429 and attempt < max_attempts - 1:
+            continue
+        response.raise_for_status()
+        return response.json()
+
+
+def _datafields_cache_path(cache_dir, cache_key):
+    import hashlib
+
+    digest = hashlib.sha1(json.dumps(cache_key).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.json")
+
+
+def _read_datafields_cache(cache_path, ttl):
+    import time
+
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - cached.get('fetched_at', 0) > ttl:
+        return None
+    return cached['results']
+
+
+def _write_datafields_cache(cache_path, cache_key, results):
+    import time
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    # 先写临时文件再改名，多个脚本同时启动时不会读到写了一半的缓存
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'key': cache_key, 'fetched_at': time.time(), 'results': results}, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+
+
 def create_simulation_data(alpha_expression, settings=None):
     """
     创建模拟数据配置
@@ -97,20 +163,7 @@ def create_simulation_data(alpha_expression, settings=None):
     Returns:
         dict: 模拟数据配置字典
     """
-    default_settings = {
-        "instrumentType": "EQUITY",
-        "region": "USA",
-        "universe": "TOP3000",
-        "delay": 1,
-        "decay": 6,
-        "neutralization": "SUBINDUSTRY",
-        "truncation": 0.08,
-        "pasteurization": "ON",
-        "unitHandling": "VERIFY",
-        "nanHandling": "ON",
-        "language": "FASTEXPR",
-        "visualization": False,
-    }
+    default_settings = dict(DEFAULT_SETTINGS)
     
     if settings:
         default_settings.update(settings)
@@ -124,35 +177,46 @@ def create_simulation_data(alpha_expression, settings=None):
     return simulation_data
 
 
-def submit_alpha_simulation(sess, alpha_data):
+def submit_alpha_simulation(sess, alpha_data, cache=None):
     """
     提交Alpha模拟并等待结果
     
     Args:
         sess (requests.Session): 已认证的会话对象
         alpha_data (dict): Alpha模拟数据
+        cache (ResultCache, optional): 结果缓存，命中时直接返回缓存的Alpha ID，不再提交. Defaults to None.
     
     Returns:
         str: Alpha ID，如果失败返回None
     """
     from time import sleep
     
+    if cache is not None:
+        cached = cache.get(alpha_data)
+        if cached and cached['alpha_id']:
+            print(f"Cached: {cached['alpha_id']}")
+            return cached['alpha_id']
+
     try:
-        sim_resp = sess.post(
+        sim_resp = limited_request(
+            sess, 'post',
             'https://api.worldquantbrain.com/simulations',
-            json=alpha_data,
+            data=payload_body(alpha_data),
+            headers=JSON_HEADERS,
         )
 
         sim_progress_url = sim_resp.headers['Location']
         
         while True:
-            sim_progress_resp = sess.get(sim_progress_url)
+            sim_progress_resp = limited_request(sess, 'get', sim_progress_url)
             retry_after_sec = float(sim_progress_resp.headers.get("Retry-After", 0))
             if retry_after_sec == 0:  # simulation done!模拟完成!
                 break
             sleep(retry_after_sec)
 
         alpha_id = sim_progress_resp.json()["alpha"]  # the final simulation result 模拟最终模拟结果
+        if cache is not None:
+            cache.store(alpha_data, alpha_id)
         return alpha_id
     except Exception as e:
         print(f"Error in simulation: {e}")
@@ -174,6 +238,136 @@ def get_standard_search_scope():
     }
 
 
+class AlphaCombinations:
+    """
+    惰性的Alpha表达式组合（多个取值列表的笛卡尔积代入模板）
+    
+    不生成列表：len()直接给出精确数量，按下标随机访问时现算表达式，
+    连续切片和shard返回的仍是惰性视图。顺序与嵌套for循环一致（最后一个维度变化最快）。
+    
+    例:
+        combos = AlphaCombinations("{gco}({tco}({cf}, {d}), {grp})",
+                                   [('gco', group_ops), ('tco', ts_ops), ('cf', fields), ('d', days), ('grp', groups)])
+        len(combos), combos[12345], combos.shard(0, 4)
+    """
+    
+    def __init__(self, template, dimensions, start=0, stop=None):
+        """
+        Args:
+            template (str): 表达式模板，用{名称}引用各维度
+            dimensions (list): [(名称, 取值列表), ...]，按嵌套顺序排列
+            start (int): 视图起始下标
+            stop (int, optional): 视图结束下标（不含）
+        """
+        self.template = template
+        self.dimensions = [(name, list(values)) for name, values in dimensions]
+        self.total = 1
+        for _, values in self.dimensions:
+            self.total *= len(values)
+        self.start = start
+        self.stop = self.total if stop is None else stop
+    
+    def __len__(self):
+        return max(0, self.stop - self.start)
+    
+    def __repr__(self):
+        return f"AlphaCombinations({self.template!r}, len={len(self)})"
+    
+    def values_at(self, index):
+        """
+        第index个组合各维度的取值
+        
+        Returns:
+            dict: {名称: 取值}
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('AlphaCombinations index out of range')
+        index += self.start
+        values = {}
+        # 混合进制分解，最后一个维度是最低位
+        for name, choices in reversed(self.dimensions):
+            index, digit = divmod(index, len(choices))
+            values[name] = choices[digit]
+        return values
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return AlphaCombinations(self.template, self.dimensions, self.start + start,
+                                         self.start + max(start, stop))
+            return [self[i] for i in range(start, stop, step)]
+        return self.template.format_map(self.values_at(index))
+    
+    def __iter__(self):
+        if self.start == 0 and self.stop == self.total:
+            names = [name for name, _ in self.dimensions]
+            for combination in itertools.product(*(values for _, values in self.dimensions)):
+                yield self.template.format_map(dict(zip(names, combination)))
+        else:
+            for i in range(len(self)):
+                yield self[i]
+    
+    def shard(self, k, n):
+        """
+        第k片（从0开始，共n片）：连续的下标区间，各片数量相差不超过1，
+        多个进程用相同的参数和不同的k即可不重不漏地分掉同一个组合空间
+        
+        Returns:
+            AlphaCombinations: 惰性视图
+        """
+        if not 0 <= k < n:
+            raise ValueError(f"shard index {k} out of range for {n} shards")
+        length = len(self)
+        return self[k * length // n:(k + 1) * length // n]
+    
+    def simulation_data(self, settings=None):
+        """
+        惰性的模拟数据序列，每次访问时才调用create_simulation_data
+        
+        Args:
+            settings (dict, optional): 自定义设置
+        
+        Returns:
+            SimulationDataSequence: 支持len、下标和迭代
+        """
+        return SimulationDataSequence(self, settings)
+
+
+class SimulationDataSequence:
+    """
+    把表达式序列惰性地映射为模拟数据，所有alpha共用一个settings预设，
+    产出的SimulationPayload带有拼好的请求体
+    """
+    
+    def __init__(self, expressions, settings=None, presets=None):
+        self.expressions = expressions
+        self.settings = settings
+        self.presets = presets if presets is not None else SettingsPresets()
+        self.preset_id = self.presets.intern(settings)
+    
+    def __len__(self):
+        return len(self.expressions)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SimulationDataSequence(self.expressions[index], self.settings, self.presets)
+        return self.presets.payload(self.expressions[index], self.preset_id)
+    
+    def __iter__(self):
+        payload, preset_id = self.presets.payload, self.preset_id
+        for expression in self.expressions:
+            yield payload(expression, preset_id)
+    
+    def csv_rows(self):
+        """save_alphas_to_csv的行（type, settings, regular）"""
+        text = self.presets.text(self.preset_id)
+        for expression in self.expressions:
+            yield "REGULAR", text, expression
+
+
 def generate_alpha_combinations(group_compare_ops, ts_compare_ops, company_fundamentals, days_list, groups):
     """
     生成Alpha表达式组合
@@ -186,21 +380,18 @@ def generate_alpha_combinations(group_compare_ops, ts_compare_ops, company_funda
         groups (list): 分组依据列表
     
     Returns:
-        list: Alpha表达式列表
+        AlphaCombinations: 惰性的Alpha表达式序列，可以len、下标访问、迭代和分片
     """
-    alpha_expressions = []
-    
-    for gco in group_compare_ops:
-        for tco in ts_compare_ops:
-            for cf in company_fundamentals:
-                for d in days_list:
-                    for grp in groups:
-                        alpha_expressions.append(f"{gco}({tco}({cf}, {d}), {grp})")
-    
-    return alpha_expressions
+    return AlphaCombinations("{gco}({tco}({cf}, {d}), {grp})", [
+        ('gco', group_compare_ops),
+        ('tco', ts_compare_ops),
+        ('cf', company_fundamentals),
+        ('d', days_list),
+        ('grp', groups),
+    ])
 
 
-def batch_submit_alphas(sess, alpha_list, start_index=0, max_failures=15):
+def batch_submit_alphas(sess, alpha_list, start_index=0, max_failures=15, cache=None, include_cached=False):
     """
     批量提交Alpha进行模拟，带重连和错误处理
     
@@ -209,6 +400,8 @@ def batch_submit_alphas(sess, alpha_list, start_index=0, max_failures=15):
         alpha_list (list): Alpha配置列表
         start_index (int): 开始的索引位置
         max_failures (int): 每个Alpha最大失败尝试次数
+        cache (ResultCache, optional): 结果缓存，已模拟过的表达式+设置直接跳过. Defaults to None.
+        include_cached (bool): 是否把缓存命中的Alpha ID也放进返回列表. Defaults to False.
     
     Returns:
         list: 成功的Alpha ID列表
@@ -223,15 +416,26 @@ def batch_submit_alphas(sess, alpha_list, start_index=0, max_failures=15):
         alpha = alpha_list[index]
         print(f"{index}: {alpha['regular']}")
         logging.info(f"{index}: {alpha['regular']}")
+        if cache is not None:
+            cached = cache.get(alpha)
+            if cached and cached['alpha_id']:
+                print(f"Cached: {cached['alpha_id']}")
+                logging.info(f"Cached: {cached['alpha_id']}")
+                if include_cached:
+                    successful_alphas.append(cached['alpha_id'])
+                continue
         keep_trying = True  # 控制while循环继续的标志
         failure_count = 0  # 记录失败尝试次数的计数器
 
         while keep_trying:
+            sim_resp = None
             try:
-                # 尝试发送POST请求
-                sim_resp = sess.post(
+                # 尝试发送POST请求，经过共享限流器
+                sim_resp = limited_request(
+                    sess, 'post',
                     'https://api.worldquantbrain.com/simulations',
-                    json=alpha  # 将当前alpha（一个JSON）发送到服务器
+                    data=payload_body(alpha),  # 将当前alpha（一个JSON）发送到服务器
+                    headers=JSON_HEADERS
                 )
 
                 # 从响应头中获取位置
@@ -241,7 +445,7 @@ def batch_submit_alphas(sess, alpha_list, start_index=0, max_failures=15):
                 
                 # 等待模拟完成
                 while True:
-                    sim_progress_resp = sess.get(sim_progress_url)
+                    sim_progress_resp = limited_request(sess, 'get', sim_progress_url)
                     retry_after_sec = float(sim_progress_resp.headers.get("Retry-After", 0))
                     if retry_after_sec == 0:  # simulation done!模拟完成!
                         break
@@ -249,16 +453,23 @@ def batch_submit_alphas(sess, alpha_list, start_index=0, max_failures=15):
                 
                 alpha_id = sim_progress_resp.json()["alpha"]  # the final simulation result
                 successful_alphas.append(alpha_id)
+                if cache is not None:
+                    cache.store(alpha, alpha_id)
                 print(f"Success: {alpha_id}")
                 logging.info(f"Success: {alpha_id}")
                 
                 keep_trying = False  # 成功获取位置，退出while循环
 
             except Exception as e:
-                # 处理异常：记录错误，让程序休眠15秒后重试
-                logging.error(f"No Location, sleep 15 and retry, error message: {str(e)}")
-                print("No Location, sleep 15 and retry")
-                sleep(15)  # 休眠15秒后重试
+                if sim_resp is not None and sim_resp.status_code == 429:
+                    # 被限流：限流器已经按Retry-After/AIMD降速，直接重试，由它决定等待多久
+                    logging.error(f"Throttled, retry at the limiter's rate, error message: {str(e)}")
+                    print("Throttled, retry at the limiter's rate")
+                else:
+                    # 处理异常：记录错误，让程序休眠15秒后重试
+                    logging.error(f"No Location, sleep 15 and retry, error message: {str(e)}")
+                    print("No Location, sleep 15 and retry")
+                    sleep(15)  # 休眠15秒后重试
                 failure_count += 1  # 增加失败尝试次数
 
                 # 检查失败尝试次数是否达到容忍上限
@@ -268,11 +479,6 @@ def batch_submit_alphas(sess, alpha_list, start_index=0, max_failures=15):
                     logging.error(f"No location for too many times, move to next alpha {alpha['regular']}")  # 记录错误
                     print(f"No location for too many times, move to next alpha {alpha['regular']}")  # 打印信息
                     break  # 退出while循环，移动到for循环中的下一个alpha
-        
-        # 每100个Alpha重新登录
-        if (index + 1) % 100 == 0:
-            sess = sign_in()
-            print(f"重新登录，当前index为{index + 1}")
     
     return successful_alphas
 
@@ -289,13 +495,14 @@ def setup_logging(log_filename='simulation.log'):
                         format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-def save_alphas_to_csv(alpha_list, filename='alpha_list_pending_simulated.csv'):
+def save_alphas_to_csv(alpha_list, filename='alpha_list_pending_simulated.csv', validator=None):
     """
     将Alpha列表保存到CSV文件
     
     Args:
-        alpha_list (list): Alpha配置列表
+        alpha_list (list): Alpha配置列表，也可以是PayloadBatch等提供csv_rows()的批次
         filename (str): 文件名
+        validator (ExpressionValidator, optional): 写入前做本地校验，不通过的alpha不写入
     """
     import csv
     import os
@@ -310,6 +517,110 @@ def save_alphas_to_csv(alpha_list, filename='alpha_list_pending_simulated.csv'):
         if not file_exists:
             dict_writer.writeheader()
 
-        dict_writer.writerows(alpha_list)
+        if validator is not None:
+            dict_writer.writerows(validator.filter(alpha_list))
+        elif hasattr(alpha_list, 'csv_rows'):
+            # 列式批次：settings文本按预设缓存，不再逐行str(dict)
+            csv.writer(output_file).writerows(alpha_list.csv_rows())
+        else:
+            dict_writer.writerows(alpha_list)
 
     print(f"Alpha list has been saved to {filename}")
+
+
+def iter_unique_alphas(alphas):
+    """
+    逐个产出去重后的Alpha：表达式的FASTEXPR规范形式和settings都相同的只保留第一个。
+    规范形式只用作去重的键，产出的Alpha保留原来的表达式。
+    只记录8字节摘要，可以用于惰性生成的超大组合。
+    
+    Args:
+        alphas (iterable): Alpha配置
+    
+    Yields:
+        dict: 去重后的Alpha配置（原对象）
+    """
+    import hashlib
+    from fastexpr import FastExprError, canonicalize
+
+    seen = set()
+    for alpha in alphas:
+        try:
+            regular = canonicalize(alpha['regular'])
+        except FastExprError:
+            regular = alpha['regular']
+        key = regular + '\0' + json.dumps(alpha.get('settings'), sort_keys=True)
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        yield alpha
+
+
+def dedupe_alpha_list(alpha_list):
+    """
+    合并等价的Alpha：表达式的FASTEXPR规范形式和settings都相同的只保留第一个，保留原来的表达式
+    
+    Args:
+        alpha_list (list): Alpha配置列表
+    
+    Returns:
+        list: 去重后的Alpha配置列表
+    """
+    return list(iter_unique_alphas(alpha_list))
+
+
+def save_alphas_to_queue(alpha_list, filename='alpha_list_pending_simulated.db', chunk_size=10000, validator=None):
+    """
+    将Alpha去重后分块写入持久化的待模拟队列（AlphaSimulator从该队列取alpha）
+    
+    Args:
+        alpha_list (iterable): Alpha配置，可以是AlphaCombinations.simulation_data()返回的惰性序列
+        filename (str): 队列文件名
+        chunk_size (int): 每次事务写入的数量
+        validator (ExpressionValidator, optional): 入队前做本地校验，不通过的alpha不入队
+    """
+    from pending_queue import PendingQueue
+
+    queue = PendingQueue(filename)
+    count = 0
+    unique_alphas = iter_unique_alphas(alpha_list)
+    if validator is not None:
+        unique_alphas = validator.filter(unique_alphas)
+    while True:
+        chunk = list(itertools.islice(unique_alphas, chunk_size))
+        if not chunk:
+            break
+        count += queue.put_many(chunk)
+    queue.close()
+    print(f"{count} alphas have been added to {filename}")
+    if validator is not None and validator.rejected:
+        print(f"{validator.rejected} invalid alphas were skipped, see the log for details")
+
+
+def save_alphas_to_store(alpha_list, path='alpha_list_pending_simulated.parquet', chunk_size=100000, validator=None):
+    """
+    将Alpha去重后写入Parquet格式的待模拟目录（需要pyarrow），
+    AlphaSimulator的alpha_list_file_path指向该目录时会导入新增的分片
+    
+    Args:
+        alpha_list (iterable): Alpha配置
+        path (str): 目录路径
+        chunk_size (int): 每个分片的行数
+        validator (ExpressionValidator, optional): 写入前做本地校验，不通过的alpha不写入
+    """
+    from alpha_store import PendingStore
+
+    store = PendingStore(path)
+    count = 0
+    unique_alphas = iter_unique_alphas(alpha_list)
+    if validator is not None:
+        unique_alphas = validator.filter(unique_alphas)
+    while True:
+        chunk = list(itertools.islice(unique_alphas, chunk_size))
+        if not chunk:
+            break
+        count += store.append(chunk)
+    print(f"{count} alphas have been saved to {path}")
+    if validator is not None and validator.rejected:
+        print(f"{validator.rejected} invalid alphas were skipped, see the log for details")
@@ -0,0 +1,537 @@
+"""
+simulation.log 增量分析
+从上次保存的字节偏移继续读取新追加的日志（大文件用mmap，按块用numpy整体处理，不逐行生成字符串），
+把"index: 表达式"/"Starting simulation for alpha"与之后的"Alpha location is"/错误行配对，
+统计每分钟吞吐、失败类型、每个alpha的重试次数和POST延迟（从开始提交到拿到location）。
+
+例:
+    python log_analyzer.py                      # 分析simulation.log新增的部分并打印累计报告
+    python log_analyzer.py --follow 10          # 每10秒读取一次新增的日志
+    python log_analyzer.py --reset              # 丢弃保存的进度，从头分析
+    python log_analyzer.py --json | jq .        # 输出一个JSON对象（--follow时每次一行）
+"""
+import json
+import mmap
+import os
+import re
+import time
+from collections import Counter
+
+import numpy as np
+
+
+# logging默认格式的行头 "YYYY-MM-DD HH:MM:SS,mmm - LEVEL - "：固定位置上的分隔符，日期时间各位数字的位置
+_HEADER_MARKS = [(4, b'-'), (7, b'-'), (10, b' '), (13, b':'), (16, b':'), (19, b','), (23, b' '), (24, b'-'), (25, b' ')]
+_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18, 20, 21, 22]
+# 按级别的首字母确定消息开始的位置（INFO/ERROR/WARNING/DEBUG/CRITICAL）
+_MESSAGE_START = np.zeros(256, dtype=np.int64)
+for _level in (b'INFO', b'ERROR', b'WARNING', b'DEBUG', b'CRITICAL'):
+    _MESSAGE_START[_level[0]] = 26 + len(_level) + 3
+
+SUBMIT, LOCATION, RETRY, GIVEUP, INVALID = range(5)
+# 关心的消息开头及其事件类型；重试类的开头包含分隔符，之后是用来归类的错误信息
+_MESSAGES = [
+    (b'Starting simulation for alpha: ', SUBMIT),
+    (b'Alpha location is: ', LOCATION),
+    (b'Location: ', LOCATION),
+    (b'No Location, sleep 15 and retry, error message: ', RETRY),
+    (b"Throttled, retry at the limiter's rate, error message: ", RETRY),
+    (b'Error in sending simulation request: ', RETRY),
+    (b'Simulation request rejected with status ', RETRY),
+    (b'No location for too many times', GIVEUP),
+    (b'Simulation request failed after', GIVEUP),
+    (b'Alpha failed ', GIVEUP),
+    (b'Invalid alpha skipped', INVALID),
+]
+_NO_LOCATION, _THROTTLED = 3, 4
+# 块末尾补的空字节数，保证行尾附近按8字节取值不越界
+_PADDING = 64
+_STATUS_RE = re.compile(rb'Alpha id: \S* ended with status: (\w+)')
+
+
+def _words(text, mask, offsets):
+    """
+    text在offsets处开始的8个字节（小端uint64）及对应的掩码，用于一次比较8个字节
+
+    Returns:
+        tuple: (offsets, 取值列表, 掩码列表)
+    """
+    def word(data, offset):
+        return np.uint64(int.from_bytes(data[offset:offset + 8].ljust(8, b'\0'), 'little'))
+    return tuple(offsets), [word(text, o) for o in offsets], [word(mask, o) for o in offsets]
+
+
+def _prefix_words(prefix):
+    """消息开头按开头和结尾各8个字节比较（以上开头由这两处即可区分，含结尾的分隔符）"""
+    return _words(prefix, b'\xff' * len(prefix), (0, len(prefix) - 8))
+
+
+def _header_words():
+    text, mask = bytearray(32), bytearray(32)
+    for pos, mark in _HEADER_MARKS:
+        text[pos], mask[pos] = mark[0], 0xff
+    # 4..11和18..25两处覆盖了除时间里两个冒号之外的全部分隔符
+    return _words(bytes(text), bytes(mask), (4, 18))
+
+
+_HEADER_WORDS = _header_words()
+# "error message: 'location'"中引号内的8个字节
+_LOCATION_WORDS = _words(b'location', b'\xff' * 8, (0,))
+_MESSAGE_TABLE = [_prefix_words(prefix) for prefix, _ in _MESSAGES]
+# 每个_MESSAGES下标的事件类型，最后两项对应"index: 表达式"和不关心的行(-1)
+_KINDS = np.array([kind for _, kind in _MESSAGES] + [SUBMIT, INVALID + 1])
+
+# 大于这个大小的增量用mmap读取
+MMAP_THRESHOLD = 1 << 20
+# 每次向量化处理的块大小（按行对齐），限制临时数组占用的内存
+CHUNK_SIZE = 64 << 20
+# POST延迟直方图的桶（毫秒），最后一个桶之外的计入最后一个桶
+LATENCY_BUCKETS_MS = [100, 250, 500, 1000, 2000, 5000, 10000, 20000, 30000, 60000, 120000, 300000, 600000, 1800000]
+
+
+def _new_stats():
+    return {
+        'submitted': 0,        # 开始提交的alpha数
+        'located': 0,          # 拿到location的alpha数
+        'gave_up': 0,          # 重试次数用完后放弃的alpha数
+        'invalid': 0,          # 本地校验不通过、没有发送的alpha数
+        'retries': 0,          # 失败后重试的总次数
+        'errors': {},          # 失败类型 -> 次数
+        'statuses': {},        # 模拟结束状态 -> 次数
+        'per_minute': {},      # 'YYYY-MM-DD HH:MM' -> 拿到location的数量
+        'latency_ms': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        'latency_sum_ms': 0,
+        'retry_hist': {},      # 每个alpha的重试次数 -> alpha数
+        'first': None,
+        'last': None,
+    }
+
+
+def classify_error(prefix, text):
+    """
+    把错误行归类
+
+    Args:
+        prefix (bytes): 错误行的开头（No Location / Throttled / Error in sending ...）
+        text (bytes): error message之后的部分
+
+    Returns:
+        str: 失败类型
+    """
+    lowered = text.lower()
+    if prefix.startswith(b'Throttled') or b'429' in text:
+        return 'throttled'
+    if lowered.startswith(b"'location'"):
+        return 'no_location'
+    if b'401' in text or b'unauthorized' in lowered:
+        return 'unauthorized'
+    if b'timed out' in lowered or b'timeout' in lowered:
+        return 'timeout'
+    if b'tls' in lowered or b'ssl' in lowered or b'certificate' in lowered:
+        return 'tls'
+    if b'connection' in lowered:
+        return 'connection'
+    if re.search(rb'\b5\d\d\b', text):
+        return 'server_error'
+    return 'other'
+
+
+class LogAnalyzer:
+    """
+    simulation.log的增量分析器
+
+    进度（字节偏移、文件标识和累计统计）保存在state_path中，再次运行只读取新追加的部分；
+    文件被截断或替换（轮转）后自动从头开始。最后一行没有换行符时留到下次读取。
+    """
+
+    def __init__(self, log_path='simulation.log', state_path=None):
+        """
+        Args:
+            log_path (str): 日志文件
+            state_path (str, optional): 进度文件，默认为日志文件名加 .analyzer.json
+        """
+        self.log_path = log_path
+        self.state_path = state_path or log_path + '.analyzer.json'
+        self.offset = 0
+        self.file_id = None
+        self.stats = _new_stats()
+        self.pending = None    # 已开始提交、还没有结果的alpha: [开始时间, 重试次数]
+        self._classes = {}     # (错误行开头, 错误信息) -> 失败类型
+        self.load_state()
+
+    # ---------- 进度 ----------
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return
+        with open(self.state_path) as f:
+            state = json.load(f)
+        self.offset = state['offset']
+        self.file_id = state['file_id']
+        self.stats = state['stats']
+        self.pending = state['pending']
+
+    def save_state(self):
+        state = {'log_path': self.log_path, 'offset': self.offset, 'file_id': self.file_id,
+                 'stats': self.stats, 'pending': self.pending}
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def reset(self):
+        self.offset = 0
+        self.file_id = None
+        self.stats = _new_stats()
+        self.pending = None
+
+    @staticmethod
+    def _file_id(f):
+        """文件标识：inode + 开头的64个字节，用来发现轮转"""
+        st = os.fstat(f.fileno())
+        head = os.pread(f.fileno(), 64, 0)
+        return [st.st_ino, head.hex()]
+
+    # ---------- 解析 ----------
+
+    def _merge(self, name, counts):
+        table = self.stats[name]
+        for key, count in counts.items():
+            if count:
+                table[key] = table.get(key, 0) + int(count)
+
+    def _close(self, retries, latencies_ms):
+        """记录结束的alpha：每个alpha的重试次数，以及拿到location的alpha的延迟"""
+        stats = self.stats
+        values, counts = np.unique(retries, return_counts=True)
+        self._merge('retry_hist', {str(int(value)): count for value, count in zip(values, counts)})
+        if len(latencies_ms):
+            buckets = np.searchsorted(LATENCY_BUCKETS_MS, latencies_ms, side='left')
+            for i, count in enumerate(np.bincount(buckets, minlength=len(LATENCY_BUCKETS_MS) + 1)):
+                stats['latency_ms'][i] += int(count)
+            stats['latency_sum_ms'] += int(latencies_ms.sum())
+
+    @staticmethod
+    def _millis(data, starts):
+        """行头时间戳 -> 毫秒（按UTC换算，只用于求差和还原分钟）"""
+        d = data[starts[:, None] + _DIGITS].astype(np.int64) - 48
+        year = d[:, 0] * 1000 + d[:, 1] * 100 + d[:, 2] * 10 + d[:, 3]
+        month = d[:, 4] * 10 + d[:, 5]
+        day = d[:, 6] * 10 + d[:, 7]
+        # 公历日期 -> 1970-01-01起的天数
+        year = year - (month <= 2)
+        era = year // 400
+        yoe = year - era * 400
+        doy = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+        days = era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+        seconds = (days * 86400 + (d[:, 8] * 10 + d[:, 9]) * 3600 + (d[:, 10] * 10 + d[:, 11]) * 60
+                   + d[:, 12] * 10 + d[:, 13])
+        return seconds * 1000 + d[:, 14] * 100 + d[:, 15] * 10 + d[:, 16]
+
+    @staticmethod
+    def _match(words, positions, pattern, first=None):
+        """
+        positions中哪些位置开始的字节与pattern一致：先比较第一组8个字节，只对候选比较其余的
+
+        Args:
+            words (np.ndarray): 每个字节位置开始的8个字节
+            positions (np.ndarray): 开始位置
+            pattern (tuple): _words的返回值
+            first (np.ndarray, optional): 已经取出的第一组，多个pattern共用时避免重复取
+
+        Returns:
+            np.ndarray: 一致的positions下标
+        """
+        offsets, values, masks = pattern
+        if first is None:
+            first = words[positions + offsets[0]]
+        rows = np.flatnonzero((first & masks[0]) == values[0])
+        for offset, value, mask in zip(offsets[1:], values[1:], masks[1:]):
+            rows = rows[(words[positions[rows] + offset] & mask) == value]
+        return rows
+
+    @classmethod
+    def _classify_lines(cls, data, words, starts, ends):
+        """
+        按消息开头给每一行归类
+
+        Returns:
+            tuple: (消息开始的位置, 匹配的_MESSAGES下标，"index: 表达式"为len(_MESSAGES)，都不是为-1)
+        """
+        message = starts + _MESSAGE_START[data[starts + 26]]
+        # 账号池的日志在消息前带"[用户名] "
+        bracketed = np.flatnonzero(data[message] == ord('['))
+        if len(bracketed):
+            block = data[message[bracketed, None] + np.arange(_PADDING)]
+            hit = block[:, :-1] == ord(']')
+            close = hit.argmax(axis=1)
+            found = hit.any(axis=1) & (block[np.arange(len(block)), close + 1] == ord(' '))
+            message[bracketed[found]] += close[found] + 2
+
+        pattern = np.full(len(starts), -1, dtype=np.int64)
+        first = words[message]
+        for i, prefix_words in enumerate(_MESSAGE_TABLE):
+            pattern[cls._match(words, message, prefix_words, first)] = i
+        # "index: 表达式"：开头若干位数字后跟": "
+        rows = np.flatnonzero((pattern < 0) & (data[message] - 48 < 10))
+        if len(rows):
+            block = data[message[rows, None] + np.arange(14)]
+            lead = np.logical_and.accumulate(block[:, :12] - 48 < 10, axis=1).sum(axis=1)
+            index = np.arange(len(rows))
+            rows = rows[(block[index, lead] == ord(':')) & (block[index, lead + 1] == ord(' '))]
+            pattern[rows] = len(_MESSAGES)
+        pattern[message > ends] = -1
+        return message, pattern
+
+    def _classify_errors(self, chunk, words, message, ends, pattern):
+        errors = Counter()
+        rows = np.flatnonzero(_KINDS[pattern] == RETRY)
+        which = pattern[rows]
+        no_location = rows[which == _NO_LOCATION]
+        # 绝大多数是"error message: 'location'"（响应里没有Location头）
+        plain = np.zeros(len(no_location), dtype=bool)
+        plain[self._match(words, message[no_location] + len(_MESSAGES[_NO_LOCATION][0]) + 1, _LOCATION_WORDS)] = True
+        errors['no_location'] += int(plain.sum())
+        errors['throttled'] += int((which == _THROTTLED).sum())
+        # 其余的错误行不多，逐行取出错误信息归类
+        rest = np.concatenate([no_location[~plain], rows[(which != _NO_LOCATION) & (which != _THROTTLED)]])
+        classes = self._classes
+        for row in rest.tolist():
+            prefix = _MESSAGES[pattern[row]][0]
+            start = int(message[row]) + len(prefix)
+            key = (prefix, chunk[start:min(start + 60, int(ends[row]))])
+            name = classes.get(key)
+            if name is None:
+                name = classes[key] = classify_error(*key)
+            errors[name] += 1
+        self._merge('errors', errors)
+
+    def _scan(self, chunk):
+        """
+        分析一段以换行符结尾的日志：逐行的工作都在numpy里完成，只有少见的错误行回到Python归类
+        """
+        stats = self.stats
+        data = np.frombuffer(chunk + bytes(_PADDING), dtype=np.uint8)
+        # 每个字节位置开始的8个字节（互相重叠的uint64视图），一次取出比较8个字节
+        words = np.ndarray(shape=(len(data) - 7,), dtype='<u8', buffer=data, strides=(1,))
+        ends = np.flatnonzero(data[:len(chunk)] == ord('\n'))
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        # 只要行头格式正确的行（多行的异常堆栈等跳过）
+        long_enough = ends - starts >= 34
+        starts, ends = starts[long_enough], ends[long_enough]
+        valid = self._match(words, starts, _HEADER_WORDS)
+        valid = valid[_MESSAGE_START[data[starts[valid] + 26]] > 0]
+        starts, ends = starts[valid], ends[valid]
+        if not len(starts):
+            return
+        stats['first'] = stats['first'] or chunk[starts[0]:starts[0] + 16].decode()
+        stats['last'] = chunk[starts[-1]:starts[-1] + 16].decode()
+
+        message, pattern = self._classify_lines(data, words, starts, ends)
+        kinds = _KINDS[pattern]
+        stats['invalid'] += int((kinds == INVALID).sum())
+        self._classify_errors(chunk, words, message, ends, pattern)
+        self._merge('statuses', Counter(status.decode() for status in _STATUS_RE.findall(chunk)))
+
+        events = np.flatnonzero(kinds <= GIVEUP)
+        kinds = kinds[events]
+        retried = np.cumsum(kinds == RETRY)
+        total_retries = int(retried[-1]) if len(retried) else 0
+        stats['retries'] += total_retries
+        # 提交、location和放弃按顺序配对，两者之间的错误行数就是这个alpha的重试次数
+        others = np.flatnonzero(kinds != RETRY)
+        kinds, retried = kinds[others], retried[others]
+        millis = self._millis(data, starts[events[others]])
+        located = kinds == LOCATION
+        submits = np.flatnonzero(kinds == SUBMIT)
+        stats['submitted'] += len(submits)
+        stats['located'] += int(located.sum())
+        stats['gave_up'] += int((kinds == GIVEUP).sum())
+        minutes, counts = np.unique(millis[located] // 60000, return_counts=True)
+        self._merge('per_minute', {time.strftime('%Y-%m-%d %H:%M', time.gmtime(int(minute) * 60)): count
+                                   for minute, count in zip(minutes, counts)})
+
+        if self.pending is not None:
+            if not len(kinds):
+                self.pending[1] += total_retries
+                return
+            started, retries = self.pending
+            # 上一个alpha既没有location也没有放弃记录（脚本被中断等）时不计入延迟
+            latency = millis[:1] - round(started * 1000) if kinds[0] == LOCATION else millis[:0]
+            self._close([retries + int(retried[0])], np.maximum(latency, 0))
+            self.pending = None
+        if not len(submits):
+            return
+        if submits[-1] == len(kinds) - 1:
+            last = submits[-1]
+            self.pending = [int(millis[last]) / 1000, total_retries - int(retried[last])]
+            submits = submits[:-1]
+        following = submits + 1
+        outcome = kinds[following] == LOCATION
+        self._close(retried[following] - retried[submits],
+                    np.maximum(millis[following[outcome]] - millis[submits[outcome]], 0))
+
+    def _chunks(self, buffer, start, end):
+        """把[start, end)按换行符切成不超过CHUNK_SIZE的块"""
+        while start < end:
+            stop = min(start + CHUNK_SIZE, end)
+            if stop < end:
+                stop = buffer.rfind(b'\n', start, stop) + 1 or buffer.find(b'\n', stop, end) + 1 or end
+            yield buffer[start:stop]
+            start = stop
+
+    def update(self):
+        """
+        读取上次之后新追加的日志并更新统计，保存进度
+
+        Returns:
+            int: 本次读取的字节数
+        """
+        if not os.path.exists(self.log_path):
+            return 0
+        with open(self.log_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            file_id = self._file_id(f)
+            if self.file_id is not None and (file_id[0] != self.file_id[0] or size < self.offset
+                                             or not file_id[1].startswith(self.file_id[1])):
+                # 轮转或截断：从头开始
+                self.reset()
+            self.file_id = file_id
+            start = self.offset
+            if size <= start:
+                return 0
+            if size - start >= MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as buffer:
+                    end = buffer.rfind(b'\n', start, size) + 1
+                    for chunk in self._chunks(buffer, start, end):
+                        self._scan(chunk)
+            else:
+                f.seek(start)
+                buffer = f.read(size - start)
+                end = buffer.rfind(b'\n') + 1
+                for chunk in self._chunks(buffer, 0, end):
+                    self._scan(chunk)
+                end += start
+        if end <= start:
+            return 0
+        self.offset = end
+        self.save_state()
+        return end - start
+
+    # ---------- 报告 ----------
+
+    def latency_percentile(self, q):
+        """POST延迟的分位数（毫秒，按直方图桶的上界估计），没有数据时为None"""
+        counts = self.stats['latency_ms']
+        total = sum(counts)
+        if not total:
+            return None
+        threshold = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            seen += count
+            if seen >= threshold:
+                return LATENCY_BUCKETS_MS[min(i, len(LATENCY_BUCKETS_MS) - 1)]
+        return LATENCY_BUCKETS_MS[-1]
+
+    def summary(self):
+        """
+        累计统计的摘要
+
+        Returns:
+            dict: 各项指标
+        """
+        stats = self.stats
+        per_minute = stats['per_minute']
+        active_minutes = len(per_minute)
+        located_latencies = sum(stats['latency_ms'])
+        retry_alphas = sum(stats['retry_hist'].values())
+        return {
+            'first': stats['first'],
+            'last': stats['last'],
+            'submitted': stats['submitted'],
+            'located': stats['located'],
+            'gave_up': stats['gave_up'],
+            'invalid': stats['invalid'],
+            'retries': stats['retries'],
+            'failure_rate': stats['retries'] / (stats['retries'] + stats['located'])
+            if stats['retries'] + stats['located'] else 0.0,
+            'errors': dict(sorted(stats['errors'].items(), key=lambda item: -item[1])),
+            'statuses': stats['statuses'],
+            'throughput_per_minute': stats['located'] / active_minutes if active_minutes else 0.0,
+            'peak_per_minute': max(per_minute.values(), default=0),
+            'active_minutes': active_minutes,
+            'mean_retries': sum(int(k) * v for k, v in stats['retry_hist'].items()) / retry_alphas
+            if retry_alphas else 0.0,
+            'max_retries': max(map(int, stats['retry_hist']), default=0),
+            'latency_mean_ms': stats['latency_sum_ms'] / located_latencies if located_latencies else None,
+            'latency_p50_ms': self.latency_percentile(0.5),
+            'latency_p90_ms': self.latency_percentile(0.9),
+            'latency_p99_ms': self.latency_percentile(0.99),
+        }
+
+    def report(self, recent_minutes=10):
+        """
+        便于打印的报告
+
+        Args:
+            recent_minutes (int): 额外列出最近多少个有提交的分钟
+
+        Returns:
+            str: 报告文本
+        """
+        s = self.summary()
+        lines = [
+            f"{self.log_path}: {s['first']} - {s['last']}, {self.offset} bytes analyzed",
+            f"submitted {s['submitted']}, located {s['located']}, gave up {s['gave_up']}, "
+            f"skipped invalid {s['invalid']}, pending {1 if self.pending else 0}",
+            f"retries {s['retries']} (failure rate {s['failure_rate']:.1%}), "
+            f"per alpha mean {s['mean_retries']:.2f} max {s['max_retries']}",
+            "failures: " + (', '.join(f"{k} {v}" for k, v in s['errors'].items()) or 'none'),
+            f"throughput {s['throughput_per_minute']:.1f}/min over {s['active_minutes']} active minutes, "
+            f"peak {s['peak_per_minute']}/min",
+        ]
+        if s['latency_mean_ms'] is not None:
+            lines.append(f"POST latency mean {s['latency_mean_ms'] / 1000:.2f}s, p50 <= {s['latency_p50_ms'] / 1000:g}s, "
+                         f"p90 <= {s['latency_p90_ms'] / 1000:g}s, p99 <= {s['latency_p99_ms'] / 1000:g}s")
+        if s['statuses']:
+            lines.append("statuses: " + ', '.join(f"{k} {v}" for k, v in s['statuses'].items()))
+        recent = sorted(self.stats['per_minute'].items())[-recent_minutes:]
+        if recent:
+            lines.append("recent minutes: " + ', '.join(f"{minute[11:]} {count}" for minute, count in recent))
+        return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    import signal
+
+    # 输出接到head等提前退出的管道时直接结束，不打印BrokenPipeError
+    if hasattr(signal, 'SIGPIPE'):
+        signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+
+    parser = argparse.ArgumentParser(description='Incrementally analyze simulation.log')
+    parser.add_argument('log_path', nargs='?', default='simulation.log', help='log file to analyze')
+    parser.add_argument('--state', default=None, help='progress file (default: <log>.analyzer.json)')
+    parser.add_argument('--reset', action='store_true', help='discard saved progress and start over')
+    parser.add_argument('--follow', type=float, default=0, help='keep tailing the log every N seconds')
+    parser.add_argument('--json', action='store_true',
+                        help='print the summary as one JSON object (one object per line with --follow)')
+    args = parser.parse_args()
+
+    analyzer = LogAnalyzer(args.log_path, args.state)
+    if args.reset:
+        analyzer.reset()
+    while True:
+        started = time.perf_counter()
+        read = analyzer.update()
+        elapsed = time.perf_counter() - started
+        if args.json:
+            summary = dict(analyzer.summary(), new_bytes=read, elapsed_s=round(elapsed, 3))
+            print(json.dumps(summary, indent=None if args.follow else 2), flush=True)
+        else:
+            print(analyzer.report())
+            print(f"({read} new bytes in {elapsed:.2f}s)", flush=True)
+        if not args.follow:
+            break
+        time.sleep(args.follow)
@@ -1,17 +1,21 @@
 # 登录
-from helper import sign_in, get_datafields, get_standard_search_scope, create_simulation_data
+from helper import sign_in, get_standard_search_scope
+from datafield_catalog import DatafieldCatalog
+from template_engine import AlphaTemplate
+from validator import ExpressionValidator
+from payload_batch import JSON_HEADERS, payload_body
+from rate_limiter import limited_request
 
 sess = sign_in()
 
 
 # 定义搜索范围
 searchScope = get_standard_search_scope()
-# 从数据集中获取数据字段
-fnd6 = get_datafields(s=sess, searchScope=searchScope, dataset_id='news18')
-# 过滤类型为 "MATRIX" 的数据字段
-fnd6 = fnd6[fnd6['type'] == "MATRIX"]
-# 提取数据字段的ID并转换为列表
-datafields_list_fnd6 = fnd6['id'].values
+# 本地数据字段目录中没有该数据集或已经过期时，先从服务器同步
+catalog = DatafieldCatalog()
+catalog.sync(sess, searchScope, dataset_ids=['news18'])
+# 查询类型为 "MATRIX" 的数据字段ID列表
+datafields_list_fnd6 = catalog.ids(searchScope, dataset='news18', type='MATRIX')
 # 输出数据字段的ID列表
 print(datafields_list_fnd6)
 print(len(datafields_list_fnd6))
@@ -35,44 +39,28 @@ company_fundamentals = datafields_list_fnd6
 days = [10, 20]
 # 定义分组依据列表
 group = ['industry']
-# 初始化alpha表达式列表
-alpha_expressions = []
-# 遍历分组比较操作符
-for gco in group_compare_op:
-    # 遍历时间序列比较操作符
-    for tco in ts_compare_op:
-        # 遍历Cross Sectional操作符
-        for cso in cross_sectional_op:
-            # 遍历公司基本面数据的字段
-            for cf in company_fundamentals:
-                # 遍历时间周期
-                for d in days:
-                    # 遍历分组依据
-                    for grp in group:
-                        # 生成alpha表达式并添加到列表中
-                        alpha_expressions.append(f"{gco}({tco}({cso}({cf})/{cso}(enterprise_value), {d}), {grp})")
-
-# 输出生成的alpha表达式总数 # 打印或返回结果字符串列表
-print(f"there are total {len(alpha_expressions)} alpha expressions")
-
-# 打印结果
-print(alpha_expressions[:5])
-print(len(alpha_expressions))
-
-# 将datafield替换到Alpha模板(框架)中group_rank({fundamental model data}/cap,subindustry)批量生成Alpha
-alpha_list = []
-
-print("将alpha表达式与setting封装")
-for index, alpha_expression in enumerate(alpha_expressions, start=1):
-    print(f"正在循环第 {index} 个元素,组装alpha表达式: {alpha_expression}")
-    # 为world4使用特殊的truncation设置
-    custom_settings = {"truncation": 0.01}
-    simulation_data = create_simulation_data(alpha_expression, custom_settings)
-    alpha_list.append(simulation_data)
-print(f"there are {len(alpha_list)} Alphas to simulate")
+# alpha模板：按 分组比较操作符 > 时间序列比较操作符 > Cross Sectional操作符 > 基本面字段 > 时间周期 > 分组依据 的顺序展开，
+# 同名槽位<cross_sectional_op>在同一个表达式中取同一个值；为world4使用特殊的truncation设置
+alpha_template = AlphaTemplate(
+    "<group_compare_op>(<ts_compare_op>(<cross_sectional_op>(<company_fundamentals>)"
+    "/<cross_sectional_op>(enterprise_value), <days>), <group>)",
+    {'group_compare_op': group_compare_op, 'ts_compare_op': ts_compare_op,
+     'cross_sectional_op': cross_sectional_op, 'company_fundamentals': company_fundamentals,
+     'days': days, 'group': group},
+    settings={"truncation": 0.01})
+# 可以声明不需要的组合，例如：alpha_template.exclude(ts_compare_op='ts_zscore', days=20)
+
+# 输出生成的alpha表达式总数 # 打印前几个结果
+print(f"there are total {alpha_template.count()} alpha expressions")
+print(alpha_template.sample(5, seed=0))
+
+# 将alpha表达式与setting封装，遍历时才生成模拟数据
+alpha_list = alpha_template.simulation_data()
+# 发送前按本地数据字段目录校验操作符、参数类型和settings，注定被服务器拒绝的alpha不发送
+validator = ExpressionValidator(catalog)
 
 # 输出
-print(alpha_list[0])
+print(next(iter(alpha_list)))
 
 
 # 在使用该代码前，需将Course3的Alpha列表里的所有alpha存入csv文件。headers of the csv：type,settings,regular
@@ -110,19 +98,21 @@ alpha_fail_attempt_tolerance = 15 # 每个alpha允许的最大失败尝试次数
 is_submit = True  # 标志变量，用于控制是否提交alpha
 if is_submit:
     # 从第0个元素开始迭代回测alpha_list
-    for index in range(0, len(alpha_list)):
-        alpha = alpha_list[index]
+    for index, alpha in enumerate(validator.filter(alpha_list)):
         print(f"{index}: {alpha['regular']}")
         logging.info(f"{index}: {alpha['regular']}")
         keep_trying = True  # 控制while循环继续的标志
         failure_count = 0  # 记录失败尝试次数的计数器
 
         while keep_trying:
+            sim_resp = None
             try:
-                # 尝试发送POST请求
-                sim_resp = sess.post(
+                # 尝试发送POST请求，经过共享限流器
+                sim_resp = limited_request(
+                    sess, 'post',
                     'https://api.worldquantbrain.com/simulations',
-                    json=alpha  # 将当前alpha（一个JSON）发送到服务器
+                    data=payload_body(alpha),  # 将当前alpha（一个JSON）发送到服务器
+                    headers=JSON_HEADERS
                 )
 
                 # 从响应头中获取位置
@@ -132,10 +122,15 @@ if is_submit:
                 keep_trying = False  # 成功获取位置，退出while循环
 
             except Exception as e:
-                # 处理异常：记录错误，让程序休眠15秒后重试
-                logging.error(f"No Location, sleep 15 and retry, error message: {str(e)}")
-                print("No Location, sleep 15 and retry")
-                sleep(15)  # 休眠15秒后重试
+                if sim_resp is not None and sim_resp.status_code == 429:
+                    # 被限流：限流器已经按Retry-After/AIMD降速，直接重试，由它决定等待多久
+                    logging.error(f"Throttled, retry at the limiter's rate, error message: {str(e)}")
+                    print("Throttled, retry at the limiter's rate")
+                else:
+                    # 处理异常：记录错误，让程序休眠15秒后重试
+                    logging.error(f"No Location, sleep 15 and retry, error message: {str(e)}")
+                    print("No Location, sleep 15 and retry")
+                    sleep(15)  # 休眠15秒后重试
                 failure_count += 1  # 增加失败尝试次数
 
                 # 检查失败尝试次数是否达到容忍上限
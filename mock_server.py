@@ -0,0 +1,548 @@
+"""
+本地的BRAIN API替身服务器
+实现客户端用到的接口（登录、模拟、alpha查询/修改/检查/提交、alpha列表分页、数据字段），
+可以配置延迟分布、并发上限、限流以及429/5xx注入，并在服务器侧统计每个请求，供benchmark.py测量吞吐。
+
+用法:
+    python mock_server.py --port 8765 --sim_duration 5 --throttle_rate 0.05
+    BRAIN_API_URL=http://127.0.0.1:8765 python 4.auto-check.py
+"""
+import argparse
+import base64
+import collections
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+
+ROUTES = [
+    ('POST', re.compile(r'^/authentication$'), 'authentication'),
+    ('POST', re.compile(r'^/simulations$'), 'simulations'),
+    ('GET', re.compile(r'^/simulations/([\w-]+)$'), 'simulation_progress'),
+    ('GET', re.compile(r'^/alphas/([\w-]+)/check$'), 'check'),
+    ('GET', re.compile(r'^/alphas/([\w-]+)/recordsets/pnl$'), 'pnl'),
+    ('POST', re.compile(r'^/alphas/([\w-]+)/submit$'), 'submit'),
+    ('GET', re.compile(r'^/alphas/([\w-]+)$'), 'alpha'),
+    ('PATCH', re.compile(r'^/alphas/([\w-]+)$'), 'alpha_patch'),
+    ('GET', re.compile(r'^/users/self/alphas$'), 'alpha_list'),
+    ('GET', re.compile(r'^/data-fields$'), 'data_fields'),
+    ('GET', re.compile(r'^/__stats$'), 'stats'),
+    ('POST', re.compile(r'^/__reset$'), 'reset'),
+]
+
+
+def _now_iso():
+    return datetime.now().astimezone().isoformat(timespec='seconds')
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+class MockBrain:
+    """
+    服务器状态：登录token、模拟、alpha、检查和请求统计
+
+    浪费的请求（wasted）包括：429、5xx、401、早于Retry-After的轮询、结果已经返回过之后的重复轮询。
+    """
+
+    def __init__(self, latency=0.05, latency_sigma=0.5, sim_duration=3.0, sim_sigma=0.3, check_duration=1.0,
+                 poll_hint=2.0, max_concurrent_sims=10, max_inflight=64, rate_limit=0.0, throttle_rate=0.0,
+                 error_rate=0.0, token_ttl=4 * 3600, seed_alphas=20, check_fail_rate=0.1, datafields=120, seed=None):
+        """
+        Args:
+            latency (float): 每个请求的延迟中位数（秒），按对数正态分布抽样
+            latency_sigma (float): 延迟的对数标准差，越大长尾越重
+            sim_duration (float): 模拟耗时中位数（秒）
+            sim_sigma (float): 模拟耗时的对数标准差
+            check_duration (float): 提交前检查的耗时中位数（秒）
+            poll_hint (float): 轮询时Retry-After的最大值
+            max_concurrent_sims (int): 每个账号同时进行的模拟上限，超过返回429
+            max_inflight (int): 服务器同时处理的请求上限，超过返回429
+            rate_limit (float): 每个账号每秒请求数上限，0为不限制
+            throttle_rate (float): 随机返回429的比例
+            error_rate (float): 随机返回503的比例
+            token_ttl (float): 登录token的有效期（秒）
+            seed_alphas (int): 启动时预先生成的未提交alpha数量
+            check_fail_rate (float): 检查不通过的比例
+            datafields (int): 每个数据集的字段数量
+            seed (int, optional): 随机种子
+        """
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.sim_duration = sim_duration
+        self.sim_sigma = sim_sigma
+        self.check_duration = check_duration
+        self.poll_hint = poll_hint
+        self.max_concurrent_sims = max_concurrent_sims
+        self.max_inflight = max_inflight
+        self.rate_limit = rate_limit
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.token_ttl = token_ttl
+        self.check_fail_rate = check_fail_rate
+        self.datafields = datafields
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = {}
+        self.simulations = {}
+        self.alphas = {}
+        self.checks = {}
+        self.pnl_ready = set()
+        self.buckets = {}
+        # PnL由几个公共因子加噪声生成，主因子相同的alpha之间相关性高
+        self.pnl_dates = [f"{2018 + i // 250}-{1 + i % 250 // 21:02d}-{1 + i % 250 % 21:02d}"
+                          for i in range(1250)]
+        self.pnl_factors = [[self.random.gauss(0, 1) for _ in self.pnl_dates] for _ in range(4)]
+        self.inflight = 0
+        self.reset_stats()
+        for _ in range(seed_alphas):
+            self._new_alpha({'type': 'REGULAR', 'settings': {'decay': 0, 'region': 'USA'},
+                             'regular': f"rank(ts_delta(close, {self.random.randint(1, 250)}))"})
+
+    def reset_stats(self):
+        with self.lock:
+            self.started = time.monotonic()
+            self.requests = collections.defaultdict(collections.Counter)
+            self.wasted = collections.Counter()
+            self.latencies = collections.defaultdict(list)
+
+    def _sample(self, median, sigma):
+        if median <= 0:
+            return 0.0
+        with self.lock:
+            return median * math.exp(self.random.gauss(0, sigma))
+
+    def _new_alpha(self, payload):
+        rnd = self.random
+        alpha_id = uuid.uuid4().hex[:7].upper()
+        sharpe = round(rnd.uniform(1.3, 2.5), 2)
+        self.alphas[alpha_id] = {
+            'id': alpha_id,
+            'type': payload.get('type', 'REGULAR'),
+            'name': None,
+            'tags': [],
+            'color': None,
+            'status': 'UNSUBMITTED',
+            'dateCreated': _now_iso(),
+            'dateModified': _now_iso(),
+            'settings': dict({'decay': 0}, **(payload.get('settings') or {})),
+            'regular': {'code': payload.get('regular', '')},
+            'is': {
+                'sharpe': sharpe,
+                'fitness': round(rnd.uniform(1.0, 2.0), 2),
+                'turnover': round(rnd.uniform(0.05, 0.25), 4),
+                'margin': round(rnd.uniform(0.0005, 0.002), 6),
+                'longCount': rnd.randint(800, 1500),
+                'shortCount': rnd.randint(800, 1500),
+                'checks': [{'name': 'LOW_SHARPE', 'result': 'PASS', 'limit': 1.25, 'value': sharpe}],
+            },
+        }
+        return alpha_id
+
+    # ---------- 请求入口 ----------
+
+    def route(self, method, path):
+        for route_method, pattern, endpoint in ROUTES:
+            match = pattern.match(path)
+            if route_method == method and match:
+                return endpoint, match.groups()
+        return None, ()
+
+    def handle(self, method, path, query, headers, body, base_url):
+        """
+        处理一个请求
+
+        Returns:
+            tuple: (状态码, 响应头dict, JSON响应体或None)
+        """
+        endpoint, groups = self.route(method, path)
+        if endpoint is None:
+            return 404, {}, {'detail': 'Not found.'}
+        if endpoint == 'stats':
+            return 200, {}, self.stats()
+        if endpoint == 'reset':
+            self.reset_stats()
+            return 200, {}, {}
+
+        status, response_headers, payload = self._handle(endpoint, groups, query, headers, body, base_url)
+        with self.lock:
+            self.requests[endpoint][status] += 1
+            if status == 429:
+                self.wasted['throttled'] += 1
+            elif status >= 500:
+                self.wasted['server_errors'] += 1
+            elif status == 401:
+                self.wasted['unauthorized'] += 1
+        return status, response_headers, payload
+
+    def _handle(self, endpoint, groups, query, headers, body, base_url):
+        with self.lock:
+            if self.inflight >= self.max_inflight:
+                return 429, {'Retry-After': '1'}, {'detail': 'Too many requests.'}
+            self.inflight += 1
+        try:
+            time.sleep(self._sample(self.latency, self.latency_sigma))
+            if endpoint == 'authentication':
+                return self.on_authentication(headers)
+
+            user = self.authorize(headers)
+            if user is None:
+                return 401, {}, {'detail': 'Incorrect authentication credentials.'}
+            with self.lock:
+                roll = self.random.random()
+            if roll < self.throttle_rate:
+                return 429, {'Retry-After': '1'}, {'detail': 'Too many requests.'}
+            if roll < self.throttle_rate + self.error_rate:
+                return 503, {}, {'detail': 'Service unavailable.'}
+            retry_after = self._take_token(user)
+            if retry_after:
+                return 429, {'Retry-After': f"{retry_after:.2f}"}, {'detail': 'Rate limit exceeded.'}
+
+            params = dict(parse_qsl(query, keep_blank_values=True))
+            data = json.loads(body) if body else None
+            return getattr(self, 'on_' + endpoint)(user, *groups, params=params, data=data, base_url=base_url)
+        finally:
+            with self.lock:
+                self.inflight -= 1
+
+    def _take_token(self, user):
+        """每个账号一个令牌桶，返回需要等待的秒数，0表示放行"""
+        if not self.rate_limit:
+            return 0
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(user, (self.rate_limit, now))
+            tokens = min(self.rate_limit, tokens + (now - updated) * self.rate_limit)
+            if tokens < 1:
+                self.buckets[user] = (tokens, now)
+                return (1 - tokens) / self.rate_limit
+            self.buckets[user] = (tokens - 1, now)
+            return 0
+
+    # ---------- 登录 ----------
+
+    def on_authentication(self, headers):
+        auth = headers.get('Authorization', '')
+        if not auth.startswith('Basic '):
+            return 401, {}, {'detail': 'Authentication credentials were not provided.'}
+        user = base64.b64decode(auth[6:]).decode('utf-8', 'replace').split(':', 1)[0]
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.tokens[token] = (user, time.monotonic() + self.token_ttl)
+        return 201, {'Set-Cookie': f't={token}; Path=/'}, {
+            'user': {'id': user},
+            'token': {'expiry': self.token_ttl},
+            'permissions': ['TECHNICAL'],
+        }
+
+    def authorize(self, headers):
+        for part in headers.get('Cookie', '').split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == 't':
+                with self.lock:
+                    user, expires = self.tokens.get(value, (None, 0))
+                if time.monotonic() < expires:
+                    return user
+        return None
+
+    # ---------- 模拟 ----------
+
+    def on_simulations(self, user, params, data, base_url):
+        now = time.monotonic()
+        duration = self._sample(self.sim_duration, self.sim_sigma)
+        with self.lock:
+            active = sum(1 for sim in self.simulations.values() if sim['user'] == user and sim['done_at'] > now)
+            if active >= self.max_concurrent_sims:
+                return 429, {}, {'detail': 'CONCURRENT_SIMULATION_LIMIT_EXCEEDED'}
+            sim_id = uuid.uuid4().hex[:12]
+            self.simulations[sim_id] = {
+                'user': user, 'payload': data or {}, 'created': now, 'done_at': now + duration,
+                'next_poll': now, 'alpha': None, 'delivered': False,
+            }
+        return 201, {'Location': f"{base_url}/simulations/{sim_id}", 'Retry-After': '1.0'}, None
+
+    def on_simulation_progress(self, user, sim_id, params, data, base_url):
+        now = time.monotonic()
+        with self.lock:
+            sim = self.simulations.get(sim_id)
+            if sim is None:
+                return 404, {}, {'detail': 'Not found.'}
+            if now < sim['next_poll'] - 0.05:
+                self.wasted['early_polls'] += 1
+            if now < sim['done_at']:
+                retry_after = min(self.poll_hint, sim['done_at'] - now)
+                sim['next_poll'] = now + retry_after
+                progress = (now - sim['created']) / (sim['done_at'] - sim['created'])
+                # 不足0.01秒时也不能写成"0.00"：脚本把Retry-After为0当作模拟已结束
+                return 200, {'Retry-After': f"{max(retry_after, 0.01):.2f}"}, {'progress': round(progress, 2)}
+            if sim['alpha'] is None:
+                sim['alpha'] = self._new_alpha(sim['payload'])
+            if sim['delivered']:
+                self.wasted['duplicate_polls'] += 1
+            else:
+                sim['delivered'] = True
+                self.latencies['simulations'].append(now - sim['created'])
+            payload = sim['payload']
+        return 200, {}, {
+            'id': sim_id, 'type': payload.get('type', 'REGULAR'), 'status': 'COMPLETE',
+            'settings': payload.get('settings'), 'regular': payload.get('regular'), 'alpha': sim['alpha'],
+        }
+
+    # ---------- alpha ----------
+
+    def on_alpha(self, user, alpha_id, params, data, base_url):
+        with self.lock:
+            record = self.alphas.get(alpha_id)
+            if record is None:
+                return 404, {}, {'detail': 'Not found.'}
+            return 200, {}, dict(record)
+
+    def on_alpha_patch(self, user, alpha_id, params, data, base_url):
+        with self.lock:
+            record = self.alphas.get(alpha_id)
+            if record is None:
+                return 404, {}, {'detail': 'Not found.'}
+            for key in ('name', 'color', 'tags', 'category'):
+                if data and key in data:
+                    record[key] = data[key]
+            record['dateModified'] = _now_iso()
+            return 200, {}, dict(record)
+
+    def on_check(self, user, alpha_id, params, data, base_url):
+        now = time.monotonic()
+        with self.lock:
+            record = self.alphas.get(alpha_id)
+            if record is None:
+                return 404, {}, {'detail': 'Not found.'}
+            check = self.checks.get(alpha_id)
+            if check is None:
+                check = self.checks[alpha_id] = {
+                    'started': now, 'next_poll': now, 'delivered': False,
+                    'done_at': now + self.check_duration * math.exp(self.random.gauss(0, 0.3)),
+                    'passed': self.random.random() >= self.check_fail_rate,
+                    'self_correlation': round(self.random.uniform(0.1, 0.6), 4),
+                }
+            elif now < check['next_poll'] - 0.05:
+                self.wasted['early_polls'] += 1
+            if now < check['done_at']:
+                retry_after = min(self.poll_hint, check['done_at'] - now)
+                check['next_poll'] = now + retry_after
+                return 200, {'Retry-After': f"{max(retry_after, 0.01):.2f}"}, {}
+            if not check['delivered']:
+                check['delivered'] = True
+                self.latencies['checks'].append(now - check['started'])
+            checks = list(record['is']['checks']) + [{
+                'name': 'SELF_CORRELATION',
+                'result': 'PASS' if check['passed'] else 'FAIL',
+                'limit': 0.7,
+                'value': check['self_correlation'] if check['passed'] else 0.85,
+            }]
+        return 200, {}, {'is': {'checks': checks}}
+
+    def on_pnl(self, user, alpha_id, params, data, base_url):
+        with self.lock:
+            if alpha_id not in self.alphas:
+                return 404, {}, {'detail': 'Not found.'}
+            if alpha_id not in self.pnl_ready:
+                # 与真实接口一样，第一次请求时还在生成，按Retry-After再取
+                self.pnl_ready.add(alpha_id)
+                return 200, {'Retry-After': '0.2'}, None
+        rnd = random.Random(alpha_id)
+        main = rnd.randrange(len(self.pnl_factors))
+        weight = rnd.uniform(0.5, 2.0)
+        cumulative, records = 0.0, []
+        for i, date in enumerate(self.pnl_dates):
+            cumulative += 1000 * (weight * self.pnl_factors[main][i] + rnd.gauss(0, 1))
+            records.append([date, round(cumulative, 2)])
+        return 200, {}, {
+            'schema': {'name': 'pnl', 'title': 'PnL', 'properties': [
+                {'name': 'date', 'title': 'Date', 'type': 'date'},
+                {'name': 'pnl', 'title': 'PnL', 'type': 'amount'},
+            ]},
+            'records': records,
+        }
+
+    def on_submit(self, user, alpha_id, params, data, base_url):
+        now = time.monotonic()
+        with self.lock:
+            record = self.alphas.get(alpha_id)
+            if record is None:
+                return 404, {}, {'detail': 'Not found.'}
+            if record['status'] != 'UNSUBMITTED':
+                return 403, {}, {'detail': 'Alpha is already submitted.'}
+            record['status'] = 'ACTIVE'
+            record['dateModified'] = _now_iso()
+            check = self.checks.get(alpha_id)
+            self.latencies['submits'].append(now - check['started'] if check else 0.0)
+        return 201, {}, None
+
+    def on_alpha_list(self, user, params, data, base_url):
+        limit = int(params.get('limit', 100))
+        offset = int(params.get('offset', 0))
+        statuses = set(params['status'].split('\x1f')) if params.get('status') else None
+        # 只支持增量同步用到的 dateModified>/< 过滤和按dateModified/dateCreated排序
+        after, before = params.get('dateModified>'), params.get('dateModified<')
+        with self.lock:
+            records = [dict(record) for record in self.alphas.values()
+                       if (statuses is None or record['status'] in statuses)
+                       and (after is None or record['dateModified'] >= after)
+                       and (before is None or record['dateModified'] < before)]
+        order = params.get('order', '')
+        if order.lstrip('-') in ('dateModified', 'dateCreated'):
+            records.sort(key=lambda record: record[order.lstrip('-')], reverse=order.startswith('-'))
+        return 200, {}, {'count': len(records), 'results': records[offset:offset + limit]}
+
+    def on_data_fields(self, user, params, data, base_url):
+        dataset_id = params.get('dataset.id') or 'dataset'
+        limit = int(params.get('limit', 50))
+        offset = int(params.get('offset', 0))
+        search = params.get('search', '')
+        fields = [{
+            'id': f"{dataset_id}_field_{i}",
+            'description': f"Field {i} of {dataset_id}",
+            'dataset': {'id': dataset_id, 'name': dataset_id},
+            'region': params.get('region', 'USA'),
+            'delay': int(params.get('delay', 1)),
+            'universe': params.get('universe', 'TOP3000'),
+            'type': 'VECTOR' if i % 5 == 4 else 'MATRIX',
+            'coverage': 0.9,
+            'userCount': 0,
+            'alphaCount': 0,
+        } for i in range(self.datafields)]
+        if search:
+            fields = [field for field in fields if search in field['id']]
+        return 200, {}, {'count': len(fields), 'results': fields[offset:offset + limit]}
+
+    # ---------- 统计 ----------
+
+    def stats(self):
+        """服务器侧统计：各接口的状态码分布、完成数量、端到端延迟分位数和浪费的请求"""
+        with self.lock:
+            latency = {}
+            for kind, values in self.latencies.items():
+                latency[kind] = {
+                    'count': len(values),
+                    'p50': percentile(values, 0.5),
+                    'p99': percentile(values, 0.99),
+                }
+            return {
+                'elapsed': time.monotonic() - self.started,
+                'requests': {endpoint: dict(counter) for endpoint, counter in self.requests.items()},
+                'total_requests': sum(sum(counter.values()) for counter in self.requests.values()),
+                'wasted': dict(self.wasted),
+                'latency': latency,
+            }
+
+
+class MockBrainHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _dispatch(self):
+        parsed = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        base_url = f"http://{self.headers.get('Host') or '%s:%d' % self.server.server_address[:2]}"
+        status, headers, payload = self.server.brain.handle(self.command, parsed.path, parsed.query,
+                                                            self.headers, body, base_url)
+        data = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if data:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PATCH = _dispatch
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockBrainServer:
+    """在后台线程运行的替身服务器"""
+
+    def __init__(self, host='127.0.0.1', port=0, **config):
+        """
+        Args:
+            host (str): 监听地址
+            port (int): 端口，0为自动分配
+            **config: 传给MockBrain的配置
+        """
+        self.brain = MockBrain(**config)
+        self.httpd = ThreadingHTTPServer((host, port), MockBrainHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.brain = self.brain
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self):
+        return self.brain.stats()
+
+
+def add_server_arguments(parser):
+    """mock_server和benchmark共用的服务器参数"""
+    parser.add_argument('--latency', type=float, default=0.05, help='请求延迟中位数（秒）')
+    parser.add_argument('--latency_sigma', type=float, default=0.5, help='请求延迟的对数标准差')
+    parser.add_argument('--sim_duration', type=float, default=3.0, help='模拟耗时中位数（秒）')
+    parser.add_argument('--sim_sigma', type=float, default=0.3, help='模拟耗时的对数标准差')
+    parser.add_argument('--check_duration', type=float, default=1.0, help='检查耗时中位数（秒）')
+    parser.add_argument('--poll_hint', type=float, default=2.0, help='轮询Retry-After的最大值（秒）')
+    parser.add_argument('--max_concurrent_sims', type=int, default=10, help='每个账号的并发模拟上限')
+    parser.add_argument('--max_inflight', type=int, default=64, help='服务器同时处理的请求上限')
+    parser.add_argument('--rate_limit', type=float, default=0.0, help='每个账号每秒请求数上限，0为不限制')
+    parser.add_argument('--throttle_rate', type=float, default=0.0, help='随机429的比例')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='随机503的比例')
+    parser.add_argument('--token_ttl', type=float, default=4 * 3600, help='登录token有效期（秒）')
+    parser.add_argument('--seed_alphas', type=int, default=20, help='预先生成的未提交alpha数量')
+    parser.add_argument('--check_fail_rate', type=float, default=0.1, help='检查不通过的比例')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+
+
+def server_config(args):
+    names = ['latency', 'latency_sigma', 'sim_duration', 'sim_sigma', 'check_duration', 'poll_hint',
+             'max_concurrent_sims', 'max_inflight', 'rate_limit', 'throttle_rate', 'error_rate', 'token_ttl',
+             'seed_alphas', 'check_fail_rate', 'seed']
+    return {name: getattr(args, name) for name in names}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local BRAIN API stand-in')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8765, help='端口')
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockBrainServer(args.host, args.port, **server_config(args))
+    print(f"Mock BRAIN API listening on {server.url}, stats at {server.url}/__stats")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
@@ -0,0 +1,112 @@
+"""
+按offset分页的列表接口的并发读取
+先取第一页，按返回的count算出其余的offset，再用线程池并发获取（请求经过共享限流器），
+按offset顺序合并；没有count时逐页读取，直到某一页不满为止。
+有分页获取失败时抛出PageFetchError，不返回缺页的不完整结果。
+
+例:
+    def fetch(url):
+        response, _ = requests_wq(sess, 'get', url)
+        return response.json()
+
+    alphas = fetch_pages(fetch, "https://api.worldquantbrain.com/users/self/alphas?limit=100&offset={offset}",
+                         page_size=100, max_items=10000)
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PageFetchError(RuntimeError):
+    """有分页获取失败，offsets为失败的offset，results为已经获取到的部分（不完整，不要据此筛选或提交）"""
+
+    def __init__(self, url_template, offsets, results):
+        self.url_template = url_template
+        self.offsets = list(offsets)
+        self.results = results
+        super().__init__(f"Failed to fetch {len(self.offsets)} page(s) at offset {self.offsets} of {url_template}")
+
+
+def page_offsets(count, page_size, max_items=None):
+    """
+    第一页之后需要获取的offset
+
+    Args:
+        count (int): 服务器返回的总数
+        page_size (int): 每页数量（与URL中的limit一致）
+        max_items (int, optional): 最多读取的数量
+
+    Returns:
+        range: offset序列
+    """
+    end = count if max_items is None else min(count, max_items)
+    return range(page_size, end, page_size)
+
+
+def fetch_pages(fetch, url_template, page_size=100, max_items=None, max_workers=8):
+    """
+    读取列表接口的所有分页
+
+    Args:
+        fetch (callable): fetch(url) -> 解析后的JSON（含results，最好含count），失败时返回None
+        url_template (str): 含{offset}占位符的URL
+        page_size (int): 每页数量（与URL中的limit一致）
+        max_items (int, optional): 最多读取的数量，None表示读到末尾
+        max_workers (int): 并发获取分页的线程数
+
+    Returns:
+        list: 按offset顺序合并的results
+
+    Raises:
+        PageFetchError: 有分页获取失败（fetch返回None），失败的offset已写入日志
+    """
+    first = fetch(url_template.format(offset=0))
+    if first is None:
+        _fail(url_template, [0], [])
+    results = list(first.get('results') or [])
+    if len(results) < page_size:
+        return results[:max_items]
+    if 'count' not in first:
+        return _fetch_sequential(fetch, url_template, results, page_size, max_items)
+
+    offsets = page_offsets(first['count'], page_size, max_items)
+    if len(offsets):
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(offsets)))) as executor:
+            pages = list(executor.map(lambda offset: fetch(url_template.format(offset=offset)), offsets))
+        # 先检查所有分页：不满的一页之后的分页失败同样算缺页
+        failed = [offset for offset, page in zip(offsets, pages) if page is None]
+        short = None
+        for offset, page in zip(offsets, pages):
+            if page is None:
+                continue
+            page_results = page.get('results') or []
+            if short is not None:
+                if page_results:
+                    logging.warning(f"Dropped {len(page_results)} results at offset {offset} after the short page "
+                                    f"at offset {short} of {url_template}")
+                continue
+            results.extend(page_results)
+            # 分页期间有alpha被删除或隐藏时，末尾几页可能为空或不满，到此为止
+            if len(page_results) < page_size:
+                short = offset
+        if failed:
+            _fail(url_template, failed, results[:max_items])
+    return results[:max_items]
+
+
+def _fail(url_template, offsets, results):
+    logging.error(f"Failed to fetch pages at offset {offsets} of {url_template}")
+    raise PageFetchError(url_template, offsets, results)
+
+
+def _fetch_sequential(fetch, url_template, results, page_size, max_items):
+    offset = page_size
+    while max_items is None or offset < max_items:
+        page = fetch(url_template.format(offset=offset))
+        if page is None:
+            _fail(url_template, [offset], results[:max_items])
+        page_results = page.get('results') or []
+        results.extend(page_results)
+        if len(page_results) < page_size:
+            break
+        offset += page_size
+    return results[:max_items]
@@ -0,0 +1,255 @@
+"""
+列式的模拟请求批次
+一批alpha的表达式放在一个列表里，settings按预设(preset)去重后只保存一份，
+请求体JSON在发送时才拼接（也可以提前编码成bytes），不再为每个alpha保存一份settings字典
+"""
+import itertools
+import json
+from array import array
+
+
+DEFAULT_SETTINGS = {
+    "instrumentType": "EQUITY",
+    "region": "USA",
+    "universe": "TOP3000",
+    "delay": 1,
+    "decay": 6,
+    "neutralization": "SUBINDUSTRY",
+    "truncation": 0.08,
+    "pasteurization": "ON",
+    "unitHandling": "VERIFY",
+    "nanHandling": "ON",
+    "language": "FASTEXPR",
+    "visualization": False,
+}
+
+# 用data=发送预先编码的请求体时需要的请求头
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+_encode_string = json.encoder.encode_basestring_ascii
+
+
+class SimulationPayload(dict):
+    """
+    单个alpha的模拟数据，行为与create_simulation_data返回的字典一致，
+    额外带有拼好的请求体body(bytes)。body在创建时生成，之后不要再修改字典内容。
+    """
+    __slots__ = ('body',)
+
+
+class SettingsPresets:
+    """
+    settings预设表：合并默认值后相同的settings只保存一份，并缓存它的JSON片段和CSV文本。
+    多个批次可以共用一个预设表。
+    """
+
+    def __init__(self):
+        self.settings = []
+        self._json = []
+        self._text = []
+        self._ids = {}
+
+    def __len__(self):
+        return len(self.settings)
+
+    def intern(self, settings=None):
+        """
+        登记一组settings
+
+        Args:
+            settings (dict, optional): 自定义设置，会先合并DEFAULT_SETTINGS
+
+        Returns:
+            int: 预设id
+        """
+        key = _settings_key(settings)
+        preset_id = self._ids.get(key)
+        if preset_id is None:
+            merged = dict(DEFAULT_SETTINGS)
+            if settings:
+                merged.update(settings)
+            # 合并后相同的settings（例如显式写出了默认值）共用一个预设
+            merged_key = _settings_key(merged)
+            preset_id = self._ids.get(merged_key)
+            if preset_id is None:
+                preset_id = len(self.settings)
+                self.settings.append(merged)
+                self._json.append(b'{"type":"REGULAR","settings":'
+                                  + json.dumps(merged, separators=(',', ':')).encode() + b',"regular":')
+                self._text.append(str(merged))
+                self._ids[merged_key] = preset_id
+            self._ids[key] = preset_id
+        return preset_id
+
+    def body(self, expression, preset_id):
+        """拼接请求体"""
+        return self._json[preset_id] + _encode_string(expression).encode() + b'}'
+
+    def text(self, preset_id):
+        """save_alphas_to_csv写入settings列的文本（字典字符串）"""
+        return self._text[preset_id]
+
+    def payload(self, expression, preset_id, body=None):
+        """
+        生成单个alpha的模拟数据
+
+        Returns:
+            SimulationPayload: 模拟数据
+        """
+        payload = SimulationPayload(type="REGULAR", settings=dict(self.settings[preset_id]), regular=expression)
+        payload.body = body if body is not None else self.body(expression, preset_id)
+        return payload
+
+
+class PayloadBatch:
+    """
+    一批模拟数据的列式表示
+
+    表达式保存在expressions列表中，每个alpha只额外占用一个预设id（array中的2字节）。
+    下标访问和迭代时才生成SimulationPayload；bodies()直接产出请求体bytes，不经过字典。
+
+    例:
+        batch = PayloadBatch(expressions, settings={'truncation': 0.01})
+        batch.extend(other_expressions, settings={'decay': 0})
+        simulator.simulate_batch(batch)
+    """
+
+    def __init__(self, expressions=(), settings=None, presets=None):
+        """
+        Args:
+            expressions (iterable): 表达式
+            settings (dict, optional): 这些表达式共用的自定义设置
+            presets (SettingsPresets, optional): 共用的预设表，默认新建一个
+        """
+        self.presets = presets if presets is not None else SettingsPresets()
+        self.expressions = []
+        self.preset_ids = array('H')
+        self._bodies = None
+        if expressions:
+            self.extend(expressions, settings)
+
+    @classmethod
+    def from_alphas(cls, alphas, presets=None):
+        """
+        从create_simulation_data格式的字典转换
+
+        Args:
+            alphas (iterable): 模拟数据字典
+            presets (SettingsPresets, optional): 共用的预设表
+
+        Returns:
+            PayloadBatch: 批次
+        """
+        batch = cls(presets=presets)
+        for alpha in alphas:
+            batch.append(alpha['regular'], alpha.get('settings'))
+        return batch
+
+    def __len__(self):
+        return len(self.expressions)
+
+    def __repr__(self):
+        return f"PayloadBatch(len={len(self)}, presets={len(self.presets)})"
+
+    def append(self, expression, settings=None):
+        self.expressions.append(expression)
+        self.preset_ids.append(self.presets.intern(settings))
+        self._bodies = None
+
+    def extend(self, expressions, settings=None):
+        """追加一批使用相同settings的表达式"""
+        preset_id = self.presets.intern(settings)
+        before = len(self.expressions)
+        self.expressions.extend(expressions)
+        self.preset_ids.extend(array('H', [preset_id]) * (len(self.expressions) - before))
+        self._bodies = None
+
+    def settings_at(self, index):
+        """第index个alpha的settings（预设表中的共享字典，只读）"""
+        return self.presets.settings[self.preset_ids[index]]
+
+    def body(self, index):
+        """第index个alpha的请求体"""
+        if self._bodies is not None:
+            return self._bodies[index]
+        return self.presets.body(self.expressions[index], self.preset_ids[index])
+
+    def bodies(self):
+        """
+        逐个产出请求体
+
+        Yields:
+            bytes: JSON请求体
+        """
+        if self._bodies is not None:
+            yield from self._bodies
+            return
+        body = self.presets.body
+        for expression, preset_id in zip(self.expressions, self.preset_ids):
+            yield body(expression, preset_id)
+
+    def encode(self):
+        """
+        提前把所有请求体编码成bytes（发送阶段不再拼接，换取内存）
+
+        Returns:
+            PayloadBatch: self
+        """
+        self._bodies = list(self.bodies())
+        return self
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            batch = PayloadBatch(presets=self.presets)
+            batch.expressions = self.expressions[index]
+            batch.preset_ids = self.preset_ids[index]
+            if self._bodies is not None:
+                batch._bodies = self._bodies[index]
+            return batch
+        return self.presets.payload(self.expressions[index], self.preset_ids[index],
+                                    self._bodies[index] if self._bodies is not None else None)
+
+    def __iter__(self):
+        payload = self.presets.payload
+        bodies = self._bodies if self._bodies is not None else itertools.repeat(None)
+        for expression, preset_id, body in zip(self.expressions, self.preset_ids, bodies):
+            yield payload(expression, preset_id, body)
+
+    def csv_rows(self):
+        """
+        save_alphas_to_csv的行（type, settings, regular），settings文本按预设缓存
+
+        Yields:
+            tuple: 一行
+        """
+        text = self.presets.text
+        for expression, preset_id in zip(self.expressions, self.preset_ids):
+            yield "REGULAR", text(preset_id), expression
+
+
+def payload_body(alpha):
+    """
+    模拟数据的JSON请求体，PayloadBatch产出的alpha直接使用拼好的body
+
+    Args:
+        alpha (dict): 模拟数据
+
+    Returns:
+        bytes: 请求体，与JSON_HEADERS一起以data=发送
+    """
+    body = getattr(alpha, 'body', None)
+    if body is None:
+        body = json.dumps(alpha).encode()
+    return body
+
+
+def _settings_key(settings):
+    if not settings:
+        return ()
+    try:
+        key = tuple(sorted(settings.items()))
+        # 值为列表/字典时可以排序但不能哈希，同样改用JSON字符串
+        hash(key)
+        return key
+    except TypeError:
+        return json.dumps(settings, sort_keys=True)
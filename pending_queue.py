@@ -0,0 +1,268 @@
+"""
+持久化的待模拟alpha队列（SQLite）
+取出(claim)和确认(ack)都是常数时间，进程崩溃后未确认的alpha会被重新投递
+"""
+import ast
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+
+class QueuedAlpha(dict):
+    """从队列取出的alpha，行为与普通的simulation_data字典一致，额外带有队列中的id和原始JSON请求体"""
+    __slots__ = ('queue_id', 'body')
+
+
+class PendingQueue:
+    """
+    待模拟alpha队列
+
+    每个alpha以JSON保存一行。claim时给一批alpha加上租约(lease)，模拟请求发出后ack删除；
+    租约到期仍未ack的alpha会在下一次claim时重新取出，进程重启后也不会丢失。
+    """
+
+    def __init__(self, db_path='alpha_list_pending_simulated.db', lease_seconds=3600):
+        """
+        Args:
+            db_path (str): SQLite文件路径
+            lease_seconds (float): 租约时长，超过后未ack的alpha重新投递
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS pending (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                lease_owner TEXT,
+                lease_until REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_pending_lease ON pending(lease_until, id);
+            CREATE INDEX IF NOT EXISTS idx_pending_owner ON pending(lease_owner);
+            CREATE TABLE IF NOT EXISTS imports (
+                path TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL
+            );
+        """)
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def count_available(self):
+        """未被租用（或租约已过期）的alpha数量"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM pending WHERE lease_until IS NULL OR lease_until < ?",
+                (time.time(),)).fetchone()[0]
+
+    def put_many(self, alpha_list):
+        """
+        批量加入队列
+
+        Args:
+            alpha_list (iterable): simulation_data字典
+
+        Returns:
+            int: 加入的数量
+        """
+        # PayloadBatch产出的alpha已经带有拼好的JSON，直接入队
+        rows = [(alpha.body.decode() if getattr(alpha, 'body', None) is not None
+                 else json.dumps(alpha, ensure_ascii=False),) for alpha in alpha_list]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("INSERT INTO pending (payload) VALUES (?)", rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def put(self, alpha):
+        return self.put_many([alpha])
+
+    def claim(self, batch_size=50, owner=''):
+        """
+        取出最多batch_size个alpha并加上租约
+
+        Args:
+            batch_size (int): 数量
+            owner (str): 租约持有者，一般为账号名，重启时用于release_owner
+
+        Returns:
+            list: QueuedAlpha列表，按入队顺序
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 租约过期的先放回可用状态，走(lease_until, id)索引，只扫描过期的行
+                self._conn.execute(
+                    "UPDATE pending SET lease_until = NULL, lease_owner = NULL "
+                    "WHERE lease_until IS NOT NULL AND lease_until < ?", (now,))
+                rows = self._conn.execute(
+                    "SELECT id, payload FROM pending WHERE lease_until IS NULL ORDER BY id LIMIT ?",
+                    (batch_size,)).fetchall()
+                self._conn.executemany(
+                    "UPDATE pending SET lease_until = ?, lease_owner = ? WHERE id = ?",
+                    [(now + self.lease_seconds, owner, row[0]) for row in rows])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        alphas = []
+        for queue_id, payload in rows:
+            alpha = QueuedAlpha(json.loads(payload))
+            alpha.queue_id = queue_id
+            alpha.body = payload.encode()
+            alphas.append(alpha)
+        return alphas
+
+    def ack(self, alphas):
+        """确认已处理（模拟请求已发出或已记入失败文件），从队列删除"""
+        ids = [(alpha.queue_id,) for alpha in alphas if getattr(alpha, 'queue_id', None) is not None]
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM pending WHERE id = ?", ids)
+
+    def release(self, alphas):
+        """放弃租约，alpha立即可以被再次claim"""
+        ids = [(alpha.queue_id,) for alpha in alphas if getattr(alpha, 'queue_id', None) is not None]
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE pending SET lease_until = NULL, lease_owner = NULL WHERE id = ?", ids)
+
+    def release_owner(self, owner):
+        """
+        释放某个持有者的全部租约。进程重启时调用，上次取出但未ack的alpha立即重新投递。
+
+        Returns:
+            int: 释放的数量
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE pending SET lease_until = NULL, lease_owner = NULL WHERE lease_owner = ?", (owner,))
+            return cursor.rowcount
+
+    def import_csv(self, filename='alpha_list_pending_simulated.csv', chunk_size=10000):
+        """
+        导入helper.save_alphas_to_csv写出的CSV（表头 type,settings,regular，settings为字典字符串）。
+        记录已导入到的字节位置，CSV继续追加后再次调用只导入新增的行。
+
+        Args:
+            filename (str): CSV文件路径
+            chunk_size (int): 每次事务写入的行数
+
+        Returns:
+            int: 本次导入的数量
+        """
+        if not os.path.isfile(filename):
+            return 0
+        path = os.path.abspath(filename)
+        with self._lock:
+            row = self._conn.execute("SELECT offset FROM imports WHERE path = ?", (path,)).fetchone()
+        offset = row[0] if row else 0
+        if offset > os.path.getsize(filename):
+            # 文件被重写过，从头导入
+            offset = 0
+
+        imported = 0
+        with open(filename, 'r', newline='') as file:
+            header = file.readline()
+            fieldnames = next(csv.reader([header]))
+            if offset == 0:
+                offset = file.tell()
+            file.seek(offset)
+            chunk = []
+            chunk_start = offset
+            # 逐行读取以便记录字节位置，不使用csv的多行字段
+            for line in iter(file.readline, ''):
+                if not line.endswith('\n'):
+                    # 写了一半的最后一行，等下次再导入
+                    break
+                offset += len(line.encode())
+                values = next(csv.reader([line]), None)
+                if not values:
+                    continue
+                alpha = dict(zip(fieldnames, values))
+                if isinstance(alpha.get('settings'), str):
+                    try:
+                        alpha['settings'] = ast.literal_eval(alpha['settings'])
+                    except (ValueError, SyntaxError):
+                        print(f"Error evaluating settings: {alpha['settings']}")
+                        continue
+                chunk.append(alpha)
+                if len(chunk) >= chunk_size:
+                    count = self._import_chunk(path, chunk, chunk_start, offset)
+                    if count is None:
+                        return imported
+                    imported += count
+                    chunk = []
+                    chunk_start = offset
+            imported += self._import_chunk(path, chunk, chunk_start, offset) or 0
+        return imported
+
+    def import_store(self, store_path):
+        """
+        导入alpha_store.PendingStore目录中新增的分片（分片写完后不再改变，按文件记录是否已导入）
+
+        Args:
+            store_path (str): PendingStore目录
+
+        Returns:
+            int: 本次导入的数量
+        """
+        from alpha_store import PendingStore
+
+        store = PendingStore(store_path)
+        imported = 0
+        for part in store.parts():
+            path = os.path.abspath(part)
+            with self._lock:
+                if self._conn.execute("SELECT 1 FROM imports WHERE path = ?", (path,)).fetchone():
+                    continue
+            # 整个分片在一个事务里导入，offset记为1表示已导入
+            count = self._import_chunk(path, list(store.iter_alphas(parts=[part])), 0, 1)
+            imported += count or 0
+        return imported
+
+    def _import_chunk(self, path, chunk, start, offset):
+        rows = [(json.dumps(alpha, ensure_ascii=False),) for alpha in chunk]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 其他进程已经导入过这一段（多个账号共用一个CSV时），放弃本次导入
+                row = self._conn.execute("SELECT offset FROM imports WHERE path = ?", (path,)).fetchone()
+                if row and row[0] > start:
+                    self._conn.execute("ROLLBACK")
+                    return None
+                self._conn.executemany("INSERT INTO pending (payload) VALUES (?)", rows)
+                self._conn.execute("INSERT OR REPLACE INTO imports (path, offset) VALUES (?, ?)", (path, offset))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+
+if __name__ == "__main__":
+    # 用法: python pending_queue.py alpha_list_pending_simulated.csv [alpha_list_pending_simulated.db]
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else 'alpha_list_pending_simulated.csv'
+    db_path = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(csv_path)[0] + '.db'
+    queue = PendingQueue(db_path)
+    print(f"Imported {queue.import_csv(csv_path)} alphas from {csv_path}, {len(queue)} pending in {db_path}")
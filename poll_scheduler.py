@@ -0,0 +1,125 @@
+"""
+模拟进度轮询调度器
+按服务器返回的Retry-After安排下一次轮询时间，用最小堆保存所有在跑的模拟
+"""
+import heapq
+import itertools
+import random
+import time
+
+
+def parse_retry_after(value):
+    """
+    解析Retry-After响应头
+
+    Args:
+        value (str | float | None): 响应头的原始值
+
+    Returns:
+        float: 需要等待的秒数，没有该响应头或值为0时返回0.0
+    """
+    if value is None:
+        return 0.0
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class PollScheduler:
+    """
+    以下一次到期时间为键的最小堆。
+    只在有URL到期时才需要唤醒，避免每一轮把所有在跑的模拟都GET一遍。
+    """
+
+    def __init__(self, default_delay=3.0, min_delay=0.5, max_delay=120.0, jitter=0.1):
+        """
+        Args:
+            default_delay (float): 服务器没有给出Retry-After时的轮询间隔
+            min_delay (float): 最短轮询间隔
+            max_delay (float): 最长轮询间隔
+            jitter (float): 在等待时间上随机增加的比例，错开同一时刻提交的模拟
+        """
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, url):
+        return url in self._entries
+
+    def schedule(self, url, retry_after=None, now=None):
+        """
+        安排url的下一次轮询。已在堆中的url会被重新安排。
+
+        Args:
+            url (str): 模拟进度URL
+            retry_after (float, optional): 服务器给出的等待秒数. Defaults to None.
+            now (float, optional): 当前时间(time.monotonic). Defaults to None.
+
+        Returns:
+            float: 下一次轮询的时间点
+        """
+        if now is None:
+            now = time.monotonic()
+        delay = retry_after if retry_after else self.default_delay
+        delay = min(max(delay, self.min_delay), self.max_delay)
+        # 只往后加抖动，不会早于服务器要求的时间
+        delay *= 1 + random.uniform(0, self.jitter)
+        due = now + delay
+        entry = [due, next(self._counter), url]
+        old = self._entries.pop(url, None)
+        if old is not None:
+            old[2] = None
+        self._entries[url] = entry
+        heapq.heappush(self._heap, entry)
+        return due
+
+    def remove(self, url):
+        """从调度中移除url（惰性删除，出堆时跳过）"""
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            entry[2] = None
+
+    def _drop_removed(self):
+        while self._heap and self._heap[0][2] is None:
+            heapq.heappop(self._heap)
+
+    def next_due_in(self, now=None):
+        """
+        距离最早一个url到期还有多少秒
+
+        Returns:
+            float: 秒数，已到期返回0.0，堆为空返回None
+        """
+        self._drop_removed()
+        if not self._heap:
+            return None
+        if now is None:
+            now = time.monotonic()
+        return max(self._heap[0][0] - now, 0.0)
+
+    def pop_due(self, now=None):
+        """
+        取出所有已到期的url，取出后不再调度，需要继续轮询时重新schedule
+
+        Returns:
+            list: 到期的url列表，按到期时间排序
+        """
+        if now is None:
+            now = time.monotonic()
+        due_urls = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            url = entry[2]
+            if url is None:
+                continue
+            del self._entries[url]
+            due_urls.append(url)
+        return due_urls
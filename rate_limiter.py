@@ -0,0 +1,195 @@
+"""
+进程内共享的自适应限流器
+按接口类别（模拟、alpha列表、检查、提交）各用一个令牌桶，
+收到429时速率乘性下降，成功时加性上升(AIMD)，让请求速率贴近服务器的实际限制。
+会话设置了rate_limit_account时（账号池里的账号）按 (账号, 类别) 分桶，一个账号被限流不影响其他账号。
+"""
+import threading
+import time
+from urllib.parse import urlparse
+
+from poll_scheduler import parse_retry_after
+
+
+# 各类接口的初始速率、最低速率、最高速率（每秒请求数）
+DEFAULT_LIMITS = {
+    'simulations': {'rate': 2.0, 'min_rate': 0.05, 'max_rate': 20.0},
+    'polls': {'rate': 5.0, 'min_rate': 0.1, 'max_rate': 20.0},
+    'alphas': {'rate': 4.0, 'min_rate': 0.1, 'max_rate': 20.0},
+    'check': {'rate': 1.0, 'min_rate': 0.05, 'max_rate': 5.0},
+    'submit': {'rate': 0.2, 'min_rate': 0.01, 'max_rate': 1.0},
+    'datafields': {'rate': 5.0, 'min_rate': 0.1, 'max_rate': 20.0},
+    'default': {'rate': 2.0, 'min_rate': 0.1, 'max_rate': 10.0},
+}
+
+
+def endpoint_class(url):
+    """
+    根据URL判断接口类别
+
+    Returns:
+        str: simulations（发起模拟） / polls（轮询模拟进度） / check / submit / alphas / datafields / default
+    """
+    path = urlparse(url).path.rstrip('/')
+    if path == '/simulations':
+        return 'simulations'
+    if path.startswith('/simulations/'):
+        # 轮询与发起模拟分开限流，轮询被限流时不会拖慢新的模拟
+        return 'polls'
+    if path.endswith('/check'):
+        return 'check'
+    if path.endswith('/submit'):
+        return 'submit'
+    if path.startswith('/alphas') or path.startswith('/users/self/alphas'):
+        return 'alphas'
+    if path.startswith('/data-fields'):
+        return 'datafields'
+    return 'default'
+
+
+class TokenBucket:
+    """
+    AIMD令牌桶：每次成功速率加increase，每次限流速率乘decrease。
+    同一时间窗口内的多个429只下调一次，避免并发请求同时被限流时速率被压到最低。
+    """
+
+    def __init__(self, rate, min_rate, max_rate, burst=None, increase=0.05, decrease=0.5):
+        """
+        Args:
+            rate (float): 初始速率（每秒请求数）
+            min_rate (float): 最低速率
+            max_rate (float): 最高速率
+            burst (float, optional): 桶容量，默认为1秒的令牌数且不少于1
+            increase (float): 每次成功增加的速率
+            decrease (float): 每次限流时速率乘以的系数
+        """
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def _capacity(self):
+        return self.burst if self.burst is not None else max(self.rate, 1.0)
+
+    def _refill(self, now):
+        self._tokens = min(self._capacity(), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """取一个令牌，不够时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after=None):
+        """
+        收到429
+
+        Args:
+            retry_after (float, optional): 服务器给出的等待秒数，整个桶暂停这么久
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease > 1.0 / self.rate:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._last_decrease = now
+            self._refill(now)
+            self._tokens = 0.0
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+
+class RateLimiter:
+    """按接口类别（以及可选的账号）分桶的限流器，一个进程里所有线程和账号共用一个实例"""
+
+    def __init__(self, limits=None):
+        self.limits = dict(DEFAULT_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, name, account=None):
+        """
+        Args:
+            name (str): 接口类别
+            account (str, optional): 账号，指定时该账号单独一个桶，否则所有账号共用
+        """
+        key = name if account is None else (account, name)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(**self.limits.get(name, self.limits['default']))
+                self._buckets[key] = bucket
+            return bucket
+
+    def acquire(self, url, account=None):
+        self.bucket(endpoint_class(url), account).acquire()
+
+    def record(self, url, response, account=None):
+        """根据响应调整对应类别（和账号）的速率"""
+        bucket = self.bucket(endpoint_class(url), account)
+        if response.status_code == 429:
+            bucket.on_throttle(parse_retry_after(response.headers.get('Retry-After')))
+        elif response.status_code < 400:
+            bucket.on_success()
+
+    def rates(self):
+        """当前各类别的速率，方便打印和记录日志"""
+        with self._lock:
+            return {key if isinstance(key, str) else '/'.join(key): round(bucket.rate, 3)
+                    for key, bucket in self._buckets.items()}
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """进程内共享的限流器"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter()
+        return _shared_limiter
+
+
+def limited_request(session, method, url, **kwargs):
+    """
+    经过共享限流器发送请求
+
+    Args:
+        session (requests.Session): 会话
+        method (str): get / post / patch ...
+        url (str): 请求地址
+        **kwargs: 传给session.request的参数
+
+    Returns:
+        requests.Response: 响应，429时限流器已经记下退避时间，调用方直接重试即可
+    """
+    limiter = get_rate_limiter()
+    account = getattr(session, 'rate_limit_account', None)
+    limiter.acquire(url, account)
+    response = session.request(method.upper(), url, **kwargs)
+    limiter.record(url, response, account)
+    return response
@@ -0,0 +1,166 @@
+"""
+模拟结果缓存
+以模拟请求内容(type + settings + regular)的规范化哈希为键，记录已经发出或已经完成的模拟，
+避免重跑脚本时把同一个表达式和设置再模拟一遍
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from fastexpr import FastExprError, canonicalize
+
+
+def payload_key(alpha):
+    """
+    计算模拟请求的规范化哈希
+
+    字典键排序、表达式按FASTEXPR规范形式哈希，settings中键的顺序不同或表达式写法不同
+    （空白、多余括号、rank(rank(x))、交换律参数顺序）也视为同一个请求。
+
+    Args:
+        alpha (dict): create_simulation_data生成的模拟数据
+
+    Returns:
+        str: sha256十六进制字符串
+    """
+    regular = str(alpha.get('regular', ''))
+    try:
+        regular = canonicalize(regular)
+    except FastExprError:
+        regular = ' '.join(regular.split())
+    canonical = {
+        'type': alpha.get('type', 'REGULAR'),
+        'settings': alpha.get('settings') or {},
+        'regular': regular,
+    }
+    data = json.dumps(canonical, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    本地模拟结果缓存（SQLite）
+
+    每个请求有两种状态：已发出（只有location）和已完成（有alpha_id和结果）。
+    """
+
+    def __init__(self, db_path='simulation_cache.db'):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                regular TEXT,
+                location TEXT,
+                alpha_id TEXT,
+                status TEXT,
+                result TEXT,
+                updated REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_location ON results(location)")
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def __contains__(self, alpha):
+        return self.get(alpha) is not None
+
+    def get(self, alpha):
+        """
+        查询缓存
+
+        Args:
+            alpha (dict): 模拟数据
+
+        Returns:
+            dict: {'location', 'alpha_id', 'status', 'result', 'updated'}，没有记录时返回None。
+                  result为/alphas/{id}返回的完整记录（含指标），只拿到alpha_id时为None；
+                  updated为最后写入的时间戳
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT location, alpha_id, status, result, updated FROM results WHERE key = ?",
+                (payload_key(alpha),)).fetchone()
+        if row is None:
+            return None
+        location, alpha_id, status, result, updated = row
+        return {
+            'location': location,
+            'alpha_id': alpha_id,
+            'status': status,
+            'result': json.loads(result) if result else None,
+            'updated': updated,
+        }
+
+    def mark_submitted(self, alpha, location):
+        """记录模拟请求已发出，模拟完成前重跑也不会重复提交"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO results (key, regular, location, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET location = excluded.location, updated = excluded.updated",
+                (payload_key(alpha), alpha.get('regular'), location, time.time()))
+
+    def forget_location(self, location):
+        """
+        删除尚未完成的location记录（location已失效或过期），下次查询时这个请求会重新POST
+
+        Returns:
+            bool: 是否删除了记录
+        """
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM results WHERE location = ? AND result IS NULL", (location,))
+            return cursor.rowcount > 0
+
+    def store(self, alpha, alpha_id=None, result=None):
+        """
+        记录模拟完成
+
+        Args:
+            alpha (dict): 模拟数据
+            alpha_id (str, optional): alpha ID，不传时从result中取（见_result_fields）
+            result (dict, optional): /alphas/{id}返回的记录或模拟进度的最终结果
+        """
+        alpha_id, status, result_json = self._result_fields(alpha_id, result)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO results (key, regular, alpha_id, status, result, updated) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET alpha_id = excluded.alpha_id, status = excluded.status, "
+                "result = excluded.result, updated = excluded.updated",
+                (payload_key(alpha), alpha.get('regular'), alpha_id, status, result_json, time.time()))
+
+    def store_by_location(self, location, result):
+        """
+        按mark_submitted记录的location写入模拟结果，轮询时不需要再保留原始的模拟数据
+
+        Returns:
+            bool: 是否找到对应的记录
+        """
+        alpha_id, status, result_json = self._result_fields(None, result)
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE results SET alpha_id = ?, status = ?, result = ?, updated = ? WHERE location = ?",
+                (alpha_id, status, result_json, time.time(), location))
+            return cursor.rowcount > 0
+
+    @staticmethod
+    def _result_fields(alpha_id, result):
+        # 模拟进度的结果中id是模拟ID，alpha ID在alpha字段（ERROR/FAIL时没有）；
+        # 只有/alphas/{id}的记录（带is指标）的id才是alpha ID
+        if result is not None and alpha_id is None:
+            if 'alpha' in result:
+                alpha_id = result['alpha']
+            elif 'is' in result:
+                alpha_id = result.get('id')
+        status = result.get('status') if result else None
+        result_json = json.dumps(result, ensure_ascii=False) if result is not None else None
+        return alpha_id, status, result_json
@@ -0,0 +1,137 @@
+"""
+登录会话管理
+同一组账号密码在进程内只保留一个requests.Session，按/authentication返回的token有效期提前续期，
+续期和401后的重新登录都在原会话上进行，连接池和TLS会话不会被丢弃
+"""
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limiter import get_rate_limiter
+
+
+DEFAULT_API_BASE = 'https://api.worldquantbrain.com'
+# 设置环境变量BRAIN_API_URL可以把所有请求转到其他地址，例如本地的mock_server
+API_BASE = os.environ.get('BRAIN_API_URL', DEFAULT_API_BASE).rstrip('/')
+AUTH_URL = DEFAULT_API_BASE + '/authentication'
+
+
+def api_url(url):
+    """把写死的BRAIN地址换成API_BASE"""
+    if API_BASE != DEFAULT_API_BASE and url.startswith(DEFAULT_API_BASE):
+        return API_BASE + url[len(DEFAULT_API_BASE):]
+    return url
+
+
+class ManagedSession(requests.Session):
+    """
+    自动续期的会话
+
+    用法与requests.Session相同。token到期前refresh_margin秒内的请求会先续期；
+    请求返回401时重新登录并重发一次。并发请求同时遇到401时，只有第一个会重新登录，
+    其余的看到登录代数(generation)已经变化，直接用新的凭据重发。
+    """
+
+    def __init__(self, username, password, pool_maxsize=10, refresh_margin=300, min_interval=5, default_ttl=4 * 3600):
+        """
+        Args:
+            username (str): 账号
+            password (str): 密码
+            pool_maxsize (int): 连接池大小，一般与并发线程数一致
+            refresh_margin (float): 提前多少秒续期
+            min_interval (float): 两次登录的最小间隔，间隔内的重复登录请求直接复用上次结果
+            default_ttl (float): 登录响应中没有token有效期时使用的有效期
+        """
+        super().__init__()
+        self.auth = (username, password)
+        self.username = username
+        # 设为账号名时限流器按该账号单独分桶（账号池），None时与其他账号共用
+        self.rate_limit_account = None
+        self.refresh_margin = refresh_margin
+        self.min_interval = min_interval
+        self.default_ttl = default_ttl
+        self.mount('https://', HTTPAdapter(pool_maxsize=pool_maxsize))
+        self.generation = 0
+        self.expires_at = 0.0
+        self.last_response = None
+        self._last_auth = float('-inf')
+        self._auth_lock = threading.Lock()
+
+    def _authenticate(self):
+        limiter = get_rate_limiter()
+        limiter.acquire(AUTH_URL, self.rate_limit_account)
+        response = super().request('POST', api_url(AUTH_URL))
+        limiter.record(AUTH_URL, response, self.rate_limit_account)
+        self.last_response = response
+        self._last_auth = time.monotonic()
+        if response.ok:
+            ttl = self.default_ttl
+            try:
+                ttl = float(response.json()['token']['expiry'])
+            except (ValueError, KeyError, TypeError):
+                pass
+            self.expires_at = self._last_auth + ttl
+            self.generation += 1
+            logging.info(f"{self.username} authenticated, token valid for {ttl:.0f}s.")
+        else:
+            logging.error(f"{self.username} authentication failed with status {response.status_code}.")
+        return response
+
+    def refresh(self, seen_generation=None):
+        """
+        在原会话上重新登录
+
+        Args:
+            seen_generation (int, optional): 调用方发现凭据失效时的登录代数；
+                如果之后已经有其他线程重新登录过，则不再重复登录
+
+        Returns:
+            requests.Response: 最近一次/authentication的响应
+        """
+        with self._auth_lock:
+            if seen_generation is not None:
+                if seen_generation != self.generation:
+                    return self.last_response
+            elif time.monotonic() - self._last_auth < self.min_interval and self.last_response is not None \
+                    and self.last_response.ok:
+                # 多个线程几乎同时调用sign_in时只登录一次
+                return self.last_response
+            return self._authenticate()
+
+    def request(self, method, url, *args, **kwargs):
+        url = api_url(url)
+        generation = self.generation
+        if self.expires_at and time.monotonic() > self.expires_at - self.refresh_margin:
+            self.refresh(generation)
+            generation = self.generation
+        response = super().request(method, url, *args, **kwargs)
+        if response.status_code == 401:
+            self.refresh(generation)
+            # 重发的请求同样要取令牌；响应由调用方（limited_request）记录，这里记录会重复计数。
+            # 直接调用super().request，不经过limited_request -> self.request，避免递归
+            get_rate_limiter().acquire(url, self.rate_limit_account)
+            response = super().request(method, url, *args, **kwargs)
+        return response
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(username, password, pool_maxsize=10):
+    """
+    获取该账号在进程内共用的会话（不登录）
+
+    Returns:
+        ManagedSession: 会话
+    """
+    with _sessions_lock:
+        session = _sessions.get((username, password))
+        if session is None:
+            session = ManagedSession(username, password, pool_maxsize=pool_maxsize)
+            _sessions[(username, password)] = session
+        return session
@@ -0,0 +1,335 @@
+"""
+声明式的Alpha模板引擎
+模板中用<槽位>标记可替换的部分，每个槽位给一组取值，编译后惰性地产出表达式，
+代替脚本里手写的多层for循环；支持槽位之间的约束、取值权重和按取值覆盖模拟设置
+"""
+import itertools
+import random
+import re
+
+from fastexpr import FastExprError, canonicalize
+from helper import AlphaCombinations
+from payload_batch import PayloadBatch, SettingsPresets
+
+
+SLOT_RE = re.compile(r'<(\w+)>')
+
+
+class AlphaTemplate:
+    """
+    Alpha模板
+
+    例:
+        template = AlphaTemplate(
+            "<group_op>(<ts_op>(<op>(<field>)/<op>(enterprise_value), <days>), <group>)",
+            {'group_op': ['group_neutralize'], 'ts_op': ['ts_rank', 'ts_av_diff'], 'op': ['rank'],
+             'field': fields, 'days': [10, 200], 'group': ['industry']},
+            settings={'truncation': 0.01})
+        template.exclude(ts_op='ts_av_diff', days=200)
+        for expression in template: ...
+
+    同名槽位（上例的<op>）在一个表达式中取同一个值；只有在domains中给出取值的<名称>才是槽位，
+    其余的尖括号原样保留。展开顺序与按槽位第一次出现的顺序写嵌套for循环一致（最后一个槽位变化最快）。
+    """
+
+    def __init__(self, template, domains, settings=None):
+        """
+        Args:
+            template (str): 模板字符串
+            domains (dict): {槽位名: 取值列表}
+            settings (dict, optional): 所有表达式共用的模拟设置（覆盖create_simulation_data的默认值）
+        """
+        self.template = template
+        self.domains = {name: list(values) for name, values in domains.items()}
+        self.settings = dict(settings or {})
+        self.slots = []
+        for name in SLOT_RE.findall(template):
+            if name in self.domains and name not in self.slots:
+                self.slots.append(name)
+        unused = set(self.domains) - set(self.slots)
+        if unused:
+            raise ValueError(f"Slots not found in template: {', '.join(sorted(unused))}")
+
+        # 编译成两种格式串：按位置的供快速展开，按名称的供AlphaCombinations随机访问
+        positional, named = [], []
+        for i, part in enumerate(SLOT_RE.split(template)):
+            if i % 2 == 0 or part not in self.domains:
+                literal = part if i % 2 == 0 else f"<{part}>"
+                literal = literal.replace('{', '{{').replace('}', '}}')
+                positional.append(literal)
+                named.append(literal)
+            else:
+                positional.append('{%d}' % self.slots.index(part))
+                named.append('{%s}' % part)
+        self._format = ''.join(positional).format
+        self._named_format = ''.join(named)
+        self._constraints = []
+        self._weights = {}
+        self._overrides = {}
+
+    def __repr__(self):
+        return f"AlphaTemplate({self.template!r}, size={self.size()})"
+
+    def _slot_index(self, slot):
+        try:
+            return self.slots.index(slot)
+        except ValueError:
+            raise ValueError(f"Unknown slot: {slot}") from None
+
+    # ---------- 声明 ----------
+
+    def exclude(self, **values):
+        """
+        跳过同时满足所有给定取值的组合，取值可以是单个值或列表（任一）
+
+        例: exclude(ts_op='ts_av_diff', days=200)，exclude(days=[5, 10], group='market')
+
+        Returns:
+            AlphaTemplate: self，便于链式调用
+        """
+        checks = []
+        for slot, value in values.items():
+            allowed = set(value) if isinstance(value, (list, tuple, set, frozenset)) else {value}
+            checks.append((self._slot_index(slot), allowed))
+        self._constraints.append(lambda combo: not all(combo[i] in allowed for i, allowed in checks))
+        return self
+
+    def where(self, predicate):
+        """
+        自定义约束
+
+        Args:
+            predicate (callable): 接收 {槽位名: 取值}，返回False的组合被跳过
+
+        Returns:
+            AlphaTemplate: self
+        """
+        slots = self.slots
+        self._constraints.append(lambda combo: predicate(dict(zip(slots, combo))))
+        return self
+
+    def weight(self, slot, weights):
+        """
+        取值权重，未列出的取值权重为1。组合的权重为各槽位取值权重之积，sample按权重抽样。
+
+        Args:
+            slot (str): 槽位名
+            weights (dict): {取值: 权重}
+
+        Returns:
+            AlphaTemplate: self
+        """
+        self._weights.setdefault(self._slot_index(slot), {}).update(weights)
+        return self
+
+    def override(self, slot, value, settings):
+        """
+        槽位取某个值时额外使用的模拟设置，例: override('universe', 'TOP200', {'truncation': 0.01})
+
+        Returns:
+            AlphaTemplate: self
+        """
+        self._overrides.setdefault(self._slot_index(slot), {}).setdefault(value, {}).update(settings)
+        return self
+
+    # ---------- 展开 ----------
+
+    def size(self):
+        """不考虑约束的组合数（有约束时是上界）"""
+        size = 1
+        for slot in self.slots:
+            size *= len(self.domains[slot])
+        return size
+
+    def combinations(self):
+        """
+        不考虑约束的惰性组合序列，支持len、下标访问和shard
+
+        Returns:
+            AlphaCombinations: 组合序列
+        """
+        return AlphaCombinations(self._named_format, [(slot, self.domains[slot]) for slot in self.slots])
+
+    def _accept(self, combo):
+        for constraint in self._constraints:
+            if not constraint(combo):
+                return False
+        return True
+
+    def accepts(self, combo):
+        """组合（按slots顺序的取值元组）是否满足所有约束"""
+        return self._accept(tuple(combo))
+
+    def render(self, combo):
+        """
+        组合对应的表达式和模拟设置
+
+        Args:
+            combo (tuple): 按slots顺序的取值
+
+        Returns:
+            tuple: (表达式, settings)
+        """
+        return self._format(*combo), self._settings_for(combo)
+
+    def _combos(self):
+        combos = itertools.product(*(self.domains[slot] for slot in self.slots))
+        if self._constraints:
+            combos = filter(self._accept, combos)
+        return combos
+
+    def __iter__(self):
+        return self.expressions()
+
+    def expressions(self, canonical=False):
+        """
+        惰性产出满足约束的表达式
+
+        Args:
+            canonical (bool): 是否输出FASTEXPR规范形式（无法解析的原样输出）
+
+        Returns:
+            iterator: 表达式字符串
+        """
+        expressions = itertools.starmap(self._format, self._combos())
+        if canonical:
+            return map(_canonical_or_original, expressions)
+        return expressions
+
+    def count(self):
+        """满足约束的组合数（需要遍历一遍，但不生成字符串）"""
+        return sum(1 for _ in self._combos())
+
+    def _settings_for(self, combo):
+        settings = dict(self.settings)
+        for i, table in self._overrides.items():
+            extra = table.get(combo[i])
+            if extra:
+                settings.update(extra)
+        return settings
+
+    def _weight_for(self, combo):
+        weight = 1.0
+        for i, table in self._weights.items():
+            weight *= table.get(combo[i], 1.0)
+        return weight
+
+    def candidates(self):
+        """
+        惰性产出 (表达式, 模拟设置, 权重)
+
+        Yields:
+            tuple: (str, dict, float)
+        """
+        for combo in self._combos():
+            yield self._format(*combo), self._settings_for(combo), self._weight_for(combo)
+
+    def _preset_ids(self, presets):
+        """每个组合对应的settings预设id，只有覆盖了设置的槽位取值不同才会登记新的预设"""
+        base = presets.intern(self.settings)
+        if not self._overrides:
+            return itertools.repeat(base)
+        cache = {}
+
+        def preset_id(combo):
+            key = tuple(combo[i] for i in self._overrides)
+            if key not in cache:
+                cache[key] = presets.intern(self._settings_for(combo))
+            return cache[key]
+        return map(preset_id, self._combos())
+
+    def _payloads(self):
+        presets = SettingsPresets()
+        payload = presets.payload
+        for expression, preset_id in zip(self.expressions(), self._preset_ids(presets)):
+            yield payload(expression, preset_id)
+
+    def simulation_data(self):
+        """
+        惰性的create_simulation_data格式模拟数据（带有拼好请求体的SimulationPayload），
+        可以重复遍历（每次重新展开），可以直接交给save_alphas_to_csv或save_alphas_to_queue
+
+        Returns:
+            iterable: 模拟数据
+        """
+        return _Reiterable(self._payloads)
+
+    def payload_batch(self):
+        """
+        把满足约束的表达式展开成列式的PayloadBatch（表达式列表 + 预设id）
+
+        Returns:
+            PayloadBatch: 批次
+        """
+        batch = PayloadBatch()
+        if not self._overrides:
+            batch.extend(self.expressions(), self.settings)
+            return batch
+        for expression, preset_id in zip(self.expressions(), self._preset_ids(batch.presets)):
+            batch.expressions.append(expression)
+            batch.preset_ids.append(preset_id)
+        return batch
+
+    def shard(self, k, n):
+        """
+        第k片（从0开始，共n片）满足约束的表达式。按不考虑约束的组合下标连续切分，
+        多个进程用相同的模板和不同的k即可不重不漏地分掉同一个组合空间。
+
+        Yields:
+            str: 表达式
+        """
+        for values in _iter_values(self.combinations().shard(k, n)):
+            combo = tuple(values[slot] for slot in self.slots)
+            if self._accept(combo):
+                yield self._format(*combo)
+
+    def sample(self, n, seed=None, max_tries=None):
+        """
+        按权重不放回地抽取n个满足约束的表达式（各槽位按取值权重独立抽取）
+
+        Args:
+            n (int): 数量
+            seed (int, optional): 随机种子
+            max_tries (int, optional): 最多尝试次数，默认为50*n
+
+        Returns:
+            list: 表达式，组合空间不足时少于n个
+        """
+        rnd = random.Random(seed)
+        choices = []
+        for i, slot in enumerate(self.slots):
+            values = self.domains[slot]
+            table = self._weights.get(i, {})
+            choices.append((values, [table.get(value, 1.0) for value in values]))
+        seen = set()
+        samples = []
+        for _ in range(max_tries or 50 * n):
+            if len(samples) >= n:
+                break
+            combo = tuple(rnd.choices(values, weights)[0] for values, weights in choices)
+            if combo in seen:
+                continue
+            seen.add(combo)
+            if self._accept(combo):
+                samples.append(self._format(*combo))
+        return samples
+
+
+class _Reiterable:
+    def __init__(self, factory):
+        self._factory = factory
+
+    def __iter__(self):
+        return self._factory()
+
+
+def _canonical_or_original(expression):
+    try:
+        return canonicalize(expression)
+    except FastExprError:
+        return expression
+
+
+def _iter_values(combinations):
+    for i in range(len(combinations)):
+        yield combinations.values_at(i)
@@ -0,0 +1,53 @@
+"""
+测试共用的fixture：每个测试在临时目录中运行，需要HTTP的测试连本地的mock_server
+"""
+import logging
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+# AlphaSimulator在导入时调用logging.basicConfig写simulation.log，先挂一个handler让它不生效
+logging.getLogger().addHandler(logging.NullHandler())
+
+import pytest
+
+import rate_limiter
+import session_manager
+from mock_server import MockBrainServer
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """脚本和类会在当前目录写csv/db文件，全部放到临时目录"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def mock_brain(monkeypatch):
+    """
+    本地的BRAIN API替身，所有请求经session_manager.API_BASE转过去；
+    每个测试重新开始：新的服务器状态、新的会话和限流器
+    """
+    server = MockBrainServer(latency=0, sim_duration=0.2, sim_sigma=0, check_duration=0.1, poll_hint=0.1,
+                             seed_alphas=0, seed=1)
+    url = server.start()
+    monkeypatch.setattr(session_manager, 'API_BASE', url)
+    monkeypatch.setattr(session_manager, '_sessions', {})
+    monkeypatch.setattr(rate_limiter, '_shared_limiter', rate_limiter.RateLimiter(
+        {name: dict(limit, rate=50.0, max_rate=100.0) for name, limit in rate_limiter.DEFAULT_LIMITS.items()}))
+    yield server
+    server.stop()
+
+
+def make_alpha(expression, region='USA', decay=0):
+    """create_simulation_data格式的alpha"""
+    return {
+        'type': 'REGULAR',
+        'settings': {'instrumentType': 'EQUITY', 'region': region, 'universe': 'TOP3000', 'delay': 1,
+                     'decay': decay, 'neutralization': 'SUBINDUSTRY', 'truncation': 0.08, 'pasteurization': 'ON',
+                     'unitHandling': 'VERIFY', 'nanHandling': 'ON', 'language': 'FASTEXPR', 'visualization': False},
+        'regular': expression,
+    }
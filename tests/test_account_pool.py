@@ -0,0 +1,82 @@
+"""AccountPool：多个账号共用一个队列模拟"""
+import time
+
+import rate_limiter
+from account_pool import AccountPool
+from tests.conftest import make_alpha
+
+
+def test_simulate_batch_twice(mock_brain):
+    pool = AccountPool([('u1', 'p', 2), ('u2', 'p', 2)], alpha_list_file_path='pending.csv',
+                       poll_interval=0.05)
+    first = pool.simulate_batch([make_alpha(f"rank(close - {i})") for i in range(4)])
+    second = pool.simulate_batch([make_alpha(f"rank(open - {i})") for i in range(4)])
+
+    assert all(result and result['id'] for result in first)
+    assert all(result and result['id'] for result in second)
+    assert [result['regular']['code'] for result in second] == [f"rank(open - {i})" for i in range(4)]
+    assert sum(mock_brain.stats()['requests']['simulations'].values()) == 8
+
+
+def test_results_keep_input_order(mock_brain):
+    pool = AccountPool([('u1', 'p', 3)], alpha_list_file_path='pending.csv', poll_interval=0.05)
+    expressions = [f"ts_rank(close, {i + 2})" for i in range(6)]
+    results = pool.simulate_batch([make_alpha(expression) for expression in expressions])
+    assert [result['regular']['code'] for result in results] == expressions
+
+
+def occupy(server, user, count):
+    """在mock上给user放count个一分钟后才结束的模拟，占满它的并发名额"""
+    now = time.monotonic()
+    with server.brain.lock:
+        for i in range(count):
+            server.brain.simulations[f"busy-{user}-{i}"] = {
+                'user': user, 'payload': {}, 'created': now, 'done_at': now + 60, 'next_poll': now, 'alpha': None,
+                'delivered': False}
+
+
+def test_throttled_account_hands_alphas_to_others(mock_brain):
+    mock_brain.brain.max_concurrent_sims = 2
+    pool = AccountPool([('u1', 'p', 2), ('u2', 'p', 2)], alpha_list_file_path='pending.csv', poll_interval=0.05,
+                       cooldown=30)
+    u1, u2 = pool.simulators
+    occupy(mock_brain, 'u1', 2)
+    expressions = [f"ts_mean(close, {i + 2})" for i in range(4)]
+
+    start = time.monotonic()
+    results = pool.simulate_batch([make_alpha(expression) for expression in expressions])
+
+    # u1的429没有让u2等待冷却时间，全部alpha由u2完成
+    assert time.monotonic() - start < 10
+    assert [result['regular']['code'] for result in results] == expressions
+    assert mock_brain.stats()['requests']['simulations'][429] >= 1
+    assert u1.paused_until > time.monotonic() + 10 and u2.paused_until == 0
+    # 限流按账号分桶：u1的429只压低u1的模拟速率
+    rates = rate_limiter.get_rate_limiter().rates()
+    assert rates['u1/simulations'] < rates['u2/simulations']
+
+
+def test_unauthorized_account_signs_in_again(mock_brain):
+    pool = AccountPool([('u1', 'p', 2)], alpha_list_file_path='pending.csv', poll_interval=0.05, cooldown=30)
+    simulator, = pool.simulators
+    post, sign_ins = simulator.post_simulation, []
+    responses = iter([(None, 401, None)])
+    simulator.post_simulation = lambda alpha: next(responses, None) or post(alpha)
+    sign_in = simulator.sign_in
+    simulator.sign_in = lambda *args: sign_ins.append(args) or sign_in(*args)
+
+    results = pool.simulate_batch([make_alpha('rank(close)'), make_alpha('rank(open)')])
+
+    # 401的alpha交回队列，重新登录成功后账号立即恢复
+    assert [result['regular']['code'] for result in results] == ['rank(close)', 'rank(open)']
+    assert sign_ins == [('u1', 'p')] and simulator.paused_until == 0
+
+
+def test_alpha_given_up_after_max_attempts(mock_brain):
+    pool = AccountPool([('u1', 'p', 2)], alpha_list_file_path='pending.csv', poll_interval=0.05, max_attempts=3)
+    mock_brain.brain.error_rate = 1.0
+
+    assert pool.simulate_batch([make_alpha('rank(close)'), make_alpha('rank(open)')]) == [None, None]
+    assert mock_brain.stats()['requests']['simulations'] == {503: 6}
+    with open('fail_alphas.csv') as f:
+        assert len(f.read().splitlines()) == 2
@@ -0,0 +1,102 @@
+"""adaptive_search：按槽位取值通过率分配模拟预算"""
+from adaptive_search import AdaptiveSearch, alpha_metrics, session_simulator
+from session_manager import get_session
+from template_engine import AlphaTemplate
+
+FIELDS = [f"f{i}" for i in range(10)]
+
+
+def make_template():
+    return AlphaTemplate("<op>(<field>, <days>)", {'op': ['ts_rank', 'ts_mean', 'ts_delta'], 'field': FIELDS,
+                                                 'days': [5, 10, 22, 66, 120, 250]})
+
+
+def fake_simulate(good_field='f3', fail=()):
+    """只有good_field的表达式合格；fail中的表达式模拟失败（结果为None）"""
+    calls = []
+
+    def simulate(batch):
+        calls.append(len(batch))
+        results = []
+        for payload in batch:
+            expression = payload['regular']
+            if expression in fail:
+                results.append(None)
+                continue
+            sharpe = 1.6 if f"({good_field}," in expression else 0.4
+            results.append({'id': expression, 'is': {'sharpe': sharpe, 'fitness': 1.2}})
+        return results
+    simulate.calls = calls
+    return simulate
+
+
+def test_alpha_metrics():
+    assert alpha_metrics({'is': {'sharpe': 1.5, 'fitness': 1.1}}) == (1.5, 1.1)
+    assert alpha_metrics(None) == (None, None)
+    assert alpha_metrics({'is': None}) == (None, None)
+
+
+def test_budget_goes_to_productive_values():
+    search = AdaptiveSearch(make_template(), fake_simulate(), batch_size=10, seed=1)
+    records = search.run(budget=120)
+    assert search.simulated == len(records) == 120
+    assert len({record['expression'] for record in records}) == 120
+    # f3的18个组合全部找到；均匀抽120个（共180个）平均只能找到12个
+    assert search.passed == 18
+    assert search.posterior_mean('field', 'f3') == max(search.posterior_mean('field', f) for f in FIELDS)
+    assert search.summary().splitlines()[2].startswith('<field>: f3 ')
+
+
+def test_target_stops_early_and_batches_respect_budget():
+    simulate = fake_simulate()
+    search = AdaptiveSearch(make_template(), simulate, batch_size=8, seed=2)
+    search.run(budget=30, target=5)
+    assert search.passed >= 5 and search.simulated < 30
+    simulate = fake_simulate()
+    AdaptiveSearch(make_template(), simulate, batch_size=8, seed=2).run(budget=20)
+    assert simulate.calls == [8, 8, 4]
+
+
+def test_constraints_and_exhausted_space():
+    template = AlphaTemplate("<op>(<field>)", {'op': ['rank', 'zscore'], 'field': ['f1', 'f3', 'f5']})
+    template.exclude(op='zscore', field='f5')
+    search = AdaptiveSearch(template, fake_simulate(), batch_size=4, seed=3)
+    records = search.run(budget=100)
+    assert sorted(record['expression'] for record in records) == [
+        'rank(f1)', 'rank(f3)', 'rank(f5)', 'zscore(f1)', 'zscore(f3)']
+
+
+def test_failed_simulations_are_retried_and_not_counted():
+    template = AlphaTemplate("<op>(<field>)", {'op': ['rank'], 'field': ['f1', 'f3']})
+    flaky = {'rank(f1)'}
+    simulate = fake_simulate(fail=flaky)
+    search = AdaptiveSearch(template, simulate, batch_size=2, seed=4)
+    search.run(budget=10)
+    # rank(f1)每轮都失败：不计入统计，连续3轮没有结果后停止
+    assert [record['expression'] for record in search.history] == ['rank(f3)']
+    assert search.stats[1]['f1'] == [0, 0]
+    assert simulate.calls == [2, 1, 1, 1]
+
+
+def test_settings_overrides_reach_simulate():
+    template = make_template().override('days', 250, {'decay': 0})
+    seen = []
+
+    def simulate(batch):
+        seen.extend((payload['regular'], payload['settings']['decay']) for payload in batch)
+        return [{'is': {'sharpe': 0, 'fitness': 0}} for _ in batch]
+    AdaptiveSearch(template, simulate, batch_size=20, seed=5).run(budget=40)
+    assert seen and all((decay == 0) == expression.endswith(' 250)') for expression, decay in seen)
+
+
+def test_session_simulator_against_mock(mock_brain):
+    template = AlphaTemplate("rank(ts_delta(<field>, <days>))", {'field': ['close', 'open'], 'days': [5, 10]})
+    search = AdaptiveSearch(template, session_simulator(get_session('u1', 'p'), max_workers=2), batch_size=2,
+                            sharpe_th=1.25, fitness_th=1.0, seed=6)
+    records = search.run(budget=4)
+    assert len(records) == 4
+    assert all(record['alpha_id'] in mock_brain.brain.alphas for record in records)
+    # mock的Sharpe和Fitness都高于阈值
+    assert search.passed == 4
+    codes = {alpha['regular']['code'] for alpha in mock_brain.brain.alphas.values()}
+    assert codes == {record['expression'] for record in records}
@@ -0,0 +1,154 @@
+"""alpha_mirror：增量同步的watermark和本地筛选"""
+import re
+
+import pytest
+
+from alpha_mirror import AlphaMirror
+from paging import PageFetchError
+from rate_limiter import limited_request
+from session_manager import get_session
+
+
+def make_fetch(fail_requests=(), after_request=None):
+    """
+    经mock_server读取列表接口，记下请求的地址；第fail_requests次（从0开始）请求返回None（请求失败），
+    after_request(第几次)在每次请求之后调用
+    """
+    session = get_session('u1', 'p')
+    urls = []
+
+    def fetch(url):
+        urls.append(url)
+        if len(urls) - 1 in fail_requests:
+            return None
+        page = limited_request(session, 'get', url).json()
+        if after_request:
+            after_request(len(urls) - 1)
+        return page
+    fetch.urls = urls
+    return fetch
+
+
+def seed(server, count, region='USA'):
+    return [server.brain._new_alpha({'type': 'REGULAR', 'settings': {'region': region, 'decay': 2},
+                                     'regular': f"rank(ts_delta(close, {i + 1}))"}) for i in range(count)]
+
+
+def test_first_sync_downloads_everything(mock_brain):
+    ids = seed(mock_brain, 230)
+    mirror = AlphaMirror('mirror.db')
+    fetch = make_fetch()
+    assert mirror.watermark() is None
+    assert mirror.sync(fetch) == 230
+    assert len(mirror) == 230
+    # 第一次同步的第一页不带条件，之后按上一页最后一条的dateModified取
+    assert 'dateModified%3E' not in fetch.urls[0]
+    assert mirror.watermark() == max(alpha['dateModified'] for alpha in mock_brain.brain.alphas.values())
+    assert {alpha['id'] for alpha in mirror.records(limit=None)} == set(ids)
+
+
+def test_incremental_sync_overwrites_by_id(mock_brain):
+    ids = seed(mock_brain, 5)
+    mirror = AlphaMirror('mirror.db')
+    mirror.sync(make_fetch())
+    watermark = mirror.watermark()
+
+    session = get_session('u1', 'p')
+    limited_request(session, 'patch', f"https://api.worldquantbrain.com/alphas/{ids[0]}", json={'name': 'renamed'})
+    new_ids = seed(mock_brain, 3)
+    fetch = make_fetch()
+    # 同一秒内修改的记录都在重叠窗口内，重新下载后按id覆盖
+    assert mirror.sync(fetch, overlap=60) >= 4
+    assert all('dateModified%3E=' in url for url in fetch.urls)
+    assert len(mirror) == 8
+    names = {alpha['id']: alpha['name'] for alpha in mirror.records(limit=None)}
+    assert names[ids[0]] == 'renamed'
+    assert set(new_ids) <= set(names)
+    assert mirror.watermark() >= watermark
+
+
+def test_failed_sync_keeps_watermark(mock_brain):
+    seed(mock_brain, 50)
+    mirror = AlphaMirror('mirror.db')
+    mirror.sync(make_fetch())
+    watermark = mirror.watermark()
+
+    seed(mock_brain, 200)
+    with pytest.raises(PageFetchError):
+        mirror.sync(make_fetch(fail_requests={1}))
+    # 不完整的一批既不写入也不推进watermark，下一次同步从原来的位置重新开始
+    assert mirror.watermark() == watermark
+    assert len(mirror) == 50
+    assert mirror.sync(make_fetch()) == 250
+    assert len(mirror) == 250
+
+
+def test_modified_during_sync_skips_nothing(mock_brain):
+    ids = seed(mock_brain, 250)
+    for i, alpha_id in enumerate(ids):
+        mock_brain.brain.alphas[alpha_id]['dateModified'] = f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}+00:00"
+    session = get_session('u1', 'p')
+
+    def tag_first(request):
+        # 第一页取完后给其中一个alpha打标签，它移到末尾，按offset分页时后面的记录都会前移一位
+        if request == 0:
+            limited_request(session, 'patch', f"https://api.worldquantbrain.com/alphas/{ids[0]}",
+                            json={'tags': ['OKOK']})
+
+    mirror = AlphaMirror('mirror.db')
+    fetch = make_fetch(after_request=tag_first)
+    assert mirror.sync(fetch) == 250
+    assert {alpha['id'] for alpha in mirror.records(limit=None)} == set(ids)
+    assert all('offset=0&' in url for url in fetch.urls)
+    assert mirror.watermark() == mock_brain.brain.alphas[ids[0]]['dateModified']
+
+
+def test_same_timestamp_pages_continue_by_offset(mock_brain):
+    # seed在同一秒内创建，250条的dateModified全部相同
+    ids = seed(mock_brain, 250)
+    mirror = AlphaMirror('mirror.db')
+    fetch = make_fetch()
+    assert mirror.sync(fetch) == 250
+    assert len(mirror) == 250 and {alpha['id'] for alpha in mirror.records(limit=None)} == set(ids)
+    assert [int(re.search(r'offset=(\d+)', url).group(1)) for url in fetch.urls][-2:] == [100, 200]
+
+
+def test_watermark_compares_across_time_zones():
+    pages = {'count': 2, 'results': [
+        {'id': 'A', 'dateModified': '2024-05-01T08:30:00+08:00', 'settings': {'region': 'USA'}},
+        {'id': 'B', 'dateModified': '2024-05-01T01:00:00+00:00', 'settings': {'region': 'USA'}},
+    ]}
+    mirror = AlphaMirror('mirror.db')
+    mirror.sync(lambda url: pages)
+    # 08:30+08:00 是 00:30Z，比 01:00Z 早
+    assert mirror.watermark() == '2024-05-01T01:00:00+00:00'
+
+
+def test_records_and_frame_filters():
+    alphas = [
+        {'type': 'REGULAR', 'id': 'A', 'status': 'UNSUBMITTED', 'dateCreated': '2024-05-01T00:00:00Z',
+         'settings': {'region': 'USA', 'decay': 4}, 'regular': {'code': 'rank(close)'},
+         'is': {'sharpe': 1.6, 'fitness': 1.2, 'turnover': 0.2, 'longCount': 80, 'shortCount': 70,
+                'checks': [{'name': 'LOW_SHARPE', 'result': 'PASS'}]}},
+        {'type': 'REGULAR', 'id': 'B', 'status': 'UNSUBMITTED', 'dateCreated': '2024-05-02T00:00:00Z',
+         'settings': {'region': 'USA', 'decay': 0}, 'regular': {'code': 'rank(open)'},
+         'is': {'sharpe': 1.4, 'fitness': 1.1, 'turnover': 0.5, 'longCount': 80, 'shortCount': 70,
+                'checks': [{'name': 'LOW_FITNESS', 'result': 'FAIL'}]}},
+        {'type': 'REGULAR', 'id': 'C', 'status': 'ACTIVE', 'dateCreated': '2024-05-02T00:00:00Z',
+         'settings': {'region': 'USA'}, 'is': {'sharpe': 2.0}},
+        {'type': 'REGULAR', 'id': 'D', 'status': 'UNSUBMITTED', 'dateCreated': '2024-05-02T00:00:00Z', 'hidden': True,
+         'settings': {'region': 'CHN'}, 'is': {'sharpe': 1.9}},
+    ]
+    mirror = AlphaMirror('mirror.db')
+    assert mirror.upsert(alphas) == 4
+    assert [alpha['id'] for alpha in mirror.records()] == ['B', 'A']
+    assert [alpha['id'] for alpha in mirror.records(max_turnover=0.3)] == ['A']
+    assert [alpha['id'] for alpha in mirror.records(without_failed_checks=True)] == ['A']
+    assert [alpha['id'] for alpha in mirror.records(created_after='2024-05-01T12:00:00+08:00')] == ['B']
+    assert [alpha['id'] for alpha in mirror.records(include_hidden=True, region='CHN')] == ['D']
+    assert mirror.records(sharpe=(1.5, None))[0] == alphas[0]
+
+    frame = mirror.frame({'id': 'id', 'exp': 'code', 'failed': 'failed_checks > 0'})
+    assert frame.to_dict('records') == [{'id': 'B', 'exp': 'rank(open)', 'failed': 1},
+                                        {'id': 'A', 'exp': 'rank(close)', 'failed': 0}]
+    assert mirror.status_counts() == {'UNSUBMITTED': 3, 'ACTIVE': 1}
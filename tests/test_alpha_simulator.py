@@ -0,0 +1,118 @@
+"""AlphaSimulator：缓存的location失效、过期和轮询次数上限"""
+import os
+import threading
+import time
+
+from AlphaSimulator import AlphaSimulator
+from account_pool import AccountPool
+from rate_limiter import limited_request
+from session_manager import get_session
+from tests.conftest import make_alpha
+
+
+def make_simulator(**kwargs):
+    return AlphaSimulator(max_concurrent=2, username='u1', password='p', alpha_list_file_path='pending.csv',
+                          batch_number_for_every_queue=10, poll_interval=0.05, **kwargs)
+
+
+def test_stale_cached_location_is_posted_again(mock_brain):
+    simulator = make_simulator()
+    alpha = make_alpha('rank(close)')
+    stale = f"{mock_brain.url}/simulations/gone"
+    simulator.result_cache.mark_submitted(alpha, stale)
+
+    result, = simulator.simulate_batch([alpha])
+
+    assert result['regular']['code'] == 'rank(close)'
+    assert mock_brain.stats()['requests']['simulation_progress'][404] == 1
+    assert simulator.result_cache.get(alpha)['alpha_id'] == result['id']
+
+
+def test_stale_cached_location_in_account_pool(mock_brain):
+    pool = AccountPool([('u1', 'p', 2)], alpha_list_file_path='pending.csv', poll_interval=0.05)
+    alpha = make_alpha('rank(volume)')
+    pool.simulators[0].result_cache.mark_submitted(alpha, f"{mock_brain.url}/simulations/gone")
+
+    result, = pool.simulate_batch([alpha])
+
+    assert result['regular']['code'] == 'rank(volume)'
+    assert sum(mock_brain.stats()['requests']['simulations'].values()) == 1
+
+
+def test_old_cached_location_is_not_resumed(mock_brain):
+    simulator = make_simulator(max_location_age=60)
+    alpha = make_alpha('rank(open)')
+    simulator.result_cache.mark_submitted(alpha, f"{mock_brain.url}/simulations/old")
+    simulator.result_cache._conn.execute("UPDATE results SET updated = updated - 3600")
+
+    assert simulator.lookup_cache(alpha) == (None, None)
+    assert simulator.result_cache.get(alpha) is None
+
+
+def test_poll_attempt_cap(mock_brain):
+    mock_brain.brain.sim_duration = 5
+    simulator = make_simulator(max_poll_attempts=2)
+
+    assert simulator.simulate_batch([make_alpha('rank(high)')]) == [None]
+    assert os.path.getsize('fail_alphas.csv') > 0
+    assert simulator.result_cache.get(make_alpha('rank(high)')) is None
+
+
+def test_dispatcher_keeps_order_within_concurrency_cap(mock_brain):
+    # 服务器上每个账号最多同时2个模拟，超过返回429
+    mock_brain.brain.max_concurrent_sims = 2
+    simulator = make_simulator()
+    expressions = [f"rank(ts_delta(close, {i}))" for i in range(1, 7)]
+
+    start = time.monotonic()
+    results = simulator.simulate_batch([make_alpha(expression) for expression in expressions])
+    elapsed = time.monotonic() - start
+
+    assert [result['regular']['code'] for result in results] == expressions
+    stats = mock_brain.stats()
+    assert 429 not in stats['requests']['simulations']
+    assert stats['wasted'].get('early_polls', 0) == 0
+    # 有空位立即补上：6个0.2s的模拟分3轮，远少于按3秒节拍逐个发送
+    assert elapsed < 3
+
+
+def test_blocking_work_runs_off_the_event_loop(mock_brain):
+    simulator = make_simulator()
+    loop_thread = threading.current_thread()
+    threads = []
+
+    def record_thread(func):
+        def wrapper(*args):
+            threads.append((func.__name__, threading.current_thread()))
+            return func(*args)
+        return wrapper
+
+    for name in ('lookup_cache', 'remember_location', 'record_simulation_result'):
+        setattr(simulator, name, record_thread(getattr(simulator, name)))
+    simulator.pending_queue.ack = record_thread(simulator.pending_queue.ack)
+
+    simulator.simulate_batch([make_alpha('rank(close)'), make_alpha('rank(open)')])
+
+    # SQLite提交和CSV追加都在线程池中执行，事件循环线程只做调度
+    assert {name for name, _ in threads} == {'lookup_cache', 'remember_location', 'record_simulation_result', 'ack'}
+    assert all(thread is not loop_thread for _, thread in threads)
+
+
+def test_alphas_sharing_a_cached_location(mock_brain):
+    simulator = make_simulator()
+    response = limited_request(get_session('u1', 'p'), 'post', 'https://api.worldquantbrain.com/simulations',
+                               json=make_alpha('rank(vwap)'))
+    location = response.headers['Location']
+    alphas = [make_alpha('rank(vwap)'), make_alpha('rank(vwap)', decay=4)]
+    for alpha in alphas:
+        simulator.result_cache.mark_submitted(alpha, location)
+    recorded = []
+    record = simulator.record_simulation_result
+    simulator.record_simulation_result = lambda *args: recorded.append(args) or record(*args)
+
+    first, second = simulator.simulate_batch(alphas)
+
+    # 两个alpha等同一个location：共用一次轮询，都拿到结果，结果只记录一次
+    assert first['id'] == second['id']
+    assert sum(mock_brain.stats()['requests']['simulations'].values()) == 1
+    assert len(recorded) == 1
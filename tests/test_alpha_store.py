@@ -0,0 +1,61 @@
+"""alpha_store：Parquet分片的待模拟/已模拟存储"""
+import json
+import time
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from alpha_store import PendingStore, SimulatedStore
+from tests.conftest import make_alpha
+
+
+def alpha_record(alpha_id, code):
+    return {'id': alpha_id, 'type': 'REGULAR', 'status': 'UNSUBMITTED', 'settings': make_alpha(code)['settings'],
+            'regular': {'code': code, 'description': None, 'operatorCount': 2}, 'is': {'sharpe': 1.5}}
+
+
+def test_pending_round_trip(tmp_path):
+    store = PendingStore(str(tmp_path / 'pending'))
+    alphas = [make_alpha('rank(close)'), make_alpha('rank(open)', decay=4)]
+    assert store.append(alphas) == 2
+    assert list(store.iter_alphas()) == alphas
+    assert store.count({'settings_decay': 4}) == 1
+
+
+def test_simulated_stores_expression_of_alpha_record(tmp_path):
+    store = SimulatedStore(str(tmp_path / 'simulated'))
+    store.append([alpha_record('A1', 'rank(close)'),
+                  {'id': 'sim-1', 'status': 'ERROR', 'regular': 'rank(bad)', 'message': 'unknown field'}])
+    rows = store.read().to_pylist()
+    assert [row['regular'] for row in rows] == ['rank(close)', 'rank(bad)']
+    assert json.loads(rows[0]['extra'])['regular'] == {'description': None, 'operatorCount': 2}
+    assert rows[0]['settings_region'] == 'USA'
+
+
+def test_simulated_imports_dict_repr_from_csv(tmp_path):
+    csv_path = tmp_path / 'simulated.csv'
+    record = alpha_record('A2', 'ts_rank(vwap, 5)')
+    csv_path.write_text('id,status,regular\n' + f'A2,UNSUBMITTED,"{record["regular"]}"\n')
+    store = SimulatedStore(str(tmp_path / 'simulated'))
+    assert store.import_csv(str(csv_path)) == 1
+    assert store.read().column('regular').to_pylist() == ['ts_rank(vwap, 5)']
+
+
+def test_buffered_results_flushed_after_interval(tmp_path):
+    store = SimulatedStore(str(tmp_path / 'simulated'), flush_every=20, flush_interval=0.2)
+    store.add(alpha_record('A3', 'rank(low)'))
+    assert store.parts() == []
+    deadline = time.monotonic() + 5
+    while not store.parts() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert store.count() == 1
+    assert store.flush() == 0
+
+
+def test_flush_every_rows(tmp_path):
+    store = SimulatedStore(str(tmp_path / 'simulated'), flush_every=2, flush_interval=None)
+    store.add(alpha_record('A4', 'rank(a)'))
+    assert store.parts() == []
+    store.add(alpha_record('A5', 'rank(b)'))
+    assert store.count() == 2
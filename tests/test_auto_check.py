@@ -0,0 +1,38 @@
+"""4.auto-check.py：对mock_server并发检查，按结果打标签和写黑名单"""
+import json
+import os
+import subprocess
+import sys
+
+from blacklist_store import BlacklistStore
+from tests.conftest import ROOT
+
+
+def run_auto_check(server, *argv):
+    with open('credentials.txt', 'w') as f:
+        json.dump(['u@example.com', 'p'], f)
+    env = dict(os.environ, BRAIN_API_URL=server.url)
+    return subprocess.run([sys.executable, os.path.join(ROOT, '4.auto-check.py'), '--quiet', *argv], env=env,
+                          capture_output=True, text=True, timeout=120)
+
+
+def test_checks_tags_and_blacklists(mock_brain):
+    mock_brain.brain.check_fail_rate = 0.5
+    ids = [mock_brain.brain._new_alpha({'settings': {'region': 'USA'}, 'regular': f"rank(ts_delta(close, {i}))"})
+           for i in range(1, 6)]
+    result = run_auto_check(mock_brain, '--check_workers', '3')
+    assert result.returncode == 0, result.stderr
+
+    stats = mock_brain.stats()
+    # 每个Alpha只检查一次，按Retry-After轮询，没有提前的轮询
+    assert len(mock_brain.brain.checks) == 5 and stats['latency']['checks']['count'] == 5
+    assert stats['wasted'].get('early_polls', 0) == 0
+    failed = {alpha_id for alpha_id, check in mock_brain.brain.checks.items() if not check['passed']}
+    assert failed and failed != set(ids)
+    for alpha_id in ids:
+        tags = mock_brain.brain.alphas[alpha_id]['tags']
+        assert tags == ([] if alpha_id in failed else ['OKOK'])
+    with BlacklistStore('blacklist.db') as blacklist:
+        assert blacklist.filter(ids) == [alpha_id for alpha_id in ids if alpha_id not in failed]
+        assert {blacklist.reason(alpha_id)[0] for alpha_id in failed} == {'FAIL'}
+    assert f"失败: {len(failed)} 个" in result.stdout
@@ -0,0 +1,46 @@
+"""5.auto-submit.py：取PnL时遇到4xx和持续的错误不会卡住相关性预筛"""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+from correlation import CorrelationEngine, PnlCache
+from session_manager import get_session
+from tests.conftest import ROOT
+
+
+@pytest.fixture
+def auto_submit(monkeypatch):
+    """按模块导入脚本（脚本在导入时解析命令行参数）"""
+    monkeypatch.setattr(sys, 'argv', ['5.auto-submit.py'])
+    spec = importlib.util.spec_from_file_location('auto_submit', os.path.join(ROOT, '5.auto-submit.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def pnl_requests(server):
+    return server.stats()['requests'].get('pnl', {})
+
+
+def test_missing_pnl_is_skipped(mock_brain, auto_submit):
+    session = get_session('u1', 'p')
+    alpha_id = mock_brain.brain._new_alpha({'regular': 'rank(close)'})
+
+    assert auto_submit.get_pnl(session, 'NOSUCH') is None
+    assert pnl_requests(mock_brain).get(404) == 1
+    assert auto_submit.get_pnl(session, alpha_id)['records']
+
+    engine = CorrelationEngine(PnlCache('pnl.db'), lambda alpha_id: auto_submit.get_pnl(session, alpha_id))
+    assert engine.set_active([alpha_id, 'NOSUCH']) == 1
+
+
+def test_server_errors_give_up(mock_brain, auto_submit):
+    session = get_session('u1', 'p')
+    session.refresh()
+    alpha_id = mock_brain.brain._new_alpha({'regular': 'rank(close)'})
+    mock_brain.brain.error_rate = 1.0
+
+    assert auto_submit.get_pnl(session, alpha_id, max_errors=2) is None
+    assert pnl_requests(mock_brain) == {503: 2}
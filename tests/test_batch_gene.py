@@ -0,0 +1,22 @@
+"""1.batch-gene.py：整个运行只登录一次，按字段目录生成并模拟"""
+import json
+import os
+import subprocess
+import sys
+
+from tests.conftest import ROOT
+
+
+def test_simulates_with_one_session(mock_brain):
+    mock_brain.brain.datafields = 3
+    with open('credentials.txt', 'w') as f:
+        json.dump(['u@example.com', 'p'], f)
+    env = dict(os.environ, BRAIN_API_URL=mock_brain.url)
+    result = subprocess.run([sys.executable, os.path.join(ROOT, '1.batch-gene.py')], env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+
+    stats = mock_brain.stats()['requests']
+    assert sum(stats['authentication'].values()) == 1
+    assert stats['simulations'] == {201: 3}
+    assert '3: ' in result.stdout, stats
@@ -0,0 +1,113 @@
+"""blacklist_store：缓存写入、有效期和按批查询"""
+import os
+import time
+
+from blacklist_store import BlacklistStore
+
+
+def test_pending_entries_are_visible_before_flush():
+    store = BlacklistStore('bl.db', batch_size=100, flush_interval=60)
+    other = BlacklistStore('bl.db')
+    store.add('A', reason='FAIL')
+    assert 'A' in store and store.filter(['A', 'B']) == ['B']
+    # 另一个进程要等写入后才能看到
+    assert 'A' not in other
+    assert store.flush() == 1
+    assert 'A' in other
+    store.close()
+    other.close()
+
+
+def test_batch_size_triggers_write():
+    store = BlacklistStore('bl.db', batch_size=3, flush_interval=60)
+    other = BlacklistStore('bl.db')
+    for alpha_id in 'ABC':
+        store.add(alpha_id)
+    assert not store._pending
+    assert other.filter('ABCD') == ['D']
+    store.close()
+    other.close()
+
+
+def test_timer_writes_slow_additions():
+    store = BlacklistStore('bl.db', batch_size=100, flush_interval=0.1)
+    other = BlacklistStore('bl.db')
+    store.add('A')
+    deadline = time.monotonic() + 5
+    while 'A' not in other and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert 'A' in other
+    store.close()
+    other.close()
+
+
+def test_close_writes_pending():
+    with BlacklistStore('bl.db', flush_interval=60) as store:
+        store.add('A', reason='passed')
+    with BlacklistStore('bl.db') as store:
+        assert store.reason('A')[0] == 'passed'
+
+
+def test_ttl_by_reason():
+    with BlacklistStore('bl.db', ttl={'FAIL': 0.2}) as store:
+        store.add('A', reason='FAIL')
+        store.add('B', reason='403')
+        store.add('C', reason='manual')
+        store.add('D', reason='manual', ttl=0.2)
+        assert store.filter('ABCD') == []
+        reason, added_at, expires_at = store.reason('B')
+        assert reason == '403' and abs(expires_at - added_at - 24 * 3600) < 1
+        assert store.reason('C')[2] is None
+        time.sleep(0.3)
+        assert store.filter('ABCD') == ['A', 'D']
+        assert 'A' not in store and 'B' in store
+        assert len(store) == 2
+        assert store.reasons() == {'403': 1, 'manual': 1}
+        assert store.purge_expired() == 2
+        assert store.reason('A') is None
+
+
+def test_expired_pending_entry():
+    with BlacklistStore('bl.db', flush_interval=60) as store:
+        store.add('A', ttl=0.1)
+        time.sleep(0.2)
+        assert 'A' not in store and store.filter(['A']) == ['A']
+
+
+def test_filter_keeps_order_across_query_chunks():
+    ids = [f"ID{i:05d}" for i in range(1200)]
+    with BlacklistStore('bl.db', batch_size=10000) as store:
+        for alpha_id in ids[::7]:
+            store.add(alpha_id)
+        store.flush()
+        store.add(ids[1])
+        assert store.filter(ids) == [alpha_id for i, alpha_id in enumerate(ids) if i % 7 and i != 1]
+
+
+def test_remove():
+    with BlacklistStore('bl.db', flush_interval=60) as store:
+        store.add('A')
+        store.add('B')
+        store.flush()
+        store.add('C')
+        store.remove('A')
+        store.remove('C')
+        assert store.filter('ABC') == ['A', 'C']
+
+
+def test_import_text_once_and_keeps_reasons():
+    with open('blacklist.txt', 'w') as f:
+        f.write('A\nB\n\nC\n')
+    with BlacklistStore('bl.db') as store:
+        store.add('B', reason='FAIL')
+        store.flush()
+        assert store.import_text('blacklist.txt') == 3
+        assert store.reason('A')[0] == 'manual' and store.reason('B')[0] == 'FAIL'
+        # 文件没变就不再读取
+        assert store.import_text('blacklist.txt') == 0
+        with open('blacklist.txt', 'a') as f:
+            f.write('D\n')
+        os.utime('blacklist.txt', (time.time() + 10, time.time() + 10))
+        assert store.import_text('blacklist.txt') == 4
+        assert len(store) == 4
+        assert store.import_text('missing.txt') == 0
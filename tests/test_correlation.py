@@ -0,0 +1,142 @@
+"""correlation：PnL缓存和本地自相关预筛"""
+import time
+
+import numpy as np
+import pytest
+
+from correlation import PNL_URL, CorrelationEngine, PnlCache, parse_pnl
+from rate_limiter import limited_request
+from session_manager import get_session
+
+
+def make_fetch():
+    """经mock_server取PnL（第一次请求返回Retry-After），记下每个alpha的请求次数"""
+    session = get_session('u1', 'p')
+    calls = []
+
+    def fetch(alpha_id):
+        calls.append(alpha_id)
+        while True:
+            response = limited_request(session, 'get', PNL_URL.format(alpha_id=alpha_id))
+            if 'retry-after' not in response.headers:
+                return response.json()
+            time.sleep(float(response.headers['Retry-After']))
+    fetch.calls = calls
+    return fetch
+
+
+def seed(server, count):
+    return [server.brain._new_alpha({'regular': f"rank(ts_delta(close, {i + 1}))"}) for i in range(count)]
+
+
+def reference_correlation(a, b, end, window_days, min_overlap):
+    """逐对计算：各自差分得到日PnL，取以end结尾的窗口内双方都有的日期做Pearson相关"""
+    daily = []
+    for days, pnl in (a, b):
+        daily.append(dict(zip(days[1:].tolist(), np.diff(pnl).tolist())))
+    common = sorted(day for day in daily[0] if day in daily[1] and end - window_days <= day <= end)
+    if len(common) < min_overlap:
+        return 0.0
+    x = np.array([daily[0][day] for day in common])
+    y = np.array([daily[1][day] for day in common])
+    if x.std() == 0 or y.std() == 0:
+        return 0.0
+    return float(np.corrcoef(x, y)[0, 1])
+
+
+def test_parse_pnl_uses_schema_and_sorts():
+    payload = {'schema': {'properties': [{'name': 'pnl'}, {'name': 'date'}]},
+               'records': [[3.0, '2024-01-03'], [1.0, '2024-01-01'], [2.0, '2024-01-02']]}
+    days, pnl = parse_pnl(payload)
+    assert np.diff(days).tolist() == [1, 1]
+    assert pnl.tolist() == [1.0, 2.0, 3.0]
+    assert parse_pnl({'records': []}) is None
+    assert parse_pnl(None) is None
+
+
+def test_pnl_cache_round_trip():
+    cache = PnlCache('pnl.db')
+    cache.put('A', np.array([1, 2, 3]), np.array([0.5, 1.5, -2.0]))
+    assert len(cache) == 1
+    found = cache.get_many(['A', 'B'])
+    assert list(found) == ['A']
+    assert found['A'][0].tolist() == [1, 2, 3] and found['A'][1].tolist() == [0.5, 1.5, -2.0]
+    cache.close()
+    assert PnlCache('pnl.db').get_many(['A'])['A'][1].tolist() == [0.5, 1.5, -2.0]
+
+
+def test_matches_pairwise_correlation():
+    rng = np.random.default_rng(7)
+    factor = rng.normal(size=800)
+    series = {}
+    for i in range(6):
+        days = np.sort(rng.choice(np.arange(800), size=rng.integers(200, 700), replace=False))
+        noise = rng.normal(size=800)
+        series[f"A{i}"] = (days, np.cumsum(factor * (i % 3) + noise)[days])
+    # 共同日期太少和PnL不变的alpha
+    series['short'] = (np.arange(700, 740), np.cumsum(rng.normal(size=40)))
+    series['flat'] = (np.arange(0, 800), np.zeros(800))
+
+    class Cache(PnlCache):
+        def get_many(self, alpha_ids):
+            return {alpha_id: series[alpha_id] for alpha_id in alpha_ids if alpha_id in series}
+
+    engine = CorrelationEngine(Cache(':memory:'), lambda alpha_id: None, window_days=500, min_overlap=60)
+    active = ['A0', 'A1', 'A2']
+    candidates = ['A3', 'A4', 'A5', 'short', 'flat', 'missing']
+    assert engine.set_active(active) == 3
+    result = engine.correlations(candidates)
+    # 窗口以已提交alpha的最新日期为准
+    end = max(series[alpha_id][0][-1] for alpha_id in active)
+    for i, a in enumerate(active):
+        for j, b in enumerate(candidates[:-1]):
+            assert result[i, j] == pytest.approx(reference_correlation(series[a], series[b], end, 500, 60), abs=1e-9)
+    assert np.isnan(result[:, -1]).all()
+
+    # 追加一行和整个重建的结果相同
+    engine.add_active('A3')
+    rebuilt = CorrelationEngine(Cache(':memory:'), lambda alpha_id: None, window_days=500, min_overlap=60)
+    rebuilt.set_active(active + ['A3'])
+    np.testing.assert_allclose(engine.correlations(candidates[1:]), rebuilt.correlations(candidates[1:]))
+
+
+def test_rank_with_mock_pnl(mock_brain):
+    ids = seed(mock_brain, 12)
+    active, candidates = ids[:4], ids[4:]
+    fetch = make_fetch()
+    engine = CorrelationEngine(PnlCache('pnl.db'), fetch)
+    assert engine.set_active(active) == 4
+    assert engine.max_correlation(active).tolist() == pytest.approx([1.0] * 4)
+
+    predicted = engine.max_correlation(candidates + ['NOSUCH'])
+    kept, skipped = engine.rank(candidates + ['NOSUCH'], limit=0.7, margin=0.05)
+    assert sorted(alpha_id for alpha_id, _ in kept + skipped) == sorted(candidates + ['NOSUCH'])
+    assert all(value > 0.75 for _, value in skipped)
+    values = [value for _, value in kept]
+    assert kept[-1][0] == 'NOSUCH' and np.isnan(values[-1])
+    assert values[:-1] == sorted(values[:-1]) and all(value <= 0.75 for value in values[:-1])
+    assert dict(kept + skipped)[candidates[0]] == pytest.approx(predicted[0])
+
+    # 同一个主因子的alpha相关很高，提交后再排序时被跳过
+    submitted = kept[0][0]
+    engine.add_active(submitted)
+    assert engine.max_correlation([submitted])[0] == pytest.approx(1.0)
+    assert submitted in [alpha_id for alpha_id, _ in engine.rank(candidates)[1]]
+
+    # PnL只取一次：新的引擎从缓存读取，不再请求服务器；取不到的下次仍会重试
+    requested = len(fetch.calls)
+    assert sorted(alpha_id for alpha_id in fetch.calls if alpha_id != 'NOSUCH') == sorted(ids)
+    other = CorrelationEngine(PnlCache('pnl.db'), fetch)
+    other.set_active(active)
+    np.testing.assert_allclose(other.max_correlation(candidates), predicted[:-1])
+    assert fetch.calls[requested:] == []
+
+
+def test_without_active_alphas(mock_brain):
+    ids = seed(mock_brain, 2)
+    engine = CorrelationEngine(PnlCache('pnl.db'), make_fetch())
+    assert engine.set_active([]) == 0
+    result = engine.max_correlation(ids + ['NOSUCH'])
+    assert result[:2].tolist() == [0.0, 0.0] and np.isnan(result[2])
+    kept, skipped = engine.rank(ids)
+    assert skipped == [] and [alpha_id for alpha_id, _ in kept] == ids
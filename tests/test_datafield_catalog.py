@@ -0,0 +1,94 @@
+"""datafield_catalog：数据字段的本地目录、按数据集同步和全文搜索"""
+import pytest
+
+from datafield_catalog import DatafieldCatalog
+from helper import get_standard_search_scope
+from session_manager import get_session
+
+SCOPE = get_standard_search_scope()
+CHN = dict(SCOPE, region='CHN')
+
+
+def field(field_id, dataset='pv1', type='MATRIX', coverage=0.9, description='', user_count=0, unit=None):
+    record = {'id': field_id, 'dataset': {'id': dataset, 'name': dataset.upper()}, 'category': {'id': 'pv'},
+              'type': type, 'coverage': coverage, 'userCount': user_count, 'alphaCount': 0,
+              'description': description}
+    if unit:
+        record['unit'] = unit
+    return record
+
+
+def data_field_pages(server):
+    return server.stats()['requests'].get('data_fields', {}).get(200, 0)
+
+
+def test_sync_by_dataset_with_max_age(mock_brain):
+    session = get_session('u1', 'p')
+    catalog = DatafieldCatalog('catalog.db')
+    assert catalog.synced_at(SCOPE, 'pv1') is None
+    assert catalog.sync(session, SCOPE, dataset_ids=['pv1', 'fundamental6']) == 240
+    pages = data_field_pages(mock_brain)
+    assert len(catalog) == 240 and catalog.synced_at(SCOPE, 'pv1') is not None
+    # 有效期内不再请求服务器
+    assert catalog.sync(session, SCOPE, dataset_ids=['pv1']) == 0
+    assert data_field_pages(mock_brain) == pages
+    # 强制重新同步时整体替换，不会重复
+    assert catalog.sync(session, SCOPE, dataset_ids=['pv1'], max_age=0) == 120
+    assert len(catalog) == 240
+    assert catalog.ids(SCOPE, dataset='pv1', type='MATRIX')[:3] == ['pv1_field_0', 'pv1_field_1', 'pv1_field_10']
+    assert len(catalog.ids(SCOPE, dataset='pv1', type='VECTOR')) == 24
+    assert catalog.ids(CHN) == []
+
+
+def test_whole_scope_sync_covers_datasets():
+    catalog = DatafieldCatalog('catalog.db')
+    catalog.replace(SCOPE, '', [field('close'), field('sales', dataset='fundamental6')])
+    assert catalog.synced_at(SCOPE, 'fundamental6') == catalog.synced_at(SCOPE, '')
+    assert catalog.sync(None, SCOPE, dataset_ids=['fundamental6']) == 0
+
+
+def test_query_filters_and_order():
+    catalog = DatafieldCatalog('catalog.db')
+    catalog.replace(SCOPE, 'pv1', [
+        field('close', coverage=1.0, description='Daily close price', user_count=50),
+        field('volume', coverage=0.95, description='Daily volume', user_count=80),
+        field('adv20', coverage=0.6, description='Average daily volume over 20 days'),
+        field('news', type='VECTOR', description='News sentiment'),
+    ])
+    catalog.replace(CHN, 'pv1', [field('close'), field('turnover')])
+    assert catalog.ids(SCOPE, type='MATRIX', min_coverage=0.8) == ['close', 'volume']
+    assert catalog.ids(SCOPE, type=['MATRIX', 'VECTOR'], max_coverage=0.9) == ['adv20', 'news']
+    assert catalog.ids(SCOPE, min_user_count=60) == ['volume']
+    assert catalog.ids(SCOPE, order_by='-coverage', limit=2) == ['close', 'volume']
+    assert sorted(catalog.ids()) == ['adv20', 'close', 'close', 'news', 'turnover', 'volume']
+    frame = catalog.query(SCOPE, dataset='pv1', type='MATRIX')
+    assert frame['id'].tolist() == ['adv20', 'close', 'volume']
+    assert frame.set_index('id').loc['close', 'dataset_name'] == 'PV1'
+    with pytest.raises(ValueError):
+        catalog.ids(SCOPE, order_by='raw')
+
+
+def test_full_text_search_follows_replacements():
+    catalog = DatafieldCatalog('catalog.db')
+    catalog.replace(SCOPE, 'pv1', [field('close', description='Daily close price'),
+                                   field('adv20', description='Average daily volume')])
+    assert catalog.ids(SCOPE, search='daily') == ['adv20', 'close']
+    assert catalog.ids(SCOPE, search='vol aver') == ['adv20']
+    assert catalog.ids(SCOPE, search='adv') == ['adv20']
+    assert catalog.ids(SCOPE, search='!!') == []
+    # 替换后旧描述不能再被搜到
+    catalog.replace(SCOPE, 'pv1', [field('close', description='Last traded price')])
+    assert catalog.ids(SCOPE, search='daily') == []
+    assert catalog.ids(SCOPE, search='traded') == ['close']
+
+
+def test_field_types_and_get():
+    catalog = DatafieldCatalog('catalog.db')
+    catalog.replace(SCOPE, 'pv1', [field('close', unit='CSPRICE'), field('news', type='VECTOR')])
+    catalog.replace(dict(SCOPE, universe='TOP500'), 'pv1', [field('sector', type='GROUP')])
+    catalog.replace(CHN, 'pv1', [field('turnover')])
+    assert catalog.field_types(SCOPE) == {'close': ('MATRIX', 'CSPRICE'), 'news': ('VECTOR', None),
+                                          'sector': ('GROUP', None)}
+    assert catalog.get('close', SCOPE)['unit'] == 'CSPRICE'
+    assert catalog.get('close', CHN) is None
+    assert catalog.get('turnover')['dataset']['id'] == 'pv1'
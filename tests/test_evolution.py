@@ -0,0 +1,166 @@
+"""evolution：从合格alpha出发的变异、交叉和(mu + lambda)选择"""
+import os
+
+import pytest
+
+from evolution import (GROUPS, OPERATOR_GROUPS, WINDOWS, Evolution, Individual, _depth, _walk, load_seeds,
+                       parse_csv_settings)
+from fastexpr import Name, canonicalize, parse
+from validator import ExpressionValidator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEEDS = [
+    {'expression': 'group_rank(ts_mean(close, 20), sector)', 'settings': {'decay': 4}, 'sharpe': 1.5,
+     'fitness': 1.1},
+    {'expression': '-rank(ts_delta(volume, 5))', 'settings': {}, 'sharpe': 1.3, 'fitness': 1.0},
+    {'expression': 'x = ts_zscore(returns, 60); rank(x)', 'settings': {}, 'sharpe': 0.5, 'fitness': 0.4},
+]
+
+
+def scorer(fail=()):
+    """Sharpe随表达式中close的个数增加（含一个close即合格）；fail中的表达式模拟失败"""
+    batches = []
+
+    def simulate(batch):
+        batches.append([(payload['regular'], tuple(sorted(payload['settings'].items()))) for payload in batch])
+        results = []
+        for payload in batch:
+            if payload['regular'] in fail:
+                results.append(None)
+                continue
+            sharpe = 0.8 + 0.5 * payload['regular'].count('close')
+            results.append({'id': payload['regular'], 'is': {'sharpe': sharpe, 'fitness': sharpe}})
+        return results
+    simulate.batches = batches
+    return simulate
+
+
+def test_parse_csv_settings():
+    text = ("{'Region': 'USA', 'Universe': 'TOP200', 'Language': 'Fast Expression', 'Decay': '80', "
+            "'Delay': '1', 'Truncation': '0.02', 'Neutralization': 'Subindustry', 'NaN_Handling': 'Off'}")
+    assert parse_csv_settings(text) == {'region': 'USA', 'universe': 'TOP200', 'decay': 80, 'delay': 1,
+                                        'truncation': 0.02, 'neutralization': 'SUBINDUSTRY', 'nanHandling': 'OFF'}
+
+
+def test_load_seeds(tmp_path):
+    seeds = load_seeds(os.path.join(ROOT, 'alpha50.csv'))
+    assert seeds and seeds[0] == {'expression': 'rank(mdf_pva)', 'settings': parse_csv_settings(
+        "{'Region': 'USA', 'Universe': 'TOP200', 'Decay': '80', 'Delay': '1', 'Truncation': '0.02', "
+        "'Neutralization': 'Subindustry', 'Pasteurization': 'On', 'NaN_Handling': 'Off', "
+        "'Unit_Handling': 'Verify'}"), 'sharpe': 1.25, 'fitness': 1.2}
+    path = tmp_path / 'seeds.csv'
+    path.write_text(",settingdict,formula,Sharpe,Fitness\n"
+                    "0,\"{'Decay': '4'}\",rank(close),1.4,\n"
+                    "1,\"{}\",rank(close,1.4,1.0\n")
+    assert load_seeds(str(path)) == [{'expression': 'rank(close)', 'settings': {'decay': 4}, 'sharpe': 1.4,
+                                      'fitness': None}]
+
+
+def test_seeds_deduplicated_and_required():
+    engine = Evolution(SEEDS + [{'expression': '-rank(ts_delta( volume ,5))'}], scorer(), seed=0)
+    assert len(engine.population) == 3
+    assert [individual.passed for individual in engine.population] == [True, True, False]
+    assert engine.fields == ['close', 'returns', 'volume']
+    with pytest.raises(ValueError):
+        Evolution([], scorer())
+
+
+@pytest.mark.parametrize('kind', ['operator', 'window', 'field', 'group', 'wrap', 'settings'])
+def test_each_mutation_kind(kind):
+    engine = Evolution(SEEDS, scorer(), mutations={kind: 1}, fields=['open', 'high'], seed=1)
+    parent = engine.population[0]
+    for _ in range(20):
+        result = engine.mutate(parent)
+        if result is None:
+            continue
+        tree, settings, origin = result
+        assert origin == kind
+        child = Individual(tree, settings)
+        if kind == 'settings':
+            assert child.expression == parent.expression and settings != parent.settings
+            continue
+        assert settings == parent.settings and child.expression != parent.expression
+        parse(child.expression)
+        call = tree.args[0] if kind != 'wrap' else tree
+        if kind == 'operator':
+            assert tree.name in OPERATOR_GROUPS[3] or call.name in OPERATOR_GROUPS[1]
+        elif kind == 'window':
+            assert int(call.args[1].value) in WINDOWS
+        elif kind == 'field':
+            assert call.args[0].id in {'open', 'high', 'volume', 'returns'}
+        elif kind == 'group':
+            assert tree.args[1].id in GROUPS and tree.args[1].id != 'sector'
+        elif kind == 'wrap':
+            assert tree.args[0] == parent.tree
+
+
+def test_wrap_keeps_sign_outside():
+    engine = Evolution(SEEDS, scorer(), mutations={'wrap': 1}, seed=2)
+    negative = engine.population[1]
+    tree, _, _ = engine.mutate(negative) or engine.mutate(negative)
+    assert tree.op == '-' and tree.operand.args[0] == negative.tree.operand
+
+
+def test_crossover_never_moves_variables():
+    engine = Evolution(SEEDS, scorer(), seed=3)
+    receiver, donor = engine.population[0], engine.population[2]
+    for _ in range(30):
+        tree, _ = engine.crossover(receiver, donor)
+        assert not any(type(node) is Name and node.id == 'x' for _, node, _ in _walk(tree))
+
+
+def test_offspring_are_new_and_bounded():
+    engine = Evolution(SEEDS, scorer(), max_depth=5, seed=4)
+    children = engine.offspring(30)
+    keys = [child.key for child in children]
+    assert len(children) == 30 and len(set(keys)) == 30
+    parents = {individual.key for individual in engine.population}
+    assert not parents & set(keys)
+    assert all(_depth(child.tree) <= 5 for child in children)
+    # 变异产生的rank(rank(x))、-(-x)已被化简
+    assert not any('rank(rank(' in child.expression or '-(-' in child.expression for child in children)
+    assert all(canonicalize(child.expression) == child.key[0] for child in children)
+
+
+def test_run_keeps_best_and_counts():
+    simulate = scorer()
+    engine = Evolution(SEEDS, simulate, population_size=8, seed=5)
+    history = engine.run(generations=6)
+    assert engine.generation == 6 and len(history) == engine.simulated == sum(map(len, simulate.batches))
+    assert all(len(batch) == 8 for batch in simulate.batches)
+    simulated = [(canonicalize(e), settings) for batch in simulate.batches for e, settings in batch]
+    assert len(set(simulated)) == len(simulated)
+    # (mu + lambda)：种群按分数排序，最好的个体不会丢失
+    scores = [individual.score() for individual in engine.population]
+    assert scores == sorted(scores, reverse=True)
+    best = max(record['fitness'] for record in history)
+    assert engine.population[0].fitness == best
+    assert engine.passed == sum(record['passed'] for record in history)
+    assert engine.summary().startswith(f"passed {engine.passed}/{engine.simulated} in 6 generations")
+
+
+def test_run_stops_at_budget_and_target():
+    engine = Evolution(SEEDS, scorer(), population_size=5, seed=6)
+    engine.run(generations=100, budget=12)
+    assert engine.simulated == 15
+    engine = Evolution(SEEDS, scorer(), population_size=5, seed=6)
+    engine.run(generations=100, target=1)
+    assert engine.passed >= 1 and engine.generation < 100
+
+
+def test_failed_results_are_not_kept():
+    engine = Evolution(SEEDS, lambda batch: [None] * len(batch), population_size=4, seed=7)
+    assert engine.run(generations=10) == []
+    # 连续3代没有结果后停止，失败的后代之后还可以重新产生
+    assert engine.generation == 3 and len(engine.population) == 3
+    assert len(engine.seen) == 3
+
+
+def test_validator_rejects_children():
+    validator = ExpressionValidator(fields={'close': 'MATRIX', 'volume': 'MATRIX', 'returns': 'MATRIX',
+                                            'sector': 'GROUP'})
+    simulate = scorer()
+    engine = Evolution(SEEDS, simulate, population_size=10, fields=['nonexistent'], validator=validator, seed=8)
+    engine.run(generations=3)
+    assert simulate.batches
+    assert not any('nonexistent' in e for batch in simulate.batches for e, _ in batch)
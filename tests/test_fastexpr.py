@@ -0,0 +1,90 @@
+"""fastexpr：解析、化简和按骨架缓存的规范化"""
+import pytest
+
+from fastexpr import FastExprError, canonicalize, dedupe_expressions, parse, simplify, to_string
+from result_cache import payload_key
+from tests.conftest import make_alpha
+
+
+def full(text):
+    return to_string(simplify(parse(text)))
+
+
+@pytest.mark.parametrize('text', [
+    'rank(close) + volume',
+    'group_rank(ts_rank(vwap, 20) * rank(close), subindustry)',
+    'add(rank(vwap), multiply(close, ts_mean(vwap, 10)), filter=true)',
+    'max(b, a) - min(d, c)',
+    'a = close + open; rank(a * volume)',
+    'b == a == c',
+    'c ? b + a : (d || c)',
+])
+def test_skeleton_matches_full_parse(text):
+    assert canonicalize(text) == full(text)
+
+
+def test_commutative_operands_sorted_per_expression():
+    # 同一个骨架，排序结果随标识符变化
+    assert canonicalize('ts_rank(b, 5) * rank(a)') == 'rank(a) * ts_rank(b, 5)'
+    assert canonicalize('ts_rank(a, 5) * rank(z)') == 'rank(z) * ts_rank(a, 5)'
+    assert canonicalize('add(zz, aa, filter=true)') == 'add(aa, zz, filter=true)'
+
+
+def test_equivalent_writings():
+    assert canonicalize('volume + rank( close )') == canonicalize('rank(close)+volume')
+    assert canonicalize('c + (b + a)') == 'a + b + c'
+    assert canonicalize('rank(rank(close))') == 'rank(close)'
+    assert canonicalize('-(-(close))') == 'close'
+    assert canonicalize('-(-(b + a)) + c') == canonicalize('c + b + a')
+
+
+def test_double_not_kept():
+    # !!x 是0/1，不是x，不能与x当作同一个alpha
+    assert canonicalize('!(!(close))') == '!!close'
+    assert canonicalize('!(!(!(close)))') == '!!!close'
+    assert payload_key(make_alpha('!(!(close))')) != payload_key(make_alpha('close'))
+    assert payload_key(make_alpha('-(-(close))')) == payload_key(make_alpha('close'))
+
+
+def test_equality_chain_not_flattened():
+    assert canonicalize('c == (b == a)') == 'a == b == c'
+    assert canonicalize('(a == b) == c') != canonicalize('a == (b == c)')
+
+
+def test_syntax_error_reports_original_text():
+    with pytest.raises(FastExprError, match='rank'):
+        canonicalize('rank(close')
+    with pytest.raises(FastExprError):
+        canonicalize('close +')
+
+
+def test_dedupe_expressions():
+    expressions = ['rank(close) + volume', 'volume+rank(close)', 'rank(open)', 'not valid (']
+    assert list(dedupe_expressions(expressions, canonical=False)) == ['rank(close) + volume', 'rank(open)',
+                                                                       'not valid (']
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('-x^2', '-x ^ 2'),
+    ('(-x)^2', '(-x) ^ 2'),
+    ('-(x^2)', '-x ^ 2'),
+    ('x^-y', 'x ^ (-y)'),
+    ('x^y^z', 'x ^ y ^ z'),
+    ('(x^y)^z', '(x ^ y) ^ z'),
+    ('-x*y', '-x * y'),
+    ('-(x*y)', '-(x * y)'),
+    ('(-2)^x', '(-2) ^ x'),
+    ('!a && b', '!a && b'),
+    ('!(b && a)', '!(a && b)'),
+])
+def test_precedence_round_trip(text, expected):
+    canonical = canonicalize(text)
+    assert canonical == expected
+    # 输出的文本重新解析得到同一棵树
+    assert simplify(parse(canonical)) == simplify(parse(text))
+
+
+def test_unary_minus_binds_looser_than_power():
+    assert parse('-x^2') == parse('-(x^2)')
+    assert parse('-x^2') != parse('(-x)^2')
+    assert canonicalize('-x^2') != canonicalize('(-x)^2')
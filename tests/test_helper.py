@@ -0,0 +1,122 @@
+"""helper：Alpha去重、组合的惰性访问与分片、数据字段的并发获取和缓存"""
+import itertools
+import os
+
+import pytest
+import requests
+
+from helper import (AlphaCombinations, create_simulation_data, dedupe_alpha_list, get_datafields,
+                    get_standard_search_scope, iter_unique_alphas)
+from session_manager import get_session
+from tests.conftest import make_alpha
+
+
+def test_unique_alphas_keep_original_expression():
+    alphas = [make_alpha('volume+rank( close )'), make_alpha('rank(close) + volume'), make_alpha('-x^2'),
+              make_alpha('(-x)^2'), make_alpha('rank(close) + volume', decay=4)]
+    unique = list(iter_unique_alphas(alphas))
+    assert [alpha['regular'] for alpha in unique] == ['volume+rank( close )', '-x^2', '(-x)^2', 'rank(close) + volume']
+    assert unique[0] is alphas[0]
+
+
+def test_unparsable_expression_deduped_verbatim():
+    alphas = [make_alpha('rank(close'), make_alpha('rank(close'), make_alpha('rank( close')]
+    assert [alpha['regular'] for alpha in dedupe_alpha_list(alphas)] == ['rank(close', 'rank( close']
+
+
+def _combos():
+    return AlphaCombinations("{op}({f}, {d})", [('op', ['ts_rank', 'ts_mean']), ('f', ['close', 'open', 'volume']),
+                                                ('d', [5, 22])])
+
+
+def _expected():
+    return [f"{op}({f}, {d})" for op, f, d in itertools.product(['ts_rank', 'ts_mean'], ['close', 'open', 'volume'],
+                                                                 [5, 22])]
+
+
+def test_combinations_match_nested_loops():
+    combos = _combos()
+    expected = _expected()
+    assert len(combos) == len(expected) == 12
+    assert list(combos) == expected
+    assert [combos[i] for i in range(len(combos))] == expected
+    assert combos[-1] == expected[-1]
+    assert combos.values_at(7) == {'op': 'ts_mean', 'f': 'close', 'd': 22}
+    with pytest.raises(IndexError):
+        combos[12]
+
+
+def test_slices_are_lazy_views():
+    combos = _combos()
+    expected = _expected()
+    view = combos[3:9]
+    assert isinstance(view, AlphaCombinations)
+    assert len(view) == 6 and list(view) == expected[3:9]
+    assert view[1:3][0] == expected[4]
+    assert combos[::5] == expected[::5]
+    assert len(combos[10:2]) == 0
+
+
+@pytest.mark.parametrize('n', [1, 3, 5, 12, 20])
+def test_shards_partition_the_sequence(n):
+    combos = _combos()
+    shards = [combos.shard(k, n) for k in range(n)]
+    assert [alpha for shard in shards for alpha in shard] == _expected()
+    assert max(map(len, shards)) - min(map(len, shards)) <= 1
+
+
+def test_shard_out_of_range():
+    with pytest.raises(ValueError):
+        _combos().shard(4, 4)
+    with pytest.raises(ValueError):
+        _combos().shard(-1, 4)
+
+
+def test_simulation_data_matches_create_simulation_data():
+    settings = {'decay': 6}
+    data = _combos().shard(1, 3).simulation_data(settings)
+    assert len(data) == 4
+    for payload, expression in zip(data, _expected()[4:8]):
+        assert dict(payload) == create_simulation_data(expression, settings)
+    assert dict(data[1:][0]) == create_simulation_data(_expected()[5], settings)
+
+
+def datafield_requests(server):
+    """成功返回的分页数（新会话的第一个请求先收到401再登录）"""
+    return server.stats()['requests'].get('data_fields', {}).get(200, 0)
+
+
+def test_datafields_all_pages_then_cache(mock_brain):
+    mock_brain.brain.datafields = 260
+    session = get_session('u1', 'p')
+    scope = get_standard_search_scope()
+    fields = get_datafields(session, scope, 'fundamental6')
+    assert fields['id'].tolist() == [f"fundamental6_field_{i}" for i in range(260)]
+    assert datafield_requests(mock_brain) == 6
+
+    # 有效期内读缓存；不同数据集分开缓存；cache_ttl=0强制重新获取
+    assert get_datafields(session, scope, 'fundamental6').equals(fields)
+    assert datafield_requests(mock_brain) == 6
+    assert len(get_datafields(session, scope, 'pv1')) == 260
+    assert datafield_requests(mock_brain) == 12
+    get_datafields(session, scope, 'fundamental6', cache_ttl=0)
+    assert datafield_requests(mock_brain) == 18
+    assert len(os.listdir(os.path.join('.cache', 'datafields'))) == 2
+
+
+def test_datafields_search_not_truncated(mock_brain):
+    mock_brain.brain.datafields = 260
+    fields = get_datafields(get_session('u1', 'p'), get_standard_search_scope(), search='_field_1', cache_dir=None)
+    # field_1、field_10..19、field_100..199
+    assert len(fields) == 111
+    assert not os.path.exists('.cache')
+
+
+def test_datafields_failure_is_not_cached(mock_brain):
+    session = get_session('u1', 'p')
+    scope = get_standard_search_scope()
+    get_datafields(session, scope, 'pv1')
+    mock_brain.brain.error_rate = 1.0
+    with pytest.raises(requests.HTTPError):
+        get_datafields(session, scope, 'fundamental6')
+    assert len(os.listdir(os.path.join('.cache', 'datafields'))) == 1
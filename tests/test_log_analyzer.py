@@ -0,0 +1,37 @@
+"""log_analyzer：命令行输出"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'log_analyzer.py')
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / 'simulation.log'
+    lines = []
+    for i in range(2000):
+        lines.append(f"2026-10-17 10:{i // 60 % 60:02d}:{i % 60:02d},000 - INFO - Starting simulation for alpha: rank(x{i})")
+        lines.append(f"2026-10-17 10:{i // 60 % 60:02d}:{i % 60:02d},500 - INFO - Location: http://x/simulations/{i}")
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+def test_json_output_is_one_object(log_file):
+    output = subprocess.run([sys.executable, SCRIPT, log_file, '--json'], capture_output=True, text=True,
+                            check=True).stdout
+    summary = json.loads(output)
+    assert summary['new_bytes'] == os.path.getsize(log_file)
+
+
+def test_closed_pipe_exits_quietly(log_file):
+    process = subprocess.Popen([sys.executable, SCRIPT, log_file, '--follow', '0.01'], stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    process.stdout.readline()
+    process.stdout.close()
+    _, stderr = process.communicate(timeout=30)
+    assert b'BrokenPipeError' not in stderr
+    assert b'Traceback' not in stderr
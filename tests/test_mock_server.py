@@ -0,0 +1,89 @@
+"""mock_server和benchmark：替身服务器的接口行为和端到端基准"""
+import argparse
+
+import pytest
+import requests
+
+import benchmark
+from mock_server import MockBrainServer, add_server_arguments
+
+
+@pytest.fixture
+def server():
+    server = MockBrainServer(latency=0, sim_duration=0.3, sim_sigma=0, poll_hint=0.1, max_concurrent_sims=2,
+                             token_ttl=60, seed_alphas=3, seed=1)
+    server.start()
+    yield server
+    server.stop()
+
+
+def signed_in(server, user='u1'):
+    session = requests.Session()
+    assert session.post(server.url + '/authentication', auth=(user, 'p')).status_code == 201
+    return session
+
+
+def test_authentication_required(server):
+    assert requests.get(server.url + '/users/self/alphas').status_code == 401
+    session = signed_in(server)
+    assert session.get(server.url + '/users/self/alphas').status_code == 200
+    server.brain.tokens.clear()
+    assert session.get(server.url + '/users/self/alphas').status_code == 401
+    assert server.stats()['wasted']['unauthorized'] == 2
+
+
+def test_simulation_lifecycle_and_concurrency_limit(server):
+    session = signed_in(server)
+    payload = {'type': 'REGULAR', 'settings': {'region': 'USA'}, 'regular': 'rank(close)'}
+    locations = [session.post(server.url + '/simulations', json=payload) for _ in range(3)]
+    assert [response.status_code for response in locations] == [201, 201, 429]
+    # 并发上限按账号计算
+    assert signed_in(server, 'u2').post(server.url + '/simulations', json=payload).status_code == 201
+
+    progress = session.get(locations[0].headers['Location'])
+    assert float(progress.headers['Retry-After']) <= 0.1 and 0 <= progress.json()['progress'] < 1
+    while 'Retry-After' in progress.headers:
+        progress = session.get(locations[0].headers['Location'])
+    alpha_id = progress.json()['alpha']
+    alpha = session.get(f"{server.url}/alphas/{alpha_id}").json()
+    assert alpha['regular'] == {'code': 'rank(close)'} and alpha['status'] == 'UNSUBMITTED'
+    # 完成后再次轮询记为浪费的请求
+    session.get(locations[0].headers['Location'])
+    assert server.stats()['wasted']['duplicate_polls'] == 1
+    assert session.get(server.url + '/simulations/missing').status_code == 404
+
+
+def test_alpha_list_filters_and_paging(server):
+    session = signed_in(server)
+    ids = [server.brain._new_alpha({'regular': f"rank(x{i})"}) for i in range(7)]
+    server.brain.alphas[ids[0]]['status'] = 'ACTIVE'
+    page = session.get(server.url + '/users/self/alphas?limit=4&offset=8&order=dateModified').json()
+    assert page['count'] == 10 and len(page['results']) == 2
+    active = session.get(server.url + '/users/self/alphas?status=ACTIVE').json()
+    assert [alpha['id'] for alpha in active['results']] == [ids[0]]
+
+
+def test_submit_once(server):
+    session = signed_in(server)
+    alpha_id = next(iter(server.brain.alphas))
+    assert session.post(f"{server.url}/alphas/{alpha_id}/submit").status_code == 201
+    assert session.post(f"{server.url}/alphas/{alpha_id}/submit").status_code == 403
+    assert server.brain.alphas[alpha_id]['status'] == 'ACTIVE'
+
+
+def benchmark_args(*argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--alphas', type=int, default=6)
+    parser.add_argument('--max_concurrent', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=120)
+    add_server_arguments(parser)
+    return parser.parse_args(['--latency', '0', '--sim_duration', '0.3', '--sim_sigma', '0', '--check_duration',
+                              '0.1', '--poll_hint', '0.2', '--seed', '1', *argv])
+
+
+def test_benchmark_simulator_path():
+    result = benchmark.run_path('simulator', benchmark_args())
+    assert result['returncode'] == 0
+    assert result['done'] == 6
+    assert result['p50'] is not None and result['alphas_per_hour'] > 0
+    assert result['wasted'].get('early_polls', 0) == 0
@@ -0,0 +1,93 @@
+"""paging：按offset分页的并发读取"""
+import logging
+import re
+
+import pytest
+
+from paging import PageFetchError, fetch_pages, page_offsets
+
+URL = "https://api.example.com/items?limit=10&offset={offset}"
+
+
+def make_fetch(total, fail=(), with_count=True, short=None):
+    """short: {offset: 条数}，该页只返回这么多条（分页期间有记录被删除）"""
+    requested = []
+    short = short or {}
+
+    def fetch(url):
+        offset = int(re.search(r'offset=(\d+)', url).group(1))
+        requested.append(offset)
+        if offset in fail:
+            return None
+        end = offset + short.get(offset, 10)
+        page = {'results': [{'id': i} for i in range(offset, min(end, total))]}
+        if with_count:
+            page['count'] = total
+        return page
+    fetch.requested = requested
+    return fetch
+
+
+def test_page_offsets():
+    assert list(page_offsets(35, 10)) == [10, 20, 30]
+    assert list(page_offsets(35, 10, max_items=20)) == [10]
+    assert list(page_offsets(5, 10)) == []
+
+
+def test_pages_merged_in_offset_order():
+    results = fetch_pages(make_fetch(95), URL, page_size=10, max_workers=4)
+    assert [item['id'] for item in results] == list(range(95))
+
+
+def test_max_items():
+    fetch = make_fetch(95)
+    results = fetch_pages(fetch, URL, page_size=10, max_items=25)
+    assert len(results) == 25
+    assert sorted(fetch.requested) == [0, 10, 20]
+
+
+def test_without_count_reads_sequentially():
+    fetch = make_fetch(42, with_count=False)
+    assert [item['id'] for item in fetch_pages(fetch, URL, page_size=10)] == list(range(42))
+    assert fetch.requested == [0, 10, 20, 30, 40]
+
+
+def test_failed_pages_raise_with_offsets(caplog):
+    with caplog.at_level(logging.ERROR), pytest.raises(PageFetchError) as info:
+        fetch_pages(make_fetch(95, fail={30, 70}), URL, page_size=10)
+    assert info.value.offsets == [30, 70]
+    assert len(info.value.results) == 75
+    assert '[30, 70]' in caplog.text
+
+
+def test_failure_after_short_page_still_raises():
+    with pytest.raises(PageFetchError) as info:
+        fetch_pages(make_fetch(95, fail={70}, short={30: 5}), URL, page_size=10)
+    assert info.value.offsets == [70]
+
+
+def test_pages_after_short_page_dropped_with_warning(caplog):
+    with caplog.at_level(logging.WARNING):
+        results = fetch_pages(make_fetch(95, short={30: 5}), URL, page_size=10)
+    assert [item['id'] for item in results] == list(range(35))
+    assert 'Dropped 10 results at offset 40 after the short page at offset 30' in caplog.text
+    assert len([record for record in caplog.records if 'Dropped' in record.message]) == 6
+
+
+def test_no_warning_for_the_last_short_page(caplog):
+    with caplog.at_level(logging.WARNING):
+        fetch_pages(make_fetch(95), URL, page_size=10)
+    assert 'Dropped' not in caplog.text
+
+
+def test_failed_first_page():
+    with pytest.raises(PageFetchError) as info:
+        fetch_pages(make_fetch(95, fail={0}), URL, page_size=10)
+    assert info.value.offsets == [0]
+    assert info.value.results == []
+
+
+def test_failed_page_without_count():
+    with pytest.raises(PageFetchError) as info:
+        fetch_pages(make_fetch(42, fail={20}, with_count=False), URL, page_size=10)
+    assert info.value.offsets == [20]
@@ -0,0 +1,91 @@
+"""payload_batch：列式批次、settings预设和预先拼好的请求体"""
+import json
+
+from helper import create_simulation_data
+from payload_batch import DEFAULT_SETTINGS, JSON_HEADERS, PayloadBatch, SettingsPresets, payload_body
+from rate_limiter import limited_request
+from session_manager import get_session
+
+
+def test_presets_are_shared_after_merging_defaults():
+    presets = SettingsPresets()
+    base = presets.intern()
+    assert presets.intern({}) == presets.intern(None) == base
+    # 显式写出默认值与不写相同
+    assert presets.intern({'decay': DEFAULT_SETTINGS['decay']}) == base
+    other = presets.intern({'decay': 0})
+    assert other != base and presets.intern({'decay': 0}) == other
+    assert len(presets) == 2
+    assert presets.settings[other] == dict(DEFAULT_SETTINGS, decay=0)
+    assert presets.text(other) == str(dict(DEFAULT_SETTINGS, decay=0))
+
+
+def test_presets_with_unhashable_values():
+    # 列表值可以排序但不能哈希，按JSON字符串登记
+    presets = SettingsPresets()
+    first = presets.intern({'testPeriod': 'P1Y', 'x': [1]})
+    assert presets.intern({'x': [1], 'testPeriod': 'P1Y'}) == first
+    assert presets.intern({'testPeriod': 'P1Y', 'x': [2]}) != first
+    assert presets.settings[first]['x'] == [1]
+    batch = PayloadBatch(['rank(close)'], settings={'x': [1]})
+    assert batch[0]['settings']['x'] == [1]
+
+
+def test_batch_matches_create_simulation_data():
+    batch = PayloadBatch(['rank(close)', 'rank("x\\u00e9")'], settings={'truncation': 0.01})
+    batch.extend(['ts_rank(close, 5)'], settings={'decay': 0})
+    batch.append('-rank(open)')
+    expected = [create_simulation_data('rank(close)', {'truncation': 0.01}),
+                create_simulation_data('rank("x\\u00e9")', {'truncation': 0.01}),
+                create_simulation_data('ts_rank(close, 5)', {'decay': 0}),
+                create_simulation_data('-rank(open)')]
+    assert len(batch) == 4 and len(batch.presets) == 3
+    assert [dict(payload) for payload in batch] == expected
+    assert [json.loads(body) for body in batch.bodies()] == expected
+    assert json.loads(batch.body(2)) == expected[2]
+    assert dict(batch[3]) == expected[3]
+    assert batch.settings_at(2)['decay'] == 0
+    assert [row[2] for row in batch.csv_rows()] == [alpha['regular'] for alpha in expected]
+
+
+def test_payload_dicts_are_independent():
+    batch = PayloadBatch(['a', 'b'])
+    first = batch[0]
+    first['settings']['decay'] = 99
+    assert batch[1]['settings']['decay'] == DEFAULT_SETTINGS['decay']
+    assert batch.settings_at(0)['decay'] == DEFAULT_SETTINGS['decay']
+
+
+def test_encode_and_slices():
+    batch = PayloadBatch([f"rank(x{i})" for i in range(10)], settings={'decay': 2})
+    bodies = list(batch.bodies())
+    batch.encode()
+    assert list(batch.bodies()) == bodies
+    part = batch[2:5]
+    assert part.presets is batch.presets and len(part) == 3
+    assert list(part.bodies()) == bodies[2:5]
+    assert [payload.body for payload in part] == bodies[2:5]
+    # 追加后预先编码的请求体失效，重新拼接
+    batch.append('rank(y)')
+    assert json.loads(batch.body(10))['regular'] == 'rank(y)'
+
+
+def test_from_alphas_and_payload_body():
+    alphas = [create_simulation_data('rank(close)', {'decay': 3}), create_simulation_data('rank(open)')]
+    batch = PayloadBatch.from_alphas(alphas)
+    assert [dict(payload) for payload in batch] == alphas
+    # 普通字典也能取得请求体
+    assert json.loads(payload_body(alphas[0])) == alphas[0]
+    payload = batch[0]
+    assert payload_body(payload) is payload.body
+
+
+def test_bodies_accepted_by_simulations_endpoint(mock_brain):
+    session = get_session('u1', 'p')
+    batch = PayloadBatch(['rank(close)', 'rank(open)'], settings={'region': 'CHN', 'decay': 0})
+    for payload in batch:
+        response = limited_request(session, 'post', 'https://api.worldquantbrain.com/simulations',
+                                   data=payload_body(payload), headers=JSON_HEADERS)
+        assert response.status_code == 201
+    posted = [sim['payload'] for sim in mock_brain.brain.simulations.values()]
+    assert posted == [dict(payload) for payload in batch]
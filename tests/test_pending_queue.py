@@ -0,0 +1,116 @@
+"""PendingQueue：租约、确认、重新投递和CSV增量导入"""
+import threading
+import time
+
+import pytest
+
+from pending_queue import PendingQueue
+from tests.conftest import make_alpha
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = PendingQueue(str(tmp_path / 'pending.db'), lease_seconds=60)
+    yield queue
+    queue.close()
+
+
+def fill(queue, count):
+    queue.put_many(make_alpha(f"rank(x{i})") for i in range(count))
+
+
+def test_claim_in_order_and_leased(queue):
+    fill(queue, 5)
+    first = queue.claim(3, owner='u1')
+    assert [alpha['regular'] for alpha in first] == ['rank(x0)', 'rank(x1)', 'rank(x2)']
+    assert first[0]['settings']['region'] == 'USA'
+    # 租用中的不会再被取出
+    assert [alpha['regular'] for alpha in queue.claim(5, owner='u2')] == ['rank(x3)', 'rank(x4)']
+    assert queue.claim(5) == []
+    assert len(queue) == 5
+    assert queue.count_available() == 0
+
+
+def test_ack_deletes(queue):
+    fill(queue, 3)
+    claimed = queue.claim(2)
+    queue.ack(claimed)
+    assert len(queue) == 1
+    # 普通字典（不是从队列取出的）ack时忽略
+    queue.ack([make_alpha('rank(x2)')])
+    assert len(queue) == 1
+
+
+def test_expired_lease_redelivered(tmp_path):
+    queue = PendingQueue(str(tmp_path / 'pending.db'), lease_seconds=0.1)
+    fill(queue, 2)
+    claimed = queue.claim(2, owner='u1')
+    assert queue.claim(2) == []
+    time.sleep(0.15)
+    again = queue.claim(2, owner='u2')
+    assert [alpha.queue_id for alpha in again] == [alpha.queue_id for alpha in claimed]
+    queue.close()
+
+
+def test_release_and_release_owner(queue):
+    fill(queue, 4)
+    u1 = queue.claim(2, owner='u1')
+    queue.claim(2, owner='u2')
+    queue.release(u1[:1])
+    assert [alpha.queue_id for alpha in queue.claim(4)] == [u1[0].queue_id]
+    assert queue.release_owner('u2') == 2
+    assert queue.count_available() == 2
+
+
+def test_survives_reopen(tmp_path):
+    path = str(tmp_path / 'pending.db')
+    queue = PendingQueue(path)
+    fill(queue, 3)
+    queue.claim(2, owner='u1')
+    queue.close()
+
+    # 进程重启：同一账号的租约释放后立即重新投递
+    queue = PendingQueue(path)
+    assert queue.release_owner('u1') == 2
+    assert [alpha['regular'] for alpha in queue.claim(3)] == ['rank(x0)', 'rank(x1)', 'rank(x2)']
+    queue.close()
+
+
+def test_concurrent_claims_are_disjoint(queue):
+    fill(queue, 200)
+    claimed = []
+    lock = threading.Lock()
+
+    def worker(owner):
+        while True:
+            batch = queue.claim(7, owner=owner)
+            if not batch:
+                return
+            with lock:
+                claimed.extend(alpha.queue_id for alpha in batch)
+
+    threads = [threading.Thread(target=worker, args=(f"u{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(set(claimed))
+    assert len(claimed) == 200
+
+
+def test_import_csv_incrementally(queue, tmp_path):
+    path = tmp_path / 'pending.csv'
+    settings = make_alpha('x')['settings']
+    header = 'type,settings,regular\n'
+    row = lambda expression: f'REGULAR,"{settings}",{expression}\n'
+    path.write_text(header + row('rank(a)') + row('rank(b)'))
+    assert queue.import_csv(str(path)) == 2
+
+    # 追加的行只导入一次；写了一半的最后一行等下次
+    with open(path, 'a') as file:
+        file.write(row('rank(c)') + 'REGULAR,"{')
+    assert queue.import_csv(str(path)) == 1
+    assert queue.import_csv(str(path)) == 0
+    claimed = queue.claim(10)
+    assert [alpha['regular'] for alpha in claimed] == ['rank(a)', 'rank(b)', 'rank(c)']
+    assert claimed[0]['settings'] == settings
@@ -0,0 +1,52 @@
+"""poll_scheduler：按Retry-After安排轮询"""
+import pytest
+
+from poll_scheduler import PollScheduler, parse_retry_after
+
+
+@pytest.mark.parametrize('value, expected', [(None, 0.0), ('2.5', 2.5), (3, 3.0), ('-1', 0.0), ('soon', 0.0),
+                                             ('', 0.0)])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_delay_from_retry_after_with_bounds():
+    scheduler = PollScheduler(default_delay=3.0, min_delay=0.5, max_delay=120.0, jitter=0)
+    assert scheduler.schedule('a', 2.0, now=100) == 102.0
+    assert scheduler.schedule('b', None, now=100) == 103.0
+    assert scheduler.schedule('c', 0.1, now=100) == 100.5
+    assert scheduler.schedule('d', 600, now=100) == 220.0
+
+
+def test_jitter_only_delays():
+    scheduler = PollScheduler(min_delay=0, jitter=0.1)
+    dues = [scheduler.schedule(f"u{i}", 10.0, now=0) for i in range(200)]
+    assert all(10.0 <= due <= 11.0 for due in dues)
+    assert len(set(dues)) > 1
+
+
+def test_pop_due_in_deadline_order():
+    scheduler = PollScheduler(min_delay=0, jitter=0)
+    for url, delay in [('c', 3), ('a', 1), ('b', 2), ('d', 10)]:
+        scheduler.schedule(url, delay, now=0)
+    assert scheduler.next_due_in(now=0) == 1
+    assert scheduler.pop_due(now=0.5) == []
+    assert scheduler.pop_due(now=3) == ['a', 'b', 'c']
+    assert len(scheduler) == 1 and 'a' not in scheduler and 'd' in scheduler
+    assert scheduler.next_due_in(now=4) == 6
+    assert scheduler.next_due_in(now=20) == 0.0
+
+
+def test_reschedule_and_remove():
+    scheduler = PollScheduler(min_delay=0, jitter=0)
+    scheduler.schedule('a', 1, now=0)
+    scheduler.schedule('b', 2, now=0)
+    # 重新安排后旧的到期时间作废
+    scheduler.schedule('a', 5, now=0)
+    scheduler.remove('b')
+    scheduler.remove('missing')
+    assert len(scheduler) == 1
+    assert scheduler.next_due_in(now=0) == 5
+    assert scheduler.pop_due(now=4) == []
+    assert scheduler.pop_due(now=5) == ['a']
+    assert scheduler.next_due_in(now=5) is None
@@ -0,0 +1,119 @@
+"""rate_limiter：接口分类、AIMD令牌桶和经过限流器的请求"""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limiter
+import session_manager
+from rate_limiter import RateLimiter, TokenBucket, endpoint_class, limited_request
+
+
+@pytest.mark.parametrize('url, kind', [
+    ('https://api.worldquantbrain.com/simulations', 'simulations'),
+    ('https://api.worldquantbrain.com/simulations/', 'simulations'),
+    ('https://api.worldquantbrain.com/simulations/3xYz9', 'polls'),
+    ('https://api.worldquantbrain.com/alphas/ABC/check', 'check'),
+    ('https://api.worldquantbrain.com/alphas/ABC/submit', 'submit'),
+    ('https://api.worldquantbrain.com/alphas/ABC', 'alphas'),
+    ('https://api.worldquantbrain.com/users/self/alphas?limit=100', 'alphas'),
+    ('https://api.worldquantbrain.com/data-fields?delay=1', 'datafields'),
+    ('https://api.worldquantbrain.com/authentication', 'default'),
+])
+def test_endpoint_class(url, kind):
+    assert endpoint_class(url) == kind
+
+
+def test_additive_increase_capped():
+    bucket = TokenBucket(rate=1.0, min_rate=0.1, max_rate=1.2, increase=0.1)
+    for _ in range(5):
+        bucket.on_success()
+    assert bucket.rate == pytest.approx(1.2)
+
+
+def test_multiplicative_decrease_once_per_window():
+    bucket = TokenBucket(rate=4.0, min_rate=0.5, max_rate=10.0)
+    for _ in range(5):
+        # 并发请求同时被限流，只下调一次
+        bucket.on_throttle()
+    assert bucket.rate == pytest.approx(2.0)
+    bucket._last_decrease -= 10
+    bucket.on_throttle()
+    assert bucket.rate == pytest.approx(1.0)
+    for _ in range(10):
+        bucket._last_decrease -= 100
+        bucket.on_throttle()
+    assert bucket.rate == pytest.approx(0.5)
+
+
+def test_retry_after_pauses_bucket():
+    bucket = TokenBucket(rate=100.0, min_rate=1.0, max_rate=100.0)
+    bucket.on_throttle(retry_after=0.3)
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.25
+
+
+def test_acquire_paces_requests():
+    bucket = TokenBucket(rate=20.0, min_rate=1.0, max_rate=20.0, burst=1)
+    started = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - started >= 0.2
+
+
+class CountingLimiter(RateLimiter):
+    def __init__(self):
+        super().__init__({name: dict(limit, rate=100.0, max_rate=100.0)
+                          for name, limit in rate_limiter.DEFAULT_LIMITS.items()})
+        self.acquired = []
+
+    def acquire(self, url, account=None):
+        self.acquired.append(endpoint_class(url))
+        super().acquire(url, account)
+
+
+def test_limited_request_records_response(mock_brain, monkeypatch):
+    limiter = CountingLimiter()
+    monkeypatch.setattr(rate_limiter, '_shared_limiter', limiter)
+    session = session_manager.get_session('u1', 'p')
+    session.refresh()
+    response = limited_request(session, 'get', 'https://api.worldquantbrain.com/users/self/alphas?limit=10')
+    assert response.ok
+    assert limiter.acquired == ['default', 'alphas']
+
+
+def test_record_adjusts_rate_per_class():
+    limiter = RateLimiter()
+    limiter.record('https://api.worldquantbrain.com/simulations/abc',
+                   SimpleNamespace(status_code=429, headers={}))
+    limiter.record('https://api.worldquantbrain.com/simulations', SimpleNamespace(status_code=201, headers={}))
+    rates = limiter.rates()
+    assert rates['polls'] == rate_limiter.DEFAULT_LIMITS['polls']['rate'] / 2
+    assert rates['simulations'] > rate_limiter.DEFAULT_LIMITS['simulations']['rate']
+
+
+def test_accounts_throttled_separately():
+    limiter = RateLimiter()
+    url = 'https://api.worldquantbrain.com/simulations'
+    limiter.record(url, SimpleNamespace(status_code=429, headers={'Retry-After': '30'}), 'u1')
+    started = time.monotonic()
+    limiter.acquire(url, 'u2')
+    limiter.acquire(url)
+    # u1暂停30秒，u2和不分账号的桶不受影响
+    assert time.monotonic() - started < 1
+    rates = limiter.rates()
+    assert rates['u1/simulations'] == rate_limiter.DEFAULT_LIMITS['simulations']['rate'] / 2
+    assert rates['u2/simulations'] == rates['simulations'] == rate_limiter.DEFAULT_LIMITS['simulations']['rate']
+
+
+def test_retry_after_401_goes_through_limiter(mock_brain, monkeypatch):
+    limiter = CountingLimiter()
+    monkeypatch.setattr(rate_limiter, '_shared_limiter', limiter)
+    session = session_manager.get_session('u1', 'p')
+    session.refresh()
+    # 服务器侧的token失效，下一个请求返回401
+    mock_brain.brain.tokens.clear()
+    response = limited_request(session, 'get', 'https://api.worldquantbrain.com/users/self/alphas?limit=10')
+    assert response.ok
+    assert limiter.acquired == ['default', 'alphas', 'default', 'alphas']
@@ -0,0 +1,53 @@
+"""ResultCache：规范化的键、location记录和结果"""
+import pytest
+
+from result_cache import ResultCache, payload_key
+from tests.conftest import make_alpha
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.db'))
+    yield cache
+    cache.close()
+
+
+def test_payload_key_ignores_formatting():
+    assert payload_key(make_alpha('rank(close) + volume')) == payload_key(make_alpha('volume + rank( close )'))
+    assert payload_key(make_alpha('rank(close)')) != payload_key(make_alpha('rank(close)', decay=4))
+
+
+def test_location_then_alpha_result(cache):
+    alpha = make_alpha('rank(close)')
+    cache.mark_submitted(alpha, 'http://x/simulations/s1')
+    assert cache.get(alpha)['location'] == 'http://x/simulations/s1'
+    assert cache.get(alpha)['alpha_id'] is None
+
+    assert cache.store_by_location('http://x/simulations/s1', {'id': 'A1', 'status': 'UNSUBMITTED', 'is': {}})
+    cached = cache.get(alpha)
+    assert (cached['alpha_id'], cached['status']) == ('A1', 'UNSUBMITTED')
+    assert not cache.forget_location('http://x/simulations/s1')
+
+
+def test_completed_progress_takes_alpha_field(cache):
+    alpha = make_alpha('rank(open)')
+    cache.store(alpha, result={'id': 'sim-1', 'status': 'COMPLETE', 'alpha': 'A2'})
+    assert cache.get(alpha)['alpha_id'] == 'A2'
+
+
+def test_failed_simulation_has_no_alpha_id(cache):
+    alpha = make_alpha('rank(bad_field)')
+    cache.mark_submitted(alpha, 'http://x/simulations/s2')
+    cache.store_by_location('http://x/simulations/s2', {'id': 'sim-2', 'status': 'ERROR', 'message': 'unknown'})
+    cached = cache.get(alpha)
+    assert cached['alpha_id'] is None
+    assert cached['status'] == 'ERROR'
+    assert cached['result']['id'] == 'sim-2'
+
+
+def test_forget_location(cache):
+    alpha = make_alpha('rank(low)')
+    cache.mark_submitted(alpha, 'http://x/simulations/s3')
+    assert cache.forget_location('http://x/simulations/s3')
+    assert alpha not in cache
+    assert len(cache) == 0
@@ -0,0 +1,60 @@
+"""ManagedSession：共用会话、提前续期和401后的重新登录"""
+from concurrent.futures import ThreadPoolExecutor
+
+import session_manager
+from session_manager import api_url, get_session
+
+ALPHAS_URL = 'https://api.worldquantbrain.com/users/self/alphas?limit=1'
+
+
+def auth_count(server):
+    return sum(server.stats()['requests'].get('authentication', {}).values())
+
+
+def test_api_url_redirect(mock_brain):
+    assert api_url(ALPHAS_URL) == mock_brain.url + '/users/self/alphas?limit=1'
+    assert api_url('http://other/x') == 'http://other/x'
+
+
+def test_one_session_per_account(mock_brain):
+    assert get_session('u1', 'p') is get_session('u1', 'p')
+    assert get_session('u1', 'p') is not get_session('u2', 'p')
+
+
+def test_repeated_sign_in_within_min_interval(mock_brain):
+    session = get_session('u1', 'p')
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(lambda _: session.refresh(), range(8)))
+    assert all(response.ok for response in responses)
+    assert auth_count(mock_brain) == 1
+
+
+def test_concurrent_401_re_authenticates_once(mock_brain):
+    session = get_session('u1', 'p')
+    session.refresh()
+    # 服务器侧token全部失效，并发请求同时收到401
+    mock_brain.brain.tokens.clear()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(lambda _: session.get(ALPHAS_URL), range(8)))
+    assert [response.status_code for response in responses] == [200] * 8
+    assert auth_count(mock_brain) == 2
+    assert session.generation == 2
+
+
+def test_refresh_before_expiry(mock_brain):
+    mock_brain.brain.token_ttl = 10
+    session = get_session('u1', 'p')
+    session.refresh_margin = 30
+    session.min_interval = 0
+    session.refresh()
+    assert session.get(ALPHAS_URL).ok
+    # token在续期窗口内，请求前先续期，不会先收到401
+    assert auth_count(mock_brain) == 2
+    assert mock_brain.stats()['requests']['alpha_list'] == {200: 1}
+
+
+def test_failed_login(mock_brain, monkeypatch):
+    monkeypatch.setattr(session_manager, 'AUTH_URL', 'https://api.worldquantbrain.com/nowhere')
+    session = get_session('u1', 'p')
+    assert not session.refresh().ok
+    assert session.generation == 0
@@ -0,0 +1,102 @@
+"""template_engine：声明式模板的展开、约束、分片和抽样"""
+import itertools
+import json
+
+import pytest
+
+from helper import create_simulation_data
+from template_engine import AlphaTemplate
+
+DOMAINS = {'ts_op': ['ts_rank', 'ts_mean', 'ts_av_diff'], 'op': ['rank', 'zscore'],
+           'field': ['close', 'volume'], 'days': [10, 200]}
+TEXT = "<ts_op>(<op>(<field>)/<op>(cap), <days>)"
+
+
+def make_template():
+    return AlphaTemplate(TEXT, DOMAINS)
+
+
+def loops(skip=lambda ts_op, op, field, days: False):
+    """等价的嵌套for循环"""
+    return [f"{ts_op}({op}({field})/{op}(cap), {days})"
+            for ts_op, op, field, days in itertools.product(*DOMAINS.values())
+            if not skip(ts_op, op, field, days)]
+
+
+def test_expansion_matches_nested_loops():
+    template = make_template()
+    assert template.slots == ['ts_op', 'op', 'field', 'days']
+    assert template.size() == template.count() == 24
+    assert list(template) == loops()
+    assert list(template.combinations()) == loops()
+
+
+def test_literals_and_unknown_brackets_are_kept():
+    template = AlphaTemplate("trade_when(<x> > 0, {a}, <cond>)", {'x': ['close', 'open']})
+    assert list(template) == ['trade_when(close > 0, {a}, <cond>)', 'trade_when(open > 0, {a}, <cond>)']
+    assert template.combinations()[1] == 'trade_when(open > 0, {a}, <cond>)'
+
+
+def test_unused_and_unknown_slots_raise():
+    with pytest.raises(ValueError):
+        AlphaTemplate("rank(<x>)", {'x': [1], 'y': [2]})
+    with pytest.raises(ValueError):
+        make_template().exclude(nope=1)
+
+
+def test_constraints():
+    template = make_template().exclude(ts_op='ts_av_diff', days=200).exclude(field='volume', op=['zscore'])
+    template.where(lambda values: not (values['ts_op'] == 'ts_mean' and values['days'] == 10))
+    expected = loops(lambda ts_op, op, field, days: (ts_op == 'ts_av_diff' and days == 200)
+                     or (field == 'volume' and op == 'zscore') or (ts_op == 'ts_mean' and days == 10))
+    assert list(template) == expected
+    assert template.count() == len(expected) and template.size() == 24
+    assert not template.accepts(('ts_av_diff', 'rank', 'close', 200))
+
+
+@pytest.mark.parametrize('n', [1, 4, 7])
+def test_shards_partition_constrained_space(n):
+    template = make_template().exclude(ts_op='ts_av_diff', days=200)
+    assert [e for k in range(n) for e in template.shard(k, n)] == list(template)
+
+
+def test_canonical_expressions():
+    template = AlphaTemplate("<a> + <b>", {'a': ['x', 'y'], 'b': ['y', 'x(']})
+    assert list(template.expressions(canonical=True)) == ['x + y', 'x + x(', 'y + y', 'y + x(']
+    assert len(set(template.expressions(canonical=True))) == 4
+
+
+def test_settings_overrides_and_payloads():
+    template = make_template().override('days', 200, {'decay': 0, 'truncation': 0.01})
+    template.settings['universe'] = 'TOP1000'
+    expression, settings = template.render(('ts_rank', 'rank', 'close', 200))
+    assert expression == 'ts_rank(rank(close)/rank(cap), 200)'
+    assert settings == {'universe': 'TOP1000', 'decay': 0, 'truncation': 0.01}
+
+    data = template.simulation_data()
+    expected = [create_simulation_data(e, {'universe': 'TOP1000', **({'decay': 0, 'truncation': 0.01}
+                                                                     if e.endswith('200)') else {})})
+                for e in loops()]
+    payloads = list(data)
+    assert [dict(payload) for payload in payloads] == expected
+    assert [json.loads(payload.body) for payload in payloads] == expected
+    # 可以重复遍历
+    assert len(list(data)) == 24
+
+    batch = template.payload_batch()
+    assert len(batch) == 24 and len(batch.presets) == 2
+    assert [dict(payload) for payload in batch] == expected
+
+
+def test_weighted_sample():
+    template = make_template().exclude(days=10).weight('ts_op', {'ts_rank': 5, 'ts_av_diff': 0})
+    samples = template.sample(6, seed=3)
+    assert len(samples) == len(set(samples)) == 6
+    assert all(e.endswith(', 200)') and not e.startswith('ts_av_diff') for e in samples)
+    assert sum(e.startswith('ts_rank') for e in samples) == 4
+    assert samples == make_template().exclude(days=10).weight(
+        'ts_op', {'ts_rank': 5, 'ts_av_diff': 0}).sample(6, seed=3)
+    # 组合空间不足时少于n个
+    assert len(template.sample(100, seed=1)) == 8
+    candidates = list(template.candidates())
+    assert {weight for _, _, weight in candidates} == {5.0, 1.0, 0.0}
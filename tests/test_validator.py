@@ -0,0 +1,132 @@
+"""validator：模拟前检查表达式和settings"""
+import pytest
+
+from AlphaSimulator import AlphaSimulator
+from datafield_catalog import DatafieldCatalog
+from helper import get_standard_search_scope
+from tests.conftest import make_alpha
+from validator import ExpressionValidator, validate_settings
+
+FIELDS = {'close': ('MATRIX', 'CSPRICE'), 'cap': ('MATRIX', 'CSDOLLAR'), 'volume': ('MATRIX', 'CSSHARE'),
+          'returns': 'MATRIX', 'analyst_estimates': 'VECTOR', 'pv13_h_f1_sector': 'GROUP'}
+
+
+def errors(expression, settings=None, fields=FIELDS):
+    return ExpressionValidator(fields=fields).errors({'regular': expression, 'settings': settings})
+
+
+@pytest.mark.parametrize('expression', [
+    'rank(close)',
+    'group_neutralize(ts_rank(close / cap, 20), pv13_h_f1_sector)',
+    'group_rank(vec_avg(analyst_estimates), densify(pv13_h_f1_sector))',
+    'x = ts_mean(returns, 5); trade_when(volume > ts_mean(volume, 20), -x, -1)',
+    'ts_decay_exp_window(close, 10, factor=0.5)',
+    'if_else(close > 0, close, nan)',
+    'add(close, cap, returns)',
+    'bucket(rank(cap), range="0.1, 1, 0.1")',
+    'arc_tan(close)', 'tanh(close)', 'sigmoid(close)', 'floor(close)', 'round(close)',
+    'ts_decay_exp_window(close, 10, 0.5)',
+    'ts_regression(close, cap, 20, 0, 1)',
+    'hump(close, 0.01)',
+    'scale(close, 1)',
+])
+def test_valid_expressions(expression):
+    assert errors(expression) == []
+
+
+@pytest.mark.parametrize('expression, message', [
+    ('rank(close', 'Expected'),
+    ('ts_mean(close)', 'ts_mean() takes 2 arguments but got 1'),
+    ('rank(close, cap)', 'rank() argument 2 expects a number'),
+    ('ts_decay_exp_window(close, 0.5)', 'positive integer window'),
+    ('ts_rank(close, 2.5)', 'positive integer window'),
+    ('ts_rank(close, cap)', 'expects a number'),
+    ('densify(close)', 'expects a group field'),
+    ('rank(analyst_estimates)', 'must be reduced with a vec_* operator'),
+    ('vec_avg(close)', 'expects a vector field'),
+    ('rank(pv13_h_f1_sector)', 'cannot be used as a value'),
+    ('rank(closee)', 'Unknown datafield: closee'),
+])
+def test_invalid_expressions(expression, message):
+    found = errors(expression)
+    assert found and message in found[0]
+
+
+@pytest.mark.parametrize('expression, message', [
+    ('foo(close)', 'Unknown operator: foo()'),
+    ('ts_mean(close, 5, 1, 2)', 'ts_mean() takes 2 arguments but got 4'),
+    ('hump(close, 0.01, 2)', 'hump() takes 1-2 arguments but got 3'),
+])
+def test_unlisted_calls_are_warnings(expression, message):
+    # 操作符表可能落后于服务器，不认识的调用照常模拟
+    validator = ExpressionValidator(fields=FIELDS)
+    issues = validator.validate(expression)
+    assert [issue.level for issue in issues] == ['warning'] and message in issues[0].message
+    assert list(validator.filter([{'regular': expression, 'settings': None}]))
+    # 参数本身照常检查
+    assert 'Unknown datafield: closee' in errors(expression.replace('close', 'closee'))[0]
+
+
+def test_unit_mismatch_is_a_warning():
+    validator = ExpressionValidator(fields=FIELDS)
+    issues = validator.validate('ts_mean(close, 5) - cap')
+    assert [issue.level for issue in issues] == ['warning'] and 'CSPRICE - CSDOLLAR' in issues[0].message
+    assert validator.validate('ts_delta(close, 5) + close') == []
+    assert ExpressionValidator(fields=FIELDS, check_units=False).validate('close - cap') == []
+
+
+def test_settings():
+    assert validate_settings(dict(make_alpha('rank(close)', decay=4)['settings'])) == []
+    messages = [issue.message for issue in validate_settings(
+        {'region': 'USA', 'universe': 'TOP2000U', 'decay': 4.5, 'delay': 2, 'neutralization': 'MARKETS',
+         'visualization': 0, 'truncation': True, 'colour': 'red'})]
+    assert messages == ["Invalid decay: 4.5, expected int in [0, 512]", "Invalid delay: 2",
+                        "Invalid neutralization: 'MARKETS'", "Invalid visualization: 0",
+                        "Invalid truncation: True, expected float in [0.0, 1.0]", "Unknown setting: colour",
+                        "Invalid universe for USA: 'TOP2000U'"]
+    assert errors('rank(close)', {'region': 'CHN', 'universe': 'TOP2000U'}) == []
+    assert errors('rank(close)', {'region': 'CHN'}) == ["Invalid universe for CHN: 'TOP3000'"]
+
+
+def test_skeleton_cache_keeps_identifiers_apart():
+    validator = ExpressionValidator(fields=FIELDS)
+    # 同一个骨架，不同的标识符
+    assert validator.errors({'regular': 'ts_rank(close, 20)'}) == []
+    assert validator.errors({'regular': 'ts_rank(analyst_estimates, 20)'}) == [
+        'ts_rank() argument 1: vector field analyst_estimates must be reduced with a vec_* operator first']
+    assert validator.errors({'regular': 'ts_rank(closee, 20)'}) == ['Unknown datafield: closee']
+    # 字符串参数中的标识符不当作字段
+    assert validator.errors({'regular': 'bucket(rank(cap), range="closee")'}) == []
+
+
+def test_catalog_scope_completeness():
+    scope = get_standard_search_scope()
+    catalog = DatafieldCatalog('catalog.db')
+    catalog.replace(scope, 'pv1', [{'id': 'close', 'type': 'MATRIX'}, {'id': 'sector', 'type': 'GROUP'}])
+    # 只同步了部分数据集：目录里有的字段检查类型，没有的不判为错误
+    validator = ExpressionValidator(catalog)
+    assert validator.errors(make_alpha('rank(cap)')) == []
+    assert validator.errors(make_alpha('rank(sector)')) == ['rank() argument 1: group sector cannot be used as a value']
+    catalog.replace(scope, '', [{'id': 'close', 'type': 'MATRIX'}])
+    validator = ExpressionValidator(catalog)
+    assert validator.errors(make_alpha('rank(cap)')) == ['Unknown datafield: cap']
+    # 其他范围没有同步过，不检查字段
+    assert validator.errors({'regular': 'rank(cap)', 'settings': {'region': 'CHN', 'universe': 'TOP2000U'}}) == []
+
+
+def test_filter_counts_rejections():
+    validator = ExpressionValidator(fields=FIELDS)
+    alphas = [make_alpha('rank(close)'), make_alpha('rank(nope)'), make_alpha('ts_mean(cap)')]
+    assert list(validator.filter(alphas)) == alphas[:1]
+    assert validator.checked == 3 and validator.rejected == 2
+
+
+def test_simulator_skips_invalid_alphas(mock_brain):
+    simulator = AlphaSimulator(max_concurrent=2, username='u1', password='p', alpha_list_file_path='pending.csv',
+                               batch_number_for_every_queue=10, poll_interval=0.05,
+                               validator=ExpressionValidator(fields=FIELDS))
+    results = simulator.simulate_batch([make_alpha('rank(nope)'), make_alpha('rank(close)')])
+    assert results[0] is None and results[1]['regular']['code'] == 'rank(close)'
+    assert sum(mock_brain.stats()['requests']['simulations'].values()) == 1
+    with open('fail_alphas.csv') as f:
+        assert 'rank(nope)' in f.read()
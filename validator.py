@@ -0,0 +1,439 @@
+"""
+模拟前的本地校验
+在alpha入队或发送之前检查表达式和settings：操作符是否存在、参数个数、参数类型（分组字段/矩阵字段/向量字段，
+例如densify(pv13_h_f1_sector)只接受分组字段）、窗口参数、加减和比较两侧的单位，以及settings的取值。
+字段的类型和单位来自本地的数据字段目录（DatafieldCatalog）。
+注定被服务器拒绝的alpha不再占用并发名额，也不会在"No Location"上反复休眠重试。
+
+例:
+    validator = ExpressionValidator(catalog)
+    for alpha in validator.filter(alpha_list): ...
+"""
+import functools
+import logging
+import re
+from collections import namedtuple
+
+from fastexpr import (Assign, BinOp, Call, FastExprError, Name, Number, Program, String, Ternary, UnaryOp, parse,
+                      skeleton_text, split_identifiers, to_string)
+from payload_batch import DEFAULT_SETTINGS
+
+
+Issue = namedtuple('Issue', 'level message')   # level: 'error'（服务器会拒绝）或 'warning'（只提示）
+
+# 参数类型: x 矩阵表达式, d 时间窗口（正整数）, g 分组, v 向量字段, n 数值常量；
+# 末尾的+表示最后一个参数可以重复，?表示可省略。关键字参数不检查。
+# 这里没有的操作符和多出的位置参数只给警告：列表不可能与服务器完全一致，不能因此把alpha丢掉。
+_OPERATOR_SPECS = {
+    # 算术
+    'abs': 'x', 'add': 'x x+', 'subtract': 'x x', 'multiply': 'x x+', 'divide': 'x x', 'inverse': 'x',
+    'log': 'x', 'exp': 'x', 'sqrt': 'x', 'sign': 'x', 'reverse': 'x', 'power': 'x x', 'signed_power': 'x x',
+    'max': 'x x+', 'min': 'x x+', 's_log_1p': 'x', 'to_nan': 'x', 'purify': 'x', 'nan_out': 'x',
+    'nan_mask': 'x x', 'fraction': 'x', 'log_diff': 'x', 'densify': 'g', 'negate': 'x',
+    'arc_cos': 'x', 'arc_sin': 'x', 'arc_tan': 'x', 'tanh': 'x', 'sigmoid': 'x', 'floor': 'x', 'ceiling': 'x',
+    'round': 'x', 'round_down': 'x n?',
+    # 逻辑
+    'and': 'x x', 'or': 'x x', 'not': 'x', 'if_else': 'x x x', 'is_nan': 'x',
+    # 时间序列
+    'ts_mean': 'x d', 'ts_rank': 'x d n?', 'ts_zscore': 'x d', 'ts_av_diff': 'x d', 'ts_delta': 'x d',
+    'ts_std_dev': 'x d', 'ts_sum': 'x d', 'ts_scale': 'x d n?', 'ts_decay_linear': 'x d', 'ts_arg_max': 'x d',
+    'ts_arg_min': 'x d', 'ts_max': 'x d', 'ts_min': 'x d', 'ts_median': 'x d', 'ts_delay': 'x d',
+    'ts_product': 'x d', 'ts_backfill': 'x d n?', 'ts_count_nans': 'x d', 'ts_quantile': 'x d', 'ts_ir': 'x d',
+    'ts_kurtosis': 'x d', 'ts_skewness': 'x d', 'ts_entropy': 'x d', 'ts_returns': 'x d', 'ts_max_diff': 'x d',
+    'ts_min_diff': 'x d', 'ts_min_max_cps': 'x d', 'ts_min_max_diff': 'x d', 'ts_decay_exp_window': 'x d n?',
+    'ts_moment': 'x d', 'ts_corr': 'x x d', 'ts_covariance': 'x x d', 'ts_regression': 'x x d n? n?',
+    'ts_co_kurtosis': 'x x d', 'ts_co_skewness': 'x x d', 'ts_partial_corr': 'x x x d',
+    'ts_triple_corr': 'x x x d', 'ts_step': 'n', 'ts_target_tvr_decay': 'x', 'ts_target_tvr_delta_limit': 'x x',
+    'ts_weighted_decay': 'x', 'days_from_last_change': 'x', 'last_diff_value': 'x d', 'kth_element': 'x d n?',
+    'hump': 'x n?', 'hump_decay': 'x n?', 'jump_decay': 'x d', 'inst_tvr': 'x d',
+    'sum': 'x d', 'delay': 'x d', 'delta': 'x d', 'stddev': 'x d', 'decay_linear': 'x d', 'product': 'x d',
+    'correlation': 'x x d', 'covariance': 'x x d',
+    # 截面
+    'rank': 'x n?', 'zscore': 'x', 'scale': 'x n? n? n?', 'normalize': 'x n? n?', 'quantile': 'x',
+    'winsorize': 'x n?',
+    'rank_by_side': 'x', 'generalized_rank': 'x', 'truncate': 'x n?', 'regression_neut': 'x x', 'vector_neut': 'x x',
+    'regression_proj': 'x x', 'vector_proj': 'x x', 'scale_down': 'x',
+    # 向量
+    'vec_avg': 'v', 'vec_sum': 'v', 'vec_max': 'v', 'vec_min': 'v', 'vec_count': 'v', 'vec_stddev': 'v',
+    'vec_range': 'v', 'vec_ir': 'v', 'vec_kurtosis': 'v', 'vec_skewness': 'v', 'vec_norm': 'v',
+    'vec_percentage': 'v', 'vec_powersum': 'v', 'vec_choose': 'v', 'vec_filter': 'v',
+    # 分组
+    'group_rank': 'x g', 'group_zscore': 'x g', 'group_neutralize': 'x g', 'group_scale': 'x g',
+    'group_normalize': 'x g', 'group_count': 'x g', 'group_sum': 'x g', 'group_max': 'x g', 'group_min': 'x g',
+    'group_median': 'x g', 'group_std_dev': 'x g', 'group_percentage': 'x g', 'group_extra': 'x x g',
+    'group_mean': 'x x g', 'group_backfill': 'x g d', 'group_vector_neut': 'x x g', 'group_vector_proj': 'x x g',
+    'group_coalesce': 'g g+', 'group_cartesian_product': 'g g', 'bucket': 'x',
+    # 变换
+    'trade_when': 'x x x', 'tail': 'x', 'left_tail': 'x', 'right_tail': 'x', 'keep': 'x x', 'clamp': 'x',
+    'filter': 'x', 'pasteurize': 'x',
+}
+# 返回分组的操作符，其余返回矩阵
+GROUP_OPERATORS = {'densify', 'bucket', 'group_cartesian_product', 'group_coalesce'}
+# 结果与第一个参数单位相同的操作符，用于检查加减两侧的单位
+UNIT_PRESERVING = {'abs', 'add', 'subtract', 'max', 'min', 'ts_mean', 'ts_sum', 'ts_delay', 'ts_delta', 'ts_max',
+                   'ts_min', 'ts_median', 'ts_backfill', 'ts_decay_linear', 'ts_std_dev', 'sum', 'delay', 'delta',
+                   'stddev', 'decay_linear', 'group_mean', 'group_median', 'group_max', 'group_min',
+                   'group_backfill', 'group_neutralize', 'vec_avg', 'vec_sum', 'vec_max', 'vec_min', 'if_else',
+                   'trade_when', 'winsorize', 'purify', 'to_nan', 'nan_out'}
+# 不需要数据字段就可以作为分组使用的名称
+GROUP_NAMES = {'market', 'sector', 'industry', 'subindustry', 'exchange', 'country'}
+CONSTANTS = {'true', 'false', 'nan', 'inf'}
+
+UNIVERSES = {
+    'USA': {'TOP3000', 'TOP1000', 'TOP500', 'TOP200', 'TOPSP500', 'ILLIQUID_MINVOL1M'},
+    'GLB': {'TOP3000', 'MINVOL1M', 'TOPDIV3000'},
+    'EUR': {'TOP2500', 'TOP1200', 'TOP800', 'TOP400', 'ILLIQUID_MINVOL1M'},
+    'ASI': {'MINVOL1M', 'ILLIQUID_MINVOL1M'},
+    'CHN': {'TOP2000U'},
+    'JPN': {'TOP1600', 'TOP1200'},
+    'KOR': {'TOP600'},
+    'TWN': {'TOP500', 'TOP100'},
+    'HKG': {'TOP800', 'TOP500'},
+    'AMR': {'TOP600'},
+}
+# settings的取值：集合为可选值，元组为 (类型, 最小值, 最大值)；universe按region单独检查
+SETTINGS_RULES = {
+    'instrumentType': {'EQUITY'},
+    'delay': {0, 1},
+    'decay': (int, 0, 512),
+    'truncation': (float, 0.0, 1.0),
+    'neutralization': {'NONE', 'MARKET', 'SECTOR', 'INDUSTRY', 'SUBINDUSTRY', 'COUNTRY', 'STATISTICAL',
+                       'CROWDING', 'FAST', 'SLOW', 'SLOW_AND_FAST', 'REVERSION_AND_MOMENTUM'},
+    'pasteurization': {'ON', 'OFF'},
+    'unitHandling': {'VERIFY'},
+    'nanHandling': {'ON', 'OFF'},
+    'language': {'FASTEXPR'},
+    'visualization': {True, False},
+}
+_KNOWN_SETTINGS = set(SETTINGS_RULES) | {'region', 'universe', 'testPeriod', 'maxTrade'}
+
+_Spec = namedtuple('_Spec', 'params required variadic returns')
+_PLACEHOLDER_RE = re.compile(r'__leaf(\d+)')
+_FIELD_TYPES = {'MATRIX': 'matrix', 'VECTOR': 'vector', 'GROUP': 'group'}
+
+
+def _compile_spec(name, spec):
+    params = spec.split()
+    variadic = bool(params) and params[-1].endswith('+')
+    params = [param.rstrip('+') for param in params]
+    required = sum(1 for param in params if not param.endswith('?'))
+    return _Spec(tuple(param.rstrip('?') for param in params), required, variadic,
+                 'group' if name in GROUP_OPERATORS else 'matrix')
+
+
+OPERATORS = {name: _compile_spec(name, spec) for name, spec in _OPERATOR_SPECS.items()}
+
+
+@functools.lru_cache(maxsize=1 << 14)
+def _parse_skeleton(parts):
+    """按骨架缓存语法树，同一个模板生成的表达式只解析一次；语法错误时返回None"""
+    try:
+        return parse(skeleton_text(parts))
+    except FastExprError:
+        return None
+
+
+class _Checker:
+    """一个表达式的类型推断，标识符通过leaves从骨架的占位符还原"""
+
+    def __init__(self, fields, complete, leaves, check_units):
+        self.fields = fields
+        self.complete = complete
+        self.leaves = leaves
+        self.check_units = check_units
+        self.variables = {}
+        self.issues = []
+
+    def error(self, message):
+        self.issues.append(Issue('error', message))
+
+    def warning(self, message):
+        self.issues.append(Issue('warning', message))
+
+    def name(self, identifier):
+        if self.leaves and identifier.startswith('__leaf'):
+            return self.leaves[int(identifier[6:])]
+        return identifier
+
+    def text(self, node):
+        text = to_string(node)
+        if self.leaves:
+            text = _PLACEHOLDER_RE.sub(lambda m: self.leaves[int(m.group(1))], text)
+        return text
+
+    def infer(self, node):
+        """
+        Returns:
+            tuple: (类型, 单位)，类型为 matrix / vector / group / number / string / any，单位未知时为None
+        """
+        cls = type(node)
+        if cls is Number:
+            return 'number', None
+        if cls is String:
+            return 'string', None
+        if cls is Name:
+            return self.infer_name(self.name(node.id))
+        if cls is Call:
+            return self.infer_call(node)
+        if cls is BinOp:
+            left = self.expect(node.left, 'x', f"operator {node.op}")
+            right = self.expect(node.right, 'x', f"operator {node.op}")
+            if node.op in ('+', '-', '<', '<=', '>', '>=', '==', '!='):
+                self.compare_units(node, left[1], right[1])
+            unit = left[1] if node.op in ('+', '-') and left[1] == right[1] else None
+            return ('number' if left[0] == right[0] == 'number' else 'matrix'), unit
+        if cls is UnaryOp:
+            kind, unit = self.expect(node.operand, 'x', f"operator {node.op}")
+            return kind, unit if node.op == '-' else None
+        if cls is Ternary:
+            self.expect(node.cond, 'x', "condition")
+            true_unit = self.expect(node.if_true, 'x', "?:")[1]
+            false_unit = self.expect(node.if_false, 'x', "?:")[1]
+            return 'matrix', true_unit if true_unit == false_unit else None
+        if cls is Assign:
+            value = self.infer(node.value)
+            self.variables[self.name(node.name)] = value
+            return value
+        if cls is Program:
+            result = ('any', None)
+            for statement in node.statements:
+                result = self.infer(statement)
+            return result
+        return 'any', None
+
+    def infer_name(self, name):
+        if name in self.variables:
+            return self.variables[name]
+        if name.lower() in CONSTANTS:
+            return 'number', None
+        field = self.fields.get(name)
+        if field is not None:
+            return _FIELD_TYPES.get(field[0], 'any'), field[1]
+        if name in GROUP_NAMES:
+            return 'group', None
+        if self.complete:
+            self.error(f"Unknown datafield: {name}")
+        return 'any', None
+
+    def infer_call(self, node):
+        spec = OPERATORS.get(node.name)
+        for _, value in node.kwargs:
+            self.infer(value)
+        if spec is None:
+            self.warning(f"Unknown operator: {node.name}()")
+            for arg in node.args:
+                self.infer(arg)
+            return 'any', None
+        n = len(node.args)
+        extra = n > len(spec.params) and not spec.variadic
+        if n < spec.required or extra:
+            expected = f"{spec.required}+" if spec.variadic else (
+                str(spec.required) if spec.required == len(spec.params) else f"{spec.required}-{len(spec.params)}")
+            message = f"{node.name}() takes {expected} arguments but got {n}: {self.text(node)}"
+            # 缺参数服务器一定拒绝；多出的参数可能是这里没有登记的可选参数
+            if extra:
+                self.warning(message)
+            else:
+                self.error(message)
+        first_unit = None
+        for i, arg in enumerate(node.args):
+            if i >= len(spec.params) and not spec.variadic:
+                self.infer(arg)
+                continue
+            kind = spec.params[min(i, len(spec.params) - 1)] if spec.params else 'x'
+            unit = self.expect(arg, kind, f"{node.name}() argument {i + 1}")[1]
+            if i == 0:
+                first_unit = unit
+        return spec.returns, first_unit if node.name in UNIT_PRESERVING else None
+
+    def expect(self, node, kind, context):
+        actual, unit = self.infer(node)
+        if actual == 'any':
+            return actual, unit
+        if kind == 'x':
+            if actual == 'vector':
+                self.error(f"{context}: vector field {self.text(node)} must be reduced with a vec_* operator first")
+            elif actual == 'group':
+                self.error(f"{context}: group {self.text(node)} cannot be used as a value")
+            elif actual == 'string':
+                self.error(f"{context}: unexpected string {self.text(node)}")
+        elif kind == 'g' and actual != 'group':
+            self.error(f"{context} expects a group field but got {actual} {self.text(node)}")
+        elif kind == 'v' and actual != 'vector':
+            self.error(f"{context} expects a vector field but got {actual} {self.text(node)}")
+        elif kind in ('d', 'n'):
+            if actual != 'number':
+                self.error(f"{context} expects a number but got {actual} {self.text(node)}")
+            elif kind == 'd' and type(node) is Number and not _is_positive_int(node.value):
+                self.error(f"{context} expects a positive integer window but got {node.value}")
+        return actual, unit
+
+    def compare_units(self, node, left, right):
+        if self.check_units and left and right and left != right:
+            self.issues.append(Issue('warning', f"Unit mismatch in {self.text(node)}: {left} {node.op} {right}"))
+
+
+def _is_positive_int(value):
+    try:
+        number = float(value)
+    except ValueError:
+        return False
+    return number >= 1 and number == int(number)
+
+
+def validate_settings(settings):
+    """
+    检查settings的取值
+
+    Args:
+        settings (dict): 合并默认值后的settings
+
+    Returns:
+        list: Issue
+    """
+    issues = []
+    for key, value in settings.items():
+        if key not in _KNOWN_SETTINGS:
+            issues.append(Issue('warning', f"Unknown setting: {key}"))
+            continue
+        rule = SETTINGS_RULES.get(key)
+        if isinstance(rule, set):
+            if value not in rule or isinstance(value, bool) != isinstance(next(iter(rule)), bool):
+                issues.append(Issue('error', f"Invalid {key}: {value!r}"))
+        elif isinstance(rule, tuple):
+            kind, low, high = rule
+            valid_type = int if kind is int else (int, float)
+            if isinstance(value, bool) or not isinstance(value, valid_type) or not low <= value <= high:
+                issues.append(Issue('error', f"Invalid {key}: {value!r}, expected {kind.__name__} in [{low}, {high}]"))
+    region, universe = settings.get('region'), settings.get('universe')
+    if region not in UNIVERSES:
+        issues.append(Issue('warning', f"Unknown region: {region!r}"))
+    elif universe not in UNIVERSES[region]:
+        issues.append(Issue('error', f"Invalid universe for {region}: {universe!r}"))
+    return issues
+
+
+class ExpressionValidator:
+    """
+    模拟前的本地校验器
+
+    字段表按范围从目录中读取一次后缓存。目录里已有的字段检查类型和单位；只有整个范围同步过
+    （catalog.sync时不指定数据集）才把目录里没有的字段判为错误，只同步了部分数据集时cap、close等
+    其他数据集的字段不会被误判。
+    """
+
+    def __init__(self, catalog=None, fields=None, check_units=True):
+        """
+        Args:
+            catalog (DatafieldCatalog, optional): 本地数据字段目录，提供字段类型和单位
+            fields (dict, optional): 直接给出 {字段ID: 类型} 或 {字段ID: (类型, 单位)}，视为完整的字段列表，
+                对所有范围生效，优先于目录
+            check_units (bool): unitHandling为VERIFY时是否检查加减和比较两侧的单位
+        """
+        self.catalog = catalog
+        self.check_units = check_units
+        self.fields = None
+        if fields is not None:
+            self.fields = {field_id: info if isinstance(info, tuple) else (info, None)
+                           for field_id, info in fields.items()}
+        self._field_tables = {}
+        self._settings_cache = {}
+        self.checked = 0
+        self.rejected = 0
+
+    def field_table(self, settings):
+        """
+        settings所在范围的字段表
+
+        Returns:
+            tuple: ({字段ID: (类型, 单位)}, 是否完整)
+        """
+        if self.fields is not None:
+            return self.fields, True
+        if self.catalog is None:
+            return {}, False
+        key = (settings.get('instrumentType'), settings.get('region'), settings.get('delay'), settings.get('universe'))
+        cached = self._field_tables.get(key)
+        if cached is None:
+            scope = dict(zip(('instrumentType', 'region', 'delay', 'universe'), key))
+            complete = self.catalog.synced_at(scope) is not None
+            cached = self._field_tables[key] = self.catalog.field_types(scope), complete
+            if not complete:
+                logging.info(f"Datafield catalog is not fully synced for {key}, skipping unknown field checks.")
+        return cached
+
+    def _check_settings(self, settings):
+        # 同一批alpha的settings通常只有几种，合并和检查的结果按settings缓存
+        try:
+            key = tuple(sorted(settings.items())) if settings else ()
+            cached = self._settings_cache.get(key)
+        except TypeError:
+            key, cached = None, None
+        if cached is None:
+            merged = dict(DEFAULT_SETTINGS)
+            if settings:
+                merged.update(settings)
+            cached = merged, validate_settings(merged)
+            if key is not None:
+                self._settings_cache[key] = cached
+        return cached
+
+    def validate(self, expression, settings=None):
+        """
+        检查一个表达式及其settings
+
+        Args:
+            expression (str): FASTEXPR表达式
+            settings (dict, optional): 自定义设置，会先合并DEFAULT_SETTINGS
+
+        Returns:
+            list: Issue，没有问题时为空
+        """
+        merged, issues = self._check_settings(settings)
+        issues = list(issues)
+        if '"' in expression or "'" in expression:
+            # 字符串里可能有标识符，不走骨架缓存
+            tree, leaves = None, ()
+        else:
+            parts, leaves = split_identifiers(expression)
+            tree = _parse_skeleton(parts)
+        if tree is None:
+            try:
+                tree, leaves = parse(expression), ()
+            except FastExprError as e:
+                issues.append(Issue('error', str(e)))
+                return issues
+        checker = _Checker(*self.field_table(merged), leaves,
+                           self.check_units and merged.get('unitHandling') == 'VERIFY')
+        checker.infer(tree)
+        issues.extend(checker.issues)
+        return issues
+
+    def errors(self, alpha):
+        """
+        模拟数据中会被服务器拒绝的问题
+
+        Args:
+            alpha (dict): create_simulation_data格式的模拟数据
+
+        Returns:
+            list: 错误信息，可以发送时为空
+        """
+        return [issue.message for issue in self.validate(alpha['regular'], alpha.get('settings'))
+                if issue.level == 'error']
+
+    def filter(self, alphas):
+        """
+        逐个产出通过校验的alpha，不通过的记入日志并计数（self.rejected）
+
+        Yields:
+            dict: 模拟数据
+        """
+        for alpha in alphas:
+            self.checked += 1
+            errors = self.errors(alpha)
+            if errors:
+                self.rejected += 1
+                logging.warning(f"Invalid alpha skipped: {alpha['regular']}: {'; '.join(errors)}")
+                continue
+            yield alpha